@@ -0,0 +1,56 @@
+"""
+Benchmark of the intersection of polygons in 3d, pp.cg.intersect_polygons_3d,
+which is used by FractureNetwork3d.find_intersections.
+
+Random convex polygons (disc-like fractures with 4 to 8 vertexes) are placed
+in a box whose size grows with the number of polygons, so that the density of
+the network, and thus the average number of intersections per polygon, is
+kept fixed. The run time should then grow close to linearly with the number
+of polygons.
+
+Usage:
+    python intersect_polygons_3d.py [max_num_polygons]
+
+"""
+import sys
+import time
+
+import numpy as np
+import porepy as pp
+
+
+def random_polygons(num_polys, seed=0, radius=0.1, density=100):
+    """ Random convex polygons in a box of volume num_polys / density.
+    """
+    rng = np.random.RandomState(seed)
+    box = (num_polys / density) ** (1 / 3)
+    polys = []
+    for _ in range(num_polys):
+        num_vert = rng.randint(4, 9)
+        angle = np.sort(rng.rand(num_vert)) * 2 * np.pi
+        normal = rng.randn(3)
+        normal /= np.linalg.norm(normal)
+        t_1 = np.cross(normal, rng.randn(3))
+        t_1 /= np.linalg.norm(t_1)
+        t_2 = np.cross(normal, t_1)
+        r = radius * (0.5 + rng.rand())
+        center = box * rng.rand(3, 1)
+        polys.append(
+            center + r * (np.outer(t_1, np.cos(angle)) + np.outer(t_2, np.sin(angle)))
+        )
+    return polys
+
+
+def run(max_num_polys=100000):
+    print("num polygons   num intersections   time (s)")
+    num_polys = 1000
+    while num_polys <= max_num_polys:
+        polys = random_polygons(num_polys)
+        tic = time.time()
+        _, _, _, pairs = pp.cg.intersect_polygons_3d(polys)
+        print("%12d %19d %10.2f" % (num_polys, len(pairs), time.time() - tic))
+        num_polys *= 4
+
+
+if __name__ == "__main__":
+    run(*[int(a) for a in sys.argv[1:]])
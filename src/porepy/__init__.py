@@ -32,6 +32,7 @@ from porepy.numerics.fv.tpfa import Tpfa
 from porepy.numerics.fv.mpfa import Mpfa
 from porepy.numerics.fv.biot import Biot, GradP, DivD, BiotStabilization
 from porepy.numerics.fv.source import Integral
+from porepy.numerics.fv.discretization_cache import DiscretizationCache
 
 # Virtual elements, elliptic
 from porepy.numerics.vem.dual_elliptic import project_flux
@@ -1,4 +1,10 @@
-from porepy.ad.forward_mode import Ad_array, initAdArrays
+from porepy.ad.forward_mode import Ad_array, BlockJacobian, initAdArrays
 
 from porepy.ad.functions import exp, log, sign, abs
 from porepy.ad.utils import concatenate
+from porepy.ad.lazy import (
+    Expression,
+    CompiledExpression,
+    lazy_variables,
+    compile_expressions,
+)
@@ -8,43 +8,204 @@ def initAdArrays(variables):
             num_val = variables.size
         except AttributeError:
             num_val = 1
-        return Ad_array(variables, sps.diags(np.ones(num_val)).tocsc())
+        jac = BlockJacobian([sps.identity(num_val, format="csr")], [num_val])
+        return Ad_array(variables, jac)
 
     num_val = [v.size for v in variables]
     ad_arrays = []
     for i, val in enumerate(variables):
-        # initiate zero jacobian
-        n = num_val[i]
-        jac = [sps.csc_matrix((n, m)) for m in num_val]
+        # initiate zero jacobian. Zero blocks are not stored
+        jac = [None] * len(num_val)
         # set jacobian of variable i to I
-        jac[i] = sps.diags(np.ones(num_val[i])).tocsc()
+        jac[i] = sps.identity(num_val[i], format="csr")
         # initiate Ad_array
-        jac = sps.bmat([jac])
-        ad_arrays.append(Ad_array(val, jac))
+        ad_arrays.append(Ad_array(val, BlockJacobian(jac, num_val)))
 
     return ad_arrays
 
 
+class BlockJacobian:
+    """ Jacobian represented by one block per primary variable.
+
+    The blocks are csr matrices, or None for blocks that are structurally zero,
+    e.g. the derivative of one variable with respect to another. Arithmetic
+    is done block-wise, and diagonal scalings are applied directly to the data
+    of the blocks, sharing the sparsity structure with the original blocks. The
+    blocks should therefore not be modified in place.
+
+    The full Jacobian is formed by tocsr(), which is also what Ad_array.jac
+    returns.
+
+    Attributes:
+        blocks (list): One csr matrix, or None, per primary variable.
+        num_rows (int): Number of rows of the Jacobian.
+        num_cols (list of int): Number of columns of each of the blocks.
+
+    """
+
+    def __init__(self, blocks, num_cols, num_rows=None):
+        if num_rows is None:
+            num_rows = [b.shape[0] for b in blocks if b is not None][0]
+        self.blocks = [b if b is None else b.tocsr() for b in blocks]
+        self.num_rows = num_rows
+        self.num_cols = list(num_cols)
+        self._full = None
+
+    @property
+    def shape(self):
+        return (self.num_rows, int(np.sum(self.num_cols)))
+
+    def compatible(self, other):
+        """ Check if other is a BlockJacobian with the same block structure.
+        """
+        return (
+            isinstance(other, BlockJacobian)
+            and self.num_rows == other.num_rows
+            and self.num_cols == other.num_cols
+        )
+
+    def tocsr(self):
+        """ The full Jacobian, as a csr matrix.
+        """
+        if self._full is None:
+            self._full = self._hstack()
+        return self._full
+
+    def copy(self):
+        blocks = [b if b is None else b.copy() for b in self.blocks]
+        return BlockJacobian(blocks, self.num_cols, self.num_rows)
+
+    def scale_rows(self, a):
+        """ Compute diag(a) * J, where a is a scalar or a vector.
+        """
+        if np.isscalar(a) or np.size(a) == 1:
+            return self._map(lambda b: b.data * a)
+        a = np.asarray(a).ravel()
+        return self._map(lambda b: b.data * np.repeat(a, np.diff(b.indptr)))
+
+    def scale_columns(self, a):
+        """ Compute J * diag(a), where a is a scalar or a vector.
+        """
+        if np.isscalar(a) or np.size(a) == 1:
+            return self._map(lambda b: b.data * a)
+        a = np.asarray(a).ravel()
+        offsets = np.hstack((0, np.cumsum(self.num_cols)))
+        blocks = []
+        for i, b in enumerate(self.blocks):
+            if b is not None:
+                loc_a = a[offsets[i] : offsets[i + 1]]
+                b = sps.csr_matrix(
+                    (b.data * loc_a[b.indices], b.indices, b.indptr), shape=b.shape
+                )
+            blocks.append(b)
+        return BlockJacobian(blocks, self.num_cols, self.num_rows)
+
+    def left_mul(self, A):
+        """ Compute A * J, where A is a sparse matrix.
+        """
+        blocks = [b if b is None else (A * b).tocsr() for b in self.blocks]
+        return BlockJacobian(blocks, self.num_cols, A.shape[0])
+
+    def add(self, other):
+        """ Sum with another BlockJacobian of the same block structure.
+        """
+        blocks = []
+        for b1, b2 in zip(self.blocks, other.blocks):
+            if b1 is None:
+                blocks.append(b2)
+            elif b2 is None:
+                blocks.append(b1)
+            else:
+                blocks.append(b1 + b2)
+        return BlockJacobian(blocks, self.num_cols, self.num_rows)
+
+    def __neg__(self):
+        return self.scale_rows(-1)
+
+    @staticmethod
+    def vstack(jacs):
+        """ Stack BlockJacobians with the same block columns vertically.
+        """
+        num_cols = jacs[0].num_cols
+        num_rows = [j.num_rows for j in jacs]
+        blocks = []
+        for i, n in enumerate(num_cols):
+            column = [j.blocks[i] for j in jacs]
+            if all(b is None for b in column):
+                blocks.append(None)
+                continue
+            column = [
+                sps.csr_matrix((m, n)) if b is None else b
+                for b, m in zip(column, num_rows)
+            ]
+            blocks.append(sps.vstack(column, format="csr"))
+        return BlockJacobian(blocks, num_cols, int(np.sum(num_rows)))
+
+    def _hstack(self):
+        # Place the rows of the blocks next to each other in the rows of the
+        # full matrix. This is linear in the number of nonzeros, while
+        # sps.hstack goes through a coo matrix and sorts the entries.
+        row_nnz = [
+            np.zeros(self.num_rows, dtype=np.int) if b is None else np.diff(b.indptr)
+            for b in self.blocks
+        ]
+        indptr = np.hstack((0, np.cumsum(np.sum(row_nnz, axis=0))))
+        if max(indptr[-1], self.shape[1]) < np.iinfo(np.int32).max:
+            indptr = indptr.astype(np.int32)
+        data = np.empty(indptr[-1])
+        indices = np.empty(indptr[-1], dtype=indptr.dtype)
+
+        row_start = indptr[:-1].copy()
+        col_offset = 0
+        for b, nnz, num_cols in zip(self.blocks, row_nnz, self.num_cols):
+            if b is not None:
+                pos = np.repeat(row_start - b.indptr[:-1], nnz) + np.arange(b.nnz)
+                data[pos] = b.data
+                indices[pos] = b.indices + col_offset
+            row_start += nnz
+            col_offset += num_cols
+
+        return sps.csr_matrix((data, indices, indptr), shape=self.shape)
+
+    def _map(self, data_func):
+        # New blocks with data given by data_func, and the same sparsity
+        # structure. The index arrays are shared, not copied.
+        blocks = [
+            b
+            if b is None
+            else sps.csr_matrix((data_func(b), b.indices, b.indptr), shape=b.shape)
+            for b in self.blocks
+        ]
+        return BlockJacobian(blocks, self.num_cols, self.num_rows)
+
+
 class Ad_array:
     def __init__(self, val=1.0, jac=0.0):
         self.val = val
         self.jac = jac
 
+    @property
+    def jac(self):
+        if isinstance(self._jac, BlockJacobian):
+            return self._jac.tocsr()
+        return self._jac
+
+    @jac.setter
+    def jac(self, jac):
+        self._jac = jac
+
     def __add__(self, other):
         b = _cast(other)
         c = Ad_array()
         c.val = self.val + b.val
-        c.jac = self.jac + b.jac
+        c.jac = _add_jac(self._jac, b._jac)
         return c
 
     def __radd__(self, other):
         return self.__add__(other)
 
     def __sub__(self, other):
-        b = _cast(other).copy()
-        b.val = -b.val
-        b.jac = -b.jac
-        return self + b
+        return self + (-_cast(other))
 
     def __rsub__(self, other):
         return -self.__sub__(other)
@@ -58,7 +219,9 @@ class Ad_array:
                 jac = self._jac_mul_other(other)
         else:
             val = self.val * other.val
-            jac = self.diagvec_mul_jac(other.val) + other.diagvec_mul_jac(self.val)
+            jac = _add_jac(
+                self.diagvec_mul_jac(other.val), other.diagvec_mul_jac(self.val)
+            )
         return Ad_array(val, jac)
 
     def __rmul__(self, other):
@@ -75,9 +238,10 @@ class Ad_array:
             jac = self.diagvec_mul_jac(other * self.val ** (other - 1))
         else:
             val = self.val ** other.val
-            jac = self.diagvec_mul_jac(
-                other.val * self.val ** (other.val - 1)
-            ) + other.diagvec_mul_jac(self.val ** other.val * np.log(self.val))
+            jac = _add_jac(
+                self.diagvec_mul_jac(other.val * self.val ** (other.val - 1)),
+                other.diagvec_mul_jac(self.val ** other.val * np.log(self.val)),
+            )
         return Ad_array(val, jac)
 
     def __rpow__(self, other):
@@ -94,6 +258,8 @@ class Ad_array:
         return self * other ** -1
 
     def __neg__(self):
+        if isinstance(self._jac, BlockJacobian):
+            return Ad_array(-self.val, -self._jac)
         b = self.copy()
         b.val = -b.val
         b.jac = -b.jac
@@ -106,12 +272,17 @@ class Ad_array:
         except AttributeError:
             b.val = self.val
         try:
-            b.jac = self.jac.copy()
+            b.jac = self._jac.copy()
         except AttributeError:
-            b.jac = self.jac
+            b.jac = self._jac
         return b
 
     def diagvec_mul_jac(self, a):
+        """ Compute diag(a) * jac. The result is a BlockJacobian if the
+        Jacobian of this array is.
+        """
+        if isinstance(self._jac, BlockJacobian):
+            return self._jac.scale_rows(a)
         try:
             A = sps.diags(a)
         except TypeError:
@@ -123,6 +294,11 @@ class Ad_array:
             return A * self.jac
 
     def jac_mul_diagvec(self, a):
+        """ Compute jac * diag(a). The result is a BlockJacobian if the
+        Jacobian of this array is.
+        """
+        if isinstance(self._jac, BlockJacobian):
+            return self._jac.scale_columns(a)
         try:
             A = sps.diags(a)
         except TypeError:
@@ -138,11 +314,18 @@ class Ad_array:
     #        return sps.hstack(self.jac[:])
 
     def _other_mul_jac(self, other):
+        if isinstance(self._jac, BlockJacobian):
+            if np.isscalar(other):
+                return self._jac.scale_rows(other)
+            elif sps.issparse(other):
+                return self._jac.left_mul(other)
         return other * self.jac
 
     #        return np.array([other * J for J in self.jac])
 
     def _jac_mul_other(self, other):
+        if isinstance(self._jac, BlockJacobian) and np.isscalar(other):
+            return self._jac.scale_rows(other)
         return self.jac * other
 
 
@@ -163,3 +346,28 @@ def _cast(variables):
         else:
             out_var = Ad_array(variables)
     return out_var
+
+
+def _add_jac(jac_1, jac_2):
+    """ Sum of two Jacobians. BlockJacobians are added block-wise if their
+    block structures agree, and Jacobians that are zero are skipped.
+    """
+    if isinstance(jac_1, BlockJacobian) or isinstance(jac_2, BlockJacobian):
+        if _is_zero(jac_2):
+            return jac_1
+        if _is_zero(jac_1):
+            return jac_2
+        if isinstance(jac_1, BlockJacobian) and jac_1.compatible(jac_2):
+            return jac_1.add(jac_2)
+        # Different block structures, or a mix with a full Jacobian
+        if isinstance(jac_1, BlockJacobian):
+            jac_1 = jac_1.tocsr()
+        if isinstance(jac_2, BlockJacobian):
+            jac_2 = jac_2.tocsr()
+    return jac_1 + jac_2
+
+
+def _is_zero(jac):
+    if sps.issparse(jac):
+        return not np.any(jac.data)
+    return np.isscalar(jac) and jac == 0
@@ -1,9 +1,12 @@
 import numpy as np
 
 from porepy.ad.forward_mode import Ad_array
+from porepy.ad.lazy import Expression
 
 
 def exp(var):
+    if isinstance(var, Expression):
+        return Expression("exp", [var])
     if isinstance(var, Ad_array):
         val = np.exp(var.val)
         der = var.diagvec_mul_jac(np.exp(var.val))
@@ -13,6 +16,8 @@ def exp(var):
 
 
 def log(var):
+    if isinstance(var, Expression):
+        return Expression("log", [var])
     if not isinstance(var, Ad_array):
         return np.log(var)
 
@@ -22,6 +27,8 @@ def log(var):
 
 
 def sign(var):
+    if isinstance(var, Expression):
+        return Expression("sign", [var])
     if not isinstance(var, Ad_array):
         return np.sign(var)
     else:
@@ -29,6 +36,8 @@ def sign(var):
 
 
 def abs(var):
+    if isinstance(var, Expression):
+        return Expression("abs", [var])
     if not isinstance(var, Ad_array):
         return np.abs(var)
     else:
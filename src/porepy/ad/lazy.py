@@ -0,0 +1,328 @@
+"""
+Deferred evaluation of forward mode automatic differentiation.
+
+Expressions are recorded as a graph of Expression nodes, which is compiled once
+by compile_expressions(). The compiled graph is then evaluated for new values
+of the variables, e.g. in each Newton iteration, and gives Ad_arrays with the
+values and Jacobians of the expressions.
+
+Chains of elementwise operations (sums, products, powers, exp, log etc.) are
+fused: The value of a chain is computed by numpy operations, together with the
+derivatives of the chain with respect to each of its inputs, which are vectors.
+The Jacobian of the chain is then formed by one diagonal scaling of the
+Jacobian of each input, while eager evaluation forms a new Jacobian for every
+operation. Products with sparse matrices, e.g. discrete divergence and gradient
+operators, are applied to the Jacobians as in eager evaluation.
+
+The gain is thus limited to the elementwise parts of the expressions. For long
+elementwise chains, e.g. constitutive relations such as relative
+permeabilities and densities evaluated in the cells, the evaluation is about
+twice as fast as eager evaluation. For typical residuals, the cost is dominated
+by the products of sparse matrices with Jacobians, which are the same as in
+eager evaluation, and no speedup should be expected.
+
+Constant scalars and arrays in the expressions are stored by reference, thus
+arrays that are changed in place, e.g. the solution at the previous time step,
+are seen by later evaluations. Note that operations between constants, e.g. a
+product of two arrays, are done when the expression is recorded.
+
+Example:
+    p, s = pp.ad.lazy_variables(2)
+    eqs = pp.ad.compile_expressions([div * (s ** 2 * (grad * p)), s * p - 1])
+    for i in range(max_iter):
+        eq_p, eq_s = eqs.evaluate([p_val, s_val])
+        ...
+
+"""
+import numpy as np
+import scipy.sparse as sps
+
+from porepy.ad.forward_mode import Ad_array, BlockJacobian, initAdArrays, _add_jac
+
+
+def lazy_variables(num_variables):
+    """ Create the variables of a deferred expression.
+
+    Parameters:
+        num_variables (int): Number of variables.
+
+    Returns:
+        list of Expression: The variables. Their values are given, in the same
+            order, to CompiledExpression.evaluate().
+
+    """
+    return [Expression("var", data=i) for i in range(num_variables)]
+
+
+def compile_expressions(expressions):
+    """ Compile deferred expressions for repeated evaluation.
+
+    Parameters:
+        expressions (Expression, or list of Expressions): Expressions to be
+            evaluated together. Subexpressions that are shared between the
+            expressions are evaluated once.
+
+    Returns:
+        CompiledExpression.
+
+    """
+    return CompiledExpression(expressions)
+
+
+class Expression:
+    """ Node of a deferred expression graph.
+
+    The nodes are created by lazy_variables(), by the arithmetic operators of
+    the class, by left multiplication with sparse matrices, and by the
+    functions in porepy.ad.functions.
+
+    Attributes:
+        op (str): The operation of the node; 'var', 'const', 'matmul', or one
+            of the elementwise operations 'add', 'mul', 'pow', 'neg', 'exp',
+            'log', 'abs' and 'sign'.
+        children (list of Expression): Operands of the operation.
+        data: Index of a variable, value of a constant, or the matrix of a
+            matrix product.
+
+    """
+
+    # Make numpy arrays leave products etc. with expressions to the expression
+    __array_ufunc__ = None
+
+    def __init__(self, op, children=None, data=None):
+        self.op = op
+        self.children = [] if children is None else children
+        self.data = data
+
+    def __repr__(self):
+        return "Deferred ad expression, operation " + self.op
+
+    def __add__(self, other):
+        return Expression("add", [self, _wrap(other)])
+
+    def __radd__(self, other):
+        return Expression("add", [_wrap(other), self])
+
+    def __sub__(self, other):
+        return self + (-_wrap(other))
+
+    def __rsub__(self, other):
+        return _wrap(other) + (-self)
+
+    def __mul__(self, other):
+        if sps.issparse(other):
+            raise ValueError("Only left multiplication with matrices is supported")
+        return Expression("mul", [self, _wrap(other)])
+
+    def __rmul__(self, other):
+        if sps.issparse(other):
+            return Expression("matmul", [self], other)
+        return Expression("mul", [_wrap(other), self])
+
+    def __matmul__(self, other):
+        raise ValueError("Only left multiplication with matrices is supported")
+
+    def __rmatmul__(self, other):
+        if not sps.issparse(other):
+            raise ValueError("Only products with sparse matrices are supported")
+        return Expression("matmul", [self], other)
+
+    def __pow__(self, other):
+        return Expression("pow", [self, _wrap(other)])
+
+    def __rpow__(self, other):
+        return Expression("pow", [_wrap(other), self])
+
+    def __truediv__(self, other):
+        return self * _wrap(other) ** -1
+
+    def __neg__(self):
+        return Expression("neg", [self])
+
+
+class CompiledExpression:
+    """ Deferred expressions, prepared for repeated evaluation.
+
+    The compilation sorts the nodes of the graph, and decides which nodes need
+    a Jacobian: The variables, matrix products, the expressions themselves,
+    and elementwise operations that are multiplied by a matrix. The other
+    elementwise operations are fused into these.
+
+    """
+
+    def __init__(self, expressions):
+        self._single = not isinstance(expressions, list)
+        if self._single:
+            expressions = [expressions]
+        self.expressions = expressions
+
+        # Sort the nodes, so that the children of a node come before it
+        self._order = []
+        visited = set()
+        for expr in expressions:
+            stack = [(expr, False)]
+            while stack:
+                node, children_done = stack.pop()
+                if children_done:
+                    self._order.append(node)
+                    continue
+                if id(node) in visited:
+                    continue
+                visited.add(id(node))
+                stack.append((node, True))
+                for c in reversed(node.children):
+                    stack.append((c, False))
+
+        self._jacobian_nodes = set(id(e) for e in expressions)
+        for node in self._order:
+            if node.op in ["var", "matmul"]:
+                self._jacobian_nodes.add(id(node))
+            if node.op == "matmul":
+                self._jacobian_nodes.add(id(node.children[0]))
+
+        # Intermediate results are released after their last use. The
+        # Jacobian of a node is used until the fused elementwise operations
+        # that depend on it have got their Jacobians.
+        last_use = {}
+        inputs = {}
+        for i, node in enumerate(self._order):
+            inputs[id(node)] = set()
+            for c in node.children:
+                last_use[id(c)] = i
+                if id(c) in self._jacobian_nodes:
+                    inputs[id(node)].add(id(c))
+                else:
+                    inputs[id(node)].update(inputs[id(c)])
+            for k in inputs[id(node)]:
+                last_use[k] = i
+        outputs = set(id(e) for e in expressions)
+        self._release = [[] for _ in self._order]
+        for key, i in last_use.items():
+            if key not in outputs:
+                self._release[i].append(key)
+
+        self.num_variables = 1 + max(
+            [n.data for n in self._order if n.op == "var"], default=-1
+        )
+
+    def evaluate(self, values):
+        """ Evaluate the expressions.
+
+        Parameters:
+            values (list of np.ndarray): Values of the variables, in the order
+                given by lazy_variables().
+
+        Returns:
+            Ad_array, or list of Ad_arrays: Values and Jacobians of the
+                expressions, with one Jacobian block per variable.
+
+        """
+        if len(values) < self.num_variables:
+            raise ValueError("A value should be given for each variable")
+        variables = initAdArrays(list(values))
+        num_cols = [np.size(v) for v in values]
+
+        # Values and Jacobians of the nodes with Jacobians, and values and
+        # derivatives (with respect to the nodes with Jacobians) of the others
+        ad = {}
+        local = {}
+
+        for node, release in zip(self._order, self._release):
+            key = id(node)
+            if node.op == "var":
+                ad[key] = variables[node.data]
+            elif node.op == "const":
+                local[key] = (node.data, {})
+            elif node.op == "matmul":
+                ad[key] = node.data * ad[id(node.children[0])]
+            else:
+                val, grad = self._elementwise(node, ad, local)
+                if key in self._jacobian_nodes:
+                    ad[key] = self._jacobian(val, grad, ad, num_cols)
+                else:
+                    local[key] = (val, grad)
+
+            for k in release:
+                ad.pop(k, None)
+                local.pop(k, None)
+
+        result = [ad[id(e)] for e in self.expressions]
+        if self._single:
+            return result[0]
+        return result
+
+    def _elementwise(self, node, ad, local):
+        """ Value and derivatives of an elementwise operation.
+        """
+        vals = []
+        grads = []
+        for c in node.children:
+            if id(c) in ad:
+                vals.append(ad[id(c)].val)
+                # The derivative of the node with respect to itself
+                grads.append({id(c): None})
+            else:
+                vals.append(local[id(c)][0])
+                grads.append(local[id(c)][1])
+
+        op = node.op
+        a = vals[0]
+        if op == "add":
+            val = a + vals[1]
+            partials = [1, 1]
+        elif op == "mul":
+            val = a * vals[1]
+            partials = [vals[1], a]
+        elif op == "pow":
+            b = vals[1]
+            val = a ** b
+            # The derivative with respect to the exponent is only computed if
+            # needed, the logarithm is not defined for all constant bases.
+            partials = [
+                b * a ** (b - 1) if grads[0] else None,
+                val * np.log(a) if grads[1] else None,
+            ]
+        elif op == "neg":
+            val = -a
+            partials = [-1]
+        elif op == "exp":
+            val = np.exp(a)
+            partials = [val]
+        elif op == "log":
+            val = np.log(a)
+            partials = [1 / a]
+        elif op == "abs":
+            val = np.abs(a)
+            partials = [np.sign(a)]
+        elif op == "sign":
+            return np.sign(a), {}
+        else:
+            raise ValueError("Unknown operation " + op)
+
+        # Chain rule
+        grad = {}
+        for partial, child_grad in zip(partials, grads):
+            for k, g in child_grad.items():
+                term = partial if g is None else partial * g
+                grad[k] = grad[k] + term if k in grad else term
+        return val, grad
+
+    def _jacobian(self, val, grad, ad, num_cols):
+        """ Form the Jacobian of a fused elementwise operation from the
+        Jacobians of its inputs.
+        """
+        jac = 0
+        for k, g in grad.items():
+            jac = _add_jac(jac, ad[k].diagvec_mul_jac(g))
+        if not isinstance(jac, BlockJacobian):
+            # No dependency on the variables
+            jac = BlockJacobian([None] * len(num_cols), num_cols, np.size(val))
+        return Ad_array(val, jac)
+
+
+def _wrap(other):
+    if isinstance(other, Expression):
+        return other
+    if isinstance(other, Ad_array):
+        raise ValueError("Ad_arrays and deferred expressions cannot be mixed")
+    return Expression("const", data=other)
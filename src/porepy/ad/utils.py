@@ -1,14 +1,23 @@
 import numpy as np
 import scipy.sparse as sps
 
-from porepy.ad.forward_mode import Ad_array, initAdArrays
+from porepy.ad.forward_mode import Ad_array, BlockJacobian, initAdArrays
 
 
 def concatenate(variables, axis=0):
     vals = [var.val for var in variables]
+    vals_stacked = np.concatenate(vals, axis=axis)
+
+    # Keep the block structure if all Jacobians have the same block columns
+    block_jacs = [var._jac for var in variables]
+    if isinstance(block_jacs[0], BlockJacobian) and all(
+        isinstance(j, BlockJacobian) and j.num_cols == block_jacs[0].num_cols
+        for j in block_jacs
+    ):
+        return Ad_array(vals_stacked, BlockJacobian.vstack(block_jacs))
+
     jacs = np.array([var.jac for var in variables])
 
-    vals_stacked = np.concatenate(vals, axis=axis)
     jacs_stacked = []
     jacs_stacked = sps.vstack(jacs)
     #    for i in range(jacs.shape[1]):
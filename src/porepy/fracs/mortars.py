@@ -295,20 +295,10 @@ def match_grids_2d(new_g, old_g, tol):
     shape = (old_g.dim + 1, old_g.num_cells)
     cn_old_g = old_g.cell_nodes().indices.reshape(shape, order="F")
     cc = np.mean(new_g.nodes, axis=1).reshape((3, 1))
-    isect = cg.intersect_triangulations(
+    new_g_ind, old_g_ind, weights = cg.triangulation_overlaps(
         proj_pts(new_g.nodes, cc), proj_pts(old_g.nodes, cc), cn_new_g, cn_old_g
     )
 
-    num = len(isect)
-    new_g_ind = np.zeros(num, dtype=np.int)
-    old_g_ind = np.zeros(num, dtype=np.int)
-    weights = np.zeros(num)
-
-    for ind, i in enumerate(isect):
-        new_g_ind[ind] = i[0]
-        old_g_ind[ind] = i[1]
-        weights[ind] = i[2]
-
     weights /= old_g.cell_volumes[old_g_ind]
     return weights, new_g_ind, old_g_ind
 
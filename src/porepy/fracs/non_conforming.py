@@ -13,7 +13,7 @@ import porepy as pp
 
 from porepy.utils import tags
 from porepy.utils.matrix_compression import rldecode
-from porepy.utils.setmembership import unique_columns_tol, ismember_rows
+from porepy.utils.setmembership import unique_columns_tol_batch, ismember_rows
 
 from porepy.fracs import tools as fractools
 import porepy.utils.comp_geom as cg
@@ -194,26 +194,19 @@ def merge_1d_grids(g, h, global_ind_offset=0, tol=1e-4):
     # Nodes of the two 1d grids, combine them
     gp = g.nodes
     hp = h.nodes
-    combined = np.hstack((gp, hp))
 
     num_g = gp.shape[1]
     num_h = hp.shape[1]
 
-    # Keep track of where we put the indices of the original grids
-    g_in_full = np.arange(num_g)
-    h_in_full = num_g + np.arange(num_h)
-
     # The tolerance should not be larger than the smallest distance between
     # two points on any of the grids.
     diff_gp = np.min(cg.dist_pointset(gp, True))
     diff_hp = np.min(cg.dist_pointset(hp, True))
     min_diff = np.minimum(tol, 0.5 * np.minimum(diff_gp, diff_hp))
 
-    # Uniquify points
-    combined_unique, _, new_2_old = unique_columns_tol(combined, tol=min_diff)
-    # Follow locations of the original grid points
-    g_in_unique = new_2_old[g_in_full]
-    h_in_unique = new_2_old[h_in_full]
+    # Uniquify points, and follow locations of the original grid points
+    combined_unique, _, in_unique = unique_columns_tol_batch([gp, hp], tol=min_diff)
+    g_in_unique, h_in_unique = in_unique
 
     # The combined nodes must be sorted along their natural line.
     # Find the dimension with the largest spatial extension, and sort those
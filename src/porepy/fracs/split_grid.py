@@ -4,10 +4,10 @@ Module for splitting a grid at the fractures.
 
 import numpy as np
 from scipy import sparse as sps
+from scipy.sparse import csgraph
 
 from porepy.utils.half_space import half_space_int
 from porepy.utils import sparse_mat, tags
-from porepy.utils.graph import Graph
 from porepy.utils.mcolon import mcolon
 
 
@@ -397,6 +397,10 @@ def duplicate_nodes(g, nodes, offset):
     added. If the node is on a X-intersection 4 duplicates will be added.
     Equivalently for other types of intersections.
 
+    All nodes are treated at once: The cells around each node are colored by
+    the connected components of the cells that share a face of the node, and
+    the face-node map and node coordinates are rebuilt in one pass.
+
     Parameters:
     ----------
     g         - The grid for which the nodes are duplicated
@@ -404,138 +408,101 @@ def duplicate_nodes(g, nodes, offset):
     offset    - How far from the original node the duplications should be
                 placed.
     """
-    node_count = 0
-
-    # We wish to convert the sparse csc matrix to a sparse
-    # csr matrix to easily add rows. However, the convertion sorts the
-    # indices, which will change the node order when we convert back. We
-    # therefore find the inverse sorting of the nodes of each face.
-    # After we have performed the row operations we will map the nodes
-    # back to their original position.
-
-    _, iv = sort_sub_list(g.face_nodes.indices, g.face_nodes.indptr)
-    g.face_nodes = g.face_nodes.tocsr()
-    # Iterate over each internal node and split it according to the graph.
-    # For each cell attached to the node, we check wich color the cell has.
-    # All cells with the same color is then attached to a new copy of the
-    # node.
-    cell_nodes = g.cell_nodes().tocsr()
-    for node in nodes:
-        # t_node takes into account the added nodes.
-        t_node = node + node_count
-        # Find cells connected to node
-
-        cells = sparse_mat.slice_indices(cell_nodes, node)
-        #        cell_nodes = g.cell_nodes().tocsr()
-        #        ind_ptr = cell_nodes.indptr
-        #        cells = cell_nodes.indices[
-        #            mcolon(ind_ptr[t_node], ind_ptr[t_node + 1])]
-        cells = np.unique(cells)
-        # Find the color of each cell. A group of cells is given the same color
-        # if they are connected by faces. This means that all cells on one side
-        # of a fracture will have the same color, but a different color than
-        # the cells on the other side of the fracture. Equivalently, the cells
-        # at a X-intersection will be given four different colors
-        colors = find_cell_color(g, cells)
-        # Find which cells share the same color
-        colors, ix = np.unique(colors, return_inverse=True)
-        # copy coordinate of old node
-        new_nodes = np.repeat(g.nodes[:, t_node, None], colors.size, axis=1)
-        faces = np.array([], dtype=int)
-        face_pos = np.array([g.face_nodes.indptr[t_node]])
-        assert g.cell_faces.getformat() == "csc"
-        assert g.face_nodes.getformat() == "csr"
-        faces_of_node_t = sparse_mat.slice_indices(g.face_nodes, t_node)
-        for j in range(colors.size):
-            # For each color we wish to add one node. First we find all faces that
-            # are connected to the fracture node, and have the correct cell
-            # color
-            colored_faces = sparse_mat.slice_indices(g.cell_faces, cells[ix == j])
-            colored_faces = np.unique(colored_faces)
-            is_colored = np.in1d(faces_of_node_t, colored_faces, assume_unique=True)
-
-            faces = np.append(faces, faces_of_node_t[is_colored])
-            # These faces are then attached to new node number j.
-            face_pos = np.append(face_pos, face_pos[-1] + np.sum(is_colored))
-            # If an offset is given, we will change the position of the nodes.
-            # We move the nodes a length of offset away from the fracture(s).
-            if offset > 0 and colors.size > 1:
-                new_nodes[:, j] -= avg_normal(g, faces_of_node_t[is_colored]) * offset
-        # The total number of faces should not have changed, only their
-        # connection to nodes. We can therefore just update the indices and
-        # indptr map.
-        g.face_nodes.indices[face_pos[0] : face_pos[-1]] = faces
-        node_count += colors.size - 1
-        g.face_nodes.indptr = np.insert(g.face_nodes.indptr, t_node + 1, face_pos[1:-1])
-        g.face_nodes._shape = (
-            g.face_nodes.shape[0] + colors.size - 1,
-            g.face_nodes._shape[1],
+    nodes = np.unique(nodes)
+    num_nodes = g.num_nodes
+    num_cells = g.num_cells
+
+    # The cells of each node to be split, stored as (node, cell) pairs sorted
+    # by node and cell.
+    star = g.cell_nodes().tocsr()[nodes]
+    star.sort_indices()
+    pair_node = np.repeat(nodes, np.diff(star.indptr))
+    pair_cell = star.indices
+    pair_key = pair_node.astype(np.int64) * num_cells + pair_cell
+
+    # Face-node incidences of the nodes to be split
+    face_nodes = g.face_nodes
+    assert face_nodes.getformat() == "csc"
+    inc_node = face_nodes.indices
+    is_split = np.zeros(num_nodes, dtype=np.bool)
+    is_split[nodes] = True
+    split_inc = np.where(is_split[inc_node])[0]
+    inc_node = inc_node[split_inc].astype(np.int64)
+    inc_face = np.repeat(np.arange(face_nodes.shape[1]), np.diff(face_nodes.indptr))
+    inc_face = inc_face[split_inc]
+
+    # The cells of each face. After the faces have been split, a face has at
+    # most two cells, and all of them are in the star of the nodes of the face.
+    face_cells = g.cell_faces.tocsr(copy=True)
+    face_cells.eliminate_zeros()
+    num_cells_of_face = np.diff(face_cells.indptr)[inc_face]
+    first_pos = face_cells.indptr[inc_face]
+    has_cell = num_cells_of_face > 0
+    first_cell = np.zeros(inc_face.size, dtype=np.int)
+    first_cell[has_cell] = face_cells.indices[first_pos[has_cell]]
+    inc_pair = np.searchsorted(pair_key, inc_node * num_cells + first_cell)
+
+    # Cells sharing a face of the node are given the same color. The colors
+    # are the connected components of the graph of (node, cell) pairs.
+    two_cells = num_cells_of_face > 1
+    second_cell = face_cells.indices[first_pos[two_cells] + 1]
+    second_pair = np.searchsorted(
+        pair_key, inc_node[two_cells] * num_cells + second_cell
+    )
+    graph = sps.coo_matrix(
+        (np.ones(second_pair.size), (inc_pair[two_cells], second_pair)),
+        shape=(pair_key.size, pair_key.size),
+    )
+    num_colors, color = csgraph.connected_components(graph, directed=False)
+
+    # Number the colors by node, and for each node by the lowest cell index of
+    # the color
+    _, first_pair = np.unique(color, return_index=True)
+    order = np.argsort(first_pair)
+    rank = np.empty(num_colors, dtype=np.int)
+    rank[order] = np.arange(num_colors)
+    color_node = pair_node[first_pair[order]]
+    local_color = rank[color] - np.searchsorted(color_node, pair_node)
+
+    # Each node is replaced by one node per color, the numbering of the new
+    # nodes follows from a prefix sum over the number of copies.
+    num_copies = np.ones(num_nodes, dtype=np.int)
+    num_copies[nodes] = np.bincount(color_node, minlength=num_nodes)[nodes]
+    new_start = np.hstack((0, np.cumsum(num_copies)))
+    num_new_nodes = new_start[-1]
+    pair_new_node = new_start[pair_node] + local_color
+
+    indices = new_start[face_nodes.indices]
+    indices[split_inc] = pair_new_node[inc_pair]
+    new_nodes = np.repeat(g.nodes, num_copies, axis=1)
+
+    # If an offset is given, we will change the position of the nodes.
+    # We move the nodes a length of offset away from the fracture(s), along
+    # the average outer normal of the fracture faces of the copy, see
+    # avg_normal().
+    if offset > 0:
+        is_multi = num_copies[inc_node] > 1
+        frac_face = np.logical_and(is_multi, num_cells_of_face == 1)
+        sign = face_cells.data[first_pos[frac_face]]
+        normals = g.face_normals[:, inc_face[frac_face]] * sign
+        target = indices[split_inc[frac_face]]
+        n = np.vstack(
+            [
+                np.bincount(target, weights=normals[d], minlength=num_new_nodes)
+                for d in range(normals.shape[0])
+            ]
         )
-        # We delete the old node because of the offset. If we do not
-        # have an offset we could keep it and add one less node.
-        g.nodes = np.delete(g.nodes, t_node, axis=1)
-        g.nodes = np.insert(g.nodes, [t_node] * new_nodes.shape[1], new_nodes, axis=1)
-
-    # Transform back to csc format and fix node ordering.
-    g.face_nodes = g.face_nodes.tocsc()
-    g.face_nodes.indices = g.face_nodes.indices[iv]  # For fast row operation
-
-    return node_count
-
+        moved = np.unique(pair_new_node[num_copies[pair_node] > 1])
+        n = n[:, moved] / np.linalg.norm(n[:, moved], axis=0)
+        new_nodes[:, moved] -= n * offset
 
-def sort_sub_list(indices, indptr):
-    ix = np.zeros(indices.size, dtype=int)
-    for i in range(indptr.size - 1):
-        sub_ind = slice(indptr[i], indptr[i + 1])
-        loc_ix = np.argsort(indices[sub_ind])
-        ix[sub_ind] = loc_ix + indptr[i]
-    indices = indices[ix]
-    iv = np.zeros(indices.size, dtype=int)
-    iv[ix] = np.arange(indices.size)
-    return indices, iv
-
-
-def find_cell_color(g, cells):
-    """
-    Color the cells depending on the cell connections. Each group of cells
-    that are connected (either directly by a shared face or through a series
-    of shared faces of many cells) is are given different colors.
-           c_1-c_3     c_4
-         /
-       c_7  |           |
-         \
-           c_2         c_5
-    In this case, cells c_1, c_2, c_3 and c_7 will be given color 0, while
-    cells c_4 and c_5 will be given color 1.
+    g.face_nodes = sps.csc_matrix(
+        (face_nodes.data, indices, face_nodes.indptr),
+        shape=(num_new_nodes, face_nodes.shape[1]),
+    )
+    g.nodes = new_nodes
 
-    Parameters:
-    ----------
-    g        - Grid for which the cells belong
-    cells    - indecies of cells (=np.array([1,2,3,4,5,7]) for case above)
-    """
-    c = np.sort(cells)
-    # Local cell-face and face-node maps.
-    assert g.cell_faces.getformat() == "csc"
-    cell_faces = sparse_mat.slice_mat(g.cell_faces, c)
-    child_cell_ind = -np.ones(g.num_cells, dtype=np.int)
-    child_cell_ind[c] = np.arange(cell_faces.shape[1])
-
-    # Create a copy of the cell-face relation, so that we can modify it at
-    # will
-    # com Runar: I don't think this is neccessary as slice_mat creates a copy
-    #    cell_faces = cf_sub.copy()
-
-    # Direction of normal vector does not matter here, only 0s and 1s
-    cell_faces.data = np.abs(cell_faces.data)
-
-    # Find connection between cells via the cell-face map
-    c2c = cell_faces.transpose() * cell_faces
-    # Only care about absolute values
-    c2c.data = np.clip(c2c.data, 0, 1).astype("bool")
-
-    graph = Graph(c2c)
-    graph.color_nodes()
-    return graph.color[child_cell_ind[cells]]
+    return num_new_nodes - num_nodes
 
 
 def avg_normal(g, faces):
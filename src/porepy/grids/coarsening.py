@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import heapq
+
 import numpy as np
 import scipy.sparse as sps
 import scipy.stats as stats
@@ -8,7 +10,7 @@ import porepy as pp
 from porepy.grids import grid, grid_bucket
 
 
-from porepy.utils import matrix_compression, mcolon, accumarray, setmembership
+from porepy.utils import matrix_compression, mcolon
 from porepy.utils import half_space, tags
 
 
@@ -120,82 +122,44 @@ def generate_coarse_grid_single(g, subdiv, face_map):
     subdiv = np.asarray(subdiv)
     assert subdiv.size == g.num_cells
 
-    # declare the storage array to build the cell_faces map
-    cell_faces = np.empty(0, dtype=g.cell_faces.indptr.dtype)
-    cells = np.empty(0, dtype=cell_faces.dtype)
-    orient = np.empty(0, dtype=g.cell_faces.data.dtype)
+    cells_list, coarse_id = np.unique(subdiv, return_inverse=True)
+    num_fine = np.bincount(coarse_id)
+
+    # compute the volumes and the average of the cell centers
+    cell_volumes = np.bincount(coarse_id, weights=g.cell_volumes)
+    cell_centers = np.array([np.bincount(coarse_id, weights=c) for c in g.cell_centers])
+    cell_centers /= num_fine
 
-    # declare the storage array to build the face_nodes map
-    face_nodes = np.empty(0, dtype=g.face_nodes.indptr.dtype)
-    nodes = np.empty(0, dtype=face_nodes.dtype)
-    visit = np.zeros(g.num_faces, dtype=np.bool)
+    # reconstruct the cell_faces mapping, the faces which appear twice in the
+    # same coarse cell are internal and discarded
+    faces_old, cells_old, orient = sps.find(g.cell_faces)
+    cells = coarse_id[cells_old]
+    key = faces_old.astype(np.int) * cells_list.size + cells
+    _, index, count = np.unique(key, return_index=True, return_counts=True)
+    index = index[count == 1]
+    cell_faces, cells, orient = faces_old[index], cells[index], orient[index]
 
-    # compute the face_node indexes
+    # reconstruct the face_nodes mapping considering only the external faces
     num_nodes_per_face = g.face_nodes.indptr[1:] - g.face_nodes.indptr[:-1]
     face_node_ind = matrix_compression.rldecode(
         np.arange(g.num_faces), num_nodes_per_face
     )
-
-    cells_list = np.unique(subdiv)
-    cell_volumes = np.zeros(cells_list.size)
-    cell_centers = np.zeros((3, cells_list.size))
-
-    for cellId, cell in enumerate(cells_list):
-        # extract the cells of the original mesh associated to a specific label
-        cells_old = np.where(subdiv == cell)[0]
-
-        # compute the volume
-        cell_volumes[cellId] = np.sum(g.cell_volumes[cells_old])
-        cell_centers[:, cellId] = np.average(g.cell_centers[:, cells_old], axis=1)
-
-        # reconstruct the cell_faces mapping
-        faces_old, _, orient_old = sps.find(g.cell_faces[:, cells_old])
-        mask = np.ones(faces_old.size, dtype=np.bool)
-        mask[np.unique(faces_old, return_index=True)[1]] = False
-        # extract the indexes of the internal edges, to be discared
-        index = np.array(
-            [np.where(faces_old == f)[0] for f in faces_old[mask]], dtype=np.int
-        ).ravel()
-        faces_new = np.delete(faces_old, index)
-        cell_faces = np.r_[cell_faces, faces_new]
-        cells = np.r_[cells, np.repeat(cellId, faces_new.shape[0])]
-        orient = np.r_[orient, np.delete(orient_old, index)]
-
-        # reconstruct the face_nodes mapping
-        # consider only the unvisited faces
-        not_visit = ~visit[faces_new]
-        if not_visit.size == 0 or np.all(~not_visit):
-            continue
-        # mask to consider only the external faces
-        mask = np.atleast_1d(
-            np.sum(
-                [face_node_ind == f for f in faces_new[not_visit]],
-                axis=0,
-                dtype=np.bool,
-            )
-        )
-        face_nodes = np.r_[face_nodes, face_node_ind[mask]]
-
-        nodes_new = g.face_nodes.indices[mask]
-        nodes = np.r_[nodes, nodes_new]
-        visit[faces_new] = True
+    mask = np.in1d(face_node_ind, cell_faces)
+    face_nodes = face_node_ind[mask]
+    nodes = g.face_nodes.indices[mask]
 
     # Rename the faces
     cell_faces_unique = np.unique(cell_faces)
     cell_faces_id = np.arange(cell_faces_unique.size, dtype=cell_faces.dtype)
-    cell_faces = np.array(
-        [cell_faces_id[np.where(cell_faces_unique == f)[0]] for f in cell_faces]
-    ).ravel()
+    cell_faces = cell_faces_id[np.searchsorted(cell_faces_unique, cell_faces)]
     shape = (cell_faces_unique.size, cells_list.size)
     cell_faces = sps.csc_matrix((orient, (cell_faces, cells)), shape=shape)
 
     # Rename the nodes
-    face_nodes = np.array(
-        [cell_faces_id[np.where(cell_faces_unique == f)[0]] for f in face_nodes]
-    ).ravel()
+    face_nodes = cell_faces_id[np.searchsorted(cell_faces_unique, face_nodes)]
     nodes_list = np.unique(nodes)
     nodes_id = np.arange(nodes_list.size, dtype=nodes.dtype)
-    nodes = np.array([nodes_id[np.where(nodes_list == n)[0]] for n in nodes]).ravel()
+    nodes = nodes_id[np.searchsorted(nodes_list, nodes)]
 
     # sort the nodes
     nodes = nodes[np.argsort(face_nodes, kind="mergesort")]
@@ -448,14 +412,10 @@ def create_aggregations(g, **kwargs):
 def __get_neigh(cells_id, c2c, partition):
     """ Support function for create_aggregations
     """
-    neighbors = np.empty(0, dtype=np.int)
-
-    for cell_id in np.atleast_1d(cells_id):
-        # Extract the neighbors of the current cell
-        loc = slice(c2c.indptr[cell_id], c2c.indptr[cell_id + 1])
-        neighbors = np.hstack((neighbors, c2c.indices[loc]))
-
-    neighbors = np.unique(neighbors)
+    cells_id = np.atleast_1d(cells_id)
+    # Extract the neighbors of the current cells
+    loc = mcolon.mcolon(c2c.indptr[cells_id], c2c.indptr[cells_id + 1])
+    neighbors = np.unique(c2c.indices[loc])
     partition_neighbors = partition[neighbors]
 
     # Check if some neighbor has already a coarse id
@@ -501,171 +461,146 @@ def create_partition(A, seeds=None, **kwargs):
         return np.zeros(1)
     Nc = A.shape[0]
 
-    # For each node, which other nodes are strongly connected to it
-    ST = sps.lil_matrix((Nc, Nc), dtype=np.bool)
-
-    # In the first instance, all cells are strongly connected to each other
-    At = A.T
-
-    for i in np.arange(Nc):
-        loc = slice(At.indptr[i], At.indptr[i + 1])
-        ci, vals = At.indices[loc], At.data[loc]
-        neg = vals < 0.0
-        nvals = vals[neg]
-        nci = ci[neg]
-        minId = np.argmin(nvals)
-        ind = -nvals >= epsilon * np.abs(nvals[minId])
-        ST[nci[ind], i] = True
+    # Work on a copy with sorted indices, each row is then scanned in order
+    A = sps.csr_matrix(A, copy=True)
+    A.sum_duplicates()
+    rows = np.repeat(np.arange(Nc), np.diff(A.indptr))
+    cols = A.indices
+
+    # For each node, which other nodes are strongly connected to it. A negative
+    # coupling is strong if it is at least epsilon times the strongest one of
+    # the row.
+    neg_data = np.minimum(A.data, 0)
+    min_neg = np.zeros(Nc)
+    not_empty = A.indptr[:-1] < A.indptr[1:]
+    min_neg[not_empty] = np.minimum.reduceat(neg_data, A.indptr[:-1][not_empty])
+    strong = np.logical_and(A.data < 0.0, -A.data >= epsilon * np.abs(min_neg[rows]))
+    ST = sps.csr_matrix(
+        (np.ones(np.sum(strong), dtype=np.int), (cols[strong], rows[strong])),
+        shape=(Nc, Nc),
+    )
 
-    # Temporary field, will store connections of depth 1
+    # Extend the connections up to depth cdepth, by powers of the graph
     for _ in np.arange(2, cdepth + 1):
-        STold = ST.copy()
-        for j in np.arange(Nc):
-            rowj = np.array(STold.rows[j])
-            if rowj.size == 0:
-                continue
-            row = np.hstack([STold.rows[r] for r in rowj])
-            ST[j, np.concatenate((rowj, row))] = True
-
-    del STold
-
-    ST.setdiag(False)
-    lmbda = np.array([len(s) for s in ST.rows])
+        ST = ST + ST * ST
+        ST.data[:] = 1
+
+    # Remove the self connections
+    ST = ST.tocoo()
+    off_diag = ST.row != ST.col
+    ST = sps.csr_matrix(
+        (ST.data[off_diag], (ST.row[off_diag], ST.col[off_diag])), shape=(Nc, Nc)
+    )
+    lmbda = np.diff(ST.indptr)
 
     # Define coarse nodes
-    candidate = np.ones(Nc, dtype=np.bool)
-    is_fine = np.zeros(Nc, dtype=np.bool)
+    # cells that are not important for any other cells are on the fine scale.
+    is_fine = lmbda == 0
+    candidate = np.logical_not(is_fine)
     is_coarse = np.zeros(Nc, dtype=np.bool)
 
-    # cells that are not important for any other cells are on the fine scale.
-    for row_id, row in enumerate(ST.rows):
-        if not row:
-            is_fine[row_id] = True
-            candidate[row_id] = False
-
-    ST = ST.tocsr()
-    it = 0
-    while np.any(candidate):
-        i = np.argmax(lmbda)
+    # The candidate with the highest weight is selected first, ties are broken
+    # by the lowest index. Outdated entries of the heap are skipped when popped.
+    heap = [(-l, i) for i, l in enumerate(lmbda.tolist()) if l > 0]
+    heapq.heapify(heap)
+    while heap:
+        weight, i = heapq.heappop(heap)
+        if not candidate[i] or -weight != lmbda[i]:
+            continue
         is_coarse[i] = True
         j = ST.indices[ST.indptr[i] : ST.indptr[i + 1]]
         jf = j[candidate[j]]
         is_fine[jf] = True
         candidate[np.r_[i, jf]] = False
+
+        # Update the weights of the candidates connected to the new fine cells
         loop = ST.indices[mcolon.mcolon(ST.indptr[jf], ST.indptr[jf + 1])]
-        for row in np.unique(loop):
-            s = ST.indices[ST.indptr[row] : ST.indptr[row + 1]]
-            lmbda[row] = s[candidate[s]].size + 2 * s[is_fine[s]].size
-        lmbda[np.logical_not(candidate)] = -1
-        it = it + 1
+        loop = np.unique(loop)
+        loop = loop[candidate[loop]]
+        if loop.size == 0:
+            continue
+        s = ST.indices[mcolon.mcolon(ST.indptr[loop], ST.indptr[loop + 1])]
+        row = np.repeat(np.arange(loop.size), np.diff(ST.indptr)[loop])
+        weights = candidate[s] + 2 * is_fine[s].astype(np.int)
+        new_lmbda = np.bincount(row, weights=weights, minlength=loop.size)
+        new_lmbda = new_lmbda.astype(np.int)
 
-        # Something went wrong during aggregation
-        assert it <= Nc
+        changed = new_lmbda != lmbda[loop]
+        lmbda[loop] = new_lmbda
+        for r, l in zip(loop[changed].tolist(), new_lmbda[changed].tolist()):
+            heapq.heappush(heap, (-l, r))
 
-    del lmbda, ST
+    del lmbda, ST, heap
 
+    is_seed = np.zeros(Nc, dtype=np.bool)
     if seeds is not None:
+        is_seed[seeds] = True
         is_coarse[seeds] = True
         is_fine[seeds] = False
 
-    # If two neighbors are coarse, eliminate one of them without touching the
-    # seeds
-    c2c = np.abs(A) > 0
-    c2c_rows, _, _ = sps.find(c2c)
-
-    pairs = np.empty((0, 2), dtype=np.int)
-    for idx, it in enumerate(np.where(is_coarse)[0]):
-        loc = slice(c2c.indptr[it], c2c.indptr[it + 1])
-        ind = np.setdiff1d(c2c_rows[loc], it)
-        cind = ind[is_coarse[ind]]
-        new_pair = np.stack((np.repeat(it, cind.size), cind), axis=-1)
-        pairs = np.append(pairs, new_pair, axis=0)
-
-    # Remove one of the neighbors cells
-    if pairs.size:
-        pairs = setmembership.unique_rows(np.sort(pairs, axis=1))[0]
-        for ij in pairs:
-            A_val = np.array(A[ij, ij]).ravel()
-            ids = ij[np.argsort(A_val)]
-            ids = np.setdiff1d(ids, seeds, assume_unique=True)
-            if ids.size:
-                is_coarse[ids[0]] = False
-                is_fine[ids[0]] = True
+    # If two neighbors are coarse, eliminate the one with the smaller diagonal
+    # entry without touching the seeds
+    c2c = np.logical_and(rows != cols, A.data != 0)
+    diag = A.diagonal()
+    pairs = np.sort(np.vstack((rows[c2c], cols[c2c])), axis=0)
+    pairs = pairs[:, np.all(is_coarse[pairs], axis=0)]
+    swap = diag[pairs[1]] < diag[pairs[0]]
+    pairs[:, swap] = pairs[::-1, swap]
+    remove = np.where(is_seed[pairs[0]], pairs[1], pairs[0])
+    remove = remove[np.logical_not(is_seed[remove])]
+    is_coarse[remove] = False
+    is_fine[remove] = True
 
     coarse = np.where(is_coarse)[0]
-
-    # Primal grid
     NC = coarse.size
-    primal = sps.lil_matrix((NC, Nc), dtype=np.bool)
-    primal[np.arange(NC), coarse[np.arange(NC)]] = True
-
-    connection = sps.lil_matrix((Nc, Nc), dtype=np.double)
-    for it in np.arange(Nc):
-        n = np.setdiff1d(c2c_rows[c2c.indptr[it] : c2c.indptr[it + 1]], it)
-        loc = slice(A.indptr[it], A.indptr[it + 1])
-        A_idx, A_row = A.indices[loc], A.data[loc]
-        mask = A_idx != it
-        connection[it, n] = np.abs(A_row[mask] / A_row[np.logical_not(mask)])
-
-    connection = connection.tocsr()
-
-    candidates_rep = np.ediff1d(connection.indptr)
-    candidates_idx = np.repeat(is_coarse, candidates_rep)
-    candidates = np.stack(
-        (
-            connection.indices[candidates_idx],
-            np.repeat(np.arange(NC), candidates_rep[is_coarse]),
-        ),
-        axis=-1,
-    )
 
-    connection_idx = mcolon.mcolon(
-        connection.indptr[coarse], connection.indptr[coarse + 1]
+    # Strength of the connections, relative to the diagonal of each row
+    connection = sps.csr_matrix(
+        (np.abs(A.data[c2c] / diag[rows[c2c]]), (rows[c2c], cols[c2c])),
+        shape=(Nc, Nc),
     )
-    vals = sps.csr_matrix(
-        accumarray.accum(candidates, connection.data[connection_idx], size=[Nc, NC])
-    )
-    del candidates_rep, candidates_idx, connection_idx
 
-    it = NC
+    partition = -np.ones(Nc, dtype=np.int)
+    partition[coarse] = np.arange(NC)
     not_found = np.logical_not(is_coarse)
-    # Process the strongest connection globally
-    while np.any(not_found):
-
-        np.argmax(vals.data)
-        vals.argmax(axis=0)
-        mcind = np.atleast_1d(np.squeeze(np.asarray(vals.argmax(axis=0))))
-        mcval = -np.inf * np.ones(mcind.size)
-        for c, r in enumerate(mcind):
-            loc = slice(vals.indptr[r], vals.indptr[r + 1])
-            vals_idx, vals_data = vals.indices[loc], vals.data[loc]
-            mask = vals_idx == c
-            if vals_idx.size == 0 or not np.any(mask):
-                continue
-            mcval[c] = vals_data[mask]
 
-        mi = np.argmax(mcval)
-        nadd = mcind[mi]
-
-        primal[mi, nadd] = True
-        it = it + 1
-        if it > Nc + 5:
-            break
+    # Strength of the connections between the cells and the coarse cells, stored
+    # with the key cell * NC + coarse id
+    vals = {}
+    heap = []
+    for mi, c in enumerate(coarse.tolist()):
+        loc = slice(connection.indptr[c], connection.indptr[c + 1])
+        nc = connection.indices[loc]
+        af = not_found[nc]
+        for n, v in zip(nc[af].tolist(), connection.data[loc][af].tolist()):
+            vals[n * NC + mi] = v
+            heap.append((-v, mi, n))
+    heapq.heapify(heap)
+
+    # Process the strongest connection globally, ties are broken by the lowest
+    # coarse id and then by the lowest cell index
+    while heap:
+        mcval, mi, nadd = heapq.heappop(heap)
+        mcval = -mcval
+        if not not_found[nadd] or vals[nadd * NC + mi] != mcval:
+            continue
 
+        partition[nadd] = mi
         not_found[nadd] = False
-        vals.data[vals.indptr[nadd] : vals.indptr[nadd + 1]] = 0
 
         loc = slice(connection.indptr[nadd], connection.indptr[nadd + 1])
         nc = connection.indices[loc]
         af = not_found[nc]
-        nc = nc[af]
-        nv = mcval[mi] * connection[nadd, :]
-        nv = nv.data[af]
-        if len(nc) > 0:
-            vals += sps.csr_matrix((nv, (nc, np.repeat(mi, len(nc)))), shape=(Nc, NC))
-
-    coarse, fine = primal.tocsr().nonzero()
-    return coarse[np.argsort(fine)]
+        nv = mcval * connection.data[loc][af]
+        for n, v in zip(nc[af].tolist(), nv.tolist()):
+            key = n * NC + mi
+            v = vals.get(key, 0.0) + v
+            vals[key] = v
+            heapq.heappush(heap, (-v, mi, n))
+
+    # Cells not connected to any coarse cell form their own aggregate
+    partition[not_found] = NC + np.arange(np.sum(not_found))
+    return partition
 
 
 # ------------------------------------------------------------------------------#
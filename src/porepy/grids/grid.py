@@ -13,6 +13,7 @@ Acknowledgements:
 from __future__ import division
 import numpy as np
 import itertools
+import scipy.spatial
 from scipy import sparse as sps
 
 from porepy.utils import matrix_compression, mcolon, tags
@@ -665,24 +666,29 @@ class Grid(object):
         if self.dim == 0:
             return np.zeros(1)
 
-        def comb(n):
-            return np.fromiter(
-                itertools.chain.from_iterable(itertools.combinations(n, 2)), n.dtype
-            ).reshape((2, -1), order="F")
-
-        def diam(n):
-            return np.amax(
-                np.linalg.norm(self.nodes[:, n[0, :]] - self.nodes[:, n[1, :]], axis=0)
-            )
-
         if cn is None:
             cn = self.cell_nodes()
-        return np.array(
-            [
-                diam(comb(cn.indices[cn.indptr[c] : cn.indptr[c + 1]]))
-                for c in np.arange(self.num_cells)
-            ]
-        )
+        cn = cn.tocsc()
+        num_nodes = np.diff(cn.indptr)
+        diams = np.zeros(self.num_cells)
+
+        # Treat the cells with the same number of nodes together, the diameter
+        # is the largest distance between two nodes of the cell
+        for nn in np.unique(num_nodes):
+            cells = np.where(num_nodes == nn)[0]
+            if nn < 2:
+                continue
+            first, second = np.array(list(itertools.combinations(range(nn), 2))).T
+            # Limit the size of the temporary arrays
+            chunk = max(1, 2 ** 20 // first.size)
+            for start in range(0, cells.size, chunk):
+                c = cells[start : start + chunk]
+                loc = mcolon.mcolon(cn.indptr[c], cn.indptr[c + 1])
+                nodes = cn.indices[loc].reshape((c.size, nn))
+                diff = self.nodes[:, nodes[:, first]] - self.nodes[:, nodes[:, second]]
+                dist = np.sqrt(np.sum(diff * diff, axis=0))
+                diams[c] = np.amax(dist, axis=1)
+        return diams
 
     def cell_face_as_dense(self):
         """
@@ -757,36 +763,47 @@ class Grid(object):
         For dim < 3, no checks are made if the point is in the plane / line
         of the grid.
 
+        The search uses a KD-tree of the cell centers, which is kept between
+        calls as long as the cell centers are not changed.
+
         Parameters:
             p (np.ndarray, 3xn): Point coordinates. If p.shape[0] < 3,
                 additional points will be treated as zeros.
+            return_distance (boolean, optional): If True, the distance between
+                the points and the closest cell centers is also returned.
+                Defaults to False.
 
         Returns:
             np.ndarray of ints: For each point, index of the cell with center
                 closest to the point.
+            np.ndarray: For each point, distance to the closest cell center.
+                Only if return_distance is True.
         """
         p = np.atleast_2d(p)
-        dim_p = p.shape[0]
         if p.shape[0] < 3:
             z = np.zeros((3 - p.shape[0], p.shape[1]))
             p = np.vstack((p, z))
 
-        def min_dist(pts):
-            c = self.cell_centers
-            d = np.sum(np.power(c - pts, 2), axis=0)
-            min_id = np.argmin(d)
-            return min_id, np.sqrt(d[min_id])
-
-        ci = np.empty(p.shape[1], dtype=np.int)
-        di = np.empty(p.shape[1])
-        for i in range(p.shape[1]):
-            ci[i], di[i] = min_dist(p[:, i].reshape((3, -1)))
+        _, ci = self._cell_center_tree().query(p.T)
+        ci = np.asarray(ci, dtype=np.int)
 
         if return_distance:
+            di = np.sqrt(np.sum(np.power(self.cell_centers[:, ci] - p, 2), axis=0))
             return ci, di
         else:
             return ci
 
+    def _cell_center_tree(self):
+        """ KD-tree of the cell centers, built at the first call and rebuilt
+        if the cell centers are changed.
+        """
+        tree = getattr(self, "_cell_center_kdtree", None)
+        if tree is None or not np.array_equal(tree[0], self.cell_centers):
+            centers = self.cell_centers.copy()
+            tree = (centers, scipy.spatial.cKDTree(centers.T))
+            self._cell_center_kdtree = tree
+        return tree[1]
+
     def initiate_face_tags(self):
         keys = tags.standard_face_tags()
         values = [np.zeros(self.num_faces, dtype=bool) for _ in keys]
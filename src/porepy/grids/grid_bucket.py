@@ -4,11 +4,16 @@ intersections in the form of a GridBucket.
 
 """
 
+import importlib
+import json
+import os
 import warnings
 from scipy import sparse as sps
 import numpy as np
 import networkx
 
+from porepy.grids.grid import Grid
+from porepy.grids.mortar_grid import MortarGrid
 from porepy.utils import setmembership
 
 
@@ -29,12 +34,30 @@ class GridBucket(object):
     Attributes:
         graph (networkx.Graph): The of the grid. See above for further
             description.
+        assembly_cache (dict): Sparsity patterns of assembled system matrices,
+            stored by pp.Assembler for reuse in subsequent assemblies.
+        compact (boolean): If True, the iterators and getters use flat lists of
+            the grids, edges and data dictionaries, indexed by dense integer
+            ids, instead of look ups in the graph. The lists are rebuilt when
+            the nodes or edges are changed through the methods of the bucket;
+            the graph should then not be modified directly. Defaults to False.
 
     """
 
-    def __init__(self):
+    def __init__(self, compact=False):
         self.graph = networkx.Graph(directed=False)
         self.name = "grid bucket"
+        self.assembly_cache = {}
+        self.compact = compact
+        self._index = None
+
+    def _compact_index(self):
+        """
+        Get the flat storage of the graph, it is built if not available.
+        """
+        if self._index is None or self._index.graph is not self.graph:
+            self._index = _CompactIndex(self.graph)
+        return self._index
 
     # --------- Iterators -------------------------
 
@@ -47,9 +70,14 @@ class GridBucket(object):
             data: The dictionary storing all information in this node.
 
         """
-        for g in self.graph:
-            data = self.graph.node[g]
-            yield g, data
+        if self.compact:
+            index = self._compact_index()
+            for g, data in zip(index.grids, index.node_data):
+                yield g, data
+        else:
+            for g in self.graph:
+                data = self.graph.node[g]
+                yield g, data
 
     def nodes(self):
         """ Iterator over the nodes in the GridBucket.
@@ -62,9 +90,7 @@ class GridBucket(object):
             data: The dictionary storing all information in this node.
 
         """
-        for g in self.graph:
-            data = self.graph.node[g]
-            yield g, data
+        return self.__iter__()
 
     def edges(self):
         """
@@ -75,8 +101,13 @@ class GridBucket(object):
             data: The dictionary storing all information in this edge..
 
         """
-        for e in self.graph.edges():
-            yield e, self.edge_props(e)
+        if self.compact:
+            index = self._compact_index()
+            for e, data in zip(index.edges, index.edge_data):
+                yield e, data
+        else:
+            for e in self.graph.edges():
+                yield e, self.edge_props(e)
 
     # ---------- Navigate within the graph --------
 
@@ -129,8 +160,13 @@ class GridBucket(object):
             object: A dictionary with keys and properties.
 
         """
-        for e in self.graph.edges([n]):
-            yield e, self.edge_props(e)
+        if self.compact:
+            index = self._compact_index()
+            for e in index.edges_of_node(n):
+                yield (n, index.other_node(e, n)), index.edge_data[e]
+        else:
+            for e in self.graph.edges([n]):
+                yield e, self.edge_props(e)
 
     def node_neighbors(self, node, only_higher=False, only_lower=False):
         """
@@ -154,7 +190,12 @@ class GridBucket(object):
 
         """
 
-        neigh = np.array([n for n in self.graph.neighbors(node)])
+        if self.compact:
+            index = self._compact_index()
+            neigh = [index.other_node(e, node) for e in index.edges_of_node(node)]
+        else:
+            neigh = [n for n in self.graph.neighbors(node)]
+        neigh = np.array(neigh)
 
         if not only_higher and not only_lower:
             return neigh
@@ -331,10 +372,16 @@ class GridBucket(object):
             object: A dictionary with keys and properties.
 
         """
+        if self.compact:
+            index = self._compact_index()
+            data = index.node_data[index.node_id[g]]
+        else:
+            data = self.graph.node[g]
+
         if key is None:
-            return self.graph.node[g]
+            return data
         else:
-            return self.graph.node[g][key]
+            return data[key]
 
     def edge_props(self, gp, key=None):
         """
@@ -354,6 +401,16 @@ class GridBucket(object):
             KeyError if the two grids do not form an edge.
 
         """
+        if self.compact:
+            index = self._compact_index()
+            e = index.edge_id.get(tuple(gp))
+            if e is None:
+                raise KeyError("Unknown edge")
+            if key is None:
+                return index.edge_data[e]
+            else:
+                return index.edge_data[e][key]
+
         if tuple(gp) in self.graph.edges():
             if key is None:
                 return self.graph.adj[gp[0]][gp[1]]
@@ -513,6 +570,7 @@ class GridBucket(object):
         if np.any([i is j for i in new_grids for j in self.graph]):
             raise ValueError("Grid already defined in bucket")
         [self.graph.add_node(g) for g in new_grids]
+        self._index = None
 
     def add_edge(self, grids, face_cells):
         """
@@ -552,6 +610,7 @@ class GridBucket(object):
             self.graph.add_edge(*grids, face_cells=face_cells)
         else:
             raise ValueError("Grid dimension mismatch")
+        self._index = None
 
     # --------- Remove and update nodes
 
@@ -565,6 +624,7 @@ class GridBucket(object):
         """
 
         self.graph.remove_node(node)
+        self._index = None
 
     def remove_nodes(self, cond):
         """
@@ -579,6 +639,7 @@ class GridBucket(object):
             cond = lambda g: True
 
         self.graph.remove_nodes_from([g for g in self.graph if cond(g)])
+        self._index = None
 
     def update_nodes(self, mapping):
         """
@@ -792,39 +853,67 @@ class GridBucket(object):
         If the GridBucket has mortar grids on the edges, a corresponding
         restriction from global mortar cells to local mortar cells will be
         made.
+
+        In addition, the keyword cell_global_slice gives the slice of the
+        global cell vector that corresponds to the node, or mortar grid, thus
+        R * global_cell_vector equals global_cell_vector[slice].
         """
+        node_offset, edge_offset = self.cell_global_offsets()
 
         # Create node restriction
-        self.add_node_props("cell_global2loc")
+        self.add_node_props(["cell_global2loc", "cell_global_slice"])
         for g, d in self:
             pos_i = d["node_number"]
-            mat = np.empty(self.num_graph_nodes(), dtype=np.object)
-            # first initial empty matrix
-            for g_j, d_j in self:
-                pos_j = d_j["node_number"]
-                mat[pos_j] = sps.coo_matrix((g.num_cells, g_j.num_cells))
-
-            # overwrite the local matrix for grid g
-            mat[pos_i] = sps.eye(g.num_cells)
-            d["cell_global2loc"] = sps.hstack(mat, "csr")
+            d["cell_global_slice"] = slice(node_offset[pos_i], node_offset[pos_i + 1])
+            d["cell_global2loc"] = self._restriction(
+                g.num_cells, node_offset[pos_i], node_offset[-1]
+            )
 
         # create mortar restriction
         for _, d in self.edges():
             if not d.get("mortar_grid"):
                 continue
-            gm = d["mortar_grid"]
             pos_i = d["edge_number"]
-            mat = np.empty(self.num_graph_edges(), dtype=np.object)
-            # first initial empty matrix
-            for _, d_j in self.edges():
-                gm_j = d_j["mortar_grid"]
-                pos_j = d_j["edge_number"]
-                mat[pos_j] = sps.coo_matrix((gm.num_cells, gm_j.num_cells))
+            d["cell_global_slice"] = slice(edge_offset[pos_i], edge_offset[pos_i + 1])
+            d["cell_global2loc"] = self._restriction(
+                d["mortar_grid"].num_cells, edge_offset[pos_i], edge_offset[-1]
+            )
+
+    def cell_global_offsets(self):
+        """
+        Compute the offsets of the cells of each grid, and of each mortar grid,
+        in the global cell ordering given by the node and edge numbers.
+
+        Returns:
+            np.ndarray (num_graph_nodes + 1): The cells of the grid with node
+                number i are global_cells[offset[i]:offset[i+1]]. The last
+                entry is the total number of cells.
+            np.ndarray (num_graph_edges + 1): The same for the mortar cells,
+                ordered by edge number. Edges without a mortar grid have no
+                cells.
+        """
+        num_cells = np.zeros(self.num_graph_nodes(), dtype=np.int)
+        for g, d in self:
+            num_cells[d["node_number"]] = g.num_cells
 
-            # overwrite the local matrix for grid g
-            mat[pos_i] = sps.eye(gm.num_cells)
+        num_mortar_cells = np.zeros(self.num_graph_edges(), dtype=np.int)
+        for _, d in self.edges():
+            if d.get("mortar_grid"):
+                num_mortar_cells[d["edge_number"]] = d["mortar_grid"].num_cells
+
+        return np.r_[0, np.cumsum(num_cells)], np.r_[0, np.cumsum(num_mortar_cells)]
 
-            d["cell_global2loc"] = sps.hstack(mat, "csr")
+    @staticmethod
+    def _restriction(num_loc, offset, num_glob):
+        """
+        Restriction from a global vector of size num_glob to the local entries
+        offset, ..., offset + num_loc - 1.
+        """
+        indices = offset + np.arange(num_loc)
+        indptr = np.arange(num_loc + 1)
+        return sps.csr_matrix(
+            (np.ones(num_loc), indices, indptr), shape=(num_loc, num_glob)
+        )
 
     def compute_geometry(self):
         """Compute geometric quantities for the grids.
@@ -842,10 +931,55 @@ class GridBucket(object):
         of networkx.
 
         """
-        gb_copy = GridBucket()
+        gb_copy = GridBucket(compact=self.compact)
         gb_copy.graph = self.graph.copy()
         return gb_copy
 
+    def save(self, path):
+        """
+        Store the grid bucket in binary format.
+
+        The grids, mortar grids and the data of the nodes and edges are stored
+        in the directory path. All arrays of the same type, including the
+        arrays of sparse matrices (face_nodes, cell_faces, face_cells etc.),
+        are stored contiguously in one .npy file, while the structure of the
+        bucket is stored in the file grid_bucket.json. The bucket can be read
+        by GridBucket.load().
+
+        Attributes of the grids starting with an underscore are not stored.
+        Data that is not numbers, strings, numpy arrays, sparse matrices,
+        grids or lists and dictionaries of these (e.g. parameter and
+        discretization objects) is skipped with a warning.
+
+        Parameters:
+            path (str): Directory of the storage. Created if not existing,
+                existing files of a stored grid bucket are overwritten.
+
+        """
+        _GridBucketWriter(self).write(path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Read a grid bucket stored by GridBucket.save().
+
+        Parameters:
+            path (str): Directory of the storage.
+            mmap (boolean, optional): If True (default), the arrays of the grids
+                are memory-mapped views of the files, so that nothing is read
+                before it is used. The mapping is copy-on-write, changes of the
+                arrays are not written back to the files. If False, the arrays
+                are read into memory.
+
+        Returns:
+            GridBucket: The stored grid bucket.
+
+        Raises:
+            ValueError if the storage format is not known.
+
+        """
+        return _GridBucketReader(path, mmap).read(cls)
+
     def find_shared_face(self, g0, g1, g_l):
         """
         Given two nd grids meeting at a (n-1)d node (to be removed), find which two
@@ -1186,3 +1320,274 @@ class GridBucket(object):
                 gl = self.grids_of_dimension(dim)
                 s += str(len(gl)) + " grids of dimension " + str(dim) + "\n"
         return s
+
+
+class _CompactIndex(object):
+    """
+    Flat storage of the nodes and edges of a graph, indexed by dense integer
+    ids in the order of the graph iterators. The data dictionaries are shared
+    with the graph. The incidence between nodes and edges is stored in CSR
+    format, for each node the edges are ordered as in the graph adjacency.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+        self.grids = list(graph)
+        self.node_data = [graph.node[g] for g in self.grids]
+        self.node_id = {g: i for i, g in enumerate(self.grids)}
+
+        self.edges = list(graph.edges())
+        self.edge_data = [graph.adj[e[0]][e[1]] for e in self.edges]
+        self.edge_id = {}
+        for i, e in enumerate(self.edges):
+            self.edge_id[e] = i
+            self.edge_id[e[::-1]] = i
+
+        self.edge_nodes = np.array(
+            [[self.node_id[e[0]], self.node_id[e[1]]] for e in self.edges],
+            dtype=np.int,
+        ).reshape((-1, 2))
+
+        num_edges = [len(graph.adj[g]) for g in self.grids]
+        self.node_edges_indptr = np.r_[0, np.cumsum(num_edges, dtype=np.int)]
+        self.node_edges_indices = np.array(
+            [self.edge_id[(g, h)] for g in self.grids for h in graph.adj[g]],
+            dtype=np.int,
+        )
+
+    def edges_of_node(self, g):
+        """ Ids of the edges of a node. """
+        i = self.node_id[g]
+        return self.node_edges_indices[
+            self.node_edges_indptr[i] : self.node_edges_indptr[i + 1]
+        ].tolist()
+
+    def other_node(self, e, g):
+        """ The grid at the other end of the edge e, seen from the grid g. """
+        g0, g1 = self.edges[e]
+        return g1 if g0 is g else g0
+
+
+# Identification of the storage format of GridBucket.save()
+_STORAGE_FORMAT = "porepy.GridBucket"
+_STORAGE_VERSION = 1
+
+
+class _GridBucketWriter(object):
+    """
+    Storage of a grid bucket in a directory, see GridBucket.save().
+
+    The structure of the bucket is encoded as json. Each value is a dictionary
+    identifying the type: {"value": v} for numbers, strings and None,
+    {"array": i} for the i-th stored array, {"sparse": format, ...} for sparse
+    matrices, {"object": i} for the i-th grid or mortar grid, and {"list": l},
+    {"tuple": l} and {"dict": [[key, value], ...]} for containers.
+    """
+
+    def __init__(self, gb):
+        self.gb = gb
+        self.objects = []
+        self.object_id = {}
+        self.arrays = []
+
+    def write(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        nodes = [[self._object(g), self._data(d)] for g, d in self.gb]
+        edges = [
+            [self._object(e[0]), self._object(e[1]), self._data(d)]
+            for e, d in self.gb.edges()
+        ]
+
+        # Arrays of the same type are stored contiguously in one file
+        dtypes = []
+        files = []
+        table = []
+        sizes = []
+        for a in self.arrays:
+            dtype = a.dtype.str
+            if dtype not in dtypes:
+                dtypes.append(dtype)
+                files.append(["arrays_" + str(len(files)) + ".npy", dtype])
+                sizes.append(0)
+            i = dtypes.index(dtype)
+            table.append([i, sizes[i], list(a.shape)])
+            sizes[i] += a.size
+
+        for i, (file_name, dtype) in enumerate(files):
+            # Write to a new file, the old one may be mapped by a loaded bucket
+            file_path = os.path.join(path, file_name)
+            tmp_path = file_path + ".tmp"
+            if sizes[i] == 0:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, np.zeros(0, dtype=dtype))
+            else:
+                buf = np.lib.format.open_memmap(
+                    tmp_path, mode="w+", dtype=dtype, shape=(sizes[i],)
+                )
+                for a, (j, offset, _) in zip(self.arrays, table):
+                    if j == i:
+                        buf[offset : offset + a.size] = a.ravel()
+                buf.flush()
+                del buf
+            os.replace(tmp_path, file_path)
+
+        content = {
+            "format": _STORAGE_FORMAT,
+            "version": _STORAGE_VERSION,
+            "name": self.gb.name,
+            "compact": self.gb.compact,
+            "files": files,
+            "arrays": table,
+            "objects": self.objects,
+            "nodes": nodes,
+            "edges": edges,
+        }
+        file_path = os.path.join(path, "grid_bucket.json")
+        with open(file_path + ".tmp", "w") as f:
+            json.dump(content, f)
+        os.replace(file_path + ".tmp", file_path)
+
+    def _object(self, obj):
+        """ Register a grid or mortar grid, and return its index. """
+        key = id(obj)
+        if key not in self.object_id:
+            cls = type(obj)
+            entry = {"class": cls.__module__ + "." + cls.__name__, "attributes": {}}
+            # Register before the attributes are encoded, they may refer to obj
+            self.object_id[key] = len(self.objects)
+            self.objects.append(entry)
+            for name, value in obj.__dict__.items():
+                if name.startswith("_"):
+                    continue
+                try:
+                    entry["attributes"][name] = self._encode(value)
+                except TypeError:
+                    warnings.warn(
+                        "Attribute " + name + " of " + entry["class"] + " not stored"
+                    )
+        return self.object_id[key]
+
+    def _data(self, d):
+        """ Encode a data dictionary, skipping the values that cannot be stored. """
+        items = []
+        for key, value in d.items():
+            try:
+                items.append([self._encode(key), self._encode(value)])
+            except TypeError:
+                warnings.warn("Data " + str(key) + " not stored")
+        return {"dict": items}
+
+    def _encode(self, value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {"value": value}
+        if isinstance(value, np.generic) and value.dtype.kind in "biufU":
+            return {"value": value.item()}
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind not in "biufcU":
+                raise TypeError("Cannot store arrays of type " + str(value.dtype))
+            self.arrays.append(value)
+            return {"array": len(self.arrays) - 1}
+        if sps.issparse(value):
+            if value.format not in ["csr", "csc"]:
+                value = value.tocsc()
+            # Use the index type chosen by scipy when the matrix is rebuilt, so
+            # that the stored arrays are used without copies
+            if max(value.shape + (value.nnz,)) <= np.iinfo(np.int32).max:
+                index_dtype = np.int32
+            else:
+                index_dtype = np.int64
+            return {
+                "sparse": value.format,
+                "shape": [int(s) for s in value.shape],
+                "data": self._encode(value.data),
+                "indices": self._encode(value.indices.astype(index_dtype, copy=False)),
+                "indptr": self._encode(value.indptr.astype(index_dtype, copy=False)),
+            }
+        if isinstance(value, (Grid, MortarGrid)):
+            return {"object": self._object(value)}
+        if type(value) in [list, tuple]:
+            return {type(value).__name__: [self._encode(v) for v in value]}
+        if type(value) is dict:
+            return {
+                "dict": [[self._encode(k), self._encode(v)] for k, v in value.items()]
+            }
+        raise TypeError("Cannot store objects of type " + str(type(value)))
+
+
+class _GridBucketReader(object):
+    """
+    Reading of a grid bucket stored by _GridBucketWriter.
+    """
+
+    def __init__(self, path, mmap):
+        self.path = path
+        self.mmap_mode = "c" if mmap else None
+
+    def read(self, cls):
+        with open(os.path.join(self.path, "grid_bucket.json")) as f:
+            content = json.load(f)
+        if (
+            content.get("format") != _STORAGE_FORMAT
+            or content.get("version") != _STORAGE_VERSION
+        ):
+            raise ValueError("Unknown storage format of grid bucket")
+
+        buffers = [
+            np.load(os.path.join(self.path, file_name), mmap_mode=self.mmap_mode)
+            for file_name, _ in content["files"]
+        ]
+        self.arrays = []
+        for i, offset, shape in content["arrays"]:
+            size = int(np.prod(shape, dtype=np.int))
+            a = buffers[i][offset : offset + size].reshape(shape)
+            self.arrays.append(a.view(np.ndarray))
+
+        # Create the objects before the attributes are set, since these may
+        # refer to other objects
+        self.objects = []
+        for entry in content["objects"]:
+            module, name = entry["class"].rsplit(".", 1)
+            if not module.startswith("porepy."):
+                raise ValueError("Unknown class " + entry["class"])
+            obj_cls = getattr(importlib.import_module(module), name)
+            self.objects.append(obj_cls.__new__(obj_cls))
+        for obj, entry in zip(self.objects, content["objects"]):
+            for key, value in entry["attributes"].items():
+                setattr(obj, key, self._decode(value))
+
+        gb = cls(compact=content["compact"])
+        gb.name = content["name"]
+        for g, data in content["nodes"]:
+            g = self.objects[g]
+            gb.graph.add_node(g)
+            gb.graph.node[g].update(self._decode(data))
+        for g0, g1, data in content["edges"]:
+            g0, g1 = self.objects[g0], self.objects[g1]
+            gb.graph.add_edge(g0, g1)
+            gb.graph.adj[g0][g1].update(self._decode(data))
+        return gb
+
+    def _decode(self, value):
+        if "value" in value:
+            return value["value"]
+        if "array" in value:
+            return self.arrays[value["array"]]
+        if "sparse" in value:
+            if value["sparse"] == "csr":
+                matrix = sps.csr_matrix
+            else:
+                matrix = sps.csc_matrix
+            arrays = [self._decode(value[k]) for k in ["data", "indices", "indptr"]]
+            return matrix(tuple(arrays), shape=tuple(value["shape"]))
+        if "object" in value:
+            return self.objects[value["object"]]
+        if "list" in value:
+            return [self._decode(v) for v in value["list"]]
+        if "tuple" in value:
+            return tuple(self._decode(v) for v in value["tuple"])
+        if "dict" in value:
+            return {self._decode(k): self._decode(v) for k, v in value["dict"]}
+        raise ValueError("Unknown stored value")
@@ -63,7 +63,7 @@ class MortarGrid(object):
 
         self.dim = dim
         self.side_grids = side_grids
-        self.sides = np.array(self.side_grids.keys)
+        self.sides = np.array(list(self.side_grids.keys()))
 
         assert self.num_sides() == 1 or self.num_sides() == 2
 
@@ -350,7 +350,7 @@ class BoundaryMortar(MortarGrid):
 
         self.dim = dim
         self.side_grids = {"mortar_grid": mortar_grid}
-        self.sides = np.array(self.side_grids.keys)
+        self.sides = np.array(list(self.side_grids.keys()))
 
         assert self.num_sides() == 1 or self.num_sides() == 2
 
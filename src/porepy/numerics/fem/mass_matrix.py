@@ -2,6 +2,7 @@ import numpy as np
 import scipy.sparse as sps
 
 import porepy as pp
+from porepy.utils.mcolon import mcolon
 
 
 class P1MassMatrix():
@@ -104,44 +105,25 @@ class P1MassMatrix():
         # surface coordinates in 1d and 2d)
         c_centers, f_normals, f_centers, R, dim, node_coords = pp.cg.map_grid(g)
 
-        # Allocate the data to store matrix entries, that's the most efficient
-        # way to create a sparse matrix.
-        size = np.power(g.dim + 1, 2) * g.num_cells
-        I = np.empty(size, dtype=np.int)
-        J = np.empty(size, dtype=np.int)
-        dataIJ = np.empty(size)
-        idx = 0
-
-        cell_nodes = g.cell_nodes()
-        nodes, cells, _ = sps.find(cell_nodes)
-
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its nodes
-            loc = slice(cell_nodes.indptr[c], cell_nodes.indptr[c + 1])
-            nodes_loc = nodes[loc]
-
-            # Compute the mass-H1 local matrix
-            # A = coeff[nodes_loc]*self.massH1(g.cell_volumes[c], g.dim)
-            A = self.massH1(g.cell_volumes[c], g.dim)
-
-            # Save values for stiff-H1 local matrix in the global structure
-            cols = np.tile(nodes_loc, (nodes_loc.size, 1))
-            loc_idx = slice(idx, idx + cols.size)
-            I[loc_idx] = cols.T.ravel()
-            J[loc_idx] = cols.ravel()
-            dataIJ[loc_idx] = A.ravel()
-            idx += cols.size
+        # Retrieve the nodes of each cell, all cells are simplices
+        nodes, _, _ = sps.find(g.cell_nodes())
+        nodes = nodes.reshape((g.num_cells, g.dim + 1))
+
+        # Compute the mass-H1 local matrices for all cells at once
+        # A = coeff[nodes]*self.massH1(g.cell_volumes, g.dim)
+        A = self.massH1(g.cell_volumes, g.dim)
 
         # Construct the global matrices
-        M = sps.csr_matrix((dataIJ, (I, J)))
+        I = np.broadcast_to(nodes[:, :, np.newaxis], A.shape).ravel()
+        J = np.broadcast_to(nodes[:, np.newaxis, :], A.shape).ravel()
+        M = sps.csr_matrix((A.ravel(), (I, J)), shape=(g.num_nodes, g.num_nodes))
 
         # assign the Dirichlet boundary conditions
         if bc and np.any(bc.is_dir):
             dir_nodes = np.where(bc.is_dir)[0]
             # set in an efficient way the essential boundary conditions, by
             # clear the rows and put norm in the diagonal
-            for row in dir_nodes:
-                M.data[M.indptr[row] : M.indptr[row + 1]] = 0.0
+            M.data[mcolon(M.indptr[dir_nodes], M.indptr[dir_nodes + 1])] = 0.0
 
         return M
 
@@ -165,16 +147,18 @@ class P1MassMatrix():
 
         Parameters
         ----------
-        c_volume : scalar
-            Cell volume.
+        c_volume : scalar or array (num_cells)
+            Cell volume, or volumes of a set of cells.
 
         Return
         ------
-        out: ndarray (num_faces_of_cell, num_faces_of_cell)
+        out: ndarray (num_faces_of_cell, num_faces_of_cell), or
+            (num_cells, num_faces_of_cell, num_faces_of_cell) if several cell
+            volumes are given.
             Local mass Hdiv matrix.
         """
         # Allow short variable names in this function
         # pylint: disable=invalid-name
 
         M = np.ones((dim + 1, dim + 1)) + np.identity(dim + 1)
-        return c_volume * M / ((dim + 1) * (dim + 2))
\ No newline at end of file
+        return np.multiply.outer(c_volume, M) / ((dim + 1) * (dim + 2))
@@ -3,6 +3,7 @@ import scipy.sparse as sps
 import logging
 
 import porepy as pp
+from porepy.utils.mcolon import mcolon
 
 # Module-wide logger
 logger = logging.getLogger(__name__)
@@ -133,42 +134,22 @@ class P1():
                 k.values = np.delete(k.values, (remove_dim), axis=0)
                 k.values = np.delete(k.values, (remove_dim), axis=1)
 
-        # Allocate the data to store matrix entries, that's the most efficient
-        # way to create a sparse matrix.
-        size = np.power(g.dim + 1, 2) * g.num_cells
-        I = np.empty(size, dtype=np.int)
-        J = np.empty(size, dtype=np.int)
-        dataIJ = np.empty(size)
-        idx = 0
-
-        cell_nodes = g.cell_nodes()
-        nodes, cells, _ = sps.find(cell_nodes)
-
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its nodes
-            loc = slice(cell_nodes.indptr[c], cell_nodes.indptr[c + 1])
-
-            nodes_loc = nodes[loc]
-            coord_loc = node_coords[:, nodes_loc]
-
-            # Compute the stiff-H1 local matrix
-            A = self.stiffH1(
-                a[c] * k.values[0 : g.dim, 0 : g.dim, c],
-                g.cell_volumes[c],
-                coord_loc,
-                g.dim,
-            )
-
-            # Save values for stiff-H1 local matrix in the global structure
-            cols = np.tile(nodes_loc, (nodes_loc.size, 1))
-            loc_idx = slice(idx, idx + cols.size)
-            I[loc_idx] = cols.T.ravel()
-            J[loc_idx] = cols.ravel()
-            dataIJ[loc_idx] = A.ravel()
-            idx += cols.size
+        # Retrieve the nodes of each cell, all cells are simplices
+        nodes, _, _ = sps.find(g.cell_nodes())
+        nodes = nodes.reshape((g.num_cells, g.dim + 1))
+
+        # Compute the stiff-H1 local matrices for all cells at once
+        A = self.stiffH1_batch(
+            np.rollaxis(a * k.values[0 : g.dim, 0 : g.dim], 2),
+            g.cell_volumes,
+            np.rollaxis(node_coords[:, nodes], 1),
+            g.dim,
+        )
 
         # Construct the global matrices
-        M = sps.csr_matrix((dataIJ, (I, J)))
+        I = np.broadcast_to(nodes[:, :, np.newaxis], A.shape).ravel()
+        J = np.broadcast_to(nodes[:, np.newaxis, :], A.shape).ravel()
+        M = sps.csr_matrix((A.ravel(), (I, J)), shape=(g.num_nodes, g.num_nodes))
 
         norm = sps.linalg.norm(M, np.inf) if bc_weight else 1
 
@@ -177,8 +158,7 @@ class P1():
             dir_nodes = np.where(bc.is_dir)[0]
             # set in an efficient way the essential boundary conditions, by
             # clear the rows and put norm in the diagonal
-            for row in dir_nodes:
-                M.data[M.indptr[row] : M.indptr[row + 1]] = 0.0
+            M.data[mcolon(M.indptr[dir_nodes], M.indptr[dir_nodes + 1])] = 0.0
 
             d = M.diagonal()
             d[dir_nodes] = norm
@@ -245,13 +225,39 @@ class P1():
         out: ndarray (num_faces_of_cell, num_faces_of_cell)
             Local mass Hdiv matrix.
         """
+        return self.stiffH1_batch(
+            K[np.newaxis], np.atleast_1d(c_volume), coord[np.newaxis], dim
+        )[0]
+
+    # ------------------------------------------------------------------------------#
+
+    def stiffH1_batch(self, K, c_volume, coord, dim):
+        """ Compute the local stiffness H1 matrices using the P1 Lagrangean
+        approach, for a set of simplices.
+
+        Parameters
+        ----------
+        K : ndarray (num_cells, g.dim, g.dim)
+            Permeability of the cells.
+        c_volume : array (num_cells)
+            Cell volumes.
+        coord : ndarray (num_cells, g.dim, g.dim + 1)
+            Coordinates of the nodes of the cells.
+
+        Return
+        ------
+        out: ndarray (num_cells, g.dim + 1, g.dim + 1)
+            Local stiffness H1 matrices.
+        """
         # Allow short variable names in this function
         # pylint: disable=invalid-name
 
-        Q = np.hstack((np.ones((dim + 1, 1)), coord.T))
-        dphi = np.linalg.inv(Q)[1:, :]
+        # Gradients of the barycentric coordinates
+        Q = np.concatenate((np.ones((coord.shape[0], 1, dim + 1)), coord), axis=1)
+        dphi = np.linalg.inv(np.swapaxes(Q, 1, 2))[:, 1:, :]
 
-        return c_volume * np.dot(dphi.T, np.dot(K, dphi))
+        A = np.matmul(np.swapaxes(dphi, 1, 2), np.matmul(K, dphi))
+        return np.reshape(c_volume, (-1, 1, 1)) * A
 
     # ------------------------------------------------------------------------------#
 
@@ -7,7 +7,6 @@
 import warnings
 import numpy as np
 import scipy.sparse as sps
-import scipy.linalg as linalg
 import logging
 
 import porepy as pp
@@ -68,10 +67,6 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
         k = parameter_dictionary["second_order_tensor"]
         a = parameter_dictionary["aperture"]
 
-        faces, cells, sign = sps.find(g.cell_faces)
-        index = np.argsort(cells)
-        faces, sign = faces[index], sign[index]
-
         # Map the domain to a reference geometry (i.e. equivalent to compute
         # surface coordinates in 1d and 2d)
         c_centers, f_normals, f_centers, R, dim, node_coords = pp.cg.map_grid(g)
@@ -85,16 +80,6 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
                 k.values = np.delete(k.values, (remove_dim), axis=0)
                 k.values = np.delete(k.values, (remove_dim), axis=1)
 
-        # Allocate the data to store matrix entries, that's the most efficient
-        # way to create a sparse matrix.
-        size = np.power(g.dim + 1, 2) * g.num_cells
-        I = np.empty(size, dtype=np.int)
-        J = np.empty(size, dtype=np.int)
-        dataIJ = np.empty(size)
-        idx = 0
-
-        nodes, _, _ = sps.find(g.face_nodes)
-
         size_HB = g.dim * (g.dim + 1)
         HB = np.zeros((size_HB, size_HB))
         for it in np.arange(0, size_HB, g.dim):
@@ -102,35 +87,28 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
         HB += HB.T
         HB /= g.dim * g.dim * (g.dim + 1) * (g.dim + 2)
 
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its faces
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-
+        # Compute the H_div-mass local matrices for all cells at once. The
+        # cells are simplices, thus they all have the same number of faces.
+        groups = pp.numerics.vem.dual_elliptic.cells_by_num_faces(g)
+        local_matrices = []
+        for cells, faces, sign in groups:
             # find the opposite node id for each face
-            node = RT0.opposite_side_node(g.face_nodes, nodes, faces_loc)
-            coord_loc = node_coords[:, node]
-
-            # Compute the H_div-mass local matrix
-            A = RT0.massHdiv(
-                a[c] * k.values[0 : g.dim, 0 : g.dim, c],
-                g.cell_volumes[c],
-                coord_loc,
-                sign[loc],
+            node = RT0.opposite_side_node_batch(g.face_nodes, faces)
+
+            A = RT0.massHdiv_batch(
+                np.rollaxis(a[cells] * k.values[0 : g.dim, 0 : g.dim, cells], 2),
+                g.cell_volumes[cells],
+                np.rollaxis(node_coords[:, node], 1),
+                sign,
                 g.dim,
                 HB,
             )
-
-            # Save values for Hdiv-mass local matrix in the global structure
-            cols = np.tile(faces_loc, (faces_loc.size, 1))
-            loc_idx = slice(idx, idx + cols.size)
-            I[loc_idx] = cols.T.ravel()
-            J[loc_idx] = cols.ravel()
-            dataIJ[loc_idx] = A.ravel()
-            idx += cols.size
+            local_matrices.append(A)
 
         # Construct the global matrices
-        mass = sps.coo_matrix((dataIJ, (I, J)))
+        mass = pp.numerics.vem.dual_elliptic.assemble_local_matrices(
+            g, groups, local_matrices
+        )
         div = -g.cell_faces.T
 
         matrix_dictionary["mass"] = mass
@@ -158,36 +136,25 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
 
         a = data[pp.PARAMETERS][self.keyword]["aperture"]
 
-        faces, cells, sign = sps.find(g.cell_faces)
-        index = np.argsort(cells)
-        faces, sign = faces[index], sign[index]
-
         c_centers, f_normals, f_centers, R, dim, node_coords = pp.cg.map_grid(g)
 
-        nodes, _, _ = sps.find(g.face_nodes)
-
         P0u = np.zeros((3, g.num_cells))
 
-        for c in np.arange(g.num_cells):
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-
+        for cells, faces, _ in pp.numerics.vem.dual_elliptic.cells_by_num_faces(g):
             # find the opposite node id for each face
-            node = RT0.opposite_side_node(g.face_nodes, nodes, faces_loc)
+            node = RT0.opposite_side_node_batch(g.face_nodes, faces)
 
             # extract the coordinates
-            center = np.tile(c_centers[:, c], (node.size, 1)).T
-            delta_c = center - node_coords[:, node]
-            delta_f = f_centers[:, faces_loc] - node_coords[:, node]
-            normals = f_normals[:, faces_loc]
+            delta_c = c_centers[:, cells, np.newaxis] - node_coords[:, node]
+            delta_f = f_centers[:, faces] - node_coords[:, node]
+            normals = f_normals[:, faces]
 
-            Pi = delta_c / np.einsum("ij,ij->j", delta_f, normals)
+            Pi = delta_c / np.einsum("icj,icj->cj", delta_f, normals)
 
-            # extract the velocity for the current cell
-            P0u[dim, c] = np.dot(Pi, u[faces_loc]) * a[c]
-            P0u[:, c] = np.dot(R.T, P0u[:, c])
+            # extract the velocity for the current cells
+            P0u[np.ix_(dim, cells)] = np.einsum("icj,cj->ic", Pi, u[faces]) * a[cells]
 
-        return P0u
+        return np.dot(R.T, P0u)
 
     @staticmethod
     def massHdiv(K, c_volume, coord, sign, dim, HB):
@@ -207,19 +174,54 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
         out: ndarray (num_faces_of_cell, num_faces_of_cell)
             Local mass Hdiv matrix.
         """
+        return RT0.massHdiv_batch(
+            K[np.newaxis],
+            np.atleast_1d(c_volume),
+            coord[np.newaxis],
+            np.asarray(sign)[np.newaxis],
+            dim,
+            HB,
+        )[0]
+
+    @staticmethod
+    def massHdiv_batch(K, c_volume, coord, sign, dim, HB):
+        """ Compute the local mass Hdiv matrices using the mixed vem approach, for
+        a set of cells.
+
+        Parameters
+        ----------
+        K : ndarray (num_cells, g.dim, g.dim)
+            Permeability of the cells.
+        c_volume : array (num_cells)
+            Cell volumes.
+        coord : ndarray (num_cells, g.dim, g.dim + 1)
+            Coordinates of the nodes opposite to the faces of the cells.
+        sign : ndarray (num_cells, g.dim + 1)
+            +1 or -1 if the normal is inward or outward to the cell.
+
+        Return
+        ------
+        out: ndarray (num_cells, g.dim + 1, g.dim + 1)
+            Local mass Hdiv matrices.
+        """
         # Allow short variable names in this function
         # pylint: disable=invalid-name
-        inv_K = np.linalg.inv(K)
-        inv_K = linalg.block_diag(*([inv_K] * (dim + 1))) / c_volume
+        coord = coord[:, 0:dim, :]
+        num_cells = coord.shape[0]
 
-        coord = coord[0:dim, :]
-        N = coord.flatten("F").reshape((-1, 1)) * np.ones((1, dim + 1)) - np.tile(
-            coord, (dim + 1, 1)
-        )
+        # Differences between the opposite nodes, stored block-wise, one block
+        # for each node
+        N = coord.transpose((0, 2, 1))[:, :, :, np.newaxis] - coord[:, np.newaxis]
 
-        C = np.diagflat(sign)
+        # Apply the inverse of the permeability to each of the blocks
+        inv_K_N = np.linalg.solve(K[:, np.newaxis], N)
+        inv_K_N /= np.reshape(c_volume, (-1, 1, 1, 1))
 
-        return np.dot(C.T, np.dot(N.T, np.dot(HB, np.dot(inv_K, np.dot(N, C)))))
+        N = N.reshape((num_cells, -1, dim + 1))
+        inv_K_N = inv_K_N.reshape((num_cells, -1, dim + 1))
+
+        A = np.matmul(np.swapaxes(N, 1, 2), np.matmul(HB, inv_K_N))
+        return A * sign[:, :, np.newaxis] * sign[:, np.newaxis, :]
 
     @staticmethod
     def opposite_side_node(face_nodes, nodes, faces_loc):
@@ -247,3 +249,36 @@ class RT0(pp.numerics.vem.dual_elliptic.DualElliptic):
             np.setdiff1d(nodes_loc, f, assume_unique=True) for f in face_nodes
         ]
         return np.array(opposite_node).flatten()
+
+    @staticmethod
+    def opposite_side_node_batch(face_nodes, faces):
+        """
+        Given the faces of a set of simplices, return for each face the node on the
+        opposite side. This function is mainly for internal use.
+
+        Parameters:
+        ----------
+        face_nodes: global map which contains, for each face, the node ids
+        faces: ndarray (num_cells, num_faces_of_cell) face ids for the cells
+
+        Return:
+        -------
+        opposite_node: ndarray (num_cells, num_faces_of_cell) for each face the id
+            of the node at its opposite side
+
+        """
+        # For a simplex, each node is shared by all faces but the opposite one.
+        # The node opposite to a face can therefore be found from the sum of the
+        # node indices of the faces.
+        face_nodes = face_nodes.tocsc()
+        num_nodes_face = np.diff(face_nodes.indptr)
+        face_sum = np.bincount(
+            np.repeat(np.arange(num_nodes_face.size), num_nodes_face),
+            weights=face_nodes.indices,
+            minlength=num_nodes_face.size,
+        )
+        face_sum = np.round(face_sum).astype(np.int)[faces]
+
+        # Each node of the cell is present in all faces but one
+        cell_sum = np.sum(face_sum, axis=1) // (faces.shape[1] - 1)
+        return cell_sum[:, np.newaxis] - face_sum
@@ -5,6 +5,7 @@ import numpy as np
 import porepy as pp
 
 from porepy.numerics.fv import fvutils, mpsa
+from porepy.numerics.fv.discretization_cache import DiscretizationCache
 
 
 class Biot:
@@ -145,6 +146,14 @@ class Biot:
                     options.
                 mpsa_eta, mpfa_eta (double): Location of continuity point in MPSA and MPFA.
                     Defaults to 1/3 for simplex grids, 0 otherwise.
+                num_workers (int): Number of worker processes used to discretize
+                    partitions of the grid in parallel. Read separately for flow
+                    and mechanics, from the respective parameter dictionaries.
+                    Defaults to 1.
+                discretization_cache (str or pp.DiscretizationCache): Directory
+                    of an on-disk cache of the discretization matrices. Read
+                    separately for flow and mechanics, from the respective
+                    parameter dictionaries.
 
         The discretization is stored in the data dictionary, in the form of
         several matrices representing different coupling terms. For details,
@@ -161,6 +170,63 @@ class Biot:
         self._discretize_mech(g, data)
         self._discretize_compr(g, data)
 
+    def update_discretization(self, g, data, changed_cells):
+        """ Update the discretization after a change of the permeability or the
+        stiffness in some cells.
+
+        The flow discretization is updated by Mpfa.update_discretization(). For
+        the mechanics and coupling terms, faces and cells sharing a node with the
+        changed cells are rediscretized on a subgrid around the changed cells,
+        and the corresponding rows of the discretization matrices are replaced in
+        place. The computational cost thus scales with the number of changed
+        cells rather than with the size of the grid.
+
+        Parameters:
+            g (grid): Grid to be discretized.
+            data (dictionary): Containing data for discretization, see
+                discretize(). The discretization matrices must have been
+                computed by a previous call to discretize().
+            changed_cells (np.ndarray, int): Index of cells where the
+                parameters have changed.
+
+        """
+        changed_cells = np.atleast_1d(np.asarray(changed_cells, dtype=np.int))
+        if changed_cells.size == 0:
+            return
+
+        pp.Mpfa(self.flow_keyword).update_discretization(g, data, changed_cells)
+
+        parameters_m = data[pp.PARAMETERS][self.mechanics_keyword]
+        matrices_m = data[pp.DISCRETIZATION_MATRICES][self.mechanics_keyword]
+        matrices_f = data[pp.DISCRETIZATION_MATRICES][self.flow_keyword]
+        bound_mech = parameters_m["bc"]
+        constit = parameters_m["fourth_order_tensor"]
+
+        eta = parameters_m.get("mpsa_eta", fvutils.determine_eta(g))
+        inverter = parameters_m.get("inverter", None)
+
+        stencil = fvutils.partial_update_stencil(g, changed_cells)
+        context = (self, g, constit, bound_mech, eta, inverter)
+        triplets = _biot_mech_partition_triplets(context, stencil)
+
+        nd = g.dim
+        update_faces = np.where(np.repeat(stencil[1], nd))[0]
+        update_cells = np.where(stencil[2])[0]
+        update_cells_nd = np.where(np.repeat(stencil[2], nd))[0]
+
+        # Matrix dictionaries, keys and rows to be replaced for stress,
+        # bound_stress, grad_p, div_d, stabilization and bound_div_d
+        targets = [
+            (matrices_m, "stress", update_faces),
+            (matrices_m, "bound_stress", update_faces),
+            (matrices_m, "grad_p", update_cells_nd),
+            (matrices_m, "div_d", update_cells),
+            (matrices_f, "biot_stabilization", update_cells),
+            (matrices_m, "bound_div_d", update_cells),
+        ]
+        for (matrices, key, rows), t in zip(targets, triplets):
+            matrices[key] = fvutils.replace_rows(matrices[key], t, rows)
+
     def assemble_matrix(self, g, data):
         """ Assemble the poro-elastic system matrix.
 
@@ -312,16 +378,89 @@ class Biot:
 
         """
         parameters_m = data[pp.PARAMETERS][self.mechanics_keyword]
-        parameters_f = data[pp.PARAMETERS][self.flow_keyword]
         matrices_m = data[pp.DISCRETIZATION_MATRICES][self.mechanics_keyword]
         matrices_f = data[pp.DISCRETIZATION_MATRICES][self.flow_keyword]
         bound_mech = parameters_m["bc"]
-        bound_flow = parameters_f["bc"]
         constit = parameters_m["fourth_order_tensor"]
 
         eta = parameters_m.get("mpsa_eta", fvutils.determine_eta(g))
         inverter = parameters_m.get("inverter", None)
+        num_workers = parameters_m.get("num_workers", 1)
+
+        cache = DiscretizationCache.from_parameters(parameters_m)
+        if cache is not None:
+            fields = [constit.mu, constit.lmbda, constit.phi, eta]
+            key = cache.key("biot", g, fields, [bound_mech])
+            matrices = cache.load(key)
+            if matrices is not None:
+                matrices_f["biot_stabilization"] = matrices.pop("biot_stabilization")
+                matrices_m.update(matrices)
+                return
+
+        if num_workers is None or num_workers <= 1:
+            stress, bound_stress, grad_p, div_d, stabilization, bound_div_d = self._discretize_mech_local(
+                g, constit, bound_mech, eta, inverter
+            )
+        else:
+            # Discretize partitions of the grid in parallel. Stresses are
+            # assigned to faces, while the remaining terms are assigned to cells.
+            stencils = fvutils.partition_stencils(g, num_workers)
+            context = (self, g, constit, bound_mech, eta, inverter)
+            triplets = fvutils.map_partitions(
+                _biot_mech_partition_triplets, context, stencils, num_workers
+            )
+            nd = g.dim
+            shapes = [
+                (g.num_faces * nd, g.num_cells * nd),
+                (g.num_faces * nd, g.num_faces * nd),
+                (g.num_cells * nd, g.num_cells),
+                (g.num_cells, g.num_cells * nd),
+                (g.num_cells, g.num_cells),
+                (g.num_cells, g.num_faces * nd),
+            ]
+            stress, bound_stress, grad_p, div_d, stabilization, bound_div_d = fvutils.merge_subgrid_triplets(
+                triplets, shapes
+            )
+
+        matrices_m["stress"] = stress
+        matrices_m["bound_stress"] = bound_stress
+        matrices_m["grad_p"] = grad_p
+        matrices_m["div_d"] = div_d
+        matrices_f["biot_stabilization"] = stabilization
+        matrices_m["bound_div_d"] = bound_div_d
 
+        if cache is not None:
+            matrices = {
+                "stress": stress,
+                "bound_stress": bound_stress,
+                "grad_p": grad_p,
+                "div_d": div_d,
+                "biot_stabilization": stabilization,
+                "bound_div_d": bound_div_d,
+            }
+            cache.save(key, matrices)
+
+    def _discretize_mech_local(self, g, constit, bound_mech, eta, inverter):
+        """
+        Core part of the discretization of poro-elasticity, see _discretize_mech().
+
+        Parameters:
+            g (pp.Grid): grid to be discretized
+            constit (pp.FourthOrderTensor): Stiffness tensor.
+            bound_mech (pp.BoundaryConditionVectorial): Boundary conditions for
+                mechanics.
+            eta: Location of continuity point in MPSA.
+            inverter (str): Block inverter, see fvutils.invert_diagonal_blocks.
+
+        Returns:
+            sps.csr_matrix: stress
+            sps.csr_matrix: bound_stress
+            sps.csr_matrix: grad_p
+            sps.csr_matrix: div_d
+            sps.csr_matrix: stabilization
+            sps.csr_matrix: bound_div_d
+
+        """
         # The grid coordinates are always three-dimensional, even if the grid
         # is really 2D. This means that there is not a 1-1 relation between the
         # number of coordinates of a point / vector and the real dimension.
@@ -338,9 +477,6 @@ class Biot:
             g.face_normals = np.delete(g.face_normals, (2), axis=0)
             g.nodes = np.delete(g.nodes, (2), axis=0)
 
-            constit = constit.copy()
-            constit.values = np.delete(constit.values, (2, 5, 6, 7, 8), axis=0)
-            constit.values = np.delete(constit.values, (2, 5, 6, 7, 8), axis=1)
         nd = g.dim
 
         # Define subcell topology
@@ -350,11 +486,6 @@ class Biot:
         bound_exclusion_mech = fvutils.ExcludeBoundaries(
             subcell_topology, bound_mech_sub, nd
         )
-        # ... and flow
-        bound_flow_sub = fvutils.boundary_to_sub_boundary(bound_flow, subcell_topology)
-        bound_exclusion_flow = fvutils.ExcludeBoundaries(
-            subcell_topology, bound_flow_sub, nd
-        )
 
         num_subhfno = subcell_topology.subhfno.size
 
@@ -381,29 +512,31 @@ class Biot:
             this_dim = build_rhs_normals_single_dimension(iter1)
             rhs_normals = sps.vstack([rhs_normals, this_dim])
 
-        rhs_normals = bound_exclusion_mech.exclude_dirichlet(rhs_normals)
+        # The rows of the stress equations in mpsa_elasticity are ordered as
+        # internal sub-faces, then Neumann and Robin boundaries. Order the pressure
+        # forces accordingly; Dirichlet sub-faces carry no stress equation.
+        rhs_normals = sps.vstack(
+            [
+                bound_exclusion_mech.exclude_boundary(rhs_normals),
+                bound_exclusion_mech.keep_neumann(rhs_normals),
+                bound_exclusion_mech.keep_robin(rhs_normals),
+            ]
+        )
+
+        # Call core part of MPSA
+        hook, igrad, rhs_cells, cell_node_blocks, hook_normal = mpsa.mpsa_elasticity(
+            g, constit, subcell_topology, bound_exclusion_mech, eta, inverter
+        )
 
-        num_dir_subface = (
-            bound_exclusion_mech.exclude_neu.shape[1]
-            - bound_exclusion_mech.exclude_neu.shape[0]
-        ) * nd
         # No right hand side for cell displacement equations.
         rhs_normals_displ_var = sps.coo_matrix(
-            (
-                nd * subcell_topology.num_subfno - num_dir_subface,
-                subcell_topology.num_cno,
-            )
+            (rhs_cells.shape[0] - rhs_normals.shape[0], subcell_topology.num_cno)
         )
 
         # Why minus?
         rhs_normals = -sps.vstack([rhs_normals, rhs_normals_displ_var])
         del rhs_normals_displ_var
 
-        # Call core part of MPSA
-        hook, igrad, rhs_cells, cell_node_blocks, hook_normal = mpsa.mpsa_elasticity(
-            g, constit, subcell_topology, bound_exclusion_mech, eta, inverter
-        )
-
         # Output should be on face-level (not sub-face)
         hf2f = fvutils.map_hf_2_f(
             subcell_topology.fno_unique, subcell_topology.subfno_unique, nd
@@ -449,12 +582,7 @@ class Biot:
 
         stabilization = div * igrad * rhs_normals
 
-        matrices_m["stress"] = stress
-        matrices_m["bound_stress"] = bound_stress
-        matrices_m["grad_p"] = grad_p
-        matrices_m["div_d"] = div_d
-        matrices_f["biot_stabilization"] = stabilization
-        matrices_m["bound_div_d"] = bound_div_d
+        return stress, bound_stress, grad_p, div_d, stabilization, bound_div_d
 
     def _face_vector_to_scalar(self, nf, nd):
         """ Create a mapping from vector quantities on faces (stresses) to scalar
@@ -958,3 +1086,59 @@ class BiotStabilization(
                 conditions.
         """
         return np.zeros(self.ndof(g))
+
+
+def _biot_mech_partition_triplets(context, stencil):
+    """
+    Discretize the poro-elastic terms on a single partition, as defined by
+    fvutils.partition_stencils(), and return the global coo triplets of the faces
+    and cells assigned to the partition. Used by Biot._discretize_mech(),
+    possibly in a worker process.
+    """
+    discr, g, constit, bound_mech, eta, inverter = context
+    active_nodes, owned_faces, owned_cells = stencil
+    nd = g.dim
+
+    ind, _ = fvutils.cell_ind_for_partial_update(g, nodes=active_nodes)
+    sub_g, l2g_faces, _ = pp.partition.extract_subgrid(g, ind)
+    l2g_cells = sub_g.parent_cell_ind
+
+    # Restrict stiffness tensor and boundary conditions to the subgrid
+    loc_c = pp.FourthOrderTensor(
+        constit.dim,
+        constit.mu[l2g_cells],
+        constit.lmbda[l2g_cells],
+        phi=constit.phi[l2g_cells],
+        compact=True,
+    )
+
+    loc_bnd = pp.BoundaryConditionVectorial(sub_g)
+    loc_bnd.is_dir = bound_mech.is_dir[:, l2g_faces]
+    loc_bnd.is_rob = bound_mech.is_rob[:, l2g_faces]
+    loc_bnd.is_neu[loc_bnd.is_dir + loc_bnd.is_rob] = False
+    loc_bnd.robin_weight = bound_mech.robin_weight[:, :, l2g_faces]
+    loc_bnd.basis = bound_mech.basis[:, :, l2g_faces]
+
+    loc_mats = discr._discretize_mech_local(sub_g, loc_c, loc_bnd, eta, inverter)
+
+    face_ind = fvutils.expand_indices_nd(l2g_faces, nd)
+    cell_ind = fvutils.expand_indices_nd(l2g_cells, nd)
+    keep_faces = np.repeat(owned_faces, nd)
+    keep_cells_nd = np.repeat(owned_cells, nd)
+
+    # Row and column maps of stress, bound_stress, grad_p, div_d, stabilization
+    # and bound_div_d
+    row_maps = [face_ind, face_ind, cell_ind, l2g_cells, l2g_cells, l2g_cells]
+    col_maps = [cell_ind, face_ind, l2g_cells, cell_ind, l2g_cells, face_ind]
+    keep_rows = [
+        keep_faces,
+        keep_faces,
+        keep_cells_nd,
+        owned_cells,
+        owned_cells,
+        owned_cells,
+    ]
+    return [
+        fvutils.subgrid_triplets(mat, row_map, col_map, keep)
+        for mat, row_map, col_map, keep in zip(loc_mats, row_maps, col_maps, keep_rows)
+    ]
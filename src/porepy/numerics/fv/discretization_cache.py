@@ -0,0 +1,240 @@
+"""
+On-disk cache for discretization matrices.
+
+Discretization of a fixed geometry with fixed parameters always gives the
+same matrices. For expensive discretizations (Mpfa, Mpsa, Biot), the matrices
+can be stored on disk and reused by later processes. The cache is activated by
+the optional parameter 'discretization_cache' in the parameter dictionary of
+the discretization, which should be either the path to the cache directory, or
+a DiscretizationCache object.
+
+The entries are identified by a hash of the grid topology and geometry, the
+parameter fields (tensor values, eta etc.), the boundary condition
+classification, and the name of the discretization. Each entry is stored as a
+compressed .npz file. If a maximum size is given, the least recently used
+entries are removed when the size of the cache exceeds it.
+
+Example:
+    data = pp.initialize_default_data(g, {}, "flow", {"discretization_cache": path})
+    pp.Mpfa("flow").discretize(g, data)
+
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import scipy.sparse as sps
+
+
+class DiscretizationCache(object):
+    """ Storage of discretization matrices in a directory.
+
+    Attributes:
+        directory (str): Path to the directory of the cache.
+        max_size (int): Maximum size of the cache in bytes. If None, there is
+            no limit.
+
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __repr__(self):
+        s = "Discretization cache in " + self.directory
+        if self.max_size is not None:
+            s += ", maximum size " + str(self.max_size) + " bytes"
+        return s
+
+    @classmethod
+    def from_parameters(cls, parameter_dictionary):
+        """ Get the cache given in a parameter dictionary.
+
+        Parameters:
+            parameter_dictionary (dict): Parameters of a discretization. The
+                cache is given by the key 'discretization_cache', either as a
+                path or as a DiscretizationCache.
+
+        Returns:
+            DiscretizationCache, or None if no cache is given.
+
+        """
+        cache = parameter_dictionary.get("discretization_cache", None)
+        if cache is None or isinstance(cache, DiscretizationCache):
+            return cache
+        return cls(cache)
+
+    def key(self, name, g, fields, bcs):
+        """ Compute the key of a discretization.
+
+        Parameters:
+            name (str): Name of the discretization method.
+            g (pp.Grid): Grid to be discretized.
+            fields (list): Parameters of the discretization, each of them a
+                np.ndarray, sparse matrix, scalar or None.
+            bcs (list): Boundary conditions of the discretization.
+
+        Returns:
+            str: Hexadecimal hash identifying the discretization.
+
+        """
+        h = hashlib.sha1(name.encode())
+
+        _hash_array(h, g.dim)
+        for attr in ["nodes", "face_nodes", "cell_faces"]:
+            _hash_array(h, getattr(g, attr))
+        for attr in [
+            "face_areas",
+            "face_normals",
+            "face_centers",
+            "cell_volumes",
+            "cell_centers",
+        ]:
+            _hash_array(h, getattr(g, attr, None))
+        for tag in sorted(g.tags.keys()):
+            h.update(tag.encode())
+            _hash_array(h, g.tags[tag])
+
+        for f in fields:
+            _hash_array(h, f)
+
+        for bc in bcs:
+            if bc is None:
+                _hash_array(h, None)
+                continue
+            h.update(bc.bc_type.encode())
+            for attr in ["is_neu", "is_dir", "is_rob", "is_internal"]:
+                _hash_array(h, getattr(bc, attr, None))
+            for attr in ["robin_weight", "basis"]:
+                _hash_array(h, getattr(bc, attr, None))
+
+        return h.hexdigest()
+
+    def load(self, key):
+        """ Load the matrices of a discretization.
+
+        Parameters:
+            key (str): Key of the discretization, see key().
+
+        Returns:
+            dict: The matrices, identified by their names, or None if the
+                discretization is not in the cache.
+
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                content = {k: f[k] for k in f.files}
+        except (IOError, OSError, ValueError):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        names = np.unique([k.rsplit("__", 1)[0] for k in content.keys()])
+        matrices = {}
+        for name in names:
+            fmt = str(content[name + "__format"])
+            shape = tuple(content[name + "__shape"])
+            arrays = (
+                content[name + "__data"],
+                content[name + "__indices"],
+                content[name + "__indptr"],
+            )
+            if fmt == "csr":
+                matrices[name] = sps.csr_matrix(arrays, shape=shape)
+            else:
+                matrices[name] = sps.csc_matrix(arrays, shape=shape)
+        return matrices
+
+    def save(self, key, matrices):
+        """ Store the matrices of a discretization.
+
+        Parameters:
+            key (str): Key of the discretization, see key().
+            matrices (dict): Sparse matrices identified by their names.
+
+        """
+        content = {}
+        for name, mat in matrices.items():
+            if not sps.isspmatrix_csr(mat):
+                mat = sps.csc_matrix(mat)
+            content[name + "__format"] = np.array(mat.format)
+            content[name + "__shape"] = np.array(mat.shape)
+            content[name + "__data"] = mat.data
+            content[name + "__indices"] = mat.indices
+            content[name + "__indptr"] = mat.indptr
+
+        # Write to a temporary file first, so that other processes never see a
+        # partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **content)
+        os.replace(tmp_path, self._path(key))
+
+        self._evict()
+
+    def clear(self):
+        """ Remove all entries of the cache.
+        """
+        for path in self._entries():
+            os.remove(path)
+
+    def size(self):
+        """
+        Returns:
+            int: Total size of the entries of the cache in bytes.
+        """
+        return np.sum([os.path.getsize(p) for p in self._entries()], dtype=np.int)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def _entries(self):
+        return [
+            os.path.join(self.directory, f)
+            for f in os.listdir(self.directory)
+            if f.endswith(".npz")
+        ]
+
+    def _evict(self):
+        """ Remove the least recently used entries until the cache size is below
+        max_size.
+        """
+        if self.max_size is None:
+            return
+        entries = self._entries()
+        mtime = [os.path.getmtime(p) for p in entries]
+        size = [os.path.getsize(p) for p in entries]
+        total = np.sum(size)
+        for i in np.argsort(mtime, kind="mergesort"):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(entries[i])
+            except OSError:
+                pass
+            total -= size[i]
+
+
+def _hash_array(h, a):
+    """ Update the hash h with the content of a, which can be a np.ndarray, a
+    sparse matrix, a scalar or None.
+    """
+    if a is None:
+        h.update(b"None")
+    elif sps.issparse(a):
+        a = a.tocsc()
+        h.update(str(a.shape).encode())
+        for arr in [a.indptr, a.indices, a.data]:
+            _hash_array(h, arr)
+    else:
+        a = np.ascontiguousarray(a)
+        h.update((a.dtype.str + str(a.shape)).encode())
+        h.update(a.tobytes())
@@ -2,11 +2,19 @@
 Various FV specific utility functions.
 """
 from __future__ import division
+import multiprocessing
+import sys
+import threading
 import numpy as np
 import scipy.sparse as sps
 
+try:
+    import numba
+except ImportError:
+    pass
+
 import porepy as pp
-from porepy.utils import matrix_compression, mcolon
+from porepy.utils import matrix_compression, mcolon, sparse_mat
 from porepy.grids.grid_bucket import GridBucket
 
 
@@ -255,15 +263,16 @@ def invert_diagonal_blocks(mat, s, method=None):
 
     Three implementations are available, either pure numpy, or a speedup using
     numba or cython. If none is specified, the function will try to use numba,
-    then cython. The python option will only be invoked if explicitly asked
-    for; it will be very slow for general problems.
+    then cython, and finally python. The python option is very slow for
+    general problems.
 
     Parameters
     ----------
     mat: sps.csr matrix to be inverted.
-    s: block size. Must be int64 for the numba acceleration to work
+    s: block size.
     method: Choice of method. Either numba (default), cython or 'python'.
-        Defaults to None, in which case first numba, then cython is tried.
+        Defaults to None, in which case first numba, then cython, then python
+        is tried.
 
     Returns
     -------
@@ -312,10 +321,9 @@ def invert_diagonal_blocks(mat, s, method=None):
         """
         try:
             import porepy.numerics.fv.cythoninvert as cythoninvert
-        except:
-            ImportError(
-                "Compiled Cython module not available. Is cython\
-            installed?"
+        except ImportError:
+            raise ImportError(
+                "Compiled Cython module not available. Is cython installed?"
             )
 
         a.sorted_indices()
@@ -328,8 +336,13 @@ def invert_diagonal_blocks(mat, s, method=None):
 
     def invert_diagonal_blocks_numba(a, size):
         """
-        Invert block diagonal matrix by invoking numba acceleration of a simple
-        for-loop based algorithm.
+        Invert block diagonal matrix by invoking numba acceleration.
+
+        Blocks of size up to 3 are inverted analytically by a compiled kernel
+        that runs in parallel over the blocks. The remaining blocks are grouped
+        according to their size, and each group is inverted in batches by
+        LAPACK. Singular small blocks are also passed to LAPACK, so that a
+        LinAlgError is raised as for the other implementations.
 
         This approach should be more efficient than the related method
         invert_diagonal_blocks_python for larger problems.
@@ -343,87 +356,50 @@ def invert_diagonal_blocks(mat, s, method=None):
         -------
         ia: inverse of a
         """
-        try:
-            import numba
-        except:
+        if "numba" not in sys.modules:
             raise ImportError("Numba not available on the system")
 
-        # Sort matrix storage before pulling indices and data
-        a.sorted_indices()
         ptr = a.indptr
         indices = a.indices
         dat = a.data
 
-        # Just in time compilation
-        @numba.jit("f8[:](i4[:],i4[:],f8[:],i8[:])", nopython=True, nogil=False)
-        def inv_python(indptr, ind, data, sz):
-            """
-            Invert block matrices by explicitly forming local matrices. The code
-            in itself is not efficient, but it is hopefully well suited for
-            speeding up with numba.
-
-            It may be possible to restruct the code to further help numba,
-            this has not been investigated.
-
-            The computation can easily be parallelized, consider this later.
-            """
-
-            # Index of where the rows start for each block.
-            # block_row_starts_ind = np.hstack((np.array([0]),
-            #                                   np.cumsum(sz[:-1])))
-            block_row_starts_ind = np.zeros(sz.size, dtype=np.int32)
-            block_row_starts_ind[1:] = np.cumsum(sz[:-1])
-
-            # Number of columns per row. Will change from one column to the
-            # next
-            num_cols_per_row = indptr[1:] - indptr[0:-1]
-            # Index to where the columns start for each row (NOT blocks)
-            # row_cols_start_ind = np.hstack((np.zeros(1),
-            #                                 np.cumsum(num_cols_per_row)))
-            row_cols_start_ind = np.zeros(num_cols_per_row.size + 1, dtype=np.int32)
-            row_cols_start_ind[1:] = np.cumsum(num_cols_per_row)
-
-            # Index to where the (full) data starts. Needed, since the
-            # inverse matrix will generally be full
-            # full_block_starts_ind = np.hstack((np.array([0]),
-            #                                    np.cumsum(np.square(sz))))
-            full_block_starts_ind = np.zeros(sz.size + 1, dtype=np.int32)
-            full_block_starts_ind[1:] = np.cumsum(np.square(sz))
-            # Structure to store the solution
-            inv_vals = np.zeros(np.sum(np.square(sz)))
-
-            # Loop over all blocks
-            for iter1 in range(sz.size):
-                n = sz[iter1]
-                loc_mat = np.zeros((n, n))
-                # Fill in non-zero elements in local matrix
-                for iter2 in range(n):  # Local rows
-                    global_row = block_row_starts_ind[iter1] + iter2
-                    data_counter = row_cols_start_ind[global_row]
-
-                    # Loop over local columns. Getting the number of columns
-                    #  for each row is a bit involved
-                    for _ in range(
-                        num_cols_per_row[iter2 + block_row_starts_ind[iter1]]
-                    ):
-                        loc_col = ind[data_counter] - block_row_starts_ind[iter1]
-                        loc_mat[iter2, loc_col] = data[data_counter]
-                        data_counter += 1
-
-                # Compute inverse. np.linalg.inv is supported by numba (May
-                # 2016), it is not clear if this is the best option. To be
-                # revised
-                inv_mat = np.ravel(np.linalg.inv(loc_mat))
-
-                loc_ind = np.arange(
-                    full_block_starts_ind[iter1], full_block_starts_ind[iter1 + 1]
+        size = np.asarray(size, dtype=np.int64)
+        # Index of where the rows start for each block
+        block_row_starts = np.hstack((0, np.cumsum(size[:-1]))).astype(np.int64)
+        # Index to where the (full) data of each block starts in the inverse.
+        # Needed, since the inverse matrix will generally be full
+        full_block_starts = np.hstack((0, np.cumsum(np.square(size)))).astype(
+            np.int64
+        )
+
+        if _use_serial_numba_kernels():
+            invert_small_blocks = _invert_small_blocks_numba_serial
+            gather_blocks = _gather_blocks_numba_serial
+        else:
+            global _parallel_numba_kernels_used
+            _parallel_numba_kernels_used = True
+            invert_small_blocks = _invert_small_blocks_numba
+            gather_blocks = _gather_blocks_numba
+
+        inv_vals, is_inverted = invert_small_blocks(
+            ptr, indices, dat, size, block_row_starts, full_block_starts
+        )
+
+        remaining = np.where(np.logical_not(is_inverted))[0]
+        for n in np.unique(size[remaining]):
+            blocks = remaining[size[remaining] == n]
+            # Limit the number of blocks treated in one batch, so that the
+            # temporary dense arrays stay reasonably small.
+            batch_size = max(1, _MAX_BATCH_ENTRIES // (n * n))
+            for batch_start in range(0, blocks.size, batch_size):
+                batch = blocks[batch_start : batch_start + batch_size]
+                loc_mat = gather_blocks(
+                    ptr, indices, dat, block_row_starts[batch], n
                 )
-                inv_vals[loc_ind] = inv_mat
-                # Update fields
-            return inv_vals
+                loc_ind = full_block_starts[batch].reshape((-1, 1)) + np.arange(n * n)
+                inv_vals[loc_ind.ravel()] = np.linalg.inv(loc_mat).ravel()
 
-        v = inv_python(ptr, indices, dat, size)
-        return v
+        return inv_vals
 
     # Variable to check if we have tried and failed with numba
     try_cython = False
@@ -434,18 +410,191 @@ def invert_diagonal_blocks(mat, s, method=None):
             # This went wrong, fall back on cython
             try_cython = True
     # Variable to check if we should fall back on python
+    try_python = False
     if method == "cython" or try_cython:
         try:
             inv_vals = invert_diagonal_blocks_cython(mat, s)
         except ImportError as e:
-            raise e
-    elif method == "python":
+            if not try_cython:
+                raise e
+            # Neither numba nor cython is available, fall back on python
+            try_python = True
+    if method == "python" or try_python:
         inv_vals = invert_diagonal_blocks_python(mat, s)
 
     ia = block_diag_matrix(inv_vals, s)
     return ia
 
 
+# Upper limit on the number of matrix elements in a batch of blocks passed to
+# LAPACK by invert_diagonal_blocks.
+_MAX_BATCH_ENTRIES = 2 ** 24
+
+if "numba" in sys.modules:
+
+    @numba.njit(cache=True)
+    def _invert_small_block(indptr, ind, data, n, row_start, inv_vals, start):
+        """
+        Invert a block of size at most 3 by explicit formulas. The values of
+        the inverse are stored in inv_vals, starting at start.
+
+        Returns True if the block was inverted. Blocks that are larger than 3,
+        or singular, are left untouched.
+        """
+        if n == 0:
+            return True
+        if n > 3:
+            return False
+
+        # Fill in non-zero elements in local matrix
+        m = np.zeros((3, 3))
+        for loc_row in range(n):
+            global_row = row_start + loc_row
+            for di in range(indptr[global_row], indptr[global_row + 1]):
+                m[loc_row, ind[di] - row_start] = data[di]
+
+        if n == 1:
+            if m[0, 0] != 0:
+                inv_vals[start] = 1.0 / m[0, 0]
+                return True
+        elif n == 2:
+            det = m[0, 0] * m[1, 1] - m[0, 1] * m[1, 0]
+            if det != 0:
+                inv_vals[start] = m[1, 1] / det
+                inv_vals[start + 1] = -m[0, 1] / det
+                inv_vals[start + 2] = -m[1, 0] / det
+                inv_vals[start + 3] = m[0, 0] / det
+                return True
+        else:
+            # Cofactors of the first row
+            c00 = m[1, 1] * m[2, 2] - m[1, 2] * m[2, 1]
+            c01 = m[1, 2] * m[2, 0] - m[1, 0] * m[2, 2]
+            c02 = m[1, 0] * m[2, 1] - m[1, 1] * m[2, 0]
+            det = m[0, 0] * c00 + m[0, 1] * c01 + m[0, 2] * c02
+            if det != 0:
+                inv_vals[start] = c00 / det
+                inv_vals[start + 1] = (m[0, 2] * m[2, 1] - m[0, 1] * m[2, 2]) / det
+                inv_vals[start + 2] = (m[0, 1] * m[1, 2] - m[0, 2] * m[1, 1]) / det
+                inv_vals[start + 3] = c01 / det
+                inv_vals[start + 4] = (m[0, 0] * m[2, 2] - m[0, 2] * m[2, 0]) / det
+                inv_vals[start + 5] = (m[0, 2] * m[1, 0] - m[0, 0] * m[1, 2]) / det
+                inv_vals[start + 6] = c02 / det
+                inv_vals[start + 7] = (m[0, 1] * m[2, 0] - m[0, 0] * m[2, 1]) / det
+                inv_vals[start + 8] = (m[0, 0] * m[1, 1] - m[0, 1] * m[1, 0]) / det
+                return True
+        return False
+
+    @numba.njit(cache=True, parallel=True)
+    def _invert_small_blocks_numba(
+        indptr, ind, data, sz, block_row_starts, full_block_starts
+    ):
+        """
+        Invert blocks of size at most 3 by explicit formulas, in parallel over
+        the blocks.
+
+        Returns the values of the inverse, laid out as in
+        invert_diagonal_blocks, and a boolean array which is True for the
+        blocks that were inverted.
+        """
+        num_blocks = sz.size
+        inv_vals = np.zeros(full_block_starts[-1])
+        is_inverted = np.zeros(num_blocks, dtype=np.bool_)
+        for bi in numba.prange(num_blocks):
+            is_inverted[bi] = _invert_small_block(
+                indptr,
+                ind,
+                data,
+                sz[bi],
+                block_row_starts[bi],
+                inv_vals,
+                full_block_starts[bi],
+            )
+        return inv_vals, is_inverted
+
+    @numba.njit(cache=True)
+    def _invert_small_blocks_numba_serial(
+        indptr, ind, data, sz, block_row_starts, full_block_starts
+    ):
+        """
+        Serial version of _invert_small_blocks_numba.
+        """
+        num_blocks = sz.size
+        inv_vals = np.zeros(full_block_starts[-1])
+        is_inverted = np.zeros(num_blocks, dtype=np.bool_)
+        for bi in range(num_blocks):
+            is_inverted[bi] = _invert_small_block(
+                indptr,
+                ind,
+                data,
+                sz[bi],
+                block_row_starts[bi],
+                inv_vals,
+                full_block_starts[bi],
+            )
+        return inv_vals, is_inverted
+
+    @numba.njit(cache=True)
+    def _gather_block(indptr, ind, data, row_start, n, loc_mat):
+        """
+        Copy the diagonal block of size n starting at row_start from a csr
+        matrix into the dense array loc_mat.
+        """
+        for loc_row in range(n):
+            global_row = row_start + loc_row
+            for di in range(indptr[global_row], indptr[global_row + 1]):
+                loc_mat[loc_row, ind[di] - row_start] = data[di]
+
+    @numba.njit(cache=True, parallel=True)
+    def _gather_blocks_numba(indptr, ind, data, block_row_starts, n):
+        """
+        Extract diagonal blocks of equal size n from a csr matrix into a dense
+        array of shape (num_blocks, n, n), suitable for batched inversion.
+        """
+        num_blocks = block_row_starts.size
+        loc_mat = np.zeros((num_blocks, n, n))
+        for bi in numba.prange(num_blocks):
+            _gather_block(indptr, ind, data, block_row_starts[bi], n, loc_mat[bi])
+        return loc_mat
+
+    @numba.njit(cache=True)
+    def _gather_blocks_numba_serial(indptr, ind, data, block_row_starts, n):
+        """
+        Serial version of _gather_blocks_numba.
+        """
+        num_blocks = block_row_starts.size
+        loc_mat = np.zeros((num_blocks, n, n))
+        for bi in range(num_blocks):
+            _gather_block(indptr, ind, data, block_row_starts[bi], n, loc_mat[bi])
+        return loc_mat
+
+
+# The parallel numba kernels should not be used in forked worker processes,
+# where the threading layer of numba may be unusable, or from several threads
+# at the same time. Workers of map_partitions, and worker threads of the
+# Assembler, therefore switch to the serial kernels by serial_numba_kernels().
+_numba_kernel_state = threading.local()
+
+# Whether the parallel kernels have been used in this process. Once the threads
+# of numba are started, the process should not be forked, see map_partitions().
+_parallel_numba_kernels_used = False
+
+
+def serial_numba_kernels(serial=True):
+    """
+    Use serial numba kernels in invert_diagonal_blocks, in the current thread.
+
+    Parameters:
+        serial (boolean, optional): If True (default), the serial kernels are
+            used. If False, the parallel kernels are used.
+
+    """
+    _numba_kernel_state.serial = serial
+
+
+def _use_serial_numba_kernels():
+    return getattr(_numba_kernel_state, "serial", False)
+
+
 def block_diag_matrix(vals, sz):
     """
     Construct block diagonal matrix based on matrix elements and block sizes.
@@ -1188,6 +1337,263 @@ def map_subgrid_to_grid(g, loc_faces, loc_cells, is_vector):
     return face_map, cell_map
 
 
+# ------------------------------------------------------------------------------
+# Helper functions for discretization on partitions of a grid, optionally
+# carried out in parallel.
+
+
+def partition_stencils(g, num_part):
+    """
+    Partition a grid, and find the computational stencils needed for a
+    discretization of the partitions, one by one, with subsequent merging into
+    global matrices.
+
+    Each face is assigned to the first partition where all its nodes are
+    nodes of the partition cells, and each cell is assigned to its partition.
+    A discretization on the subgrid found by cell_ind_for_partial_update(),
+    with the partition nodes as argument, will be exact on the assigned faces
+    and cells.
+
+    Parameters:
+        g (pp.Grid): Grid to be partitioned.
+        num_part (int): Target number of partitions, see pp.partition.partition.
+
+    Returns:
+        list of tuples, one per non-empty partition, each containing
+            np.array (int): Nodes of the partition cells, to be used as the
+                nodes argument to cell_ind_for_partial_update().
+            np.array (bool, size g.num_faces): Faces assigned to the partition.
+            np.array (bool, size g.num_cells): Cells assigned to the partition.
+
+    """
+    num_part = max(1, int(num_part))
+    if num_part == 1:
+        part = np.zeros(g.num_cells, dtype=np.int)
+    else:
+        # Let partitioning module apply the best available method
+        part = pp.partition.partition(g, num_part)
+
+    cn = g.cell_nodes()
+    fn = _face_node_incidence(g)
+    num_face_nodes = np.diff(g.face_nodes.indptr)
+
+    face_covered = np.zeros(g.num_faces, dtype=np.bool)
+    stencils = []
+    for p in np.unique(part):
+        active_cells = part == p
+        active_nodes = np.zeros(g.num_nodes, dtype=np.int)
+        active_nodes[(cn * active_cells) > 0] = 1
+
+        # Active faces are those where all nodes are active.
+        active_faces = (fn * active_nodes) == num_face_nodes
+        owned_faces = np.logical_and(active_faces, np.logical_not(face_covered))
+        face_covered[active_faces] = 1
+
+        stencils.append((np.where(active_nodes)[0], owned_faces, active_cells))
+    return stencils
+
+
+def partial_update_stencil(g, cells):
+    """
+    Find the computational stencil needed to update a discretization after a
+    change of the parameters in some cells.
+
+    The discretization is affected on all faces and cells that share a node
+    with the changed cells. These are returned on the same form as the stencils
+    of partition_stencils(), so that the functions used to discretize
+    partitions of a grid can also be used for the update.
+
+    Parameters:
+        g (pp.Grid): Grid to be discretized.
+        cells (np.array, int): Index of cells with changed parameters.
+
+    Returns:
+        np.array (int): Nodes of the cells affected by the update, to be used as
+            the nodes argument to cell_ind_for_partial_update().
+        np.array (bool, size g.num_faces): Faces where the discretization
+            should be updated.
+        np.array (bool, size g.num_cells): Cells where the discretization
+            should be updated.
+
+    """
+    cn = g.cell_nodes()
+    fn = _face_node_incidence(g)
+
+    changed_cells = np.zeros(g.num_cells, dtype=np.int)
+    changed_cells[cells] = 1
+    changed_nodes = ((cn * changed_cells) > 0).astype(np.int)
+
+    update_faces = (fn * changed_nodes) > 0
+    update_cells = (cn.transpose() * changed_nodes) > 0
+
+    # The interaction regions of all nodes of the updated cells must be
+    # included in the subgrid. The nodes of the updated faces are all nodes of
+    # updated cells.
+    active_nodes = np.where((cn * update_cells.astype(np.int)) > 0)[0]
+    return active_nodes, update_faces, update_cells
+
+
+def replace_rows(mat, triplets, rows):
+    """
+    Replace rows of a global matrix with rows given as coo triplets, as
+    computed by subgrid_triplets().
+
+    Parameters:
+        mat (sps.spmatrix): Matrix to be updated. If it is in csr format, it is
+            modified in place.
+        triplets (tuple): Global row indices, column indices and values of the
+            new rows. All row indices must be in rows.
+        rows (np.array, int): Rows to be replaced. Rows without new entries
+            will be empty after the update.
+
+    Returns:
+        sps.csr_matrix: The updated matrix.
+
+    """
+    rows = np.unique(rows)
+    r, c, v = triplets
+    new_rows = sps.coo_matrix(
+        (v, (np.searchsorted(rows, r), c)), shape=(rows.size, mat.shape[1])
+    ).tocsr()
+    if mat.getformat() != "csr":
+        mat = mat.tocsr()
+    sparse_mat.merge_matrices(mat, new_rows, rows)
+    return mat
+
+
+def _face_node_incidence(g):
+    """ Face-node relation, with faces as rows and unit weights.
+
+    The index arrays are copied, since sparse operations may sort them in place,
+    and the ordering of the nodes of a face should be preserved.
+    """
+    return sps.csr_matrix(
+        (
+            np.ones(g.face_nodes.nnz, dtype=np.int),
+            g.face_nodes.indices.copy(),
+            g.face_nodes.indptr.copy(),
+        ),
+        shape=(g.num_faces, g.num_nodes),
+    )
+
+
+def subgrid_triplets(mat, row_map, col_map, keep_rows):
+    """
+    Map a matrix computed on a subgrid to global indices, and return the rows
+    to be kept as coo triplets.
+
+    Parameters:
+        mat (sps.spmatrix): Matrix in local numbering.
+        row_map (np.array, int): Global index of each local row.
+        col_map (np.array, int): Global index of each local column.
+        keep_rows (np.array, bool): For each global row, whether the row should
+            be kept.
+
+    Returns:
+        np.array (int): Global row indices.
+        np.array (int): Global column indices.
+        np.array: Matrix values.
+
+    """
+    mat = mat.tocoo()
+    glob_rows = row_map[mat.row]
+    keep = keep_rows[glob_rows]
+    return glob_rows[keep], col_map[mat.col[keep]], mat.data[keep]
+
+
+def merge_subgrid_triplets(triplets, shapes):
+    """
+    Merge triplets computed by subgrid_triplets() on several partitions into
+    global matrices.
+
+    Parameters:
+        triplets (list): One item per partition, each a list with one
+            (rows, cols, vals) tuple per matrix.
+        shapes (list of tuples): Shape of each global matrix.
+
+    Returns:
+        list of sps.csr_matrix: The global matrices.
+
+    """
+    mats = []
+    for ind, shape in enumerate(shapes):
+        rows = np.concatenate([t[ind][0] for t in triplets])
+        cols = np.concatenate([t[ind][1] for t in triplets])
+        vals = np.concatenate([t[ind][2] for t in triplets])
+        mats.append(sps.coo_matrix((vals, (rows, cols)), shape=shape).tocsr())
+    return mats
+
+
+# Context shared by the worker processes in map_partitions.
+_partition_context = None
+
+
+def _init_partition_worker(func, context):
+    global _partition_context
+    serial_numba_kernels()
+    _partition_context = (func, context)
+
+
+def _run_partition_task(task):
+    func, context = _partition_context
+    return func(context, task)
+
+
+def map_partitions(func, context, tasks, num_workers=1):
+    """
+    Apply a function to a list of tasks, either serially or in a pool of
+    worker processes.
+
+    The context is sent to each worker once, when the worker is started. If
+    the platform supports forking of processes, this is done without copying,
+    so that grid and parameter arrays are shared between the processes.
+
+    Forking a process after the threads of numba are started may leave the
+    process hanging, at the latest when the interpreter exits. If the parallel
+    numba kernels for block inversion have been used in the current process,
+    the workers are therefore started from a fresh interpreter, by a forkserver
+    if available; the context is then pickled. As for other uses of
+    multiprocessing, the main module of a script should then be guarded by
+    if __name__ == "__main__". The workers use the serial numba kernels for
+    block inversion, see serial_numba_kernels().
+
+    Parameters:
+        func (function): Called as func(context, task). Must be defined on
+            module level, so that it can be pickled.
+        context (object): Data common to all tasks, typically the grid and
+            the parameters of the discretization.
+        tasks (list): Tasks to be processed.
+        num_workers (int, optional): Number of worker processes. If 1 (default)
+            or None, the tasks are processed in the current process.
+
+    Returns:
+        list: The return values of func, in the order of tasks.
+
+    """
+    if num_workers is None or num_workers <= 1 or len(tasks) < 2:
+        return [func(context, task) for task in tasks]
+
+    start_methods = multiprocessing.get_all_start_methods()
+    if "fork" in start_methods and not _parallel_numba_kernels_used:
+        mp_context = multiprocessing.get_context("fork")
+    elif "forkserver" in start_methods:
+        mp_context = multiprocessing.get_context("forkserver")
+    else:
+        mp_context = multiprocessing.get_context("spawn")
+
+    pool = mp_context.Pool(
+        min(num_workers, len(tasks)),
+        initializer=_init_partition_worker,
+        initargs=(func, context),
+    )
+    try:
+        results = pool.map(_run_partition_task, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
 # ------------------------------------------------------------------------------
 
 
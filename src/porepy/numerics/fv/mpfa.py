@@ -10,6 +10,7 @@ import scipy.sparse as sps
 import porepy as pp
 from porepy.numerics.fv import fvutils
 from porepy.numerics.fv.fv_elliptic import FVElliptic
+from porepy.numerics.fv.discretization_cache import DiscretizationCache
 
 
 class Mpfa(FVElliptic):
@@ -57,6 +58,16 @@ class Mpfa(FVElliptic):
             value.
             mpfa_inverter (str): Optional. Inverter to apply for local problems.
                 Can take values 'numba' (default), 'cython' or 'python'.
+            mpfa_max_memory (float): Optional. Threshold for peak memory, in
+                bytes. If given, the discretization is split into partitions
+                of the grid that are treated one by one, see mpfa().
+            num_workers (int): Optional. Number of worker processes used to
+                discretize partitions of the grid in parallel, see mpfa().
+                Defaults to 1.
+            discretization_cache (str or pp.DiscretizationCache): Optional.
+                Directory of an on-disk cache of the discretization matrices.
+                If the same discretization has been stored before, the matrices
+                are loaded instead of computed.
 
         matrix_dictionary will be updated with the following entries:
             flux: sps.csc_matrix (g.num_faces, g.num_cells)
@@ -83,14 +94,82 @@ class Mpfa(FVElliptic):
 
         eta = parameter_dictionary.get("mpfa_eta", None)
         inverter = parameter_dictionary.get("mpfa_inverter", None)
+        max_memory = parameter_dictionary.get("mpfa_max_memory", None)
+        num_workers = parameter_dictionary.get("num_workers", 1)
+
+        cache = DiscretizationCache.from_parameters(parameter_dictionary)
+        if cache is not None:
+            key = cache.key("mpfa", g, [k.values, aperture, eta], [bnd])
+            matrices = cache.load(key)
+            if matrices is not None:
+                matrix_dictionary.update(matrices)
+                return
 
         trm, bound_flux, bp_cell, bp_face = self.mpfa(
-            g, k, bnd, eta=eta, apertures=aperture, inverter=inverter
+            g,
+            k,
+            bnd,
+            eta=eta,
+            apertures=aperture,
+            inverter=inverter,
+            max_memory=max_memory,
+            num_workers=num_workers,
         )
-        matrix_dictionary["flux"] = trm
-        matrix_dictionary["bound_flux"] = bound_flux
-        matrix_dictionary["bound_pressure_cell"] = bp_cell
-        matrix_dictionary["bound_pressure_face"] = bp_face
+        matrices = {
+            "flux": trm,
+            "bound_flux": bound_flux,
+            "bound_pressure_cell": bp_cell,
+            "bound_pressure_face": bp_face,
+        }
+        matrix_dictionary.update(matrices)
+        if cache is not None:
+            cache.save(key, matrices)
+
+    def update_discretization(self, g, data, changed_cells):
+        """
+        Update the discretization after a change of the permeability in some
+        cells.
+
+        Only faces sharing a node with the changed cells are affected. These are
+        rediscretized on a subgrid around the changed cells, and the
+        corresponding rows of the discretization matrices are replaced in
+        place. The computational cost thus scales with the number of changed
+        cells rather than with the size of the grid.
+
+        The parameters are read from data[pp.PARAMETERS][self.keyword], see
+        discretize(). The matrices in data[pp.DISCRETIZATION_MATRICES][self.keyword]
+        must have been computed by a previous call to discretize().
+
+        Parameters
+        ----------
+        g (pp.Grid): grid, or a subclass, with geometry fields computed.
+        data (dict): For entries, see discretize().
+        changed_cells (np.ndarray, int): Index of cells where the permeability
+            has changed.
+        """
+        changed_cells = np.atleast_1d(np.asarray(changed_cells, dtype=np.int))
+        if changed_cells.size == 0:
+            return
+
+        parameter_dictionary = data[pp.PARAMETERS][self.keyword]
+        matrix_dictionary = data[pp.DISCRETIZATION_MATRICES][self.keyword]
+        k = parameter_dictionary["second_order_tensor"]
+        bnd = parameter_dictionary["bc"]
+        aperture = parameter_dictionary["aperture"]
+
+        eta = parameter_dictionary.get("mpfa_eta", None)
+        inverter = parameter_dictionary.get("mpfa_inverter", None)
+
+        stencil = fvutils.partial_update_stencil(g, changed_cells)
+        context = (self, g, k, bnd, eta, inverter, aperture)
+        triplets = _mpfa_partition_triplets(context, stencil)
+
+        update_faces = np.where(stencil[1])[0]
+        keys = ["flux", "bound_flux", "bound_pressure_cell", "bound_pressure_face"]
+        for key, t in zip(keys, triplets):
+            matrix_dictionary[key] = fvutils.replace_rows(
+                matrix_dictionary[key], t, update_faces
+            )
 
     def mpfa(
         self,
@@ -101,6 +180,7 @@ class Mpfa(FVElliptic):
         inverter=None,
         apertures=None,
         max_memory=None,
+        num_workers=1,
         **kwargs
     ):
         """
@@ -130,10 +210,15 @@ class Mpfa(FVElliptic):
                 cython or python. See fvutils.invert_diagonal_blocks for details.
             apertures (np.ndarray) apertures of the cells for scaling of the face
                 normals.
-            max_memory (double): Threshold for peak memory during discretization.
-                If the **estimated** memory need is larger than the provided
-                threshold, the discretization will be split into an appropriate
-                number of sub-calculations, using mpfa_partial().
+            max_memory (double): Threshold for peak memory during discretization,
+                in bytes. If the **estimated** memory need is larger than the
+                provided threshold, the discretization will be split into an
+                appropriate number of sub-calculations on partitions of the grid,
+                which are merged into the global matrices at the end.
+            num_workers (int): Number of worker processes. If larger than 1, the
+                grid is partitioned, and the partitions are discretized in
+                parallel. If max_memory is also given, it is taken as the
+                threshold for all workers combined. Defaults to 1.
 
         Returns:
             scipy.sparse.csr_matrix (shape num_faces, num_cells): flux
@@ -181,7 +266,7 @@ class Mpfa(FVElliptic):
             bp = bp_cell * x + bp_face * bound_vals
         """
 
-        if max_memory is None:
+        if max_memory is None and (num_workers is None or num_workers <= 1):
             # For the moment nothing to do here, just call main mpfa method for the
             # entire grid.
             # TODO: We may want to estimate the memory need, and give a warning if
@@ -190,54 +275,16 @@ class Mpfa(FVElliptic):
                 g, k, bnd, eta=eta, inverter=inverter, apertures=apertures
             )
         else:
-            # Estimate number of partitions necessary based on prescribed memory
-            # usage
-            peak_mem = self._estimate_peak_memory(g)
-            num_part = np.ceil(peak_mem / max_memory)
-
-            # Let partitioning module apply the best available method
-            part = pp.partition.partition(g, num_part)
-
-            # Empty fields for flux and bound_flux. Will be expanded as we go.
-            # Implementation note: It should be relatively straightforward to
-            # estimate the memory need of flux (face_nodes -> node_cells ->
-            # unique).
-            flux = sps.csr_matrix(g.num_faces, g.num_cells)
-            bound_flux = sps.csr_matrix(g.num_faces, g.num_faces)
-            bound_pressure_cell = sps.csr_matrix(g.num_faces, g.num_cells)
-            bound_pressure_face = sps.csr_matrix(g.num_faces, g.num_faces)
-
-            cn = g.cell_nodes()
-
-            face_covered = np.zeros(g.num_faces, dtype=np.bool)
-
-            for p in range(part.max()):
-                # Cells in this partitioning
-                cell_ind = np.argwhere(part == p).ravel("F")
-                # To discretize with as little overlap as possible, we use the
-                # keyword nodes to specify the update stencil. Find nodes of the
-                # local cells.
-                active_cells = np.zeros(g.num_cells, dtype=np.bool)
-                active_cells[cell_ind] = 1
-                active_nodes = np.squeeze(np.where((cn * active_cells) > 0))
-
-                # Perform local discretization.
-                loc_flux, loc_bound_flux, loc_bp_cell, loc_bp_face, loc_faces = self.partial_discr(
-                    g, k, bnd, eta=eta, inverter=inverter, nodes=active_nodes
-                )
-
-                # Eliminate contribution from faces already covered
-                loc_flux[face_covered, :] *= 0
-                loc_bound_flux[face_covered, :] *= 0
-                loc_bp_cell[face_covered, :] *= 0
-                loc_bp_face[face_covered, :] *= 0
-
-                face_covered[loc_faces] = 1
-
-                flux += loc_flux
-                bound_flux += loc_bound_flux
-                bound_pressure_cell += loc_bp_cell
-                bound_pressure_face += loc_bp_face
+            flux, bound_flux, bound_pressure_cell, bound_pressure_face = self._partitioned_discr(
+                g,
+                k,
+                bnd,
+                max_memory=max_memory,
+                num_workers=num_workers,
+                eta=eta,
+                inverter=inverter,
+                apertures=apertures,
+            )
 
         return flux, bound_flux, bound_pressure_cell, bound_pressure_face
 
@@ -301,6 +348,140 @@ class Mpfa(FVElliptic):
         if faces is not None:
             warnings.warn("Faces keyword for partial mpfa has not been tested")
 
+        flux_loc, bound_flux_loc, bound_pressure_cell, bound_pressure_face, l2g_faces, l2g_cells, active_faces = self._subgrid_discr(
+            g,
+            k,
+            bnd,
+            eta=eta,
+            inverter=inverter,
+            cells=cells,
+            faces=faces,
+            nodes=nodes,
+            apertures=apertures,
+        )
+
+        # Map to global indices
+        face_map, cell_map = fvutils.map_subgrid_to_grid(
+            g, l2g_faces, l2g_cells, is_vector=False
+        )
+        flux_glob = face_map * flux_loc * cell_map
+        bound_flux_glob = face_map * bound_flux_loc * face_map.transpose()
+        bound_pressure_cell_glob = face_map * bound_pressure_cell * cell_map
+        bound_pressure_face_glob = face_map * bound_pressure_face * face_map.T
+
+        # By design of mpfa, and the subgrids, the discretization will update faces
+        # outside the active faces. Kill these.
+        outside = np.setdiff1d(np.arange(g.num_faces), active_faces, assume_unique=True)
+        flux_glob[outside, :] = 0
+        bound_flux_glob[outside, :] = 0
+        bound_pressure_cell_glob[outside, :] = 0
+        bound_pressure_face_glob[outside, :] = 0
+
+        return (
+            flux_glob,
+            bound_flux_glob,
+            bound_pressure_cell_glob,
+            bound_pressure_face_glob,
+            active_faces,
+        )
+
+    def _partitioned_discr(
+        self,
+        g,
+        k,
+        bnd,
+        max_memory=None,
+        num_workers=1,
+        eta=None,
+        inverter=None,
+        apertures=None,
+    ):
+        """
+        Discretize on partitions of the grid, and merge into global matrices.
+
+        The number of partitions is at least the number of workers. If a memory
+        threshold is given, the number is increased until the estimated peak
+        memory of the partitions under simultaneous treatment is within the
+        threshold, see _estimate_peak_memory(). Each face is assigned to a
+        single partition, see fvutils.partition_stencils(). The rows of the
+        local discretizations belonging to the assigned faces are mapped to
+        global indices and stored as coo triplets; the global matrices are
+        formed once all partitions have been treated.
+
+        Parameters:
+            g (pp.Grid): grid to be discretized
+            k (pp.SecondOrderTensor) permeability tensor
+            bnd (pp.BoundarCondition) class for boundary conditions
+            max_memory (double, optional): Threshold for peak memory, in bytes.
+            num_workers (int, optional): Number of worker processes.
+                Defaults to 1.
+            eta, inverter, apertures: See mpfa().
+
+        Returns:
+            sps.csr_matrix (g.num_faces x g.num_cells): flux discretization.
+            sps.csr_matrix (g.num_faces x g.num_faces): boundary flux
+                discretization.
+            sps.csr_matrix (g.num_faces x g.num_cells): Operator for pressure
+                trace reconstruction, cell center contribution.
+            sps.csr_matrix (g.num_faces x g.num_faces): Operator for pressure
+                trace reconstruction, face contribution.
+
+        """
+        if num_workers is None:
+            num_workers = 1
+        num_part = num_workers
+        if max_memory is not None:
+            # Estimate number of partitions necessary based on prescribed memory
+            # usage
+            peak_mem = self._estimate_peak_memory(g)
+            num_part = max(num_part, int(np.ceil(num_workers * peak_mem / max_memory)))
+
+        stencils = fvutils.partition_stencils(g, num_part)
+
+        context = (self, g, k, bnd, eta, inverter, apertures)
+        triplets = fvutils.map_partitions(
+            _mpfa_partition_triplets, context, stencils, num_workers
+        )
+
+        # Global shapes of flux, bound_flux, bound_pressure_cell and
+        # bound_pressure_face
+        shapes = [
+            (g.num_faces, g.num_cells),
+            (g.num_faces, g.num_faces),
+            (g.num_faces, g.num_cells),
+            (g.num_faces, g.num_faces),
+        ]
+        return tuple(fvutils.merge_subgrid_triplets(triplets, shapes))
+
+    def _subgrid_discr(
+        self,
+        g,
+        k,
+        bnd,
+        eta=0,
+        inverter="numba",
+        cells=None,
+        faces=None,
+        nodes=None,
+        apertures=None,
+    ):
+        """
+        Run an MPFA discretization on a subgrid, and return the discretization
+        in terms of local variable numbers, together with the local to global
+        maps. See partial_discr() for parameters.
+
+        Returns:
+            sps.csr_matrix: Flux discretization on the subgrid.
+            sps.csr_matrix: Boundary flux discretization on the subgrid.
+            sps.csr_matrix: Pressure trace reconstruction, cell contribution.
+            sps.csr_matrix: Pressure trace reconstruction, face contribution.
+            np.array (int): Global indices of the subgrid faces.
+            np.array (int): Global indices of the subgrid cells.
+            np.array (int): Global indices of the faces where the flux
+                discretization is computed.
+
+        """
+
         # Find computational stencil, based on specified cells, faces and nodes.
         ind, active_faces = fvutils.cell_ind_for_partial_update(
             g, cells=cells, faces=faces, nodes=nodes
@@ -329,41 +510,34 @@ class Mpfa(FVElliptic):
             # For primal-like discretizations like the MPFA, internal boundaries
             # are handled by assigning Neumann conditions.
             is_dir = np.logical_and(bnd.is_dir, np.logical_not(bnd.is_internal))
+            is_rob = np.logical_and(bnd.is_rob, np.logical_not(bnd.is_internal))
             is_neu = np.logical_or(bnd.is_neu, bnd.is_internal)
 
             is_dir = is_dir[l2g_faces[loc_bound_ind]]
+            is_rob = is_rob[l2g_faces[loc_bound_ind]]
             is_neu = is_neu[l2g_faces[loc_bound_ind]]
 
             loc_cond[is_dir] = "dir"
+            loc_cond[is_rob] = "rob"
         loc_bnd = pp.BoundaryCondition(sub_g, faces=loc_bound_ind, cond=loc_cond)
+        loc_bnd.robin_weight = bnd.robin_weight[l2g_faces]
+        loc_bnd.basis = bnd.basis[l2g_faces]
+
+        # Restrict apertures to local cells
+        if apertures is not None:
+            apertures = apertures[l2g_cells]
 
         # Discretization of sub-problem
         flux_loc, bound_flux_loc, bound_pressure_cell, bound_pressure_face = self._local_discr(
             sub_g, loc_k, loc_bnd, eta=eta, inverter=inverter, apertures=apertures
         )
-
-        # Map to global indices
-        face_map, cell_map = fvutils.map_subgrid_to_grid(
-            g, l2g_faces, l2g_cells, is_vector=False
-        )
-        flux_glob = face_map * flux_loc * cell_map
-        bound_flux_glob = face_map * bound_flux_loc * face_map.transpose()
-        bound_pressure_cell_glob = face_map * bound_pressure_cell * cell_map
-        bound_pressure_face_glob = face_map * bound_pressure_face * face_map.T
-
-        # By design of mpfa, and the subgrids, the discretization will update faces
-        # outside the active faces. Kill these.
-        outside = np.setdiff1d(np.arange(g.num_faces), active_faces, assume_unique=True)
-        flux_glob[outside, :] = 0
-        bound_flux_glob[outside, :] = 0
-        bound_pressure_cell_glob[outside, :] = 0
-        bound_pressure_face_glob[outside, :] = 0
-
         return (
-            flux_glob,
-            bound_flux_glob,
-            bound_pressure_cell_glob,
-            bound_pressure_face_glob,
+            flux_loc,
+            bound_flux_loc,
+            bound_pressure_cell,
+            bound_pressure_face,
+            l2g_faces,
+            l2g_cells,
             active_faces,
         )
 
@@ -719,10 +893,10 @@ class Mpfa(FVElliptic):
 
     def _estimate_peak_memory(self, g):
         """
-        Rough estimate of peak memory need
+        Rough estimate of peak memory need, in bytes.
         """
         nd = g.dim
-        num_cell_nodes = g.cell_nodes().toarray().sum(axis=1)
+        num_cell_nodes = np.asarray(g.cell_nodes().sum(axis=1)).ravel()
 
         # Number of unknowns around a vertex: nd per cell that share the vertex for
         # pressure gradients, and one per cell (cell center pressure)
@@ -734,7 +908,7 @@ class Mpfa(FVElliptic):
 
         # The discretization of Darcy's law will require nd (that is, a gradient)
         # per sub-face.
-        num_sub_face = g.face_nodes.toarray().sum()
+        num_sub_face = g.face_nodes.nnz
         darcy_size = nd * num_sub_face
 
         # Balancing of fluxes will require 2*nd (gradient on both sides) fields per
@@ -748,7 +922,9 @@ class Mpfa(FVElliptic):
 
         # Not covered yet is various fields on subcell topology, mapping matrices
         # between local and block ordering etc.
-        return total_size
+        # Each entry is stored in a sparse matrix, that is, a float64 value and
+        # an int32 index.
+        return 12 * total_size
 
     def _tensor_vector_prod(self, g, k, subcell_topology, apertures=None):
         """
@@ -1004,3 +1180,29 @@ class Mpfa(FVElliptic):
         rhs_bound = sps.vstack([neu_rob_cell, dir_cell]) * bnd_2_all_hf * hf_2_f
 
         return rhs_bound
+
+
+def _mpfa_partition_triplets(context, stencil):
+    """
+    Discretize a single partition, as defined by fvutils.partition_stencils(),
+    and return the global coo triplets of the faces assigned to the partition.
+    Used by Mpfa._partitioned_discr(), possibly in a worker process.
+    """
+    discr, g, k, bnd, eta, inverter, apertures = context
+    active_nodes, owned_faces, _ = stencil
+
+    loc_flux, loc_bound_flux, loc_bp_cell, loc_bp_face, l2g_faces, l2g_cells, _ = discr._subgrid_discr(
+        g,
+        k,
+        bnd,
+        eta=eta,
+        inverter=inverter,
+        nodes=active_nodes,
+        apertures=apertures,
+    )
+    loc_mats = [loc_flux, loc_bound_flux, loc_bp_cell, loc_bp_face]
+    col_maps = [l2g_cells, l2g_faces, l2g_cells, l2g_faces]
+    return [
+        fvutils.subgrid_triplets(mat, l2g_faces, col_map, owned_faces)
+        for mat, col_map in zip(loc_mats, col_maps)
+    ]
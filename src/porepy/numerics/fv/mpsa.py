@@ -12,6 +12,7 @@ import numpy as np
 import scipy.sparse as sps
 import logging
 import porepy as pp
+from porepy.numerics.fv.discretization_cache import DiscretizationCache
 
 # Module-wide logger
 logger = logging.getLogger(__name__)
@@ -77,6 +78,13 @@ class Mpsa(
                 value. If a float is given this value is set to all subfaces, except the
                 boundary (where, 0 is used). If eta is a np.ndarray its size should
                 equal SubcellTopology(g).num_subfno.
+            num_workers (int): Optional. Number of worker processes used to
+                discretize partitions of the grid in parallel, see mpsa().
+                Defaults to 1.
+            discretization_cache (str or pp.DiscretizationCache): Optional.
+                Directory of an on-disk cache of the discretization matrices.
+                If the same discretization has been stored before, the matrices
+                are loaded instead of computed.
 
         matrix_dictionary will be updated with the following entries:
             stress: sps.csc_matrix (g.dim * g.num_faces, g.dim * g.num_cells)
@@ -110,21 +118,93 @@ class Mpsa(
 
         partial = parameter_dictionary.get("partial_update", False)
         inverter = parameter_dictionary.get("inverter", None)
+        num_workers = parameter_dictionary.get("num_workers", 1)
 
         if not partial:
+            cache = DiscretizationCache.from_parameters(parameter_dictionary)
+            if cache is not None:
+                key = cache.key("mpsa", g, [c.mu, c.lmbda, c.phi, eta], [bnd])
+                matrices = cache.load(key)
+                if matrices is not None:
+                    matrix_dictionary.update(matrices)
+                    return
+
             stress, bound_stress, bound_displacement_cell, bound_displacement_face = mpsa(
-                g, c, bnd, eta=eta, inverter=inverter
+                g, c, bnd, eta=eta, inverter=inverter, num_workers=num_workers
             )
-            matrix_dictionary["stress"] = stress
-            matrix_dictionary["bound_stress"] = bound_stress
-            matrix_dictionary["bound_displacement_cell"] = bound_displacement_cell
-            matrix_dictionary["bound_displacement_face"] = bound_displacement_face
+            matrices = {
+                "stress": stress,
+                "bound_stress": bound_stress,
+                "bound_displacement_cell": bound_displacement_cell,
+                "bound_displacement_face": bound_displacement_face,
+            }
+            matrix_dictionary.update(matrices)
+            if cache is not None:
+                cache.save(key, matrices)
         else:
             raise NotImplementedError(
                 """Partial discretiation for the Mpsa class is not
             implemented. See mpsa.mpsa_partial(...)"""
             )
 
+    def update_discretization(self, g, data, changed_cells):
+        """
+        Update the discretization after a change of the stiffness in some cells.
+
+        Only faces sharing a node with the changed cells are affected. These are
+        rediscretized on a subgrid around the changed cells, and the
+        corresponding rows of the discretization matrices, including the
+        displacement reconstruction on sub-faces, are replaced in place. The
+        computational cost thus scales with the number of changed cells rather
+        than with the size of the grid.
+
+        The parameters are read from data[pp.PARAMETERS][self.keyword], see
+        discretize(). The matrices in data[pp.DISCRETIZATION_MATRICES][self.keyword]
+        must have been computed by a previous call to discretize().
+
+        Parameters
+        ----------
+        g (pp.Grid): grid, or a subclass, with geometry fields computed.
+        data (dict): For entries, see discretize().
+        changed_cells (np.ndarray, int): Index of cells where the stiffness has
+            changed.
+        """
+        changed_cells = np.atleast_1d(np.asarray(changed_cells, dtype=np.int))
+        if changed_cells.size == 0:
+            return
+
+        parameter_dictionary = data[pp.PARAMETERS][self.keyword]
+        matrix_dictionary = data[pp.DISCRETIZATION_MATRICES][self.keyword]
+        c = parameter_dictionary["fourth_order_tensor"]
+        bnd = parameter_dictionary["bc"]
+
+        eta = parameter_dictionary.get("mpsa_eta", None)
+        if eta is None:
+            eta = pp.fvutils.determine_eta(g)
+        inverter = parameter_dictionary.get("inverter", None)
+
+        stencil = pp.fvutils.partial_update_stencil(g, changed_cells)
+        subcell_topology = pp.fvutils.SubcellTopology(g)
+        context = (g, c, bnd, eta, inverter, None, subcell_topology)
+        triplets = _mpsa_partition_triplets(context, stencil)
+
+        nd = g.dim
+        update_faces = np.where(np.repeat(stencil[1], nd))[0]
+        update_sub_faces = np.where(
+            np.repeat(stencil[1][subcell_topology.fno_unique], nd)
+        )[0]
+        keys = [
+            "stress",
+            "bound_stress",
+            "bound_displacement_cell",
+            "bound_displacement_face",
+        ]
+        rows = [update_faces, update_faces, update_sub_faces, update_sub_faces]
+        for key, t, r in zip(keys, triplets, rows):
+            matrix_dictionary[key] = pp.fvutils.replace_rows(
+                matrix_dictionary[key], t, r
+            )
+
     def assemble_matrix_rhs(self, g, data):
         """
         Return the matrix and right-hand side for a discretization of a second
@@ -877,6 +957,7 @@ def mpsa(
     max_memory=None,
     hf_disp=False,
     hf_eta=None,
+    num_workers=1,
     **kwargs
 ):
     """
@@ -913,10 +994,11 @@ def mpsa(
             eta=0 will be enforced.
         inverter (string) Block inverter to be used, either numba (default),
             cython or python. See fvutils.invert_diagonal_blocks for details.
-        max_memory (double): Threshold for peak memory during discretization.
-            If the **estimated** memory need is larger than the provided
-            threshold, the discretization will be split into an appropriate
-            number of sub-calculations, using mpsa_partial().
+        max_memory (double): Threshold for peak memory during discretization,
+            in bytes. If the **estimated** memory need is larger than the
+            provided threshold, the discretization will be split into an
+            appropriate number of sub-calculations on partitions of the grid,
+            which are merged into the global matrices at the end.
         hf_disp (bool) False: If true two matrices hf_cell, hf_bound is also returned such
             that hf_cell * U + hf_bound * u_bound gives the reconstructed displacement
             at the point on the face hf_eta. U is the cell centered displacement and
@@ -924,6 +1006,10 @@ def mpsa(
         hf_eta (float) None: The point of displacment on the sub-faces. hf_eta=0 gives the
             displacement at the face centers while hf_eta=1 gives the displacements at
             the nodes. If None is given, the continuity points eta will be used.
+        num_workers (int): Number of worker processes. If larger than 1, the
+            grid is partitioned, and the partitions are discretized in parallel.
+            If max_memory is also given, it is taken as the threshold for all
+            workers combined. Defaults to 1.
     Returns:
         scipy.sparse.csr_matrix (shape num_faces, num_cells): stress
             discretization, in the form of mapping from cell displacement to
@@ -990,7 +1076,7 @@ def mpsa(
     if eta is None:
         eta = pp.fvutils.determine_eta(g)
 
-    if max_memory is None:
+    if max_memory is None and (num_workers is None or num_workers <= 1):
         # For the moment nothing to do here, just call main mpfa method for the
         # entire grid.
         # TODO: We may want to estimate the memory need, and give a warning if
@@ -1005,51 +1091,36 @@ def mpsa(
             hf_eta=hf_eta,
         )
     else:
-        # Estimate number of partitions necessary based on prescribed memory
-        # usage
-        peak_mem = _estimate_peak_memory_mpsa(g)
-        num_part = np.ceil(peak_mem / max_memory)
+        if num_workers is None:
+            num_workers = 1
+        num_part = num_workers
+        if max_memory is not None:
+            # Estimate number of partitions necessary based on prescribed memory
+            # usage
+            peak_mem = _estimate_peak_memory_mpsa(g)
+            num_part = max(num_part, int(np.ceil(num_workers * peak_mem / max_memory)))
 
         logger.info("Split MPSA discretization into " + str(num_part) + " parts")
 
-        # Let partitioning module apply the best available method
-        part = pp.grid.partition.partition_metis(g, num_part)
-
-        # Empty fields for stress and bound_stress. Will be expanded as we go.
-        # Implementation note: It should be relatively straightforward to
-        # estimate the memory need of stress (face_nodes -> node_cells ->
-        # unique).
-        stress = sps.csr_matrix((g.num_faces * g.dim, g.num_cells * g.dim))
-        bound_stress = sps.csr_matrix((g.num_faces * g.dim, g.num_faces * g.dim))
-
-        cn = g.cell_nodes()
-
-        face_covered = np.zeros(g.num_faces, dtype=np.bool)
-
-        for p in np.unique(part):
-            # Cells in this partitioning
-            cell_ind = np.argwhere(part == p).ravel("F")
-            # To discretize with as little overlap as possible, we use the
-            # keyword nodes to specify the update stencil. Find nodes of the
-            # local cells.
-            active_cells = np.zeros(g.num_cells, dtype=np.bool)
-            active_cells[cell_ind] = 1
-            active_nodes = np.squeeze(np.where((cn * active_cells) > 0))
-
-            # Perform local discretization.
-            loc_stress, loc_bound_stress, loc_faces = mpsa_partial(
-                g, constit, bound, eta=eta, inverter=inverter, nodes=active_nodes
-            )
-
-            # Eliminate contribution from faces already covered
-            eliminate_ind = pp.fvutils.expand_indices_nd(face_covered, g.dim)
-            pp.fvutils.zero_out_sparse_rows(loc_stress, eliminate_ind)
-            pp.fvutils.zero_out_sparse_rows(loc_bound_stress, eliminate_ind)
+        stencils = pp.fvutils.partition_stencils(g, num_part)
+        subcell_topology = pp.fvutils.SubcellTopology(g)
 
-            face_covered[loc_faces] = 1
+        context = (g, constit, bound, eta, inverter, hf_eta, subcell_topology)
+        triplets = pp.fvutils.map_partitions(
+            _mpsa_partition_triplets, context, stencils, num_workers
+        )
 
-            stress += loc_stress
-            bound_stress += loc_bound_stress
+        nd = g.dim
+        num_subfno = subcell_topology.num_subfno_unique
+        shapes = [
+            (g.num_faces * nd, g.num_cells * nd),
+            (g.num_faces * nd, g.num_faces * nd),
+            (num_subfno * nd, g.num_cells * nd),
+            (num_subfno * nd, g.num_faces * nd),
+        ]
+        stress, bound_stress, hf_cell, hf_bound = pp.fvutils.merge_subgrid_triplets(
+            triplets, shapes
+        )
 
     return stress, bound_stress, hf_cell, hf_bound
 
@@ -1245,37 +1316,8 @@ def mpsa_partial(
             (g.dim * g.num_faces, g.dim * g.num_faces), dtype="float64"
         )
         return stress_glob, bound_stress_glob, active_faces
-    # Extract subgrid, together with mappings between local and global
-    # cells
-    sub_g, l2g_faces, _ = pp.partition.extract_subgrid(g, ind)
-    l2g_cells = sub_g.parent_cell_ind
-
-    # Copy stiffness tensor, and restrict to local cells
-    loc_c = constit.copy()
-    loc_c.values = loc_c.values[::, ::, l2g_cells]
-    # Also restrict the lambda and mu fields; we will copy the stiffness
-    # tensors later.
-    loc_c.lmbda = loc_c.lmbda[l2g_cells]
-    loc_c.mu = loc_c.mu[l2g_cells]
-
-    # Boundary conditions are slightly more complex. Find local faces
-    # that are on the global boundary.
-    # Then transfer boundary condition on those faces.
-
-    loc_bnd = pp.BoundaryConditionVectorial(sub_g)
-    loc_bnd.is_dir = bound.is_dir[:, l2g_faces]
-    loc_bnd.is_rob = bound.is_rob[:, l2g_faces]
-    loc_bnd.is_neu[loc_bnd.is_dir + loc_bnd.is_rob] = False
-
-    # Discretization of sub-problem
-    stress_loc, bound_stress_loc, hf_cell_loc, hf_bound_loc = _mpsa_local(
-        sub_g,
-        loc_c,
-        loc_bnd,
-        eta=eta,
-        inverter=inverter,
-        hf_disp=hf_disp,
-        hf_eta=hf_eta,
+    stress_loc, bound_stress_loc, hf_cell_loc, hf_bound_loc, l2g_faces, l2g_cells, l2g_sub_faces = _mpsa_subgrid_discr(
+        g, constit, bound, ind, eta=eta, inverter=inverter, hf_eta=hf_eta
     )
 
     face_map, cell_map = pp.fvutils.map_subgrid_to_grid(
@@ -1296,9 +1338,9 @@ def mpsa_partial(
     # to do some more work. The following is equivalent to what is done for the stresses,
     # but as they are working on faces, the displacement reconstruction has to work on
     # subfaces.
-    # First, we find the mappings from local subfaces to global subfaces
+    # The mapping from local subfaces to global subfaces was computed together
+    # with the local discretization.
     subcell_topology = pp.fvutils.SubcellTopology(g)
-    l2g_sub_faces = np.where(np.in1d(subcell_topology.fno_unique, l2g_faces))[0]
     # We now create a fake grid, just to be able to use the function map_subgrid_to_grid.
     subgrid = pp.CartGrid([1] * g.dim)
     subgrid.num_faces = subcell_topology.fno_unique.size
@@ -1330,6 +1372,121 @@ def mpsa_partial(
     return stress_glob, bound_stress_glob, hf_cell_glob, hf_bound_glob, active_faces
 
 
+def _mpsa_subgrid_discr(g, constit, bound, ind, eta=None, inverter=None, hf_eta=None):
+    """
+    Run an MPSA discretization on the subgrid spanned by the given cells, and
+    return the discretization in terms of local variable numbers, together
+    with the local to global maps of faces and cells.
+
+    Parameters:
+        g, constit, bound, eta, inverter, hf_eta: See mpsa_partial().
+        ind (np.array, int): Cells of the subgrid, as computed by
+            fvutils.cell_ind_for_partial_update().
+
+    Returns:
+        sps.csr_matrix: Stress discretization on the subgrid.
+        sps.csr_matrix: Boundary stress discretization on the subgrid.
+        sps.csr_matrix: Sub-face displacement reconstruction, cell contribution.
+        sps.csr_matrix: Sub-face displacement reconstruction, boundary
+            contribution.
+        np.array (int): Global indices of the subgrid faces.
+        np.array (int): Global indices of the subgrid cells.
+        np.array (int): Global indices of the subgrid sub-faces, as numbered
+            by fvutils.SubcellTopology.
+
+    """
+    # Extract subgrid, together with mappings between local and global
+    # cells
+    sub_g, l2g_faces, l2g_nodes = pp.partition.extract_subgrid(g, ind)
+    l2g_cells = sub_g.parent_cell_ind
+
+    # Restrict stiffness tensor to local cells. The discretization only uses
+    # the mu, lambda and phi fields, thus there is no need to form the cell-wise
+    # tensor.
+    loc_c = pp.FourthOrderTensor(
+        constit.dim,
+        constit.mu[l2g_cells],
+        constit.lmbda[l2g_cells],
+        phi=constit.phi[l2g_cells],
+        compact=True,
+    )
+
+    # Boundary conditions are slightly more complex. Find local faces
+    # that are on the global boundary.
+    # Then transfer boundary condition on those faces.
+
+    loc_bnd = pp.BoundaryConditionVectorial(sub_g)
+    loc_bnd.is_dir = bound.is_dir[:, l2g_faces]
+    loc_bnd.is_rob = bound.is_rob[:, l2g_faces]
+    loc_bnd.is_neu[loc_bnd.is_dir + loc_bnd.is_rob] = False
+    loc_bnd.robin_weight = bound.robin_weight[:, :, l2g_faces]
+    loc_bnd.basis = bound.basis[:, :, l2g_faces]
+
+    # Discretization of sub-problem
+    stress_loc, bound_stress_loc, hf_cell_loc, hf_bound_loc = _mpsa_local(
+        sub_g,
+        loc_c,
+        loc_bnd,
+        eta=eta,
+        inverter=inverter,
+        hf_eta=hf_eta,
+    )
+    # Map from local to global sub-faces. Sub-faces are identified by their face
+    # and node.
+    subcell_topology = pp.fvutils.SubcellTopology(g)
+    sub_topology = pp.fvutils.SubcellTopology(sub_g)
+    glob_key = subcell_topology.fno_unique * g.num_nodes + subcell_topology.nno_unique
+    loc_key = (
+        l2g_faces[sub_topology.fno_unique] * g.num_nodes
+        + l2g_nodes[sub_topology.nno_unique]
+    )
+    sort_ind = np.argsort(glob_key)
+    l2g_sub_faces = sort_ind[np.searchsorted(glob_key, loc_key, sorter=sort_ind)]
+
+    return (
+        stress_loc,
+        bound_stress_loc,
+        hf_cell_loc,
+        hf_bound_loc,
+        l2g_faces,
+        l2g_cells,
+        l2g_sub_faces,
+    )
+
+
+def _mpsa_partition_triplets(context, stencil):
+    """
+    Discretize a single partition, as defined by fvutils.partition_stencils(),
+    and return the global coo triplets of the faces assigned to the partition.
+    Used by mpsa(), possibly in a worker process.
+    """
+    g, constit, bound, eta, inverter, hf_eta, subcell_topology = context
+    active_nodes, owned_faces, _ = stencil
+    nd = g.dim
+
+    ind, _ = pp.fvutils.cell_ind_for_partial_update(g, nodes=active_nodes)
+    stress_loc, bound_stress_loc, hf_cell_loc, hf_bound_loc, l2g_faces, l2g_cells, l2g_sub_faces = _mpsa_subgrid_discr(
+        g, constit, bound, ind, eta=eta, inverter=inverter, hf_eta=hf_eta
+    )
+    face_ind = pp.fvutils.expand_indices_nd(l2g_faces, nd)
+    cell_ind = pp.fvutils.expand_indices_nd(l2g_cells, nd)
+    sub_face_ind = pp.fvutils.expand_indices_nd(l2g_sub_faces, nd)
+
+    keep_faces = np.repeat(owned_faces, nd)
+    keep_sub_faces = np.repeat(owned_faces[subcell_topology.fno_unique], nd)
+
+    return [
+        pp.fvutils.subgrid_triplets(stress_loc, face_ind, cell_ind, keep_faces),
+        pp.fvutils.subgrid_triplets(bound_stress_loc, face_ind, face_ind, keep_faces),
+        pp.fvutils.subgrid_triplets(
+            hf_cell_loc, sub_face_ind, cell_ind, keep_sub_faces
+        ),
+        pp.fvutils.subgrid_triplets(
+            hf_bound_loc, sub_face_ind, face_ind, keep_sub_faces
+        ),
+    ]
+
+
 def _mpsa_local(
     g, constit, bound, eta=None, inverter="numba", hf_disp=False, hf_eta=None
 ):
@@ -1407,10 +1564,6 @@ def _mpsa_local(
         g.face_normals = np.delete(g.face_normals, (2), axis=0)
         g.nodes = np.delete(g.nodes, (2), axis=0)
 
-        constit = constit.copy()
-        constit.values = np.delete(constit.values, (2, 5, 6, 7, 8), axis=0)
-        constit.values = np.delete(constit.values, (2, 5, 6, 7, 8), axis=1)
-
     nd = g.dim
 
     # Define subcell topology
@@ -1693,7 +1846,7 @@ def reconstruct_displacement(g, subcell_topology, eta=None):
 
 
 def _estimate_peak_memory_mpsa(g):
-    """ Rough estimate of peak memory need for mpsa discretization.
+    """ Rough estimate of peak memory need for mpsa discretization, in bytes.
     """
     nd = g.dim
     num_cell_nodes = g.cell_nodes().sum(axis=1).A
@@ -1725,7 +1878,8 @@ def _estimate_peak_memory_mpsa(g):
 
     # Not covered yet is various fields on subcell topology, mapping matrices
     # between local and block ordering etc.
-    return total_size
+    # Convert to bytes, counting each entry as a float64.
+    return 8 * total_size
 
 
 def __get_displacement_submatrices(
@@ -1810,64 +1964,52 @@ def __get_displacement_submatrices_rob(
     return rob_grad, rob_cell
 
 
-def _split_stiffness_matrix(constit):
+def _split_stiffness_matrix(constit, nd):
     """
     Split the stiffness matrix into symmetric and asymetric part
 
+    The splitting is done on the basis matrices of the tensor, see
+    FourthOrderTensor.basis(), so that the cell-wise tensor is never formed.
+
     Parameters
     ----------
     constit stiffness tensor
+    nd dimension of the grid
 
     Returns
     -------
-    csym part of stiffness tensor that enters the local calculation
-    casym part of stiffness matrix not included in local calculation
+    csym part of the basis matrices that enters the local calculation, size
+        num_basis x nd^2 x nd^2
+    casym part of the basis matrices not included in local calculation
+    fields cell-wise weights of the basis matrices, size num_basis x num_cells
     """
-    dim = np.sqrt(constit.values.shape[0])
-
     # We do not know how constit is used outside the discretization,
-    # so create deep copies to avoid overwriting. Not really sure if this is
+    # so work on a copy to avoid overwriting. Not really sure if this is
     # necessary
-    csym = 0 * constit.copy().values
-    casym = constit.copy().values
-
-    # The copy constructor for the stiffness matrix will represent all
-    # dimensions as 3d. If dim==2, delete the redundant rows and columns
-    if dim == 2 and csym.shape[0] == 9:
-        csym = np.delete(csym, (2, 5, 6, 7, 8), axis=0)
-        csym = np.delete(csym, (2, 5, 6, 7, 8), axis=1)
-        casym = np.delete(casym, (2, 5, 6, 7, 8), axis=0)
+    basis = constit.copy().basis()
+    casym = np.array([b[0] for b in basis], dtype=np.float)
+    fields = np.array([b[1] for b in basis])
+
+    # The basis matrices represent all dimensions as 3d. If nd==2, delete the
+    # redundant rows and columns
+    if nd == 2:
         casym = np.delete(casym, (2, 5, 6, 7, 8), axis=1)
+        casym = np.delete(casym, (2, 5, 6, 7, 8), axis=2)
 
     # The splitting is hard coded based on the ordering of elements in the
     # stiffness matrix
-    if dim == 2:
-        csym[0, 0] = casym[0, 0]
-        csym[1, 1] = casym[1, 1]
-        csym[2, 2] = casym[2, 2]
-        csym[3, 0] = casym[3, 0]
-        csym[0, 3] = casym[0, 3]
-        csym[3, 3] = casym[3, 3]
-    else:  # dim == 3
-        csym[0, 0] = casym[0, 0]
-        csym[1, 1] = casym[1, 1]
-        csym[2, 2] = casym[2, 2]
-        csym[3, 3] = casym[3, 3]
-        csym[4, 4] = casym[4, 4]
-        csym[5, 5] = casym[5, 5]
-        csym[6, 6] = casym[6, 6]
-        csym[7, 7] = casym[7, 7]
-        csym[8, 8] = casym[8, 8]
-
-        csym[4, 0] = casym[4, 0]
-        csym[8, 0] = casym[8, 0]
-        csym[0, 4] = casym[0, 4]
-        csym[8, 4] = casym[8, 4]
-        csym[0, 8] = casym[0, 8]
-        csym[4, 8] = casym[4, 8]
+    if nd == 2:
+        rows = np.array([0, 1, 2, 3, 0, 3])
+        cols = np.array([0, 1, 2, 0, 3, 3])
+    else:  # nd == 3
+        rows = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 4, 8, 0, 8, 0, 4])
+        cols = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8, 0, 0, 4, 4, 8, 8])
+    csym = np.zeros_like(casym)
+    csym[:, rows, cols] = casym[:, rows, cols]
+
     # The asymmetric part is whatever is not in the symmetric part
     casym -= csym
-    return csym, casym
+    return csym, casym, fields
 
 
 def _tensor_vector_prod(g, constit, subcell_topology):
@@ -1937,12 +2079,10 @@ def _tensor_vector_prod(g, constit, subcell_topology):
     ind_ptr_c = np.hstack((np.arange(0, cc.size, nd ** 2), cc.size))
 
     # Splitt stiffness matrix into symmetric and anti-symmatric part
-    sym_tensor, asym_tensor = _split_stiffness_matrix(constit)
+    sym_basis, asym_basis, fields = _split_stiffness_matrix(constit, nd)
 
-    # Getting the right elements out of the constitutive laws was a bit
-    # tricky, but the following code turned out to do the trick
-    sym_tensor_swp = np.swapaxes(sym_tensor, 2, 0)
-    asym_tensor_swp = np.swapaxes(asym_tensor, 2, 0)
+    # The cell-wise weights of the basis matrices, distributed on subcells
+    sub_cell_fields = fields[:, cell_node_blocks[0]]
 
     # The first dimension in csym and casym represent the contribution from
     # all dimensions to the stress in one dimension (in 2D, csym[0:2,:,
@@ -1980,18 +2120,15 @@ def _tensor_vector_prod(g, constit, subcell_topology):
     average = sps.kron(map_mat * weight_mat, sps.identity(nd)).tocsr()
 
     for iter1 in range(nd):
-        # Pick out part of Hook's law associated with this dimension
-        # The code here looks nasty, it should be possible to get the right
-        # format of the submatrices in a simpler way, but I couldn't do it.
-        sym_dim = np.hstack(sym_tensor_swp[:, :, rind]).transpose()
-        asym_dim = np.hstack(asym_tensor_swp[:, :, rind]).transpose()
-
-        # Distribute (relevant parts of) Hook's law on subcells
-        # This will be nd rows, thus cell ci is associated with indices
-        # ci*nd+np.arange(nd)
-        sub_cell_ind = pp.fvutils.expand_indices_nd(cell_node_blocks[0], nd)
-        sym_vals = sym_dim[sub_cell_ind]
-        asym_vals = asym_dim[sub_cell_ind]
+        # Distribute the part of Hook's law associated with this dimension on
+        # subcells. This will be nd rows for each subcell, computed from the
+        # basis matrices without forming the cell-wise stiffness tensor.
+        sym_vals = np.einsum(
+            "ks,kij->sij", sub_cell_fields, sym_basis[:, rind]
+        ).reshape((-1, nd ** 2))
+        asym_vals = np.einsum(
+            "ks,kij->sij", sub_cell_fields, asym_basis[:, rind]
+        ).reshape((-1, nd ** 2))
 
         # Represent this part of the stiffness matrix in matrix form
         csym_mat = sps.csr_matrix((sym_vals.ravel("C"), cc.ravel("F"), ind_ptr_c))
@@ -3,6 +3,8 @@
 """
 
 """
+import concurrent.futures
+
 import numpy as np
 import scipy.sparse as sps
 
@@ -42,7 +44,13 @@ class Assembler:
             return "_".join([term, key_1, key_2, key_3])
 
     def assemble_matrix_rhs(
-        self, gb, matrix_format="csr", variables=None, add_matrices=True
+        self,
+        gb,
+        matrix_format="csr",
+        variables=None,
+        add_matrices=True,
+        cache_sparsity=False,
+        num_workers=1,
     ):
         """ Assemble the system matrix and right hand side for a general
         multi-physics problem, and return a block matrix and right hand side.
@@ -119,6 +127,47 @@ class Assembler:
 
             (g1, data_1, data_edge, local_matrix)
 
+        If cache_sparsity is True (and add_matrices is True), the sparsity
+        pattern of the global matrix, together with the map from the entries of
+        the individual blocks to the global matrix, is computed on the first
+        call and stored in gb.assembly_cache. Subsequent calls with an unchanged
+        structure of the blocks then only scatter the new values into the
+        cached pattern, avoiding the construction and summation of global
+        matrices for each term. This is useful for repeated assembly, e.g. in
+        time stepping or non-linear iterations. If the structure of the blocks
+        changes, the pattern is recomputed.
+
+        If num_workers is larger than 1, the terms internal to the nodes of the
+        GridBucket, including any discretization carried out by the
+        discretization objects, are computed concurrently in a pool of threads,
+        one task per node. The contributions are added to the global system in
+        the same order as for a serial assembly, and the coupling terms are
+        treated serially afterwards. Discretization objects acting on the same
+        node are called one after another, but objects acting on different
+        nodes should not modify shared state. The threads use the serial numba
+        kernels for the inversion of diagonal blocks in the finite volume
+        methods, see pp.fvutils.serial_numba_kernels(), so that the parallel
+        kernels are not started from several threads at once.
+
+        Parameters:
+            gb (pp.GridBucket): Mixed-dimensional grid, with data.
+            matrix_format (str, optional): Format of the assembled matrices,
+                either 'csr' (default) or 'csc'.
+            variables (list of str, optional): Variables to be assembled.
+                Defaults to all variables.
+            add_matrices (bool, optional): If True (default), the matrices of
+                all terms are summed. If False, one matrix per term is returned.
+            cache_sparsity (bool, optional): If True, use and update the
+                sparsity pattern cached on gb, see above. Defaults to False.
+            num_workers (int, optional): Number of threads used for the
+                assembly of node terms, see above. Defaults to 1.
+
+        Returns:
+            sps.spmatrix, or dict of sps.spmatrix: System matrix.
+            np.ndarray, or dict of np.ndarray: Right hand side.
+            dict: Block index of each (grid or edge, variable) pair.
+            np.ndarray: Number of degrees of freedom in each block.
+
         """
         # Define the matrix format, common for all the sub-matrices
         if matrix_format == "csc":
@@ -139,38 +188,32 @@ class Assembler:
 
         # Loop over all grids, discretize (if necessary) and assemble. This
         # will populate the main diagonal of the equation.
-        for g, data in gb:
-            loc_var = self._local_variables(data, variables)
-            for row in loc_var.keys():
-                for col in loc_var.keys():
+        nodes = [(g, data) for g, data in gb]
 
-                    ri = block_dof[(g, row)]
-                    ci = block_dof[(g, col)]
-
-                    discr_data = data.get(pp.DISCRETIZATION, None)
-                    if discr_data is None:
-                        continue
-                    discr = discr_data.get(self.discretization_key(row, col), None)
+        def node_terms(node):
+            return self._assemble_node_terms(node[0], node[1], variables, block_dof)
 
-                    if discr is None:
-                        continue
-                    else:
-                        # Loop over all discretizations
-                        for term, d in discr.items():
-                            # Assemble the matrix and right hand side. This will also
-                            # discretize if not done before.
-                            loc_A, loc_b = d.assemble_matrix_rhs(g, data)
+        def node_terms_in_thread(node):
+            pp.fvutils.serial_numba_kernels()
+            return node_terms(node)
 
-                            # Assign values in global matrix
-                            var_key_name = self._variable_term_key(term, row, col)
-                            # Check if the current block is None or not, it could
-                            # happend based on the problem setting. Better to stay
-                            # on the safe side.
-                            if matrix[var_key_name][ri, ci] is None:
-                                matrix[var_key_name][ri, ci] = loc_A
-                            else:
-                                matrix[var_key_name][ri, ci] += loc_A
-                            rhs[var_key_name][ri] += loc_b
+        if num_workers is None or num_workers <= 1 or len(nodes) < 2:
+            all_node_terms = [node_terms(node) for node in nodes]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(num_workers) as executor:
+                all_node_terms = list(executor.map(node_terms_in_thread, nodes))
+
+        for (g, data), terms in zip(nodes, all_node_terms):
+            for var_key_name, ri, ci, loc_A, loc_b in terms:
+                # Assign values in global matrix.
+                # Check if the current block is None or not, it could
+                # happend based on the problem setting. Better to stay
+                # on the safe side.
+                if matrix[var_key_name][ri, ci] is None:
+                    matrix[var_key_name][ri, ci] = loc_A
+                else:
+                    matrix[var_key_name][ri, ci] += loc_A
+                rhs[var_key_name][ri] += loc_b
 
         # Loop over all edges
         for e, data_edge in gb.edges():
@@ -342,11 +385,20 @@ class Assembler:
 
         if add_matrices:
             size = np.sum(full_dof)
-            full_matrix = sps_matrix((size, size))
             full_rhs = np.zeros(size)
 
-            for mat in matrix.values():
-                full_matrix += sps.bmat(mat, matrix_format)
+            if cache_sparsity:
+                if variables is None:
+                    cache_key = (matrix_format, None)
+                else:
+                    cache_key = (matrix_format, tuple(variables))
+                full_matrix = self._assemble_with_cached_pattern(
+                    gb, cache_key, matrix, full_dof, sps_matrix
+                )
+            else:
+                full_matrix = sps_matrix((size, size))
+                for mat in matrix.values():
+                    full_matrix += sps.bmat(mat, matrix_format)
 
             for vec in rhs.values():
                 full_rhs += np.concatenate(tuple(vec))
@@ -361,6 +413,160 @@ class Assembler:
 
             return matrix, rhs, block_dof, full_dof
 
+    def _assemble_node_terms(self, g, data, variables, block_dof):
+        """ Assemble, and discretize if necessary, all terms internal to a node.
+
+        Parameters:
+            g (pp.Grid): Grid of the node.
+            data (dict): Data dictionary of the node.
+            variables (list of str): Variables to be assembled, or None for all.
+            block_dof (dict): Block index of each (grid or edge, variable) pair.
+
+        Returns:
+            list of tuples: One item per term, each containing the key of the
+                term, the block row and column indices, and the local matrix and
+                right hand side.
+
+        """
+        terms = []
+        discr_data = data.get(pp.DISCRETIZATION, None)
+        if discr_data is None:
+            return terms
+
+        loc_var = self._local_variables(data, variables)
+        for row in loc_var.keys():
+            for col in loc_var.keys():
+                discr = discr_data.get(self.discretization_key(row, col), None)
+                if discr is None:
+                    continue
+
+                ri = block_dof[(g, row)]
+                ci = block_dof[(g, col)]
+                # Loop over all discretizations
+                for term, d in discr.items():
+                    # Assemble the matrix and right hand side. This will also
+                    # discretize if not done before.
+                    loc_A, loc_b = d.assemble_matrix_rhs(g, data)
+                    var_key_name = self._variable_term_key(term, row, col)
+                    terms.append((var_key_name, ri, ci, loc_A, loc_b))
+        return terms
+
+    def _assemble_with_cached_pattern(self, gb, cache_key, matrix, full_dof, sps_matrix):
+        """ Sum the block matrices of all terms into a global matrix, using a
+        sparsity pattern cached on the GridBucket.
+
+        The blocks are brought to the compressed format of the global matrix.
+        The cache holds the index pointers and indices of each block, and a map
+        from the entries of the blocks to the data array of the global matrix.
+        If the blocks have the same position and structure as in the last call
+        with the same cache key, only the data of the blocks is scattered into
+        the cached pattern; else the pattern is recomputed and stored. Index
+        arrays that are the same objects as the cached ones are not compared,
+        thus the structure of a block should not be changed in place between
+        calls.
+
+        Parameters:
+            gb (pp.GridBucket): Storage of the cached pattern.
+            cache_key (tuple): Key of the pattern in gb.assembly_cache.
+            matrix (dict): Block matrices, one per term.
+            full_dof (np.ndarray): Number of degrees of freedom per block.
+            sps_matrix: Either sps.csr_matrix or sps.csc_matrix.
+
+        Returns:
+            sps.spmatrix: The global matrix, in the format given by sps_matrix.
+
+        """
+        size = np.sum(full_dof)
+        matrix_format = "csr" if sps_matrix is sps.csr_matrix else "csc"
+
+        # Non-empty blocks, in the format of the global matrix
+        blocks = []
+        for mat in matrix.values():
+            for (ri, ci), block in np.ndenumerate(mat):
+                if block is None:
+                    continue
+                if not sps.issparse(block) or block.getformat() != matrix_format:
+                    block = sps_matrix(block)
+                if block.nnz == 0:
+                    continue
+                blocks.append((ri, ci, block))
+
+        if len(blocks) == 0:
+            return sps_matrix((size, size))
+
+        cache = gb.assembly_cache.get(cache_key, None)
+        if cache is None or not self._same_pattern(cache["blocks"], blocks):
+            cache = self._compute_pattern(blocks, full_dof, matrix_format)
+            gb.assembly_cache[cache_key] = cache
+
+        # Entries with the same global index, also within a block, are summed
+        data = np.bincount(
+            cache["scatter"],
+            weights=np.hstack([block.data for _, _, block in blocks]),
+            minlength=cache["indices"].size,
+        )
+        return sps_matrix(
+            (data, cache["indices"].copy(), cache["indptr"].copy()), shape=(size, size)
+        )
+
+    def _same_pattern(self, cached_blocks, blocks):
+        """ Check if the blocks have the positions and structure of the blocks
+        of a cached pattern.
+        """
+        if len(cached_blocks) != len(blocks):
+            return False
+        for (ri, ci, block), (cached_ri, cached_ci, indptr, indices) in zip(
+            blocks, cached_blocks
+        ):
+            if ri != cached_ri or ci != cached_ci or block.nnz != indices.size:
+                return False
+            if block.indptr is not indptr and not np.array_equal(block.indptr, indptr):
+                return False
+            if block.indices is not indices and not np.array_equal(
+                block.indices, indices
+            ):
+                return False
+        return True
+
+    def _compute_pattern(self, blocks, full_dof, matrix_format):
+        """ Compute the sparsity pattern of the sum of the blocks, and the map
+        from the entries of each block to the data array of the global matrix.
+        """
+        size = np.sum(full_dof)
+        offset = np.hstack((0, np.cumsum(full_dof)))
+
+        # Global (major, minor) index of all block entries, as a single key
+        keys = []
+        for ri, ci, block in blocks:
+            if matrix_format == "csr":
+                major_offset, minor_offset = offset[ri], offset[ci]
+            else:
+                major_offset, minor_offset = offset[ci], offset[ri]
+            major = np.repeat(np.arange(block.indptr.size - 1), np.diff(block.indptr))
+            keys.append(
+                (major + major_offset).astype(np.int64) * size
+                + block.indices
+                + minor_offset
+            )
+
+        # The unique keys are sorted, which gives the ordering of the compressed
+        # format, with sorted indices within each row (column).
+        unique_keys, inverse = np.unique(np.hstack(keys), return_inverse=True)
+        indptr = np.hstack(
+            (0, np.cumsum(np.bincount(unique_keys // size, minlength=size)))
+        )
+        if max(size, unique_keys.size) < np.iinfo(np.int32).max:
+            index_dtype = np.int32
+        else:
+            index_dtype = np.int64
+
+        return {
+            "blocks": [(ri, ci, b.indptr, b.indices) for ri, ci, b in blocks],
+            "scatter": inverse,
+            "indices": (unique_keys % size).astype(index_dtype),
+            "indptr": indptr.astype(index_dtype),
+        }
+
     def _initialize_matrix_rhs(self, gb, variables, sps_matrix):
         """
         Initialize local matrices for all combinations of variables and operators.
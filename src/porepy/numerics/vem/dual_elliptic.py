@@ -49,6 +49,71 @@ def project_flux(gb, discr, flux, P0_flux, mortar_key="mortar_solution"):
         d[P0_flux] = discr.project_flux(g, edge_flux + d[flux], d)
 
 
+def cells_by_num_faces(g):
+    """
+    Group the cells of a grid according to their number of faces, so that local
+    computations can be done for all cells in a group at the same time.
+
+    Parameters
+    ---------
+    g: grid, or a subclass.
+
+    Return
+    ------
+    list of tuples, one for each number of faces present in the grid. Each tuple
+    contains
+        cells: array (num_cells_in_group) Index of the cells in the group.
+        faces: ndarray (num_cells_in_group, num_faces_of_cell) Faces of the cells.
+        sign: ndarray (num_cells_in_group, num_faces_of_cell) +1 or -1 if the
+            normal is inward or outward to the cell.
+
+    """
+    faces, cells, sign = sps.find(g.cell_faces)
+    index = np.argsort(cells, kind="mergesort")
+    faces, cells, sign = faces[index], cells[index], sign[index]
+
+    num_faces = np.bincount(cells, minlength=g.num_cells)
+    first = np.cumsum(num_faces) - num_faces
+
+    groups = []
+    for nf in np.unique(num_faces[num_faces > 0]):
+        cells_loc = np.where(num_faces == nf)[0]
+        index = first[cells_loc].reshape((-1, 1)) + np.arange(nf)
+        groups.append((cells_loc, faces[index], sign[index]))
+    return groups
+
+
+def assemble_local_matrices(g, groups, local_matrices):
+    """
+    Assemble a global face-face matrix from local matrices computed for groups
+    of cells.
+
+    Parameters
+    ---------
+    g: grid, or a subclass.
+    groups: list of tuples, as returned by cells_by_num_faces.
+    local_matrices: list of ndarray (num_cells_in_group, num_faces_of_cell,
+        num_faces_of_cell), one for each group.
+
+    Return
+    ------
+    sps.coo_matrix (g.num_faces, g.num_faces) The global matrix.
+
+    """
+    I, J, dataIJ = [], [], []
+    for (_, faces, _), A in zip(groups, local_matrices):
+        I.append(np.broadcast_to(faces[:, :, np.newaxis], A.shape).ravel())
+        J.append(np.broadcast_to(faces[:, np.newaxis, :], A.shape).ravel())
+        dataIJ.append(A.ravel())
+
+    if len(dataIJ) == 0:
+        return sps.coo_matrix((g.num_faces, g.num_faces))
+    return sps.coo_matrix(
+        (np.hstack(dataIJ), (np.hstack(I), np.hstack(J))),
+        shape=(g.num_faces, g.num_faces),
+    )
+
+
 # ------------------------------------------------------------------------------#
 
 
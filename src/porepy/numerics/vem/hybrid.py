@@ -11,6 +11,7 @@ import scipy.sparse as sps
 import porepy as pp
 
 from porepy.utils import comp_geom as cg
+from porepy.utils.mcolon import mcolon
 
 
 class HybridDualVEM:
@@ -106,8 +107,6 @@ class HybridDualVEM:
         bc_val = parameter_dictionary["bc_values"]
         a = parameter_dictionary["aperture"]
 
-        faces, _, sgn = sps.find(g.cell_faces)
-
         # Map the domain to a reference geometry (i.e. equivalent to compute
         # surface coordinates in 1d and 2d)
         c_centers, f_normals, f_centers, _, _, _ = cg.map_grid(g)
@@ -115,68 +114,41 @@ class HybridDualVEM:
         # Weight for the stabilization term
         diams = g.cell_diameters()
         weight = np.power(diams, 2 - g.dim)
+        geometry = (c_centers, f_normals, f_centers, diams, weight)
 
-        # Allocate the data to store matrix entries, that's the most efficient
-        # way to create a sparse matrix.
-        size = np.sum(np.square(g.cell_faces.indptr[1:] - g.cell_faces.indptr[:-1]))
-        I = np.empty(size, dtype=np.int)
-        J = np.empty(size, dtype=np.int)
-        data = np.empty(size)
         rhs = np.zeros(g.num_faces)
 
-        idx = 0
-        # Use a dummy keyword to trick the constructor of dualVEM.
-        massHdiv = pp.MVEM("dummy").massHdiv
-
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its faces
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-            ndof = faces_loc.size
-
-            # Retrieve permeability and normals assumed outward to the cell.
-            sgn_loc = sgn[loc].reshape((-1, 1))
-            normals = np.multiply(
-                np.tile(sgn_loc.T, (g.dim, 1)), f_normals[:, faces_loc]
+        # Process all cells with the same number of faces at once
+        groups = pp.numerics.vem.dual_elliptic.cells_by_num_faces(g)
+        local_matrices = []
+        for cells, faces, sgn in groups:
+            # Compute the H_div-mass local matrices
+            invA = np.linalg.inv(
+                self._local_mass(g, cells, faces, sgn, k, a, geometry)
             )
 
-            # Compute the H_div-mass local matrix
-            A = massHdiv(
-                k.values[0 : g.dim, 0 : g.dim, c],
-                c_centers[:, c],
-                a[c] * g.cell_volumes[c],
-                f_centers[:, faces_loc],
-                a[c] * normals,
-                np.ones(ndof),
-                diams[c],
-                weight[c],
-            )[0]
-            # Compute the Div local matrix
-            B = -np.ones((ndof, 1))
-            # Compute the hybrid local matrix
-            C = np.eye(ndof, ndof)
-
-            # Perform the static condensation to compute the hybrid local matrix
-            invA = np.linalg.inv(A)
-            S = 1 / np.dot(B.T, np.dot(invA, B))
-            L = np.dot(np.dot(invA, np.dot(B, np.dot(S, B.T))), invA)
-            L = np.dot(np.dot(C.T, L - invA), C)
+            # Perform the static condensation to compute the hybrid local
+            # matrices. The local Div matrices are -1 for all faces, and the
+            # local hybrid matrices are identities.
+            invA_B = -np.sum(invA, axis=2)
+            B_invA = -np.sum(invA, axis=1)
+            S = 1 / -np.sum(invA_B, axis=1)
+            L = S[:, np.newaxis, np.newaxis] * (
+                invA_B[:, :, np.newaxis] * B_invA[:, np.newaxis, :]
+            )
+            local_matrices.append(L - invA)
 
             # Compute the local hybrid right using the static condensation
-            rhs[faces_loc] += np.dot(C.T, np.dot(invA, np.dot(B, np.dot(S, f[c]))))[
-                :, 0
-            ]
-
-            # Save values for hybrid matrix
-            cols = np.tile(faces_loc, (faces_loc.size, 1))
-            loc_idx = slice(idx, idx + cols.size)
-            I[loc_idx] = cols.T.ravel()
-            J[loc_idx] = cols.ravel()
-            data[loc_idx] = L.ravel()
-            idx += cols.size
+            rhs += np.bincount(
+                faces.ravel(),
+                weights=(invA_B * (S * f[cells])[:, np.newaxis]).ravel(),
+                minlength=g.num_faces,
+            )
 
         # construct the global matrices
-        H = sps.coo_matrix((data, (I, J))).tocsr()
+        H = pp.numerics.vem.dual_elliptic.assemble_local_matrices(
+            g, groups, local_matrices
+        ).tocsr()
 
         # Apply the boundary conditions
         if bc is not None:
@@ -185,8 +157,10 @@ class HybridDualVEM:
                 norm = sps.linalg.norm(H, np.inf)
                 is_dir = np.where(bc.is_dir)[0]
 
-                H[is_dir, :] *= 0
-                H[is_dir, is_dir] = norm
+                H.data[mcolon(H.indptr[is_dir], H.indptr[is_dir + 1])] = 0
+                d = H.diagonal()
+                d[is_dir] = norm
+                H.setdiag(d)
                 rhs[is_dir] = norm * bc_val[is_dir]
 
             if np.any(bc.is_neu):
@@ -222,12 +196,10 @@ class HybridDualVEM:
         if g.dim == 0:
             return 0, l[0]
 
-        param = data["param"]
-        k = param.get_tensor(self)
-        f = param.get_source(self)
-        a = param.aperture
-
-        faces, _, sgn = sps.find(g.cell_faces)
+        parameter_dictionary = data[pp.PARAMETERS][self.keyword]
+        k = parameter_dictionary["second_order_tensor"]
+        f = parameter_dictionary["source"]
+        a = parameter_dictionary["aperture"]
 
         # Map the domain to a reference geometry (i.e. equivalent to compute
         # surface coordinates in 1d and 2d)
@@ -236,47 +208,65 @@ class HybridDualVEM:
         # Weight for the stabilization term
         diams = g.cell_diameters()
         weight = np.power(diams, 2 - g.dim)
+        geometry = (c_centers, f_normals, f_centers, diams, weight)
 
         # Allocation of the pressure and velocity vectors
         p = np.zeros(g.num_cells)
         u = np.zeros(g.num_faces)
-        massHdiv = dual.DualVEM().massHdiv
-
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its faces
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-            ndof = faces_loc.size
-
-            # Retrieve permeability and normals assumed outward to the cell.
-            sgn_loc = sgn[loc].reshape((-1, 1))
-            normals = np.multiply(
-                np.tile(sgn_loc.T, (g.dim, 1)), f_normals[:, faces_loc]
-            )
 
-            # Compute the H_div-mass local matrix
-            A = massHdiv(
-                k.values[0 : g.dim, 0 : g.dim, c],
-                c_centers[:, c],
-                a[c] * g.cell_volumes[c],
-                f_centers[:, faces_loc],
-                a[c] * normals,
-                np.ones(ndof),
-                diams[c],
-                weight[c],
-            )[0]
-            # Compute the Div local matrix
-            B = -np.ones((ndof, 1))
-            # Compute the hybrid local matrix
-            C = np.eye(ndof, ndof)
-
-            # Perform the static condensation to compute the pressure and velocity
-            S = 1 / np.dot(B.T, solve(A, B))
-            l_loc = l[faces_loc].reshape((-1, 1))
-
-            p[c] = np.dot(S, f[c] - np.dot(B.T, solve(A, np.dot(C, l_loc))))
-            u[faces_loc] = -np.multiply(
-                sgn_loc, solve(A, np.dot(B, p[c]) + np.dot(C, l_loc))
-            )
+        # Process all cells with the same number of faces at once
+        for cells, faces, sgn in pp.numerics.vem.dual_elliptic.cells_by_num_faces(g):
+            # Compute the H_div-mass local matrices
+            A = self._local_mass(g, cells, faces, sgn, k, a, geometry)
+
+            # Perform the static condensation to compute the pressure and
+            # velocity. The local Div matrices are -1 for all faces, and the
+            # local hybrid matrices are identities.
+            rhs_loc = np.stack((-np.ones(faces.shape), l[faces]), axis=2)
+            invA_B, invA_l = np.rollaxis(solve(A, rhs_loc), 2)
+            S = 1 / -np.sum(invA_B, axis=1)
+
+            p[cells] = S * (f[cells] + np.sum(invA_l, axis=1))
+            u[faces] = -sgn * (invA_B * p[cells, np.newaxis] + invA_l)
 
         return u, p
+
+    # ------------------------------------------------------------------------------#
+
+    def _local_mass(self, g, cells, faces, sgn, k, a, geometry):
+        """
+        Compute the local H_div-mass matrices for a set of cells with the same
+        number of faces, with normals assumed outward to the cells.
+
+        Parameters
+        ----------
+        g : grid, or a subclass, with geometry fields computed.
+        cells : array (num_cells_in_group) Index of the cells.
+        faces : ndarray (num_cells_in_group, num_faces_of_cell) Faces of the cells.
+        sgn : ndarray (num_cells_in_group, num_faces_of_cell) Sign of the normals.
+        k : tensor.SecondOrderTensor Permeability defined cell-wise.
+        a : array (g.num_cells) Apertures of the cells.
+        geometry : tuple with the mapped cell centers, face normals and face
+            centers, as given by cg.map_grid, and the cell diameters and weights
+            for the stabilization term.
+
+        Return
+        ------
+        A : ndarray (num_cells_in_group, num_faces_of_cell, num_faces_of_cell)
+            Local mass matrices.
+
+        """
+        # pylint: disable=invalid-name
+        c_centers, f_normals, f_centers, diams, weight = geometry
+        a_loc = a[cells].reshape((-1, 1, 1))
+
+        return pp.MVEM.massHdiv_batch(
+            np.rollaxis(k.values[0 : g.dim, 0 : g.dim, cells], 2),
+            c_centers[:, cells].T,
+            a[cells] * g.cell_volumes[cells],
+            np.rollaxis(f_centers[:, faces], 1),
+            a_loc * sgn[:, np.newaxis, :] * np.rollaxis(f_normals[:, faces], 1),
+            np.ones(faces.shape),
+            diams[cells],
+            weight[cells],
+        )[0]
@@ -71,10 +71,6 @@ class MVEM(pp.numerics.vem.dual_elliptic.DualElliptic):
         k = parameter_dictionary["second_order_tensor"]
         a = parameter_dictionary["aperture"]
 
-        faces, cells, sign = sps.find(g.cell_faces)
-        index = np.argsort(cells)
-        faces, sign = faces[index], sign[index]
-
         # Map the domain to a reference geometry (i.e. equivalent to compute
         # surface coordinates in 1d and 2d)
         c_centers, f_normals, f_centers, R, dim, _ = pp.cg.map_grid(g)
@@ -95,41 +91,27 @@ class MVEM(pp.numerics.vem.dual_elliptic.DualElliptic):
         # Weight for the stabilization term
         weight = np.power(diams, 2 - g.dim)
 
-        # Allocate the data to store matrix entries, that's the most efficient
-        # way to create a sparse matrix.
-        size = np.sum(np.square(g.cell_faces.indptr[1:] - g.cell_faces.indptr[:-1]))
-        I = np.empty(size, dtype=np.int)
-        J = np.empty(size, dtype=np.int)
-        dataIJ = np.empty(size)
-        idx = 0
-
-        for c in np.arange(g.num_cells):
-            # For the current cell retrieve its faces
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-
-            # Compute the H_div-mass local matrix
-            A = MVEM.massHdiv(
-                a[c] * k.values[0 : g.dim, 0 : g.dim, c],
-                c_centers[:, c],
-                g.cell_volumes[c],
-                f_centers[:, faces_loc],
-                f_normals[:, faces_loc],
-                sign[loc],
-                diams[c],
-                weight[c],
+        # Compute the H_div-mass local matrices for all cells with the same
+        # number of faces at once
+        groups = pp.numerics.vem.dual_elliptic.cells_by_num_faces(g)
+        local_matrices = []
+        for cells, faces, sign in groups:
+            A = MVEM.massHdiv_batch(
+                np.rollaxis(a[cells] * k.values[0 : g.dim, 0 : g.dim, cells], 2),
+                c_centers[:, cells].T,
+                g.cell_volumes[cells],
+                np.rollaxis(f_centers[:, faces], 1),
+                np.rollaxis(f_normals[:, faces], 1),
+                sign,
+                diams[cells],
+                weight[cells],
             )[0]
-
-            # Save values for Hdiv-mass local matrix in the global structure
-            cols = np.tile(faces_loc, (faces_loc.size, 1))
-            loc_idx = slice(idx, idx + cols.size)
-            I[loc_idx] = cols.T.ravel()
-            J[loc_idx] = cols.ravel()
-            dataIJ[loc_idx] = A.ravel()
-            idx += cols.size
+            local_matrices.append(A)
 
         # Construct the global matrices
-        mass = sps.coo_matrix((dataIJ, (I, J)))
+        mass = pp.numerics.vem.dual_elliptic.assemble_local_matrices(
+            g, groups, local_matrices
+        )
         div = -g.cell_faces.T
 
         matrix_dictionary["mass"] = mass
@@ -156,14 +138,10 @@ class MVEM(pp.numerics.vem.dual_elliptic.DualElliptic):
             return np.zeros(3).reshape((3, 1))
 
         # The velocity field already has permeability effects incorporated,
-        # thus we assign a unit permeability to be passed to MVEM.massHdiv
+        # thus we assign a unit permeability to be passed to MVEM.massHdiv_batch
         k = pp.SecondOrderTensor(g.dim, kxx=np.ones(g.num_cells))
         a = data[pp.PARAMETERS][self.keyword]["aperture"]
 
-        faces, cells, sign = sps.find(g.cell_faces)
-        index = np.argsort(cells)
-        faces, sign = faces[index], sign[index]
-
         c_centers, f_normals, f_centers, R, dim, _ = pp.cg.map_grid(g)
 
         # In the virtual cell approach the cell diameters should involve the
@@ -173,25 +151,23 @@ class MVEM(pp.numerics.vem.dual_elliptic.DualElliptic):
 
         P0u = np.zeros((3, g.num_cells))
 
-        for c in np.arange(g.num_cells):
-            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-            faces_loc = faces[loc]
-
-            Pi_s = MVEM.massHdiv(
-                a[c] * k.values[0 : g.dim, 0 : g.dim, c],
-                c_centers[:, c],
-                g.cell_volumes[c],
-                f_centers[:, faces_loc],
-                f_normals[:, faces_loc],
-                sign[loc],
-                diams[c],
+        for cells, faces, sign in pp.numerics.vem.dual_elliptic.cells_by_num_faces(g):
+            Pi_s = MVEM.massHdiv_batch(
+                np.rollaxis(a[cells] * k.values[0 : g.dim, 0 : g.dim, cells], 2),
+                c_centers[:, cells].T,
+                g.cell_volumes[cells],
+                np.rollaxis(f_centers[:, faces], 1),
+                np.rollaxis(f_normals[:, faces], 1),
+                sign,
+                diams[cells],
             )[1]
 
-            # extract the velocity for the current cell
-            P0u[dim, c] = np.dot(Pi_s, u[faces_loc]) / diams[c] * a[c]
-            P0u[:, c] = np.dot(R.T, P0u[:, c])
+            # extract the velocity for the current cells
+            P0u[np.ix_(dim, cells)] = (
+                np.einsum("cij,cj->ic", Pi_s, u[faces]) / diams[cells] * a[cells]
+            )
 
-        return P0u
+        return np.dot(R.T, P0u)
 
     @staticmethod
     def massHdiv(K, c_center, c_volume, f_centers, normals, sign, diam, weight=0):
@@ -221,35 +197,76 @@ class MVEM(pp.numerics.vem.dual_elliptic.DualElliptic):
         out: ndarray (num_faces_of_cell, num_faces_of_cell)
             Local mass Hdiv matrix.
         """
+        A, Pi_s = MVEM.massHdiv_batch(
+            K[np.newaxis],
+            np.asarray(c_center)[np.newaxis],
+            np.atleast_1d(c_volume),
+            f_centers[np.newaxis],
+            normals[np.newaxis],
+            np.asarray(sign)[np.newaxis],
+            np.atleast_1d(diam),
+            np.atleast_1d(weight),
+        )
+        return A[0], Pi_s[0]
+
+    @staticmethod
+    def massHdiv_batch(K, c_center, c_volume, f_centers, normals, sign, diam, weight=0):
+        """ Compute the local mass Hdiv matrices using the mixed vem approach,
+        for a set of cells with the same number of faces.
+
+        Parameters
+        ----------
+        K : ndarray (num_cells, g.dim, g.dim)
+            Permeability of the cells.
+        c_center : ndarray (num_cells, g.dim)
+            Cell centers.
+        c_volume : array (num_cells)
+            Cell volumes.
+        f_centers : ndarray (num_cells, g.dim, num_faces_of_cell)
+            Center of the cell faces.
+        normals : ndarray (num_cells, g.dim, num_faces_of_cell)
+            Normal of the cell faces weighted by the face areas.
+        sign : ndarray (num_cells, num_faces_of_cell)
+            +1 or -1 if the normal is inward or outward to the cell.
+        diam : array (num_cells)
+            Diameter of the cells.
+        weight : array (num_cells) or scalar
+            weight for the stabilization term. Optional, default = 0.
+
+        Return
+        ------
+        out: ndarray (num_cells, num_faces_of_cell, num_faces_of_cell)
+            Local mass Hdiv matrices.
+        out: ndarray (num_cells, g.dim, num_faces_of_cell)
+            Local projection matrices Pi_s.
+        """
         # Allow short variable names in this function
         # pylint: disable=invalid-name
 
-        dim = K.shape[0]
-        mono = np.array(
-            [lambda pt, i=i: (pt[i] - c_center[i]) / diam for i in np.arange(dim)]
-        )
-        grad = np.eye(dim) / diam
+        num_faces = f_centers.shape[2]
+        diam = np.reshape(diam, (-1, 1, 1))
 
-        # local matrix D
-        D = np.array([np.dot(normals.T, np.dot(K, g)) for g in grad]).T
+        # local matrices D, with the gradients of the scaled monomials
+        D = np.einsum("cjf,cji->cfi", normals, K) / diam
 
-        # local matrix G
-        G = np.dot(grad, np.dot(K, grad.T)) * c_volume
+        # local matrices G
+        G = K / np.square(diam) * np.reshape(c_volume, (-1, 1, 1))
 
-        # local matrix F
-        F = np.array(
-            [s * m(f) for m in mono for s, f in zip(sign, f_centers.T)]
-        ).reshape((dim, -1))
+        # local matrices F, with the scaled monomials evaluated at the faces
+        F = sign[:, np.newaxis, :] * (f_centers - c_center[:, :, np.newaxis]) / diam
 
-        assert np.allclose(G, np.dot(F, D)), "G " + str(G) + " F*D " + str(np.dot(F, D))
+        assert np.allclose(G, np.matmul(F, D)), "G " + str(G) + " F*D " + str(
+            np.matmul(F, D)
+        )
 
-        # local matrix Pi_s
+        # local matrices Pi_s
         Pi_s = np.linalg.solve(G, F)
-        I_Pi = np.eye(f_centers.shape[1]) - np.dot(D, Pi_s)
+        I_Pi = np.eye(num_faces) - np.matmul(D, Pi_s)
 
-        # local Hdiv-mass matrix
-        w = weight * np.linalg.norm(np.linalg.inv(K), np.inf)
-        A = np.dot(Pi_s.T, np.dot(G, Pi_s)) + w * np.dot(I_Pi.T, I_Pi)
+        # local Hdiv-mass matrices
+        w = np.multiply(weight, np.abs(np.linalg.inv(K)).sum(axis=2).max(axis=1))
+        A = np.matmul(np.swapaxes(Pi_s, 1, 2), np.matmul(G, Pi_s))
+        A += w.reshape((-1, 1, 1)) * np.matmul(np.swapaxes(I_Pi, 1, 2), I_Pi)
 
         return A, Pi_s
 
@@ -165,20 +165,28 @@ class FourthOrderTensor(object):
     e.g. using two degrees of freedom. A third parameter phi is also present,
     but this has never been used.
 
+    The tensor is a sum of constant basis matrices, see basis(), multiplied by
+    the cell-wise parameters. In the compact mode, only the parameters are
+    stored, and the cell-wise values are formed when accessed. Mpsa and Biot
+    use the basis directly, and never form the cell-wise values.
+
     Primary usage for the class is for mpsa discretizations. Other applications
     have not been tested.
 
     Attributes:
         values - numpy.ndarray, dimensions (dim^2,dim^2,nc), cell-wise
-            representation of the stiffness matrix.
+            representation of the stiffness matrix. In the compact mode, the
+            array is computed on each access, unless it has been assigned.
         dim (int): Real dimension of the tensor (as oposed to the 3d
             representation of the data)
         lmbda (np.ndarray, size: num_cells): First Lame parameter
         mu (np.ndarray, size: num_cells): Second Lame parameter
+        phi (np.ndarray, size: num_cells): Third parameter.
+        compact (boolean): Whether the cell-wise values are stored.
 
     """
 
-    def __init__(self, dim, mu, lmbda, phi=None):
+    def __init__(self, dim, mu, lmbda, phi=None, compact=False):
         """ Constructor for fourth order tensor on Lame-parameter form
 
         Parameters
@@ -187,6 +195,8 @@ class FourthOrderTensor(object):
         mu (numpy.ndarray), First lame parameter, 1-D, one value per cell
         lmbda (numpy.ndarray), Second lame parameter, 1-D, one value per cell
         phi (Optional numpy.ndarray), 1-D one value per cell, never been used.
+        compact (Optional boolean), If True, the cell-wise values are not
+            stored. Defaults to False.
 
         """
 
@@ -217,10 +227,36 @@ class FourthOrderTensor(object):
         # Save lmbda and mu, can be useful to have in some cases
         self.lmbda = lmbda
         self.mu = mu
+        self.phi = phi
         self.dim = dim
+        self.compact = compact
+
+        self._values = None
+        if not compact:
+            self._values = self._cell_values()
+
+    @property
+    def values(self):
+        if self._values is None:
+            return self._cell_values()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
 
+    def basis(self):
+        """ Representation of the tensor by constant basis matrices.
+
+        The tensor of cell c is sum_i basis[i][0] * basis[i][1][c].
+
+        Returns:
+            list of tuples: The basis matrices of mu, lmbda and phi (each a
+                np.ndarray of size 9 x 9), together with the parameters.
+
+        """
         # Basis for the contributions of mu, lmbda and phi is hard-coded
-        if dim == 2:
+        if self.dim == 2:
             mu_mat = np.array(
                 [
                     [2, 0, 0, 0, 0, 0, 0, 0, 0],
@@ -304,13 +340,21 @@ class FourthOrderTensor(object):
                 ]
             )
 
+        return [(mu_mat, self.mu), (lmbda_mat, self.lmbda), (phi_mat, self.phi)]
+
+    def _cell_values(self):
+        """ Cell-wise representation of the tensor, size 9 x 9 x num_cells.
+        """
+        (mu_mat, mu), (lmbda_mat, lmbda), (phi_mat, phi) = self.basis()
+
         # Expand dimensions to prepare for cell-wise representation
         mu_mat = mu_mat[:, :, np.newaxis]
         lmbda_mat = lmbda_mat[:, :, np.newaxis]
         phi_mat = phi_mat[:, :, np.newaxis]
 
-        c = mu_mat * mu + lmbda_mat * lmbda + phi_mat * phi
-        self.values = c
+        return mu_mat * mu + lmbda_mat * lmbda + phi_mat * phi
 
     def copy(self):
-        return FourthOrderTensor(self.dim, mu=self.mu, lmbda=self.lmbda)
+        return FourthOrderTensor(
+            self.dim, mu=self.mu, lmbda=self.lmbda, phi=self.phi, compact=self.compact
+        )
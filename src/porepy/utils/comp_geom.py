@@ -10,12 +10,14 @@ from __future__ import division
 import logging
 import time
 import numpy as np
+import scipy.spatial
 from sympy import geometry as geom
 
 import shapely.geometry as shapely_geometry
 import shapely.speedups as shapely_speedups
 
 from porepy.utils import setmembership
+from porepy.utils.mcolon import mcolon
 import porepy as pp
 
 # Module level logger
@@ -780,23 +782,16 @@ def _axis_aligned_bounding_box_3d(polys):
     """
 
     polys = list(polys)
+    if len(polys) == 0:
+        return tuple(np.empty(0) for _ in range(6))
 
-    num_poly = len(polys)
+    # Compute the extension of all polygons at once
+    pts = np.hstack(polys)
+    num_pts = np.array([p.shape[1] for p in polys])
+    first = np.cumsum(num_pts) - num_pts
 
-    x_min = np.empty(num_poly)
-    x_max = np.empty_like(x_min)
-    y_min = np.empty_like(x_min)
-    y_max = np.empty_like(x_min)
-    z_min = np.empty_like(x_min)
-    z_max = np.empty_like(x_min)
-
-    for ind, p in enumerate(polys):
-        x_min[ind] = np.min(p[0])
-        x_max[ind] = np.max(p[0])
-        y_min[ind] = np.min(p[1])
-        y_max[ind] = np.max(p[1])
-        z_min[ind] = np.min(p[2])
-        z_max[ind] = np.max(p[2])
+    x_min, y_min, z_min = np.minimum.reduceat(pts, first, axis=1)
+    x_max, y_max, z_max = np.maximum.reduceat(pts, first, axis=1)
 
     return x_min, x_max, y_min, y_max, z_min, z_max
 
@@ -1005,6 +1000,11 @@ def remove_edge_crossings2(p, e, tol=1e-4):
     remove_edge_crossings, based on a much faster algorithm. The two functions
     will coexist for a while.
 
+    Candidate pairs of crossing edges are found by sorting the bounding boxes
+    of the edges into buckets, see _identify_overlapping_boxes. The crossing
+    test and the splitting of edges are then done for all pairs and edges at
+    the same time; only pairs of parallel edges are processed one by one.
+
     Parameters:
         p (np.ndarray, 2 x n_pt): Coordinates of points to be processed
         e (np.ndarray, n x n_con): Connections between lines. n >= 2, row
@@ -1020,192 +1020,525 @@ def remove_edge_crossings2(p, e, tol=1e-4):
     # Find the bounding box
     x_min, x_max, y_min, y_max = _axis_aligned_bounding_box_2d(p, e)
     # Identify fractures with overlapping bounding boxes
-    pairs = _identify_overlapping_rectangles(x_min, x_max, y_min, y_max)
-
-    # Identify all fractures that are the first (by index) of a potentially
-    # crossing pair. A better way to group the fractures may be feasible,
-    # but this has not been investigated.
-    start_inds = np.unique(pairs[0])
+    pairs = _identify_overlapping_boxes(
+        np.vstack((x_min, y_min)), np.vstack((x_max, y_max))
+    )
 
     num_lines = e.shape[1]
 
-    # Data structure for storage of intersection points. For each fracture,
-    # we have an array that will contain the index of the intersections.
-    isect_pt = np.empty(num_lines, dtype=np.object)
-    for i in range(isect_pt.size):
-        isect_pt[i] = np.empty(0, dtype=np.int)
-
-    # Array of new points, found in the intersection of old ones.
-    new_pts = []
-    # The new points will be appended to the old ones, thus their index
-    # must be adjusted.
-    new_ind = p.shape[1]
-
-    # Loop through all candidate pairs of intersecting fractures, check if
-    # they do intersect. If so, store the point, and for each crossing fracture
-    # take note of the index of the cross point.
-    for di, line_ind in enumerate(start_inds):
-        # First fracture in the candidate pair
-        main = line_ind
-        # Find all other fractures that is in a pair with the main as the first one.
-        hit = np.where(pairs[0] == main)
-        # Sort the other points; this makes debugging simpler if nothing else.
-        other = np.sort(pairs[1, hit][0])
-
-        # We will first do a coarse sorting, to rule out fractures that are clearly
-        # not intersecting, and then do a finer search for an intersection below.
-
-        # Utility function to pull out one or several points from an array based
-        # on index
-        def pt(p, ind):
-            a = p[:, ind]
-            if ind.size == 1:
-                return a.reshape((-1, 1))
-            else:
-                return a
-
-        # Obtain start and endpoint of the main and other fractures
-        start_main = pt(p, e[0, main])
-        end_main = pt(p, e[1, main])
-        start_other = pt(p, e[0, other])
-        end_other = pt(p, e[1, other])
-
-        # Utility function to normalize the fracture length
-        def normalize(v):
-            nrm = np.sqrt(np.sum(v ** 2, axis=0))
-            return v / nrm
-
-        def dist(a, b):
-            return np.sqrt(np.sum((a - b) ** 2))
-
-        # Vectors along the main fracture, and from the start of the main
-        # to the start and end of the other fractures. All normalized.
-        # If the other edges share start or endpoint with the main one, normalization
-        # of the distance vector will make the vector nans. In this case, we
-        # use another point along the other line, this works equally well for the
-        # coarse identification (based on cross products).
-        # If the segments are overlapping, there will still be issues with nans,
-        # but these are dealt with below.
-        main_vec = normalize(end_main - start_main)
-        if dist(start_other, start_main) > 1e-4:
-            main_other_start = normalize(start_other - start_main)
-        else:
-            main_other_start = normalize(0.5 * (start_other + end_other) - start_main)
-        if dist(end_other, start_main) > 1e-4:
-            main_other_end = normalize(end_other - start_main)
-        else:
-            main_other_end = normalize(0.3 * start_other + 0.7 * end_other - start_main)
+    # We will first do a coarse sorting, to rule out fractures that are clearly
+    # not intersecting, and then do a finer search for an intersection below.
+    # The first fracture in each pair is referred to as the main one.
+    main = pairs[0]
 
-        # Modified signum function: The value is 0 if it is very close to zero.
-        def mod_sign(v, tol):
-            sgn = np.sign(v)
-            sgn[np.abs(v) < tol] = 0
-            return sgn
-
-        # Take the cross product between the vector along the main line, and the
-        # vectors to the start and end of the other lines, respectively.
-        start_cross = mod_sign(
-            main_vec[0] * main_other_start[1] - main_vec[1] * main_other_start[0], tol
-        )
-        end_cross = mod_sign(
-            main_vec[0] * main_other_end[1] - main_vec[1] * main_other_end[0], tol
-        )
+    # Obtain start and endpoint of the main and other fractures
+    start_main = p[:, e[0, main]]
+    end_main = p[:, e[1, main]]
+    start_other = p[:, e[0, pairs[1]]]
+    end_other = p[:, e[1, pairs[1]]]
 
-        # If the start and endpoint of the other fracture are clearly on the
-        # same side of the main one, these are not crossing.
-        # For completely ovrelapping edges, the normalization will leave the
-        # vectors nan. There may be better ways of dealing with this, but we simply
-        # run the intersection finder in this case.
-        relevant = np.where(
-            np.logical_or(
-                (start_cross * end_cross < 1),
-                np.any(np.isnan(main_other_start + main_other_end), axis=0),
-            )
-        )[0]
+    # Utility function to normalize the fracture length
+    def normalize(v):
+        nrm = np.sqrt(np.sum(v ** 2, axis=0))
+        return v / nrm
 
-        # Loop over all relevant (possibly crossing) fractures, look closer
-        # for an intersection.
-        for ri in relevant:
-            ipt = pp.cg.lines_intersect(
-                start_main, end_main, pt(start_other, ri), pt(end_other, ri)
-            )
-            # Add the intersection point, if any.
-            # If two intersection points are found, that is the edges are overlapping
-            # both points are added.
-            if ipt is not None:
-                num_isect = ipt.shape[1]
-                # Add indices of the new points to the main and other edge
-                isect_pt[main] = np.append(
-                    isect_pt[main], new_ind + np.arange(num_isect)
-                )
-                isect_pt[other[ri]] = np.append(
-                    isect_pt[other[ri]], new_ind + np.arange(num_isect)
-                )
-                new_ind += num_isect
+    # Check if the given points on the other fractures are away from the start
+    # of the main fracture. The distance is measured for all fractures paired
+    # with the same main fracture at once.
+    def away_from_start(pt):
+        dist = np.sum((pt - start_main) ** 2, axis=0)
+        dist = np.sqrt(np.bincount(main, weights=dist, minlength=num_lines))
+        return dist[main] > 1e-4
+
+    # Vectors along the main fracture, and from the start of the main
+    # to the start and end of the other fractures. All normalized.
+    # If the other edges share start or endpoint with the main one, normalization
+    # of the distance vector will make the vector nans. In this case, we
+    # use another point along the other line, this works equally well for the
+    # coarse identification (based on cross products).
+    # If the segments are overlapping, there will still be issues with nans,
+    # but these are dealt with below.
+    main_vec = normalize(end_main - start_main)
+    main_other_start = np.where(
+        away_from_start(start_other),
+        normalize(start_other - start_main),
+        normalize(0.5 * (start_other + end_other) - start_main),
+    )
+    main_other_end = np.where(
+        away_from_start(end_other),
+        normalize(end_other - start_main),
+        normalize(0.3 * start_other + 0.7 * end_other - start_main),
+    )
 
-                # Add the one or two intertion points
-                if num_isect == 1:
-                    new_pts.append(ipt.squeeze())
-                else:
-                    # It turned out the transport was needed to get the code to work
-                    new_pts.append(ipt.squeeze().T)
+    # Modified signum function: The value is 0 if it is very close to zero.
+    def mod_sign(v, tol):
+        sgn = np.sign(v)
+        sgn[np.abs(v) < tol] = 0
+        return sgn
+
+    # Take the cross product between the vector along the main line, and the
+    # vectors to the start and end of the other lines, respectively.
+    start_cross = mod_sign(
+        main_vec[0] * main_other_start[1] - main_vec[1] * main_other_start[0], tol
+    )
+    end_cross = mod_sign(
+        main_vec[0] * main_other_end[1] - main_vec[1] * main_other_end[0], tol
+    )
+
+    # If the start and endpoint of the other fracture are clearly on the
+    # same side of the main one, these are not crossing.
+    # For completely ovrelapping edges, the normalization will leave the
+    # vectors nan. There may be better ways of dealing with this, but we simply
+    # run the intersection finder in this case.
+    relevant = np.where(
+        np.logical_or(
+            (start_cross * end_cross < 1),
+            np.any(np.isnan(main_other_start + main_other_end), axis=0),
+        )
+    )[0]
+    pairs = pairs[:, relevant]
+    start_1 = start_main[:, relevant]
+    start_2 = start_other[:, relevant]
+
+    # Look closer for an intersection between the relevant (possibly crossing)
+    # fractures. This is the computation done in lines_intersect, done for all
+    # pairs of non-parallel lines at once.
+    d_1 = end_main[:, relevant] - start_1
+    d_2 = end_other[:, relevant] - start_2
+    length_1 = np.sqrt(np.sum(d_1 * d_1, axis=0))
+    length_2 = np.sqrt(np.sum(d_2 * d_2, axis=0))
+    d_s = start_2 - start_1
 
+    discr = d_1[0] * (-d_2[1]) - d_1[1] * (-d_2[0])
+    parallel = np.abs(discr) < 1e-8 * length_1 * length_2
+    not_parallel = np.where(np.logical_not(parallel))[0]
+
+    # Solve linear system using Cramer's rule
+    d_1, d_2, d_s = d_1[:, not_parallel], d_2[:, not_parallel], d_s[:, not_parallel]
+    discr = discr[not_parallel]
+    t_1 = (d_s[0] * (-d_2[1]) - d_s[1] * (-d_2[0])) / discr
+    t_2 = (d_1[0] * d_s[1] - d_1[1] * d_s[0]) / discr
+
+    isect_1 = start_1[:, not_parallel] + t_1 * d_1
+    isect_2 = start_2[:, not_parallel] + t_2 * d_2
+    # Safeguarding
+    assert np.allclose(isect_1, isect_2, 1e-8)
+
+    # The intersection lies on both segments if both t_1 and t_2 are on the
+    # unit interval.
+    hit = np.where(
+        np.logical_and.reduce(
+            (t_1 >= -1e-8, t_1 <= (1 + 1e-8), t_2 >= -1e-8, t_2 <= (1 + 1e-8))
+        )
+    )[0]
+
+    # Data structures for the intersection points: The coordinates, the pair
+    # of fractures that gave the point, and the ordering of the points within
+    # the pair.
+    isect_pair = [not_parallel[hit]]
+    isect_coord = [isect_1[:, hit]]
+    isect_order = [np.zeros(hit.size, dtype=np.int)]
+
+    # Parallel lines may overlap, possibly along a segment. This is rare, thus
+    # we simply use lines_intersect. If the edges are overlapping two
+    # intersection points are found, and both points are added.
+    for pi in np.where(parallel)[0]:
+        ipt = pp.cg.lines_intersect(
+            start_1[:, pi],
+            end_main[:, relevant[pi]],
+            start_2[:, pi],
+            end_other[:, relevant[pi]],
+        )
+        if ipt is not None:
+            ipt = ipt.reshape((2, -1))
+            isect_pair.append(pi * np.ones(ipt.shape[1], dtype=np.int))
+            isect_coord.append(ipt)
+            isect_order.append(np.arange(ipt.shape[1]))
+
+    isect_pair = np.hstack(isect_pair)
     # If we have found no intersection points, we can safely return the incoming
     # points and edges.
-    if len(new_pts) == 0:
+    if isect_pair.size == 0:
         return p, e
+
     # If intersection points are found, the intersecting lines must be split into
     # shorter segments.
-    else:
-        # The full set of points, both original and newly found intersection points
-        all_pt = np.hstack((p, np.vstack((i for i in new_pts)).T))
-        # Remove duplicates in the point set.
-        # NOTE: The tolerance used here is a bit sensitive, if set too loose, this
-        # may merge non-intersecting fractures.
-        unique_all_pt, _, ib = pp.utils.setmembership.unique_columns_tol(all_pt, tol)
-        # Data structure for storing the split edges.
-        new_edge = np.empty((e.shape[0], 0))
-
-        # Loop over all lines, split it into non-overlapping segments.
-        for ei in range(num_lines):
-            # Find indices of all points involved in this fracture.
-            # Map them to the unique point set, and uniquify
-            inds = np.unique(ib[np.hstack((e[:2, ei], isect_pt[ei]))])
-            num_branches = inds.size - 1
-            # Get the coordinates themselves.
-            loc_pts = pt(unique_all_pt, inds)
-            # Specifically get the start point: Pick one of the points of the
-            # original edge, e[0, ei], which is known to be at an end of the edge.
-            # map to the unique indices
-            loc_start = pt(unique_all_pt, ib[e[0, ei]])
-            # Measure the distance of the points from the start. This can be used
-            # to sort the points along the line
-            dist = np.sum((loc_pts - loc_start) ** 2, axis=0)
-            order = np.argsort(dist)
-            new_inds = inds[order]
-            # All new segments share the tags of the old one.
-            loc_tags = e[2:, ei].reshape((-1, 1)) * np.ones(num_branches)
-            # Define the new segments, in terms of the unique points
-            loc_edge = np.vstack((new_inds[:-1], new_inds[1:], loc_tags))
-
-            # Add to the global list of segments
-            new_edge = np.hstack((new_edge, loc_edge))
-
-        # Finally, uniquify edges. This operation is necessary for overlapping edges.
-        # Operate on sorted point indices per edge
-        new_edge[:2] = np.sort(new_edge[:2], axis=0)
-        # Uniquify.
-        _, edge_map, _ = pp.utils.setmembership.unique_columns_tol(
-            new_edge[:2].astype(np.int), tol
+    # Number the new points according to the ordering of the pairs.
+    order = np.lexsort((np.hstack(isect_order), isect_pair))
+    isect_pair = isect_pair[order]
+    new_pts = np.hstack(isect_coord)[:, order]
+    new_ind = p.shape[1] + np.arange(isect_pair.size)
+
+    # The full set of points, both original and newly found intersection points
+    all_pt = np.hstack((p, new_pts))
+    # Remove duplicates in the point set.
+    # NOTE: The tolerance used here is a bit sensitive, if set too loose, this
+    # may merge non-intersecting fractures.
+    unique_all_pt, _, ib = pp.utils.setmembership.unique_columns_tol(all_pt, tol)
+    num_unique = unique_all_pt.shape[1]
+
+    # Find indices of all points involved in each fracture: The start and
+    # endpoints, and the intersection points. Map them to the unique point set,
+    # and uniquify the pairs of fracture and point index.
+    edge_ind = np.hstack(
+        (
+            np.arange(num_lines),
+            np.arange(num_lines),
+            pairs[0, isect_pair],
+            pairs[1, isect_pair],
+        )
+    )
+    pt_ind = ib[np.hstack((e[0], e[1], new_ind, new_ind))]
+    edge_pt = np.unique(edge_ind * num_unique + pt_ind)
+    edge_ind = edge_pt // num_unique
+    pt_ind = edge_pt % num_unique
+
+    # Measure the distance of the points from the start of the fracture; the
+    # start point of the original edge is known to be at an end of the edge.
+    # Sort the points along each fracture according to this distance.
+    loc_start = unique_all_pt[:, ib[e[0, edge_ind]]]
+    dist = np.sum((unique_all_pt[:, pt_ind] - loc_start) ** 2, axis=0)
+    order = np.lexsort((dist, edge_ind))
+    edge_ind = edge_ind[order]
+    pt_ind = pt_ind[order]
+
+    # Define the new segments, in terms of the unique points, as consecutive
+    # points along the same fracture. All new segments share the tags of the
+    # old one.
+    seg = np.where(edge_ind[:-1] == edge_ind[1:])[0]
+    new_edge = np.vstack((pt_ind[seg], pt_ind[seg + 1], e[2:, edge_ind[seg]]))
+
+    # Finally, uniquify edges. This operation is necessary for overlapping edges.
+    # Operate on sorted point indices per edge
+    new_edge[:2] = np.sort(new_edge[:2], axis=0)
+    # Uniquify.
+    _, edge_map, _ = pp.utils.setmembership.unique_columns_tol(
+        new_edge[:2].astype(np.int), tol
+    )
+    new_edge = new_edge[:, edge_map]
+
+    return unique_all_pt, new_edge.astype(np.int)
+
+
+def _identify_overlapping_boxes(lower, upper):
+    """ Based on a set of axis aligned bounding boxes, identify pairs of
+    overlapping boxes. The boxes can be of any dimension.
+
+    The boxes are sorted into a uniform grid of buckets, with bucket size
+    comparable to the typical box size. Only boxes that share a bucket are
+    compared. All operations are vectorized, thus this is much faster than
+    _identify_overlapping_rectangles and _identify_overlapping_intervals for
+    large numbers of boxes.
+
+    Parameters:
+        lower (np.ndarray, nd x num_boxes): Minimum coordinates of the boxes.
+        upper (np.ndarray, nd x num_boxes): Maximum coordinates of the boxes.
+
+        For all items, the minimum is less or equal to the maximum.
+
+    Returns:
+        np.array, 2 x num_overlaps: Each column contains a pair of overlapping
+            boxes, refering to their placement in the input arrays. The pairs
+            are sorted so that the lowest index is in the first row, and the
+            columns are sorted lexicographically.
+
+    """
+    nd, num_boxes = lower.shape
+    # There can be no overlaps if there is less than two boxes
+    if num_boxes < 2:
+        return np.empty((2, 0), dtype=np.int)
+
+    # The bucket size is the median box size, but not so small that there are
+    # on average less than one box per bucket.
+    origin = lower.min(axis=1).reshape((-1, 1))
+    domain_size = np.max(upper.max(axis=1) - origin.ravel())
+    size = max(
+        np.median(np.max(upper - lower, axis=0)), domain_size / num_boxes ** (1 / nd)
+    )
+    if size <= 0:
+        size = 1.0
+
+    # Index of the first and last bucket of each box, along each axis
+    lower_ind = np.floor((lower - origin) / size).astype(np.int64)
+    upper_ind = np.floor((upper - origin) / size).astype(np.int64)
+    num_ind = upper_ind - lower_ind + 1
+    num_buckets = upper_ind.max(axis=1) + 1
+
+    # Expand each box to all buckets it overlaps
+    num_box_buckets = np.prod(num_ind, axis=0)
+    box = np.repeat(np.arange(num_boxes), num_box_buckets)
+    local = np.arange(box.size) - np.repeat(
+        np.cumsum(num_box_buckets) - num_box_buckets, num_box_buckets
+    )
+    bucket = np.zeros(box.size, dtype=np.int64)
+    stride = 1
+    for dim in range(nd):
+        ind = lower_ind[dim, box] + local % num_ind[dim, box]
+        local = local // num_ind[dim, box]
+        bucket += stride * ind
+        stride *= num_buckets[dim]
+
+    # Sort by bucket, then pair all boxes within the same bucket
+    order = np.lexsort((box, bucket))
+    box = box[order]
+    bucket = bucket[order]
+    is_last = np.hstack((bucket[1:] != bucket[:-1], True))
+    group_end = np.where(is_last)[0] + 1
+    end = np.repeat(group_end, np.diff(np.hstack((0, group_end))))
+    first = np.repeat(box, end - np.arange(box.size) - 1)
+    second = box[mcolon(np.arange(box.size) + 1, end)]
+
+    # Remove pairs that do not overlap, and pairs that share several buckets
+    overlap = np.all(
+        np.logical_and(
+            upper[:, first] >= lower[:, second], lower[:, first] <= upper[:, second]
+        ),
+        axis=0,
+    )
+    pairs = np.unique(first[overlap] * num_boxes + second[overlap])
+    return np.vstack((pairs // num_boxes, pairs % num_boxes))
+
+
+def _identify_overlapping_boxes_3d(x_min, x_max, y_min, y_max, z_min, z_max):
+    """ Based on a set of axis aligned bounding boxes in 3d, identify pairs of
+    overlapping boxes.
+
+    See _identify_overlapping_boxes for a description of the algorithm.
+
+    Parameters:
+        x_min (np.array): Minimum coordinates of the boxes on the first axis.
+        x_max (np.array): Maximum coordinates of the boxes on the first axis.
+        y_min (np.array): Minimum coordinates of the boxes on the second axis.
+        y_max (np.array): Maximum coordinates of the boxes on the second axis.
+        z_min (np.array): Minimum coordinates of the boxes on the third axis.
+        z_max (np.array): Maximum coordinates of the boxes on the third axis.
+
+        For all items, the minimum is less or equal to the maximum.
+
+    Returns:
+        np.array, 2 x num_overlaps: Each column contains a pair of overlapping
+            boxes, refering to their placement in the input arrays. The pairs
+            are sorted so that the lowest index is in the first row, and the
+            columns are sorted lexicographically.
+
+    """
+    return _identify_overlapping_boxes(
+        np.vstack((x_min, y_min, z_min)), np.vstack((x_max, y_max, z_max))
+    )
+
+
+def _intersect_polygon_pairs_3d(polys, pairs, max_entries=2 ** 20):
+    """ Compute the intersection of pairs of convex polygons in 3d, for all
+    pairs at the same time.
+
+    Only pairs in general position are treated, that is, no vertex of one
+    polygon lies in the plane of the other. For the remaining pairs, the
+    computation is marked as undecided, and should be done by the more
+    general, but slower, treatment in intersect_polygons_3d.
+
+    The pairs are grouped by the largest number of vertexes of their polygons,
+    and the polygons of each group are padded to this number. The pairs of a
+    group are treated in chunks, so that the number of vertex pairs treated at
+    the same time is limited by max_entries.
+
+    Parameters:
+        polys (list of np.array): Each list item represents a polygon, specified
+            by its vertexses as a numpy array, of dimension 3 x num_pts.
+        pairs (np.array, 2 x num_pairs): Index of the candidate pairs.
+        max_entries (int, optional): Approximate number of vertex pairs treated
+            at the same time. Limits the size of the temporary arrays.
+
+    Returns:
+        np.array, bool (num_pairs): True if the pair is found to intersect.
+        np.array (num_pairs x 3 x 2): For each intersecting pair, the two
+            points of the intersection segment.
+        np.array, bool (num_pairs): True if the pair was not treated.
+
+    """
+    num_pairs = pairs.shape[1]
+    is_isect = np.zeros(num_pairs, dtype=np.bool)
+    undecided = np.zeros(num_pairs, dtype=np.bool)
+    isect_pts = np.zeros((num_pairs, 3, 2))
+    if num_pairs == 0:
+        return is_isect, isect_pts, undecided
+
+    num_vert = np.array([p.shape[1] for p in polys])
+    all_pts = np.hstack(polys).astype(np.float)
+    first_vert = np.cumsum(num_vert) - num_vert
+    centers = np.add.reduceat(all_pts, first_vert, axis=1).T / num_vert.reshape(
+        (-1, 1)
+    )
+
+    def padded_vertexes(ind, n):
+        # Vertexes of the polygons ind, padded with their first vertex, so that
+        # all of them have n + 1 vertexes and the first vertex is repeated at
+        # the end.
+        local = np.arange(n + 1)
+        local = np.where(local < num_vert[ind].reshape((-1, 1)), local, 0)
+        return all_pts.T[first_vert[ind].reshape((-1, 1)) + local]
+
+    # Normal vectors, computed as in compute_normal, for polygons with the same
+    # number of vertexes at a time
+    normals = np.zeros((len(polys), 3))
+    degenerate = np.zeros(len(polys), dtype=np.bool)
+    for n in np.unique(num_vert):
+        ind = np.where(num_vert == n)[0]
+        vertexes = padded_vertexes(ind, n)[:, :n]
+        dist = np.sum((vertexes - centers[ind, np.newaxis, :]) ** 2, axis=2)
+        furthest = np.argmax(dist, axis=1)
+        tangent = vertexes[np.arange(ind.size), furthest] - centers[ind]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tangent /= np.sqrt(np.sum(tangent ** 2, axis=1)).reshape((-1, 1))
+            loc_normals = np.cross(vertexes[:, 0] - vertexes[:, 1], tangent)
+            degenerate[ind] = np.logical_or(
+                np.all(np.abs(loc_normals) <= 1e-8, axis=1),
+                np.any(~np.isfinite(loc_normals), axis=1),
+            )
+            loc_normals /= np.sqrt(np.sum(loc_normals ** 2, axis=1)).reshape(
+                (-1, 1)
+            )
+        normals[ind] = loc_normals
+    # Degenerate cases are left for compute_normal
+    for i in np.where(degenerate)[0]:
+        normals[i] = pp.cg.compute_normal(polys[i])
+
+    def plane_side(a, vert_a, vert_b):
+        # For the vertexes of the polygons b, find on which side of the plane
+        # of the polygons a they are located. The vectors to the vertexes are
+        # drawn from the first vertex of a that does not coincide with a vertex
+        # of b.
+        dist = np.sqrt(
+            np.sum(
+                (vert_b[:, np.newaxis, :, :] - vert_a[:, :, np.newaxis, :]) ** 2,
+                axis=3,
+            )
+        )
+        far = np.logical_and(
+            dist.min(axis=2) > 1e-4,
+            np.arange(vert_a.shape[1]) < num_vert[a].reshape((-1, 1)),
+        )
+        ref = vert_a[np.arange(a.size), np.argmax(far, axis=1)]
+        vec = vert_b - ref[:, np.newaxis, :]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vec /= np.sqrt(np.sum(vec ** 2, axis=2))[:, :, np.newaxis]
+        dot = np.einsum("ijk,ik->ij", vec, normals[a])
+        sgn = np.sign(dot)
+        sgn[np.abs(dot) < 1e-8] = 0
+        return sgn, np.any(far, axis=1)
+
+    def plane_crossing(a, vert_b, sgn):
+        # Find the two segments of the polygons b crossing the plane of the
+        # polygons a, and compute the points where they cross
+        change = np.diff(sgn, axis=1) != 0
+        valid = np.sum(change, axis=1) == 2
+        seg = np.vstack(
+            (
+                np.argmax(change, axis=1),
+                change.shape[1] - 1 - np.argmax(change[:, ::-1], axis=1),
+            )
+        )
+        rows = np.arange(a.size)
+        pts = np.empty((a.size, 3, 2))
+        for i in range(2):
+            start = vert_b[rows, seg[i]]
+            dx = vert_b[rows, seg[i] + 1] - start
+            dot_prod = np.sum(normals[a] * dx, axis=1)
+            valid = np.logical_and(valid, np.abs(dot_prod) > 1e-6)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = -np.sum((start - centers[a]) * normals[a], axis=1) / dot_prod
+            valid = np.logical_and(valid, np.logical_and(t >= 0, t <= 1))
+            pts[:, :, i] = start + t.reshape((-1, 1)) * dx
+        return pts, valid
+
+    # Group the pairs by the largest number of vertexes of the two polygons
+    pair_vert = np.maximum(num_vert[pairs[0]], num_vert[pairs[1]])
+    chunks = []
+    for n in np.unique(pair_vert):
+        group = np.where(pair_vert == n)[0]
+        chunk_size = max(1, max_entries // (n + 1) ** 2)
+        for lo in range(0, group.size, chunk_size):
+            chunks.append((group[lo : lo + chunk_size], n))
+
+    for ind, n in chunks:
+        main, other = pairs[0, ind], pairs[1, ind]
+        vert_main = padded_vertexes(main, n)
+        vert_other = padded_vertexes(other, n)
+
+        # Signs of the vertexes of other relative to the plane of main, and
+        # the other way around
+        sgn_main, found_main = plane_side(main, vert_main, vert_other)
+        sgn_other, found_other = plane_side(other, vert_other, vert_main)
+
+        # If one of the polygons lie completely on one side of the other,
+        # there can be no intersection.
+        separated = np.logical_or.reduce(
+            (
+                np.all(sgn_main > 0, axis=1),
+                np.all(sgn_main < 0, axis=1),
+                np.all(sgn_other > 0, axis=1),
+                np.all(sgn_other < 0, axis=1),
+            )
+        )
+        # Pairs with vertexes in the plane of the other polygon are not treated
+        general = np.logical_and(
+            np.all(sgn_main != 0, axis=1), np.all(sgn_other != 0, axis=1)
+        )
+        found = np.logical_and(found_main, found_other)
+        candidate = np.logical_and.reduce((found, ~separated, general))
+
+        other_intersects_main, valid_main = plane_crossing(
+            main, vert_other, sgn_main
+        )
+        main_intersects_other, valid_other = plane_crossing(
+            other, vert_main, sgn_other
         )
-        new_edge = new_edge[:, edge_map]
 
-        return unique_all_pt, new_edge.astype(np.int)
+        # Vectors from the intersection points in the main polygon to the
+        # intersection points in the other polygon, see intersect_polygons_3d
+        def vec(i, j):
+            return other_intersects_main[:, :, j] - main_intersects_other[:, :, i]
+
+        e_1 = np.sum(vec(0, 0) * vec(0, 1), axis=1)
+        e_2 = np.sum(vec(1, 0) * vec(1, 1), axis=1)
+        e_3 = np.sum(vec(0, 0) * vec(1, 0), axis=1)
+        e_4 = np.sum(vec(0, 1) * vec(1, 1), axis=1)
+
+        no_isect = np.logical_and.reduce((e_1 > 0, e_2 > 0, e_3 > 0, e_4 > 0))
+        # Intersection points are the points of the other polygon, a point of
+        # the main polygon together with a point of the other polygon, or the
+        # points of the main polygon
+        first = np.where(e_1 >= 0, np.where(e_2 >= 0, -1, 1), np.where(e_2 >= 0, 0, -2))
+        second = np.where(e_3 <= 0, 0, np.where(e_4 <= 0, 1, -1))
+        mixed = first >= 0
+        pts = np.where(
+            (first == -1).reshape((-1, 1, 1)),
+            other_intersects_main,
+            main_intersects_other,
+        )
+        rows = np.where(mixed)[0]
+        pts[rows, :, 0] = main_intersects_other[rows, :, first[rows]]
+        pts[rows, :, 1] = other_intersects_main[rows, :, second[rows]]
+
+        treated = np.logical_and.reduce(
+            (candidate, valid_main, valid_other, np.logical_or(~mixed, second >= 0))
+        )
+        undecided[ind] = np.logical_and(~separated, ~treated)
+        undecided[ind] = np.logical_or(undecided[ind], ~found)
+        is_isect[ind] = np.logical_and(treated, ~no_isect)
+        isect_pts[ind] = pts
+
+    return is_isect, isect_pts, undecided
 
 
 def intersect_polygons_3d(polys, tol=1e-8):
     """ Compute the intersection between polygons embedded in 3d.
 
+    Candidate pairs are found by comparing bounding boxes, sorted into a
+    uniform grid of buckets. For candidate pairs in general position, the
+    intersections are computed for all pairs at the same time, while pairs
+    where a vertex of one polygon lies in the plane of the other are treated
+    one by one.
+
     Assumptions:
         * All polygons are convex. Non-convex polygons will simply be treated
           in a wrong way.
@@ -1229,19 +1562,15 @@ def intersect_polygons_3d(polys, tol=1e-8):
             intersecting polygons.
 
     """
-    # Obtain bounding boxes for the polygons
+    polys = list(polys)
+
+    # Obtain bounding boxes for the polygons, and identify overlapping boxes
     x_min, x_max, y_min, y_max, z_min, z_max = pp.cg._axis_aligned_bounding_box_3d(
         polys
     )
-
-    # Identify overlapping bounding boxes: First, use a fast method to find
-    # overlapping rectangles in the xy-plane.
-    pairs_xy = pp.cg._identify_overlapping_rectangles(x_min, x_max, y_min, y_max)
-    # Next, find overlapping intervals in the z-directien
-    pairs_z = pp.cg._identify_overlapping_intervals(z_min, z_max)
-
-    # Finally, do the intersection
-    pairs = pp.cg._intersect_pairs(pairs_xy, pairs_z)
+    pairs = pp.cg._identify_overlapping_boxes_3d(
+        x_min, x_max, y_min, y_max, z_min, z_max
+    )
 
     # Various utility functions
     def center(p):
@@ -1292,40 +1621,10 @@ def intersect_polygons_3d(polys, tol=1e-8):
 
         return b - a[:, found].reshape((-1, 1))
 
-    num_polys = len(polys)
-
-    # Storage array for storing the index of the intersection points for each polygon
-    isect_pt = np.empty(num_polys, dtype=np.object)
-    # Storage for whehter an intersection is on the boundary of a polygon
-    is_bound_isect = np.empty_like(isect_pt)
-    # Initialization
-    for i in range(isect_pt.size):
-        isect_pt[i] = []
-        is_bound_isect[i] = []
-
-    # Array for storing the newly found points
-    new_pt = []
-    new_pt_ind = 0
-
-    # Index of the main fractures, to which the other ones will be compared.
-    start_inds = np.unique(pairs[0])
-
-    polygon_pairs = []
-
-    # Loop over all fracture pairs (taking more than one simultaneously if an index
-    # occurs several times in pairs[0]), and look for intersections
-    for di, line_ind in enumerate(start_inds):
-        # The algorithm first does a coarse filtering, to check if the candidate
-        # pairs both crosses each others plane. For those pairs that passes
-        # this test, we next compute the intersection points, and check if
-        # they are contained within the fractures.
-
-        # The main fracture, from the first row in pairs
-        main = line_ind
-
-        # Find the other fracture of all pairs starting with the main one
-        hit = np.where(pairs[0] == main)
-        other = pairs[1, hit][0]
+    def intersect_pair(main, o):
+        # Compute the intersection between the polygons main and o. Return the
+        # intersection points and whether the intersection is on the boundary
+        # of main and o, or None if the polygons do not intersect.
 
         # Center point and normal vector of the main fracture
         main_center = center(polys[main])
@@ -1338,270 +1637,301 @@ def intersect_polygons_3d(polys, tol=1e-8):
         ind_main_cyclic = np.arange(num_main + 1) % num_main
         main_p_expanded = polys[main][:, ind_main_cyclic]
 
-        # Loop over the other polygon in the pairs, look for intersections
-        for o in other:
-            # Expanded version of the other polygon
-            num_other = polys[o].shape[1]
-            ind_other_cyclic = np.arange(num_other + 1) % num_other
-            other_p_expanded = polys[o][:, ind_other_cyclic]
-
-            # Normal vector and cetner of the other polygon
-            other_normal = pp.cg.compute_normal(polys[o]).reshape((-1, 1))
-            other_center = center(polys[o])
-
-            # Point a vector from the main center to the vertexes of the
-            # other polygon. Then take the dot product with the normal vector
-            # of the main fracture. If all dot products have the same sign,
-            # the other fracture does not cross the plane of the main polygon.
-            # Note that we use mod_sign to safeguard the computation - if
-            # the vertexes are close, we will take a closer look at the combination
-            vec_from_main = normalize(
-                vector_pointset_point(polys[main], other_p_expanded)
-            )
-            dot_prod_from_main = mod_sign(np.sum(main_normal * vec_from_main, axis=0))
+        # Expanded version of the other polygon
+        num_other = polys[o].shape[1]
+        ind_other_cyclic = np.arange(num_other + 1) % num_other
+        other_p_expanded = polys[o][:, ind_other_cyclic]
+
+        # Normal vector and cetner of the other polygon
+        other_normal = pp.cg.compute_normal(polys[o]).reshape((-1, 1))
+        other_center = center(polys[o])
+
+        # Point a vector from the main center to the vertexes of the
+        # other polygon. Then take the dot product with the normal vector
+        # of the main fracture. If all dot products have the same sign,
+        # the other fracture does not cross the plane of the main polygon.
+        # Note that we use mod_sign to safeguard the computation - if
+        # the vertexes are close, we will take a closer look at the combination
+        vec_from_main = normalize(
+            vector_pointset_point(polys[main], other_p_expanded)
+        )
+        dot_prod_from_main = mod_sign(np.sum(main_normal * vec_from_main, axis=0))
+
+        # Similar procedure: Vector from ohter center to the main polygon,
+        # then dot product.
+        vec_from_other = normalize(vector_pointset_point(polys[o], main_p_expanded))
+        dot_prod_from_other = mod_sign(
+            np.sum(other_normal * vec_from_other, axis=0)
+        )
 
-            # Similar procedure: Vector from ohter center to the main polygon,
-            # then dot product.
-            vec_from_other = normalize(vector_pointset_point(polys[o], main_p_expanded))
-            dot_prod_from_other = mod_sign(
-                np.sum(other_normal * vec_from_other, axis=0)
+        # If one of the polygons lie completely on one side of the other,
+        # there can be no intersection.
+        if (
+            np.all(dot_prod_from_main > 0)
+            or np.all(dot_prod_from_main < 0)
+            or np.all(dot_prod_from_other > 0)
+            or np.all(dot_prod_from_other < 0)
+        ):
+            return None
+
+        # At this stage, we are fairly sure both polygons cross the plane of
+        # the other polygon.
+        # Identify the segments where the polygon crosses the plane
+        sign_change_main = np.where(np.abs(np.diff(dot_prod_from_main)) > 0)[0]
+        sign_change_other = np.where(np.abs(np.diff(dot_prod_from_other)) > 0)[0]
+
+        # The default option is that the intersection is not on the boundary
+        # of main or other, that is, the two intersection points are identical
+        # to two vertexes of the polygon
+        isect_on_boundary_main = False
+        isect_on_boundary_other = False
+
+        if np.all(dot_prod_from_main != 0):
+            # In the case where one polygon does not have a vertex in the plane of
+            # the other polygon, there should be exactly two segments crossing the plane.
+            assert sign_change_main.size == 2
+            # Compute the intersection points between the segments of the other polygon
+            # and the plane of the main polygon.
+            other_intersects_main_0 = intersection(
+                other_p_expanded[:, sign_change_main[0]],
+                other_p_expanded[:, sign_change_main[0] + 1],
+                main_normal,
+                main_center,
+            )
+            other_intersects_main_1 = intersection(
+                other_p_expanded[:, sign_change_main[1]],
+                other_p_expanded[:, sign_change_main[1] + 1],
+                main_normal,
+                main_center,
+            )
+        elif np.sum(dot_prod_from_main[:-1] == 0) == 1:
+            # The first and last element represent the same point, thus include
+            # only one of them when counting the number of points in the plane
+            # of the other fracture.
+            hit = np.where(dot_prod_from_main[:-1] == 0)[0]
+            other_intersects_main_0 = other_p_expanded[:, hit[0]]
+            sign_change_full = np.where(np.abs(np.diff(dot_prod_from_main)) > 1)[0]
+            other_intersects_main_1 = intersection(
+                other_p_expanded[:, sign_change_full[0]],
+                other_p_expanded[:, sign_change_full[0] + 1],
+                main_normal,
+                main_center,
             )
 
-            # If one of the polygons lie completely on one side of the other,
-            # there can be no intersection.
+        else:
+            # Both of the intersection points are vertexes.
+            # Check that there are only two points - if this assertion fails,
+            # there is a hanging node of the other polygon, which is in the
+            # plane of the other polygon. Extending to cover this case should
+            # be possible, but further treatment is unclear at the moment.
+            assert np.sum(dot_prod_from_main[:-1] == 0) == 2
+            hit = np.where(dot_prod_from_main[:-1] == 0)[0]
+            other_intersects_main_0 = other_p_expanded[:, hit[0]]
+            # Pick the last of the intersection points. This is valid also for
+            # multiple (>2) intersection points, but we keep the assertion for now.
+            other_intersects_main_1 = other_p_expanded[:, hit[1]]
+            # The other polygon has an edge laying in the plane of the main polygon.
+            # This will be registered as a boundary intersection, but only if
+            # the polygons (not only plane) intersect.
             if (
-                np.all(dot_prod_from_main > 0)
-                or np.all(dot_prod_from_main < 0)
-                or np.all(dot_prod_from_other > 0)
-                or np.all(dot_prod_from_other < 0)
+                hit[0] + 1 == hit[-1]
+                or hit[0] == 0
+                and hit[-1] == (dot_prod_from_main.size - 2)
             ):
-                continue
-
-            # At this stage, we are fairly sure both polygons cross the plane of
-            # the other polygon.
-            # Identify the segments where the polygon crosses the plane
-            sign_change_main = np.where(np.abs(np.diff(dot_prod_from_main)) > 0)[0]
-            sign_change_other = np.where(np.abs(np.diff(dot_prod_from_other)) > 0)[0]
-
-            # The default option is that the intersection is not on the boundary
-            # of main or other, that is, the two intersection points are identical
-            # to two vertexes of the polygon
-            isect_on_boundary_main = False
-            isect_on_boundary_other = False
-
-            if np.all(dot_prod_from_main != 0):
-                # In the case where one polygon does not have a vertex in the plane of
-                # the other polygon, there should be exactly two segments crossing the plane.
-                assert sign_change_main.size == 2
-                # Compute the intersection points between the segments of the other polygon
-                # and the plane of the main polygon.
-                other_intersects_main_0 = intersection(
-                    other_p_expanded[:, sign_change_main[0]],
-                    other_p_expanded[:, sign_change_main[0] + 1],
-                    main_normal,
-                    main_center,
-                )
-                other_intersects_main_1 = intersection(
-                    other_p_expanded[:, sign_change_main[1]],
-                    other_p_expanded[:, sign_change_main[1] + 1],
-                    main_normal,
-                    main_center,
-                )
-            elif np.sum(dot_prod_from_main[:-1] == 0) == 1:
-                # The first and last element represent the same point, thus include
-                # only one of them when counting the number of points in the plane
-                # of the other fracture.
-                hit = np.where(dot_prod_from_main[:-1] == 0)[0]
-                other_intersects_main_0 = other_p_expanded[:, hit[0]]
-                sign_change_full = np.where(np.abs(np.diff(dot_prod_from_main)) > 1)[0]
-                other_intersects_main_1 = intersection(
-                    other_p_expanded[:, sign_change_full[0]],
-                    other_p_expanded[:, sign_change_full[0] + 1],
-                    main_normal,
-                    main_center,
-                )
-
-            else:
-                # Both of the intersection points are vertexes.
-                # Check that there are only two points - if this assertion fails,
-                # there is a hanging node of the other polygon, which is in the
-                # plane of the other polygon. Extending to cover this case should
-                # be possible, but further treatment is unclear at the moment.
-                assert np.sum(dot_prod_from_main[:-1] == 0) == 2
-                hit = np.where(dot_prod_from_main[:-1] == 0)[0]
-                other_intersects_main_0 = other_p_expanded[:, hit[0]]
-                # Pick the last of the intersection points. This is valid also for
-                # multiple (>2) intersection points, but we keep the assertion for now.
-                other_intersects_main_1 = other_p_expanded[:, hit[1]]
-                # The other polygon has an edge laying in the plane of the main polygon.
-                # This will be registered as a boundary intersection, but only if
-                # the polygons (not only plane) intersect.
-                if (
-                    hit[0] + 1 == hit[-1]
-                    or hit[0] == 0
-                    and hit[-1] == (dot_prod_from_main.size - 2)
-                ):
-                    isect_on_boundary_other = True
-
-            if np.all(dot_prod_from_other != 0):
-                # In the case where one polygon does not have a vertex in the plane of
-                # the other polygon, there should be exactly two segments crossing the plane.
-                assert sign_change_other.size == 2
-                # Compute the intersection points between the segments of the main polygon
-                # and the plane of the other polygon.
-                main_intersects_other_0 = intersection(
-                    main_p_expanded[:, sign_change_other[0]],
-                    main_p_expanded[:, sign_change_other[0] + 1],
-                    other_normal,
-                    other_center,
-                )
-                main_intersects_other_1 = intersection(
-                    main_p_expanded[:, sign_change_other[1]],
-                    main_p_expanded[:, sign_change_other[1] + 1],
-                    other_normal,
-                    other_center,
-                )
-            elif np.sum(dot_prod_from_other[:-1] == 0) == 1:
-                # The first and last element represent the same point, thus include
-                # only one of them when counting the number of points in the plane
-                # of the other fracture.
-                hit = np.where(dot_prod_from_other[:-1] == 0)[0]
-                main_intersects_other_0 = main_p_expanded[:, hit[0]]
-                sign_change_full = np.where(np.abs(np.diff(dot_prod_from_other)) > 1)[0]
-                main_intersects_other_1 = intersection(
-                    main_p_expanded[:, sign_change_full[0]],
-                    main_p_expanded[:, sign_change_full[0] + 1],
-                    other_normal,
-                    other_center,
-                )
+                isect_on_boundary_other = True
+
+        if np.all(dot_prod_from_other != 0):
+            # In the case where one polygon does not have a vertex in the plane of
+            # the other polygon, there should be exactly two segments crossing the plane.
+            assert sign_change_other.size == 2
+            # Compute the intersection points between the segments of the main polygon
+            # and the plane of the other polygon.
+            main_intersects_other_0 = intersection(
+                main_p_expanded[:, sign_change_other[0]],
+                main_p_expanded[:, sign_change_other[0] + 1],
+                other_normal,
+                other_center,
+            )
+            main_intersects_other_1 = intersection(
+                main_p_expanded[:, sign_change_other[1]],
+                main_p_expanded[:, sign_change_other[1] + 1],
+                other_normal,
+                other_center,
+            )
+        elif np.sum(dot_prod_from_other[:-1] == 0) == 1:
+            # The first and last element represent the same point, thus include
+            # only one of them when counting the number of points in the plane
+            # of the other fracture.
+            hit = np.where(dot_prod_from_other[:-1] == 0)[0]
+            main_intersects_other_0 = main_p_expanded[:, hit[0]]
+            sign_change_full = np.where(np.abs(np.diff(dot_prod_from_other)) > 1)[0]
+            main_intersects_other_1 = intersection(
+                main_p_expanded[:, sign_change_full[0]],
+                main_p_expanded[:, sign_change_full[0] + 1],
+                other_normal,
+                other_center,
+            )
+        else:
+            # Both of the intersection points are vertexes.
+            # Check that there are only two points - if this assertion fails,
+            # there is a hanging node of the main polygon, which is in the
+            # plane of the other polygon. Extending to cover this case should
+            # be possible, but further treatment is unclear at the moment.
+            # Do not count the last point here, this is identical to the
+            # first one.
+            assert np.sum(dot_prod_from_other[:-1] == 0) == 2
+            hit = np.where(dot_prod_from_other[:-1] == 0)[0]
+            main_intersects_other_0 = main_p_expanded[:, hit[0]]
+            # Pick the last of the intersection points. This is valid also for
+            # multiple (>2) intersection points, but we keep the assertion for now.
+            main_intersects_other_1 = main_p_expanded[:, hit[-1]]
+            # The main polygon has an edge laying in the plane of the other polygon.
+            # If the two intersection points form a segment
+            # This will be registered as a boundary intersection, but only if
+            # the polygons (not only plane) intersect.
+            # The two points can either be one apart in the main polygon,
+            # or it can be the first and the penultimate point
+            # (in the latter case, the final point, which is identical to the
+            # first one, will also be in the plane, but this is disregarded
+            # by the [:-1] above)
+            if (
+                hit[0] + 1 == hit[-1]
+                or hit[0] == 0
+                and hit[-1] == (dot_prod_from_other.size - 2)
+            ):
+                isect_on_boundary_main = True
+
+        # Vectors from the intersection points in the main fracture to the
+        # intersection point in the other fracture
+        main_0_other_0 = other_intersects_main_0 - main_intersects_other_0
+        main_0_other_1 = other_intersects_main_1 - main_intersects_other_0
+        main_1_other_0 = other_intersects_main_0 - main_intersects_other_1
+        main_1_other_1 = other_intersects_main_1 - main_intersects_other_1
+
+        # To finalize the computation, we need to sort out how the intersection
+        # points are located relative to each other. Only if there is an overlap
+        # between the intersection points of the main and the other polygon
+        # is there a real intersection (contained within the polygons, not only)
+        # in their planes, but outside the features themselves.
+
+        # e_1 is positive if both points of the other fracture lie on the same side of the
+        # first intersection point of the main one
+        e_1 = np.sum(main_0_other_0 * main_0_other_1)
+        # e_2 is positive if both points of the other fracture lie on the same side of the
+        # second intersection point of the main one
+        e_2 = np.sum(main_1_other_0 * main_1_other_1)
+        # e_3 is positive if both points of the main fracture lie on the same side of the
+        # first intersection point of the other one
+        e_3 = np.sum((-main_0_other_0) * (-main_1_other_0))
+        # e_3 is positive if both points of the main fracture lie on the same side of the
+        # second intersection point of the other one
+        e_4 = np.sum((-main_0_other_1) * (-main_1_other_1))
+
+        # This is in essence an implementation of the flow chart in Figure 9 in Dong et al,
+        # However the inequality signs are changed a bit to make the logic clearer
+        if e_1 > 0 and e_2 > 0 and e_3 > 0 and e_4 > 0:
+            # The intersection points for the two fractures are separated.
+            # There is no intersection
+            return None
+        if e_1 >= 0:
+            # The first point on the main fracture is not involved in the intersection
+            if e_2 >= 0:
+                # The second point on the main fracture is not involved
+                # We know that e_3 and e_4 are negative (positive is covered above
+                # and a combination is not possible)
+                isect_pt_loc = [other_intersects_main_0, other_intersects_main_1]
             else:
-                # Both of the intersection points are vertexes.
-                # Check that there are only two points - if this assertion fails,
-                # there is a hanging node of the main polygon, which is in the
-                # plane of the other polygon. Extending to cover this case should
-                # be possible, but further treatment is unclear at the moment.
-                # Do not count the last point here, this is identical to the
-                # first one.
-                assert np.sum(dot_prod_from_other[:-1] == 0) == 2
-                hit = np.where(dot_prod_from_other[:-1] == 0)[0]
-                main_intersects_other_0 = main_p_expanded[:, hit[0]]
-                # Pick the last of the intersection points. This is valid also for
-                # multiple (>2) intersection points, but we keep the assertion for now.
-                main_intersects_other_1 = main_p_expanded[:, hit[-1]]
-                # The main polygon has an edge laying in the plane of the other polygon.
-                # If the two intersection points form a segment
-                # This will be registered as a boundary intersection, but only if
-                # the polygons (not only plane) intersect.
-                # The two points can either be one apart in the main polygon,
-                # or it can be the first and the penultimate point
-                # (in the latter case, the final point, which is identical to the
-                # first one, will also be in the plane, but this is disregarded
-                # by the [:-1] above)
-                if (
-                    hit[0] + 1 == hit[-1]
-                    or hit[0] == 0
-                    and hit[-1] == (dot_prod_from_other.size - 2)
-                ):
-                    isect_on_boundary_main = True
-
-            # Vectors from the intersection points in the main fracture to the
-            # intersection point in the other fracture
-            main_0_other_0 = other_intersects_main_0 - main_intersects_other_0
-            main_0_other_1 = other_intersects_main_1 - main_intersects_other_0
-            main_1_other_0 = other_intersects_main_0 - main_intersects_other_1
-            main_1_other_1 = other_intersects_main_1 - main_intersects_other_1
-
-            # To finalize the computation, we need to sort out how the intersection
-            # points are located relative to each other. Only if there is an overlap
-            # between the intersection points of the main and the other polygon
-            # is there a real intersection (contained within the polygons, not only)
-            # in their planes, but outside the features themselves.
-
-            # e_1 is positive if both points of the other fracture lie on the same side of the
-            # first intersection point of the main one
-            e_1 = np.sum(main_0_other_0 * main_0_other_1)
-            # e_2 is positive if both points of the other fracture lie on the same side of the
-            # second intersection point of the main one
-            e_2 = np.sum(main_1_other_0 * main_1_other_1)
-            # e_3 is positive if both points of the main fracture lie on the same side of the
-            # first intersection point of the other one
-            e_3 = np.sum((-main_0_other_0) * (-main_1_other_0))
-            # e_3 is positive if both points of the main fracture lie on the same side of the
-            # second intersection point of the other one
-            e_4 = np.sum((-main_0_other_1) * (-main_1_other_1))
-
-            # This is in essence an implementation of the flow chart in Figure 9 in Dong et al,
-            # However the inequality signs are changed a bit to make the logic clearer
-            if e_1 > 0 and e_2 > 0 and e_3 > 0 and e_4 > 0:
-                # The intersection points for the two fractures are separated.
-                # There is no intersection
-                continue
-            if e_1 >= 0:
-                # The first point on the main fracture is not involved in the intersection
-                if e_2 >= 0:
-                    # The second point on the main fracture is not involved
-                    # We know that e_3 and e_4 are negative (positive is covered above
-                    # and a combination is not possible)
-                    isect_pt_loc = [other_intersects_main_0, other_intersects_main_1]
+                # The second point on the main fracture is surrounded by points on
+                # the other fracture. One of them will in turn be surrounded by the
+                # points on the main fracture, this is the intersecting one.
+                if e_3 <= 0:
+                    isect_pt_loc = [
+                        main_intersects_other_1,
+                        other_intersects_main_0,
+                    ]
+                elif e_4 <= 0:
+                    isect_pt_loc = [
+                        main_intersects_other_1,
+                        other_intersects_main_1,
+                    ]
                 else:
-                    # The second point on the main fracture is surrounded by points on
-                    # the other fracture. One of them will in turn be surrounded by the
-                    # points on the main fracture, this is the intersecting one.
-                    if e_3 <= 0:
-                        isect_pt_loc = [
-                            main_intersects_other_1,
-                            other_intersects_main_0,
-                        ]
-                    elif e_4 <= 0:
-                        isect_pt_loc = [
-                            main_intersects_other_1,
-                            other_intersects_main_1,
-                        ]
-                    else:
-                        # We may eventually end up here for overlapping fractures
-                        assert False
-            elif e_2 >= 0:
-                # The first point on the main fracture is not involved in the intersection
-                # The case of e_1 also non-negative was covered above
-                if e_1 < 0:  # Equality is covered above
-                    # The first point on the main fracture is surrounded by points on
-                    # the other fracture. One of them will in turn be surrounded by the
-                    # points on the main fracture, this is the intersecting one.
-                    if e_3 <= 0:
-                        isect_pt_loc = [
-                            main_intersects_other_0,
-                            other_intersects_main_0,
-                        ]
-                    elif e_4 <= 0:
-                        isect_pt_loc = [
-                            main_intersects_other_0,
-                            other_intersects_main_1,
-                        ]
-                    else:
-                        # We may eventually end up here for overlapping fractures
-                        assert False
-            elif e_1 < 0 and e_2 < 0:
-                # The points in on the main fracture are the intersection points
-                isect_pt_loc = [main_intersects_other_0, main_intersects_other_1]
-            else:
-                # This should never happen
-                assert False
-
-            new_pt.append(np.array(isect_pt_loc).T)
-            num_new = len(isect_pt_loc)
-            isect_pt[main].append(new_pt_ind + np.arange(num_new))
-            isect_pt[o].append(new_pt_ind + np.arange(num_new))
-            new_pt_ind += num_new
-            is_bound_isect[main].append(isect_on_boundary_main)
-            is_bound_isect[o].append(isect_on_boundary_other)
-            polygon_pairs.append((main, o))
-
-    if len(new_pt) > 0:
-        new_pt = np.hstack((v for v in new_pt))
-        for i in range(isect_pt.size):
-            if len(isect_pt[i]) > 0:
-                isect_pt[i] = np.hstack((v for v in isect_pt[i]))
+                    # We may eventually end up here for overlapping fractures
+                    assert False
+        elif e_2 >= 0:
+            # The first point on the main fracture is not involved in the intersection
+            # The case of e_1 also non-negative was covered above
+            if e_1 < 0:  # Equality is covered above
+                # The first point on the main fracture is surrounded by points on
+                # the other fracture. One of them will in turn be surrounded by the
+                # points on the main fracture, this is the intersecting one.
+                if e_3 <= 0:
+                    isect_pt_loc = [
+                        main_intersects_other_0,
+                        other_intersects_main_0,
+                    ]
+                elif e_4 <= 0:
+                    isect_pt_loc = [
+                        main_intersects_other_0,
+                        other_intersects_main_1,
+                    ]
+                else:
+                    # We may eventually end up here for overlapping fractures
+                    assert False
+        elif e_1 < 0 and e_2 < 0:
+            # The points in on the main fracture are the intersection points
+            isect_pt_loc = [main_intersects_other_0, main_intersects_other_1]
+        else:
+            # This should never happen
+            assert False
+
+        return np.array(isect_pt_loc).T, isect_on_boundary_main, isect_on_boundary_other
+
+    num_polys = len(polys)
+
+    # Storage array for storing the index of the intersection points for each polygon
+    isect_pt = np.empty(num_polys, dtype=np.object)
+    # Storage for whehter an intersection is on the boundary of a polygon
+    is_bound_isect = np.empty_like(isect_pt)
+    # Initialization
+    for i in range(isect_pt.size):
+        isect_pt[i] = []
+        is_bound_isect[i] = []
+
+    # Compute the intersections for all pairs in general position at once
+    is_isect, pair_pts, undecided = pp.cg._intersect_polygon_pairs_3d(polys, pairs)
+    bound_main = np.zeros(is_isect.size, dtype=np.bool)
+    bound_other = np.zeros(is_isect.size, dtype=np.bool)
 
+    # The remaining pairs are treated one by one
+    for pi in np.where(undecided)[0]:
+        isect = intersect_pair(pairs[0, pi], pairs[1, pi])
+        if isect is not None:
+            is_isect[pi] = True
+            pair_pts[pi], bound_main[pi], bound_other[pi] = isect
+
+    # Collect the intersection points, two for each intersecting pair. The
+    # pairs are ordered according to the first and then the second polygon.
+    hit = np.where(is_isect)[0]
+    polygon_pairs = list(zip(pairs[0, hit], pairs[1, hit]))
+
+    if hit.size > 0:
+        new_pt = pair_pts[hit].transpose((1, 0, 2)).reshape((3, -1))
+
+        # For each polygon, find the intersections it takes part in
+        polygon = np.hstack((pairs[0, hit], pairs[1, hit]))
+        isect_ind = np.tile(np.arange(hit.size), 2)
+        on_bound = np.hstack((bound_main[hit], bound_other[hit]))
+        order = np.lexsort((isect_ind, polygon))
+        polygon, isect_ind, on_bound = polygon[order], isect_ind[order], on_bound[order]
+        breaks = np.where(np.diff(polygon) > 0)[0] + 1
+        starts = np.hstack((0, breaks))
+        stops = np.hstack((breaks, polygon.size))
+        for start, stop in zip(starts, stops):
+            i = polygon[start]
+            isect_pt[i] = np.vstack(
+                (2 * isect_ind[start:stop], 2 * isect_ind[start:stop] + 1)
+            ).ravel(order="F")
+            is_bound_isect[i] = on_bound[start:stop].tolist()
     else:
         new_pt = np.empty((3, 0))
         for i in range(isect_pt.size):
@@ -3565,10 +3895,8 @@ def intersect_triangulations(p_1, p_2, t_1, t_2):
     t_2, and compute their common area. If parts of domain 1 or 2 is covered by
     one tessalation only, this will simply be ignored by the function.
 
-    Implementation note: The function relies on the intersection algorithm in
-    shapely.geometry.Polygon. It may be possible to extend the functionality
-    to other cell shapes. This would require more general data structures, but
-    should not be too much of an effort.
+    The computation is done by triangulation_overlaps(), see that function
+    for a version that returns arrays.
 
     Parameters:
         p_1 (np.array, 2 x n_p1): Points in first tessalation.
@@ -3584,64 +3912,202 @@ def intersect_triangulations(p_1, p_2, t_1, t_2):
             and their common area.
 
     """
-    n_1 = t_1.shape[1]
-    n_2 = t_2.shape[1]
-    t_1 = t_1.T
-    t_2 = t_2.T
+    ind_1, ind_2, areas = triangulation_overlaps(p_1, p_2, t_1, t_2)
+    return list(zip(ind_1.tolist(), ind_2.tolist(), areas.tolist()))
+
+
+def triangulation_overlaps(p_1, p_2, t_1, t_2, tol=1e-12):
+    """ Compute the overlaps between the triangles of two tessalations.
+
+    Candidate pairs are found by comparing the bounding boxes of the triangles,
+    using kd-trees of the box centers for groups of triangles of similar size,
+    see _overlapping_boxes(). The common area of each candidate pair
+    is computed by clipping one triangle by the edges of the other
+    (Sutherland-Hodgman), for all pairs at once.
+
+    Parameters:
+        p_1 (np.array, 2 x n_p1): Points in first tessalation.
+        p_2 (np.array, 2 x n_p2): Points in second tessalation.
+        t_1 (np.array, 3 x n_tri_1): Triangles in first tessalation, referring
+            to indices in p_1.
+        t_2 (np.array, 3 x n_tri_2): Triangles in second tessalation, referring
+            to indices in p_2.
+        tol (double, optional): Overlaps with area below tol times the area of
+            the smallest of the two triangles are ignored. Defaults to 1e-12.
+
+    Returns:
+        np.array (int): Index of the overlapping triangles in the first
+            tessalation.
+        np.array (int): Index of the overlapping triangles in the second
+            tessalation.
+        np.array (double): Common area of the triangles.
+        The overlaps are sorted by the first and then the second index.
+
+    """
+    # Coordinates of the triangles, size num_triangles x 3 x 2
+    x_1 = np.transpose(np.asarray(p_1, dtype=np.float)[:2, np.asarray(t_1)], (2, 1, 0))
+    x_2 = np.transpose(np.asarray(p_2, dtype=np.float)[:2, np.asarray(t_2)], (2, 1, 0))
 
-    # Find x and y coordinates of the triangles of first tessalation
-    x_1 = p_1[0, t_1]
-    y_1 = p_1[1, t_1]
-    # Same with second tessalation
-    x_2 = p_2[0, t_2]
-    y_2 = p_2[1, t_2]
+    if x_1.shape[0] == 0 or x_2.shape[0] == 0:
+        empty = np.zeros(0, dtype=np.int)
+        return empty, empty, np.zeros(0)
 
-    intersections = []
+    # Broad phase: Pairs with overlapping bounding boxes
+    ind_1, ind_2 = _overlapping_boxes(
+        x_1.min(axis=1), x_1.max(axis=1), x_2.min(axis=1), x_2.max(axis=1)
+    )
+    order = np.lexsort((ind_2, ind_1))
+    ind_1, ind_2 = ind_1[order], ind_2[order]
 
-    # Bounding box of each triangle for first and second tessalation
-    min_x_1 = np.min(x_1, axis=1)
-    max_x_1 = np.max(x_1, axis=1)
-    min_y_1 = np.min(y_1, axis=1)
-    max_y_1 = np.max(y_1, axis=1)
+    # Orient all triangles counterclockwise
+    area_1 = _signed_triangle_areas(x_1)
+    area_2 = _signed_triangle_areas(x_2)
+    x_1[area_1 < 0] = x_1[area_1 < 0][:, ::-1]
+    x_2[area_2 < 0] = x_2[area_2 < 0][:, ::-1]
+    area_1, area_2 = np.abs(area_1), np.abs(area_2)
 
-    min_x_2 = np.min(x_2, axis=1)
-    max_x_2 = np.max(x_2, axis=1)
-    min_y_2 = np.min(y_2, axis=1)
-    max_y_2 = np.max(y_2, axis=1)
+    # Narrow phase, in chunks to limit the memory use
+    areas = np.zeros(ind_1.size)
+    chunk = 2 ** 16
+    for start in range(0, ind_1.size, chunk):
+        loc = slice(start, start + chunk)
+        areas[loc] = _clip_triangles(x_1[ind_1[loc]], x_2[ind_2[loc]])
 
-    # Represent the second tessalation using a Polygon from the shapely package
-    poly_2 = [
-        shapely_geometry.Polygon(
-            [(x_2[j, 0], y_2[j, 0]), (x_2[j, 1], y_2[j, 1]), (x_2[j, 2], y_2[j, 2])]
-        )
-        for j in range(n_2)
-    ]
-
-    # Loop over all triangles in first tessalation, look for overlapping
-    # members in second tessalation
-    for i in range(n_1):
-        # Polygon representation of the first triangle.
-        poly_1 = shapely_geometry.Polygon(
-            [(x_1[i, 0], y_1[i, 0]), (x_1[i, 1], y_1[i, 1]), (x_1[i, 2], y_1[i, 2])]
+    keep = areas > tol * np.minimum(area_1[ind_1], area_2[ind_2])
+    return ind_1[keep], ind_2[keep], areas[keep]
+
+
+def _overlapping_boxes(min_1, max_1, min_2, max_2):
+    """ Find the pairs of overlapping boxes from two sets of boxes.
+
+    The boxes overlap if the distance between the centers, in the max-norm, is
+    less than the sum of the half widths in both directions. Candidate pairs
+    are found by kd-trees of the box centers, with a search radius given by the
+    largest half widths. To avoid that a few large boxes give a large search
+    radius for all boxes, the boxes are grouped by size, within a factor two,
+    and each combination of groups is searched separately.
+
+    Parameters:
+        min_1, max_1 (np.array, num_boxes_1 x nd): Corners of the first boxes.
+        min_2, max_2 (np.array, num_boxes_2 x nd): Corners of the second boxes.
+
+    Returns:
+        np.array (int): Index of the overlapping boxes in the first set.
+        np.array (int): Index of the overlapping boxes in the second set.
+
+    """
+    center_1, center_2 = 0.5 * (min_1 + max_1), 0.5 * (min_2 + max_2)
+    size_1 = np.max(max_1 - center_1, axis=1)
+    size_2 = np.max(max_2 - center_2, axis=1)
+
+    def groups(center, size):
+        # Group by the binary exponent of the half width
+        exponent = np.frexp(size)[1]
+        return [
+            (ind, scipy.spatial.cKDTree(center[ind]), size[ind].max())
+            for ind in (np.where(exponent == e)[0] for e in np.unique(exponent))
+        ]
+
+    ind_1, ind_2 = [], []
+    for sub_1, tree_1, size_max_1 in groups(center_1, size_1):
+        for sub_2, tree_2, size_max_2 in groups(center_2, size_2):
+            radius = (size_max_1 + size_max_2) * (1 + 1e-10)
+            pairs = tree_1.sparse_distance_matrix(
+                tree_2, radius, p=np.inf, output_type="ndarray"
+            )
+            i = sub_1[pairs["i"]]
+            j = sub_2[pairs["j"]]
+            overlap = np.all(
+                np.logical_and(min_1[i] <= max_2[j], min_2[j] <= max_1[i]), axis=1
+            )
+            ind_1.append(i[overlap])
+            ind_2.append(j[overlap])
+
+    return np.hstack(ind_1).astype(np.int), np.hstack(ind_2).astype(np.int)
+
+
+def _signed_triangle_areas(x):
+    """ Signed areas of triangles given as an array num_triangles x 3 x 2.
+    """
+    d1 = x[:, 1] - x[:, 0]
+    d2 = x[:, 2] - x[:, 0]
+    return 0.5 * (d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+
+
+def _clip_triangles(x_1, x_2):
+    """ Common area of pairs of counterclockwise triangles.
+
+    The triangles x_1 are clipped by the three edges of x_2, by the
+    Sutherland-Hodgman algorithm. The polygons are stored in arrays of fixed
+    size, padded beyond the number of vertexes of each polygon. Each clipping
+    adds at most one vertex to a convex polygon.
+
+    Parameters:
+        x_1, x_2 (np.array, num_pairs x 3 x 2): Vertexes of the triangles.
+
+    Returns:
+        np.array, num_pairs: Area of the intersections.
+
+    """
+    areas = np.zeros(x_1.shape[0])
+    # Index of the pairs that are not yet found to be disjoint
+    pairs = np.arange(x_1.shape[0])
+    poly = x_1
+    num_vert = 3 * np.ones(pairs.size, dtype=np.int)
+
+    for e in range(3):
+        a = x_2[pairs, e, None]
+        tangent = x_2[pairs, (e + 1) % 3, None] - a
+        # Distance from the edge, scaled by its length, positive on the inside
+        dist = tangent[:, :, 0] * (poly[:, :, 1] - a[:, :, 1]) - tangent[:, :, 1] * (
+            poly[:, :, 0] - a[:, :, 0]
         )
-        # Find triangles in the second tessalation that are outside the
-        # bounding box of this triangle.
-        right = np.squeeze(np.where(min_x_2 > max_x_1[i]))
-        left = np.squeeze(np.where(max_x_2 < min_x_1[i]))
-        above = np.squeeze(np.where(min_y_2 > max_y_1[i]))
-        below = np.squeeze(np.where(max_y_2 < min_y_1[i]))
-
-        # Candidates for intersection are only elements not outside
-        outside = np.unique(np.hstack((right, left, above, below)))
-        candidates = np.setdiff1d(np.arange(n_2), outside, assume_unique=True)
-
-        # Loop over remaining candidates, call upon shapely to find
-        # intersection
-        for j in candidates:
-            isect = poly_1.intersection(poly_2[j])
-            if isinstance(isect, shapely_geometry.Polygon):
-                intersections.append((i, j, isect.area))
-    return intersections
+
+        # Each edge of the polygon gives at most two new vertexes
+        rows = np.arange(pairs.size)
+        max_vert = poly.shape[1]
+        new_poly = np.zeros((pairs.size, 2 * max_vert, 2))
+        new_num = np.zeros(pairs.size, dtype=np.int)
+        for k in range(max_vert):
+            active = k < num_vert
+            nxt = np.where(k + 1 < num_vert, k + 1, 0)
+            d0 = dist[:, k]
+            d1 = dist[rows, nxt]
+
+            # Keep the vertexes on the inside
+            inside = np.logical_and(active, d0 >= 0)
+            new_poly[rows[inside], new_num[inside]] = poly[inside, k]
+            new_num += inside
+
+            # Add the intersection if the edge crosses the clipping line
+            cross = np.logical_or(
+                np.logical_and(d0 > 0, d1 < 0), np.logical_and(d0 < 0, d1 > 0)
+            )
+            cross = np.where(np.logical_and(active, cross))[0]
+            t = d0[cross] / (d0[cross] - d1[cross])
+            p0 = poly[cross, k]
+            p1 = poly[cross, nxt[cross]]
+            new_poly[cross, new_num[cross]] = p0 + t[:, None] * (p1 - p0)
+            new_num[cross] += 1
+
+        # Polygons with less than three vertexes have no area, and are dropped.
+        # Also remove the padding that is not used by any polygon.
+        keep = new_num > 2
+        pairs, num_vert = pairs[keep], new_num[keep]
+        if pairs.size == 0:
+            return areas
+        poly = new_poly[keep, : num_vert.max()]
+
+    # Area by the shoelace formula
+    rows = np.arange(pairs.size)
+    ind = np.arange(poly.shape[1])
+    nxt = np.where(ind + 1 < num_vert[:, None], ind + 1, 0)
+    x, y = poly[:, :, 0], poly[:, :, 1]
+    x_next = x[rows[:, None], nxt]
+    y_next = y[rows[:, None], nxt]
+    valid = ind < num_vert[:, None]
+    areas[pairs] = 0.5 * np.sum((x * y_next - x_next * y) * valid, axis=1)
+    return areas
 
 
 # ------------------------------------------------------------------------------#
@@ -6,6 +6,7 @@ Created on Thu Feb 25 20:16:42 2016
 """
 from __future__ import division
 import numpy as np
+import scipy.spatial
 
 
 def unique_rows(data):
@@ -215,6 +216,58 @@ def unique_columns_tol(mat, tol=1e-8, exponent=2):
         )
 
     (nd, l) = mat.shape
+    threshold = tol * np.sqrt(nd)
+
+    # The kd-tree only supports Minkowski norms, and does not handle nan or inf
+    if not 1 <= exponent < np.inf or not np.all(np.isfinite(mat)):
+        return _unique_columns_tol_loop(mat, threshold, dist)
+
+    # Find the pairs of points that are close. The search radius is slightly
+    # enlarged, and the candidate pairs are then checked with the same distance
+    # measure as in the sequential algorithm, to get identical results.
+    if threshold > 0:
+        tree = scipy.spatial.cKDTree(mat.T)
+        pairs = tree.query_pairs(
+            threshold * (1 + 1e-10), p=exponent, output_type="ndarray"
+        )
+    else:
+        pairs = np.empty((0, 2), dtype=np.int)
+    pairs = pairs.reshape((-1, 2))
+    close = dist(mat[:, pairs[:, 0]], mat[:, pairs[:, 1]]) < threshold
+    earlier, later = np.sort(pairs[close], axis=1).T
+
+    # For each point, the close points with lower index, sorted
+    order = np.lexsort((earlier, later))
+    earlier, later = earlier[order], later[order]
+    later, start = np.unique(later, return_index=True)
+    end = np.r_[start[1:], earlier.size]
+
+    # A point is represented by the first kept point it is close to. Points are
+    # processed in the order of the columns, thus the representatives are the
+    # same as for the sequential algorithm.
+    keep = np.ones(l, dtype=np.bool)
+    rep = np.arange(l)
+    for i, s, e in zip(later.tolist(), start.tolist(), end.tolist()):
+        candidates = earlier[s:e]
+        kept = candidates[keep[candidates]]
+        if kept.size > 0:
+            keep[i] = False
+            rep[i] = kept[0]
+
+    # Map from old points to the unique subspace
+    old_2_new = np.cumsum(keep) - 1
+    old_2_new = old_2_new[rep]
+    new_2_old = np.argwhere(keep).ravel()
+
+    return mat[:, keep], new_2_old, old_2_new
+
+
+def _unique_columns_tol_loop(mat, threshold, dist):
+    """
+    Sequential version of unique_columns_tol, each column is compared with all
+    the kept ones. Used as a fallback for cases not covered by the kd-tree.
+    """
+    l = mat.shape[1]
 
     # By default, no columns are kept
     keep = np.zeros(l, dtype=np.bool)
@@ -228,7 +281,7 @@ def unique_columns_tol(mat, tol=1e-8, exponent=2):
 
     # Loop over all points, check if it is already represented in the kept list
     for i in range(1, l):
-        proximate = np.argwhere(dist(mat[:, i], mat[:, keep]) < tol * np.sqrt(nd))
+        proximate = np.argwhere(dist(mat[:, i], mat[:, keep]) < threshold)
 
         if proximate.size > 0:
             # We will not keep this point
@@ -242,3 +295,40 @@ def unique_columns_tol(mat, tol=1e-8, exponent=2):
     new_2_old = np.argwhere(keep).ravel()
 
     return mat[:, keep], new_2_old, old_2_new
+
+
+def unique_columns_tol_batch(mats, tol=1e-8, exponent=2):
+    """
+    Merge several point sets, removing duplicates both within and across the
+    sets. See unique_columns_tol for the comparison of the points.
+
+    Parameters:
+        mats (list of np.ndarray, nd x n_pts): Point sets to be merged.
+        tol (double, optional): Tolerance for when columns are considered equal.
+            Defaults to 1e-8.
+        exponent (double, optional): Exponnet in norm used in distance
+            calculation. Defaults to 2.
+
+    Returns:
+        np.ndarray: Unique columns of the merged point sets.
+        new_2_old: Index of which points that are preserved, referring to the
+            point sets stacked horizontally.
+        list of np.ndarray: For each point set, index of the representation of
+            its points in the reduced list.
+
+    Example:
+        >>> p = np.array([[0, 1], [0, 0]])
+        >>> q = np.array([[1, 2], [0, 0]])
+        >>> p_un, n2o, o2n = unique_columns_tol_batch([p, q])
+        >>> p_un
+        array([[0, 1, 2],
+               [0, 0, 0]])
+        >>> o2n
+        [array([0, 1]), array([1, 2])]
+
+    """
+    mats = [np.atleast_2d(m) for m in mats]
+    num_pts = [m.shape[1] for m in mats]
+
+    un_ar, new_2_old, old_2_new = unique_columns_tol(np.hstack(mats), tol, exponent)
+    return un_ar, new_2_old, np.split(old_2_new, np.cumsum(num_pts)[:-1])
@@ -1,11 +1,15 @@
 """
-Module for exporting to vtu for (e.g. ParaView) visualization using the vtk module.
+Module for exporting to vtu for (e.g. ParaView) visualization.
 
 The Exporter class contains methods for exporting a grid or grid bucket with
 associated data to the vtu format. For grid buckets with multiple grids, one
 vtu file is printed for each grid. For transient simulations with multiple
 time steps, a single pvd file takes care of the ordering of all printed vtu
 files.
+
+The connectivity of the grids is computed with vectorized numpy operations. If
+the vtk module is available, the files are written by vtk, otherwise a
+built-in writer for the vtu format is used.
 """
 
 import sys, os
@@ -14,16 +18,13 @@ import scipy.sparse as sps
 import logging
 import warnings
 import porepy as pp
+from porepy.utils.mcolon import mcolon
 
 try:
     import vtk
     import vtk.util.numpy_support as ns
 except ImportError:
     warnings.warn("No vtk module loaded.")
-try:
-    import numba
-except ImportError:
-    warnings.warn("Numba not available. Export may be slow for large grids")
 
 # Module-wide logger
 logger = logging.getLogger(__name__)
@@ -172,6 +173,14 @@ class Exporter:
             grid changes in time or not. The default is True.
         binary: export in binary format, default is True.
         simplicial: consider only simplicial elements (triangles and tetra)
+        use_vtk: write the files with the vtk module, if available. If False,
+            or if vtk is not available, the files are written by a built-in
+            writer. The default is True.
+        time_series: in a time dependent simulation, write the mesh only once
+            and the data of each time step appended to a single file, instead
+            of one vtu file per time step. The time series is described by
+            the xdmf file name.xdmf, which references the binary files
+            name_mesh.bin and name_data.bin. The default is False.
 
         How to use:
         If you need to export a single grid:
@@ -184,6 +193,12 @@ class Exporter:
             save.write_vtk({"conc": conc}, time_step=i)
         save.write_pvd(steps*deltaT)
 
+        The same time loop, with the mesh written only once:
+        save = Exporter(gb, "solution", folder="results", time_series=True)
+        while time:
+            save.write_vtk({"conc": conc}, time_step=i)
+        save.write_pvd(steps*deltaT)
+
         if you need to export the grid bucket
         save = Exporter(gb, "solution", folder="results")
         save.write_vtk(gb, ["cells_id", "pressure"])
@@ -209,10 +224,15 @@ class Exporter:
         self.simplicial = kwargs.get("simplicial", False)
 
         self.is_GridBucket = isinstance(self.gb, pp.GridBucket)
-        self.is_not_vtk = "vtk" not in sys.modules
+        self.is_not_vtk = "vtk" not in sys.modules or not kwargs.get("use_vtk", True)
 
-        if self.is_not_vtk:
-            return
+        self.time_series = kwargs.get("time_series", False)
+        if self.time_series:
+            self._series_name = self._make_folder(self.folder, self.name)
+            # meshes already written, the time steps and the size of the files
+            self._series_meshes = {}
+            self._series_steps = []
+            self._series_bytes = {}
 
         if self.is_GridBucket:
             self.dims = np.setdiff1d(self.gb.all_dims(), [0])
@@ -226,8 +246,6 @@ class Exporter:
         else:
             self.gb_VTK = None
 
-        self.has_numba = "numba" in sys.modules
-
         if self.fixed_grid:
             self._update_gb_VTK()
 
@@ -250,7 +268,7 @@ class Exporter:
         Interface function to export the grid and additional data in VTK.
 
         In 2d the cells are represented as polygon, while in 3d as polyhedra.
-        The VTK module needs to be installed.
+        If the VTK module is not installed, a built-in vtu writer is used.
         In 3d the geometry of the mesh needs to be computed.
 
         To work with python3, the package vtk should be installed in version 7
@@ -261,26 +279,33 @@ class Exporter:
               if g is a grid bucket then list of names for optional data,
               they are the keys in the grid bucket (see example).
         time_step: (optional) in a time dependent problem defines the full name of
-            the file.
+            the file. For a time series it is the index of the time step.
         grid: (optional) in case of changing grid set a new one.
         point_data: ***
 
         """
-        if self.is_not_vtk:
-            return
-
         if self.fixed_grid and grid is not None:
             raise ValueError("Inconsistency in exporter setting")
         elif not self.fixed_grid and grid is not None:
             self.gb = grid
             self.is_GridBucket = isinstance(self.gb, pp.GridBucket)
-            self._update_gVTK()
+            self._update_gb_VTK()
+
+        if self.time_series:
+            if time_step is None:
+                time_step = len(self._series_steps)
+            self._series_steps.append((time_step, []))
+            # the grids of the time series are named without the time step
+            time_step = None
 
         if self.is_GridBucket:
             self._export_vtk_gb(data, time_step, point_data)
         else:
             self._export_vtk_single(data, time_step, point_data)
 
+        if self.time_series:
+            self._write_xdmf_step()
+
     # ------------------------------------------------------------------------------#
 
     def write_pvd(self, time):
@@ -291,11 +316,15 @@ class Exporter:
         We assume that the VTU associated files have the same name.
         We assume that the VTU associated files are in the same folder.
 
+        For a time series the xdmf file is written instead, where the time of
+        each step is given by its time step index in time.
+
         Parameters:
         time: vector of times.
 
         """
-        if self.is_not_vtk:
+        if self.time_series:
+            self._write_xdmf(np.atleast_1d(time))
             return
 
         o_file = open(self._make_folder(self.folder, self.name) + ".pvd", "w")
@@ -468,8 +497,9 @@ class Exporter:
             if self.m_gb_VTK[dim] is not None:
                 self._write_vtk(extra_fields, file_name, self.m_gb_VTK[dim])
 
-        name = self._make_folder(self.folder, self.name) + ".pvd"
-        self._export_pvd_gb(name)
+        if not self.time_series:
+            name = self._make_folder(self.folder, self.name) + ".pvd"
+            self._export_pvd_gb(name)
 
         self.gb.remove_edge_props(extra_fields.names())
 
@@ -505,100 +535,29 @@ class Exporter:
 
     def _export_vtk_grid(self, gs, dim):
         """
-        Wrapper function to export grids of dimension dim. Calls the
-        appropriate dimension specific export function.
+        Export the geometrical data (point coordinates) and connectivity
+        information from PorePy grids of dimension dim. The result is a vtk
+        unstructured grid, or, if vtk is not used, the raw arrays of the vtu
+        format.
         """
         if dim == 0:
             return
-        elif dim == 1:
-            return self._export_vtk_1d(gs)
-        elif dim == 2:
-            return self._export_vtk_2d(gs)
-        elif dim == 3:
-            return self._export_vtk_3d(gs)
+        cells = _grid_cells(gs, dim, self.simplicial)
+        if self.is_not_vtk or self.time_series:
+            return cells
+        return _vtk_unstructured_grid(cells)
 
     # ------------------------------------------------------------------------------#
 
-    def _export_vtk_1d(self, gs):
-        """
-        Export the geometrical data (point coordinates) and connectivity
-        information from the 1d PorePy grids to vtk.
-        """
-        gVTK = vtk.vtkUnstructuredGrid()
-        ptsVTK = vtk.vtkPoints()
-
-        ptsId_global = 0
-        for g in gs:
-            cell_nodes = g.cell_nodes()
-            nodes, cells, _ = sps.find(cell_nodes)
-
-            for c in np.arange(g.num_cells):
-                loc = slice(cell_nodes.indptr[c], cell_nodes.indptr[c + 1])
-                ptsId = nodes[loc] + ptsId_global
-                fsVTK = vtk.vtkIdList()
-                [fsVTK.InsertNextId(p) for p in ptsId]
-                gVTK.InsertNextCell(vtk.VTK_LINE, fsVTK)
-
-            ptsId_global += g.num_nodes
-            [ptsVTK.InsertNextPoint(*node) for node in g.nodes.T]
-
-        gVTK.SetPoints(ptsVTK)
-
-        return gVTK
-
-    # ------------------------------------------------------------------------------#
-
-    def _export_vtk_2d(self, gs):
-        """
-        Export the geometrical data (point coordinates) and connectivity
-        information from the 2d PorePy grids to vtk.
-        """
-        gVTK = vtk.vtkUnstructuredGrid()
-        ptsVTK = vtk.vtkPoints()
-
-        ptsId_global = 0
-        for g in gs:
-            faces_cells, _, _ = sps.find(g.cell_faces)
-            nodes_faces, _, _ = sps.find(g.face_nodes)
-
-            for c in np.arange(g.num_cells):
-                loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-                ptsId = np.array(
-                    [
-                        nodes_faces[g.face_nodes.indptr[f] : g.face_nodes.indptr[f + 1]]
-                        for f in faces_cells[loc]
-                    ]
-                ).T
-                ptsId = (
-                    pp.utils.sort_points.sort_point_pairs(ptsId)[0, :] + ptsId_global
-                )
-
-                fsVTK = vtk.vtkIdList()
-                [fsVTK.InsertNextId(p) for p in ptsId]
-
-                gVTK.InsertNextCell(vtk.VTK_POLYGON, fsVTK)
-
-            ptsId_global += g.num_nodes
-            [ptsVTK.InsertNextPoint(*node) for node in g.nodes.T]
-
-        gVTK.SetPoints(ptsVTK)
-
-        return gVTK
-
-    # ------------------------------------------------------------------------------#
-
-    def _export_vtk_3d(self, gs):
-        """
-        Export the geometrical data (point coordinates) and connectivity
-        information from the 3d PorePy grids to vtk.
-        """
-        # This functionality became rather complex, with possible use of numba.
-        # Decided to dump this to a separate file.
-        return self._define_gvtk_3d(gs)
+    def _write_vtk(self, fields, name, g_VTK):
+        if self.time_series:
+            self._write_time_step(fields, name, g_VTK)
+            return
 
-    # ------------------------------------------------------------------------------#
+        if self.is_not_vtk:
+            _write_vtu(g_VTK, fields, name, self.binary)
+            return
 
-    def _write_vtk(self, fields, name, g_VTK):
         writer = vtk.vtkXMLUnstructuredGridWriter()
         writer.SetInputData(g_VTK)
         writer.SetFileName(name)
@@ -631,6 +590,139 @@ class Exporter:
 
     # ------------------------------------------------------------------------------#
 
+    def _write_time_step(self, fields, name, cells):
+        """
+        Append the data of a grid to the data file of the time series. The mesh
+        is written to the mesh file only the first time the grid is exported.
+        """
+        mesh_file = self._series_name + "_mesh.bin"
+        data_file = self._series_name + "_data.bin"
+
+        key = id(cells)
+        if key not in self._series_meshes:
+            topology = _xdmf_topology(cells)
+            points = np.ascontiguousarray(cells.points.T, dtype=np.float64)
+            self._series_meshes[key] = (
+                cells,
+                topology.size,
+                self._append_to_file(mesh_file, topology),
+                self._append_to_file(mesh_file, points),
+            )
+
+        data = []
+        if fields is not None:
+            for field in fields:
+                if field.values is None:
+                    continue
+                kind = field.values.dtype.kind
+                values = field.values.astype(_XDMF_TYPES[kind][2])
+                offset = self._append_to_file(data_file, values)
+                data.append(
+                    (
+                        field.name,
+                        field.cell_data,
+                        field.num_components,
+                        values.size,
+                        kind,
+                        offset,
+                    )
+                )
+
+        grid_name = os.path.splitext(os.path.basename(name))[0]
+        self._series_steps[-1][1].append((grid_name, key, data))
+
+    # ------------------------------------------------------------------------------#
+
+    def _append_to_file(self, file_name, values):
+        """
+        Append the values to a binary file of the time series, and return the
+        position where they are written. Files are overwritten the first time.
+        """
+        offset = self._series_bytes.get(file_name, 0)
+        with open(file_name, "ab" if offset > 0 else "wb") as o_file:
+            o_file.write(np.ascontiguousarray(values).tobytes())
+        self._series_bytes[file_name] = offset + values.nbytes
+        return offset
+
+    # ------------------------------------------------------------------------------#
+
+    def _write_xdmf_step(self):
+        """
+        Add the last time step to the xdmf file of the time series. Only the
+        new step is written, the previous content of the file is kept.
+        """
+        if len(self._series_steps) == 1:
+            self._write_xdmf()
+            return
+
+        # overwrite the footer with the new step, followed by the footer
+        step = self._xdmf_step(*self._series_steps[-1]) + _XDMF_FOOTER
+        with open(self._series_name + ".xdmf", "r+b") as o_file:
+            o_file.seek(-len(_XDMF_FOOTER), os.SEEK_END)
+            o_file.write(step.encode())
+
+    # ------------------------------------------------------------------------------#
+
+    def _write_xdmf(self, time=None):
+        """
+        Write the xdmf file of the time series. If time is given, the time of
+        each step is given by its time step index in time, otherwise the time
+        step index itself is used.
+        """
+        header = (
+            '<?xml version="1.0"?>\n'
+            + '<Xdmf Version="3.0">\n'
+            + "  <Domain>\n"
+            + '    <Grid Name="%s" ' % self.name
+            + 'GridType="Collection" CollectionType="Temporal">\n'
+        )
+        with open(self._series_name + ".xdmf", "w") as o_file:
+            o_file.write(header)
+            for time_step, grids in self._series_steps:
+                t = time_step if time is None else time[time_step]
+                o_file.write(self._xdmf_step(t, grids))
+            o_file.write(_XDMF_FOOTER)
+
+    # ------------------------------------------------------------------------------#
+
+    def _xdmf_step(self, time, grids):
+        """
+        Xdmf description of a time step, as a collection of grids.
+        """
+        mesh_file = os.path.basename(self._series_name + "_mesh.bin")
+        data_file = os.path.basename(self._series_name + "_data.bin")
+
+        s = '      <Grid GridType="Collection" CollectionType="Spatial">\n'
+        s += '        <Time Value="%.16g"/>\n' % time
+        for grid_name, key, data in grids:
+            mesh = self._series_meshes[key]
+            cells, topology_size, topology_offset, points_offset = mesh
+            s += '        <Grid Name="%s" GridType="Uniform">\n' % grid_name
+            s += '          <Topology TopologyType="Mixed" '
+            s += 'NumberOfElements="%d">\n' % cells.num_cells
+            s += _xdmf_data_item(str(topology_size), "i", mesh_file, topology_offset)
+            s += "          </Topology>\n"
+            s += '          <Geometry GeometryType="XYZ">\n'
+            num_points = cells.points.shape[1]
+            s += _xdmf_data_item("%d 3" % num_points, "f", mesh_file, points_offset)
+            s += "          </Geometry>\n"
+
+            for name, cell_data, num_components, size, kind, offset in data:
+                if num_components == 1:
+                    attribute_type, dims = "Scalar", str(size)
+                else:
+                    attribute_type = "Vector"
+                    dims = "%d %d" % (size // num_components, num_components)
+                s += '          <Attribute Name="%s" ' % name
+                s += 'AttributeType="%s" ' % attribute_type
+                s += 'Center="%s">\n' % ("Cell" if cell_data else "Node")
+                s += _xdmf_data_item(dims, kind, data_file, offset)
+                s += "          </Attribute>\n"
+            s += "        </Grid>\n"
+        return s + "      </Grid>\n"
+
+    # ------------------------------------------------------------------------------#
+
     def _update_gb_VTK(self):
         if self.is_GridBucket:
             for dim in self.dims:
@@ -693,235 +785,433 @@ class Exporter:
 
     # ------------------------------------------------------------------------------#
 
-    def _define_gvtk_3d(self, gs):
-        # NOTE: we are assuming only one 3d grid
-        gVTK = vtk.vtkUnstructuredGrid()
-        ptsVTK = vtk.vtkPoints()
-
-        ptsId_global = 0
-        for g in gs:
-            faces_cells, cells, _ = sps.find(g.cell_faces)
-            nodes_faces, faces, _ = sps.find(g.face_nodes)
-
-            cptr = g.cell_faces.indptr
-            fptr = g.face_nodes.indptr
-            face_per_cell = np.diff(cptr)
-            nodes_per_face = np.diff(fptr)
-
-            # Total number of nodes to be written in the face-node relation
-            num_cell_nodes = np.array([nodes_per_face[i] for i in g.cell_faces.indices])
-
-            n = g.nodes
-            fc = g.face_centers
-            normal_vec = g.face_normals / g.face_areas
-
-            # Use numba if available, unless the problem is very small, in which
-            # case the pure python version probably is faster than combined compile
-            # and runtime for numba
-            # The number 1000 here is somewhat random.
-            if self.has_numba and g.num_cells > 1000:
-                logger.info("Construct 3d grid information using numba")
-                cell_nodes = _point_ind_numba(
-                    cptr,
-                    fptr,
-                    faces_cells,
-                    nodes_faces,
-                    n,
-                    fc,
-                    normal_vec,
-                    num_cell_nodes,
-                )
-            else:
-                logger.info("Construct 3d grid information using pure python")
-                cell_nodes = _point_ind(
-                    cptr,
-                    fptr,
-                    faces_cells,
-                    nodes_faces,
-                    n,
-                    fc,
-                    normal_vec,
-                    num_cell_nodes,
-                )
-            # implementation note: I did not even try feeding this to numba, my
-            # guess is that it will not like the vtk specific stuff.
-            node_counter = 0
-            face_counter = 0
-            for c in np.arange(g.num_cells):
-                if self.simplicial:
-                    loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
-                    ptsId = np.array(
-                        [
-                            nodes_faces[
-                                g.face_nodes.indptr[f] : g.face_nodes.indptr[f + 1]
-                            ]
-                            for f in faces_cells[loc]
-                        ]
-                    ).T
-                    ptsId = np.unique(ptsId)
-                    fsVTK = vtk.vtkIdList()
-                    [fsVTK.InsertNextId(p) for p in ptsId]
-
-                    gVTK.InsertNextCell(vtk.VTK_TETRA, fsVTK)
-                else:
-                    fsVTK = vtk.vtkIdList()
-                    # Number faces that make up the cell
-                    fsVTK.InsertNextId(face_per_cell[c])
-                    for f in range(face_per_cell[c]):
-                        fi = g.cell_faces.indices[face_counter]
-                        fsVTK.InsertNextId(
-                            nodes_per_face[fi]
-                        )  # Number of points in face
-                        for ni in range(nodes_per_face[fi]):
-                            fsVTK.InsertNextId(cell_nodes[node_counter])
-                            node_counter += 1
-                        face_counter += 1
-
-                    gVTK.InsertNextCell(vtk.VTK_POLYHEDRON, fsVTK)
-
-            [ptsVTK.InsertNextPoint(*node) for node in g.nodes.T]
-
-        gVTK.SetPoints(ptsVTK)
-
-        return gVTK
-
-
-def _point_ind(
-    cell_ptr, face_ptr, face_cells, nodes_faces, nodes, fc, normals, num_cell_nodes
-):
-    cell_nodes = np.zeros(num_cell_nodes.sum(), dtype=np.int)
-    counter = 0
-    for ci in range(cell_ptr.size - 1):
-        loc_c = slice(cell_ptr[ci], cell_ptr[ci + 1])
-
-        for fi in face_cells[loc_c]:
-            loc_f = slice(face_ptr[fi], face_ptr[fi + 1])
-            ptsId = nodes_faces[loc_f]
-            num_p_loc = ptsId.size
-            nodes_loc = nodes[:, ptsId]
-            # Sort points. Cut-down version of
-            # sort_points.sort_points_plane() and subfunctions
-            reference = np.array([0.0, 0.0, 1])
-            angle = np.arccos(np.dot(normals[:, fi], reference))
-            vect = np.cross(normals[:, fi], reference)
-            # Cut-down version of cg.rot()
-            W = np.array(
-                [
-                    [0.0, -vect[2], vect[1]],
-                    [vect[2], 0.0, -vect[0]],
-                    [-vect[1], vect[0], 0.0],
-                ]
-            )
-            R = (
-                np.identity(3)
-                + np.sin(angle) * W
-                + (1.0 - np.cos(angle)) * np.linalg.matrix_power(W, 2)
-            )
-            # pts is now a npt x 3 matrix
-            pts = np.array([R.dot(nodes_loc[:, i]) for i in range(nodes_loc.shape[1])])
-            center = R.dot(fc[:, fi])
-            # Distance from projected points to center
-            delta = np.array([pts[i] - center for i in range(pts.shape[0])])[:, :2]
-            nrm = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
-            delta = delta / nrm[:, np.newaxis]
 
-            argsort = np.argsort(np.arctan2(delta[:, 0], delta[:, 1]))
-            cell_nodes[counter : (counter + num_p_loc)] = ptsId[argsort]
-            counter += num_p_loc
 
-    return cell_nodes
 
+# Cell types of the vtu format
+_VTK_LINE = 3
+_VTK_POLYGON = 7
+_VTK_TETRA = 10
+_VTK_POLYHEDRON = 42
+
+
+class _GridCells(object):
+    """
+    Internal class to store the geometry and connectivity of a set of grids
+    as flat arrays, following the layout of the vtu format.
+    """
+
+    def __init__(self, points, types, connectivity, offsets, faces, face_offsets):
+        # point coordinates, 3 x num_points
+        self.points = points
+        # vtk cell type of each cell
+        self.types = types
+        # point ids of the cells and end offset of each cell in connectivity
+        self.connectivity = connectivity
+        self.offsets = offsets
+        # face stream of polyhedral cells, and the end offset of each cell in
+        # faces (-1 for cells which are not polyhedra). Both are None if there
+        # are no polyhedral cells.
+        self.faces = faces
+        self.face_offsets = face_offsets
+
+    @property
+    def num_cells(self):
+        return self.types.size
+
+
+# Cell types of the xdmf format, indexed by the vtk cell types
+_XDMF_CELL_TYPES = np.zeros(_VTK_POLYHEDRON + 1, dtype=np.int64)
+_XDMF_CELL_TYPES[[_VTK_LINE, _VTK_POLYGON, _VTK_TETRA, _VTK_POLYHEDRON]] = [2, 3, 6, 16]
+
+# map numpy to xdmf types
+_XDMF_TYPES = {
+    "b": ("UChar", 1, np.uint8),
+    "i": ("Int", 8, np.int64),
+    "u": ("Int", 8, np.int64),
+    "f": ("Float", 8, np.float64),
+}
+
+_XDMF_FOOTER = "    </Grid>\n  </Domain>\n</Xdmf>\n"
+
+# ------------------------------------------------------------------------------#
+
+
+def _sorted_csc(mat):
+    """
+    Return a csc copy of mat with sorted indices, so that the entries of each
+    column are ordered as in sps.find.
+    """
+    mat = sps.csc_matrix(mat, copy=True)
+    mat.sort_indices()
+    return mat
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _grid_cells(gs, dim, simplicial=False):
+    """
+    Compute the points and cell connectivity of a set of grids of the same
+    dimension. The points of the grids are stacked, and the point ids shifted
+    accordingly.
 
-if "numba" in sys.modules:
+    Parameters:
+        gs: list of grids, all of dimension dim.
+        dim: dimension of the grids, 1, 2 or 3.
+        simplicial: if True, 3d cells are represented as tetrahedra.
 
-    @numba.jit(
-        "i4[:](i4[:],i4[:],i4[:],i4[:],f8[:,:],f8[:,:],f8[:,:],i4[:])",
-        nopython=True,
-        nogil=False,
+    Returns:
+        _GridCells: the geometry and connectivity of the grids.
+    """
+    points, types, conn, offsets, faces, face_offsets = [], [], [], [], [], []
+    num_points = 0
+    num_conn = 0
+    num_faces = 0
+    for g in gs:
+        if dim == 1:
+            t, c, o = _cells_1d(g)
+        elif dim == 2:
+            t, c, o = _cells_2d(g)
+        else:
+            t, c, o, f, fo = _cells_3d(g, num_points, simplicial)
+            if f is not None:
+                faces.append(f)
+                face_offsets.append(fo + num_faces)
+                num_faces += f.size
+
+        points.append(g.nodes)
+        types.append(t)
+        conn.append(c + num_points)
+        offsets.append(o + num_conn)
+
+        num_points += g.num_nodes
+        num_conn += c.size
+
+    if len(faces) > 0:
+        faces = np.hstack(faces)
+        face_offsets = np.hstack(face_offsets)
+    else:
+        faces = face_offsets = None
+
+    return _GridCells(
+        np.hstack(points),
+        np.hstack(types).astype(np.uint8),
+        np.hstack(conn).astype(np.int64),
+        np.hstack(offsets).astype(np.int64),
+        faces,
+        face_offsets,
     )
-    def _point_ind_numba(
-        cell_ptr, face_ptr, faces_cells, nodes_faces, nodes, fc, normals, num_cell_nodes
-    ):
-        """ Implementation note: This turned out to be less than pretty, and quite
-        a bit more explicit than the corresponding pure python implementation.
-        The process was basically to circumvent whatever statements numba did not
-        like. Not sure about why this ended so, but there you go.
-        """
-        cell_nodes = np.zeros(num_cell_nodes.sum(), dtype=np.int32)
-        counter = 0
-        fc.astype(np.float64)
-        for ci in range(cell_ptr.size - 1):
-            loc_c = slice(cell_ptr[ci], cell_ptr[ci + 1])
-            for fi in faces_cells[loc_c]:
-                loc_f = np.arange(face_ptr[fi], face_ptr[fi + 1])
-                ptsId = nodes_faces[loc_f]
-                num_p_loc = ptsId.size
-                nodes_loc = np.zeros((3, num_p_loc))
-                for iter1 in range(num_p_loc):
-                    nodes_loc[:, iter1] = nodes[:, ptsId[iter1]]
-                #            # Sort points. Cut-down version of
-                #            # sort_points.sort_points_plane() and subfunctions
-                reference = np.array([0.0, 0.0, 1])
-                angle = np.arccos(np.dot(normals[:, fi], reference))
-                # Hand code cross product, not supported by current numba version
-                vect = np.array(
-                    [
-                        normals[1, fi] * reference[2] - normals[2, fi] * reference[1],
-                        normals[2, fi] * reference[0] - normals[0, fi] * reference[2],
-                        normals[0, fi] * reference[1] - normals[1, fi] * reference[0],
-                    ],
-                    dtype=np.float64,
-                )
-                ##            # Cut-down version of cg.rot()
-                W = np.array(
-                    [
-                        0.0,
-                        -vect[2],
-                        vect[1],
-                        vect[2],
-                        0.0,
-                        -vect[0],
-                        -vect[1],
-                        vect[0],
-                        0.0,
-                    ]
-                ).reshape((3, 3))
-                R = (
-                    np.identity(3)
-                    + np.sin(angle) * W.reshape((3, 3))
-                    + (
-                        (1.0 - np.cos(angle)) * np.linalg.matrix_power(W, 2).ravel()
-                    ).reshape((3, 3))
-                )
-                ##            # pts is now a npt x 3 matrix
-                num_p = nodes_loc.shape[1]
-                pts = np.zeros((3, num_p))
-                fc_loc = fc[:, fi]
-                center = np.zeros(3)
-                for i in range(3):
-                    center[i] = (
-                        R[i, 0] * fc_loc[0] + R[i, 1] * fc_loc[1] + R[i, 2] * fc_loc[2]
-                    )
-                for i in range(num_p):
-                    for j in range(3):
-                        pts[j, i] = (
-                            R[j, 0] * nodes_loc[0, i]
-                            + R[j, 1] * nodes_loc[1, i]
-                            + +R[j, 2] * nodes_loc[2, i]
-                        )
-                ##            # Distance from projected points to center
-                delta = 0 * pts
-                for i in range(num_p):
-                    delta[:, i] = pts[:, i] - center
-                nrm = np.sqrt(delta[0] ** 2 + delta[1] ** 2)
-                for i in range(num_p):
-                    delta[:, i] = delta[:, i] / nrm[i]
-                ##
-                argsort = np.argsort(np.arctan2(delta[0], delta[1]))
-                cell_nodes[counter : (counter + num_p_loc)] = ptsId[argsort]
-                counter += num_p_loc
-
-        return cell_nodes
 
 
 # ------------------------------------------------------------------------------#
+
+
+def _cells_1d(g):
+    """
+    Connectivity of a 1d grid, represented by lines.
+    """
+    cell_nodes = _sorted_csc(g.cell_nodes())
+    types = _VTK_LINE * np.ones(g.num_cells, dtype=np.uint8)
+    return types, cell_nodes.indices, cell_nodes.indptr[1:]
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _cells_2d(g):
+    """
+    Connectivity of a 2d grid, represented by polygons. The nodes of each cell
+    are ordered by walking along the boundary of the cell, starting from the
+    first face of the cell.
+    """
+    cell_faces = _sorted_csc(g.cell_faces)
+    face_nodes = _sorted_csc(g.face_nodes)
+
+    faces = cell_faces.indices
+    cells = np.repeat(np.arange(g.num_cells), np.diff(cell_faces.indptr))
+    first = face_nodes.indices[face_nodes.indptr[faces]]
+    second = face_nodes.indices[face_nodes.indptr[faces] + 1]
+
+    # For each pair (cell, node), store the two neighbouring nodes of the node
+    # in the boundary of the cell
+    keys = np.hstack((cells, cells)) * g.num_nodes + np.hstack((first, second))
+    order = np.argsort(keys, kind="mergesort")
+    keys = keys[order][::2]
+    neighs = np.hstack((second, first))[order].reshape((-1, 2))
+
+    num_faces = np.diff(cell_faces.indptr)
+    start = cell_faces.indptr[:-1]
+    # Walk along the boundary of all the cells at the same time
+    connectivity = np.empty(faces.size, dtype=np.int64)
+    prev, curr = first[start], second[start]
+    connectivity[start] = prev
+    for step in range(1, np.hstack((0, num_faces)).max()):
+        active = num_faces > step
+        connectivity[start[active] + step] = curr[active]
+        ind = np.searchsorted(keys, np.arange(g.num_cells) * g.num_nodes + curr)
+        neigh = neighs[ind]
+        prev, curr = curr, np.where(neigh[:, 0] == prev, neigh[:, 1], neigh[:, 0])
+
+    types = _VTK_POLYGON * np.ones(g.num_cells, dtype=np.uint8)
+    return types, connectivity, cell_faces.indptr[1:]
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _cells_3d(g, point_offset=0, simplicial=False):
+    """
+    Connectivity of a 3d grid, represented by tetrahedra if simplicial, and by
+    polyhedra otherwise. For polyhedra also the face stream is returned, where
+    the nodes of each face are sorted counter-clockwise with respect to the
+    face normal.
+    """
+    cell_faces = _sorted_csc(g.cell_faces)
+    face_nodes = _sorted_csc(g.face_nodes)
+
+    # The points of a cell are its unique nodes, in increasing order
+    cell_nodes = _sorted_csc(g.cell_nodes())
+    connectivity = cell_nodes.indices
+    offsets = cell_nodes.indptr[1:]
+
+    if simplicial:
+        types = _VTK_TETRA * np.ones(g.num_cells, dtype=np.uint8)
+        return types, connectivity, offsets, None, None
+    types = _VTK_POLYHEDRON * np.ones(g.num_cells, dtype=np.uint8)
+
+    # Sort the nodes of each face: rotate the face to the xy-plane and order
+    # the nodes by their angle around the face center
+    nodes_per_face = np.diff(face_nodes.indptr)
+    face_of = np.repeat(np.arange(g.num_faces), nodes_per_face)
+    normals = g.face_normals / g.face_areas
+    angle = np.arccos(normals[2])
+    # Rotation matrices around the vector normal x (0, 0, 1)
+    W = np.zeros((g.num_faces, 3, 3))
+    W[:, 0, 2] = -normals[0]
+    W[:, 1, 2] = -normals[1]
+    W[:, 2, 0] = normals[0]
+    W[:, 2, 1] = normals[1]
+    R = (
+        np.identity(3)
+        + np.sin(angle)[:, np.newaxis, np.newaxis] * W
+        + (1.0 - np.cos(angle))[:, np.newaxis, np.newaxis]
+        * np.einsum("fij,fjk->fik", W, W)
+    )
+    R = R[face_of]
+    pts = np.einsum("nij,jn->ni", R, g.nodes[:, face_nodes.indices])
+    center = np.einsum("nij,jn->ni", R, g.face_centers[:, face_of])
+    delta = pts - center
+    order = np.lexsort((np.arctan2(delta[:, 0], delta[:, 1]), face_of))
+    sorted_nodes = face_nodes.indices[order] + point_offset
+
+    # Face stream of each cell: [num_faces, num_nodes, nodes, num_nodes, ...]
+    faces = cell_faces.indices
+    cells = np.repeat(np.arange(g.num_cells), np.diff(cell_faces.indptr))
+    entry_size = 1 + nodes_per_face[faces]
+    entry_start = np.cumsum(entry_size) - entry_size + cells + 1
+    cell_size = 1 + np.bincount(cells, weights=entry_size, minlength=g.num_cells)
+    cell_size = cell_size.astype(np.int64)
+    cell_end = np.cumsum(cell_size)
+
+    stream = np.empty(cell_size.sum(), dtype=np.int64)
+    stream[cell_end - cell_size] = np.diff(cell_faces.indptr)
+    stream[entry_start] = nodes_per_face[faces]
+    stream[mcolon(entry_start + 1, entry_start + entry_size)] = sorted_nodes[
+        mcolon(face_nodes.indptr[faces], face_nodes.indptr[faces + 1])
+    ]
+
+    return types, connectivity, offsets, stream, cell_end
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _vtk_unstructured_grid(cells):
+    """
+    Convert the arrays of _GridCells to a vtk unstructured grid. The arrays
+    are passed to vtk in bulk, without copying where the data types agree.
+    """
+    gVTK = vtk.vtkUnstructuredGrid()
+
+    # vtk stores the points in single precision by default
+    ptsVTK = vtk.vtkPoints()
+    points = np.ascontiguousarray(cells.points.T, dtype=np.float32)
+    ptsVTK.SetData(ns.numpy_to_vtk(points, deep=False))
+    gVTK.SetPoints(ptsVTK)
+
+    # The vtk cell array stores, for each cell, the number of points followed
+    # by the point ids
+    num_cells = cells.num_cells
+    sizes = np.diff(np.hstack((0, cells.offsets)))
+    locations = cells.offsets - sizes + np.arange(num_cells)
+    cell_array = np.empty(cells.connectivity.size + num_cells, dtype=ns.ID_TYPE_CODE)
+    is_size = np.zeros(cell_array.size, dtype=np.bool)
+    is_size[locations] = True
+    cell_array[is_size] = sizes
+    cell_array[~is_size] = cells.connectivity
+
+    cellsVTK = vtk.vtkCellArray()
+    cellsVTK.SetCells(num_cells, ns.numpy_to_vtkIdTypeArray(cell_array, deep=False))
+    typesVTK = ns.numpy_to_vtk(
+        cells.types, deep=False, array_type=vtk.VTK_UNSIGNED_CHAR
+    )
+    locationsVTK = ns.numpy_to_vtkIdTypeArray(
+        locations.astype(ns.ID_TYPE_CODE), deep=False
+    )
+
+    if cells.faces is None:
+        gVTK.SetCells(typesVTK, locationsVTK, cellsVTK)
+    else:
+        face_sizes = np.diff(np.hstack((0, cells.face_offsets)))
+        face_locations = (cells.face_offsets - face_sizes).astype(ns.ID_TYPE_CODE)
+        gVTK.SetCells(
+            typesVTK,
+            locationsVTK,
+            cellsVTK,
+            ns.numpy_to_vtkIdTypeArray(face_locations, deep=False),
+            ns.numpy_to_vtkIdTypeArray(
+                cells.faces.astype(ns.ID_TYPE_CODE), deep=False
+            ),
+        )
+
+    return gVTK
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _write_vtu(cells, fields, file_name, binary=True):
+    """
+    Write a vtu file without the vtk module.
+
+    Parameters:
+        cells (_GridCells): geometry and connectivity of the grids.
+        fields (Fields): cell or point data to export, can be None.
+        file_name (str): name of the file.
+        binary (bool): if True the data are written as raw binary appended
+            data, otherwise in ascii format.
+    """
+    # map numpy to vtu types
+    map_type = {"b": ("UInt8", np.uint8), "i": ("Int64", np.int64)}
+    map_type["u"] = map_type["i"]
+    map_type["f"] = ("Float64", np.float64)
+
+    def data_array(name, values, num_components=1):
+        vtu_type, dtype = map_type[values.dtype.kind]
+        return name, vtu_type, num_components, values.astype(dtype, copy=False)
+
+    point_data, cell_data = [], []
+    if fields is not None:
+        for field in fields:
+            if field.values is None:
+                continue
+            array = data_array(field.name, field.values, field.num_components)
+            if field.cell_data:
+                cell_data.append(array)
+            elif field.point_data:
+                point_data.append(array)
+
+    points = [data_array("Points", cells.points.ravel(order="F"), 3)]
+    cell_arrays = [
+        data_array("connectivity", cells.connectivity),
+        data_array("offsets", cells.offsets),
+        ("types", "UInt8", 1, cells.types.astype(np.uint8)),
+    ]
+    if cells.faces is not None:
+        cell_arrays.append(data_array("faces", cells.faces))
+        cell_arrays.append(data_array("faceoffsets", cells.face_offsets))
+
+    byte_order = "LittleEndian" if sys.byteorder == "little" else "BigEndian"
+    appended = []
+    offset = 0
+
+    def write_section(o_file, section, arrays):
+        nonlocal offset
+        o_file.write(("      <%s>\n" % section).encode())
+        for name, vtu_type, num_components, values in arrays:
+            header = '        <DataArray type="%s" Name="%s" NumberOfComponents="%d"'
+            header = header % (vtu_type, name, num_components)
+            if binary:
+                header += ' format="appended" offset="%d"/>\n' % offset
+                o_file.write(header.encode())
+                appended.append(values)
+                offset += 8 + values.nbytes
+            else:
+                o_file.write((header + ' format="ascii">\n').encode())
+                fmt = "%.16g" if vtu_type == "Float64" else "%d"
+                o_file.write(b"          ")
+                np.savetxt(o_file, values[np.newaxis], fmt=fmt)
+                o_file.write(b"        </DataArray>\n")
+        o_file.write(("      </%s>\n" % section).encode())
+
+    with open(file_name, "wb") as o_file:
+        o_file.write(
+            (
+                '<?xml version="1.0"?>\n'
+                + '<VTKFile type="UnstructuredGrid" version="1.0" '
+                + 'byte_order="%s" header_type="UInt64">\n' % byte_order
+                + "  <UnstructuredGrid>\n"
+                + '    <Piece NumberOfPoints="%d" ' % cells.points.shape[1]
+                + 'NumberOfCells="%d">\n' % cells.num_cells
+            ).encode()
+        )
+        write_section(o_file, "PointData", point_data)
+        write_section(o_file, "CellData", cell_data)
+        write_section(o_file, "Points", points)
+        write_section(o_file, "Cells", cell_arrays)
+        o_file.write(b"    </Piece>\n  </UnstructuredGrid>\n")
+
+        if binary:
+            o_file.write(b'  <AppendedData encoding="raw">\n   _')
+            for values in appended:
+                o_file.write(np.uint64(values.nbytes).tobytes())
+                o_file.write(np.ascontiguousarray(values).tobytes())
+            o_file.write(b"\n  </AppendedData>\n")
+        o_file.write(b"</VTKFile>\n")
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _xdmf_topology(cells):
+    """
+    Mixed topology of the xdmf format. Each cell is given by its cell type,
+    followed by the number of points for lines and polygons, and then by its
+    point ids. Polyhedra are followed by their face stream instead.
+    """
+    if cells.faces is None:
+        body, body_end = cells.connectivity, cells.offsets
+    else:
+        body, body_end = cells.faces, cells.face_offsets
+    body_size = np.diff(np.hstack((0, body_end)))
+    body_start = body_end - body_size
+
+    with_size = np.logical_or(cells.types == _VTK_LINE, cells.types == _VTK_POLYGON)
+    head_size = 1 + with_size
+    size = head_size + body_size
+    start = np.cumsum(size) - size
+
+    topology = np.empty(size.sum(), dtype=np.int64)
+    topology[start] = _XDMF_CELL_TYPES[cells.types]
+    topology[start[with_size] + 1] = body_size[with_size]
+    topology[mcolon(start + head_size, start + size)] = body[
+        mcolon(body_start, body_end)
+    ]
+    return topology
+
+
+# ------------------------------------------------------------------------------#
+
+
+def _xdmf_data_item(dims, kind, file_name, offset):
+    """
+    Xdmf data item for an array stored in a raw binary file.
+    """
+    number_type, precision, _ = _XDMF_TYPES[kind]
+    endian = "Little" if sys.byteorder == "little" else "Big"
+    return (
+        '            <DataItem Dimensions="%s" NumberType="%s" ' % (dims, number_type)
+        + 'Precision="%d" Format="Binary" Endian="%s" ' % (precision, endian)
+        + 'Seek="%d">%s</DataItem>\n' % (offset, file_name)
+    )
@@ -543,6 +543,20 @@ class BasicsTest(unittest.TestCase):
 
     # ------------------------------------------------------------------------------#
 
+    def test_create_partition_2d_cart_heterogeneous(self):
+        g = pp.CartGrid([6, 6])
+        g.compute_geometry()
+        kxx = np.power(10.0, np.arange(g.num_cells) % 5 - 2)
+        A = co.tpfa_matrix(g, pp.SecondOrderTensor(g.dim, kxx))
+        part = co.create_partition(A, epsilon=0.5)
+        known = np.array(
+            [3, 0, 0, 0, 0, 2, 3, 1, 1, 0, 2, 2, 3, 3, 1, 2, 2, 2]
+            + [3, 3, 5, 5, 2, 2, 3, 5, 5, 5, 4, 2, 5, 5, 5, 5, 5, 5]
+        )
+        self.assertTrue(np.array_equal(part, known))
+
+    # ------------------------------------------------------------------------------#
+
     def test_create_partition_2d_tri(self):
         g = pp.StructuredTriangleGrid([3, 2])
         g.compute_geometry()
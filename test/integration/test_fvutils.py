@@ -1,6 +1,8 @@
 import numpy as np
 import scipy.sparse as sps
+import sys
 import unittest
+from unittest import mock
 import porepy as pp
 from porepy.numerics.fv import fvutils
 
@@ -131,6 +133,65 @@ class TestFvutils(unittest.TestCase):
                 # may change in the future.
                 pass
 
+    def test_block_matrix_inverters_mixed_block_sizes(self):
+        """
+        Invert a block diagonal matrix with blocks of size 1 to 5, appearing in
+        random order, and with several blocks of each size. This covers both
+        the explicit formulas for small blocks and the batched inversion of
+        larger blocks in the numba inverter.
+        """
+        np.random.seed(0)
+        sz = np.random.randint(1, 6, 40).astype("i8")
+        # Diagonally dominant blocks, to avoid ill-conditioned matrices
+        blocks = [np.random.rand(n, n) + n * np.eye(n) for n in sz]
+        block = sps.block_diag(blocks, format="csr")
+        identity = np.eye(block.shape[0])
+
+        def compare(iblock):
+            # Compare the inverse block by block, and check that it is an
+            # inverse of the full matrix
+            iblock = iblock.toarray()
+            start = 0
+            for n, b in zip(sz, blocks):
+                loc = iblock[start : start + n, start : start + n]
+                self.assertTrue(np.allclose(loc, np.linalg.inv(b)))
+                start += n
+            self.assertTrue(np.allclose(block * iblock, identity))
+
+        compare(fvutils.invert_diagonal_blocks(block, sz, method="python"))
+
+        try:
+            import numba
+        except ImportError:
+            return
+        compare(fvutils.invert_diagonal_blocks(block, sz, method="numba"))
+
+    def test_block_matrix_inverter_fallback(self):
+        """
+        Without numba and the compiled cython module, the default inverter
+        should fall back on python, while an explicit request for cython
+        should give an ImportError.
+        """
+        try:
+            import porepy.numerics.fv.cythoninvert
+        except ImportError:
+            pass
+        else:
+            return
+
+        block = sps.csr_matrix(np.array([[2, 1, 0], [1, 3, 0], [0, 0, 4]]))
+        sz = np.array([2, 1], dtype="i8")
+        iblock_ex = np.linalg.inv(block.toarray())
+
+        # Hide numba from the numba inverter
+        with mock.patch.dict(sys.modules):
+            sys.modules.pop("numba", None)
+            iblock = fvutils.invert_diagonal_blocks(block, sz)
+        self.assertTrue(np.allclose(iblock.toarray(), iblock_ex))
+
+        with self.assertRaises(ImportError):
+            fvutils.invert_diagonal_blocks(block, sz, method="cython")
+
     def test_compute_darcy_flux_mono_grid(self):
         g = pp.CartGrid([1, 1])
         flux = sps.csc_matrix((4, 1))
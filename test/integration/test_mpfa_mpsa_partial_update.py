@@ -1,3 +1,5 @@
+import subprocess
+import sys
 import unittest
 import numpy as np
 import scipy.sparse as sps
@@ -6,6 +8,20 @@ import porepy as pp
 from porepy.numerics.fv import mpsa
 
 
+def _flow_bc(g, robin=False):
+    # Dirichlet conditions on half of the boundary, and Neumann or Robin
+    # conditions with random weights on the rest
+    bound_faces = g.get_all_boundary_faces()
+    cond = np.array(bound_faces.size * ["neu"])
+    if robin:
+        cond[bound_faces.size // 4 :] = "rob"
+    cond[: bound_faces.size // 2] = "dir"
+    bnd = pp.BoundaryCondition(g, bound_faces, cond)
+    if robin:
+        bnd.robin_weight = 1 + np.random.rand(g.num_faces)
+    return bnd
+
+
 class TestPartialMPFA(unittest.TestCase):
     def setup(self):
         g = pp.CartGrid([5, 5])
@@ -118,6 +134,137 @@ class TestPartialMPFA(unittest.TestCase):
         self.assertTrue((bound_flux - bound_flux_full).max() < 1e-8)
         self.assertTrue((bound_flux - bound_flux_full).min() > -1e-8)
 
+    def _compare_max_memory(self, g, robin=False):
+        # Discretize with a memory threshold that enforces a split into
+        # partitions, and compare with a discretization on the full grid.
+        np.random.seed(42)
+        kxx = np.random.random(g.num_cells)
+        kyy = np.random.random(g.num_cells)
+        # Ensure positive definiteness
+        kxy = np.random.random(g.num_cells) * kxx * kyy
+        perm = pp.SecondOrderTensor(2, kxx=kxx, kyy=kyy, kxy=kxy)
+
+        bnd = _flow_bc(g, robin)
+
+        discr = pp.Mpfa("flow")
+        full = discr.mpfa(g, perm, bnd, inverter="python")
+        max_memory = discr._estimate_peak_memory(g) / 5
+        split = discr.mpfa(g, perm, bnd, inverter="python", max_memory=max_memory)
+
+        for mat_full, mat_split in zip(full, split):
+            self.assertTrue(mat_full.shape == mat_split.shape)
+            self.assertTrue(np.allclose((mat_full - mat_split).data, 0))
+
+    def test_max_memory_cart_grid(self):
+        g = pp.CartGrid([6, 5])
+        g.compute_geometry()
+        self._compare_max_memory(g)
+
+    def test_max_memory_simplex_grid(self):
+        g = pp.StructuredTriangleGrid([5, 4])
+        g.compute_geometry()
+        self._compare_max_memory(g)
+
+    def test_max_memory_robin(self):
+        g = pp.CartGrid([7, 6])
+        g.compute_geometry()
+        self._compare_max_memory(g, robin=True)
+
+    def test_num_workers(self):
+        g = pp.CartGrid([4, 3, 3])
+        g.compute_geometry()
+        perm = pp.SecondOrderTensor(3, np.ones(g.num_cells))
+        bnd = pp.BoundaryCondition(g)
+
+        discr = pp.Mpfa("flow")
+        full = discr.mpfa(g, perm, bnd, inverter="python")
+        split = discr.mpfa(g, perm, bnd, inverter="python", num_workers=2)
+
+        for mat_full, mat_split in zip(full, split):
+            self.assertTrue(mat_full.shape == mat_split.shape)
+            self.assertTrue(np.allclose((mat_full - mat_split).data, 0))
+
+    def test_num_workers_robin(self):
+        g = pp.CartGrid([7, 6])
+        g.compute_geometry()
+        np.random.seed(42)
+        perm = pp.SecondOrderTensor(2, 1 + np.random.rand(g.num_cells))
+        bnd = _flow_bc(g, robin=True)
+
+        discr = pp.Mpfa("flow")
+        full = discr.mpfa(g, perm, bnd, inverter="python")
+        split = discr.mpfa(g, perm, bnd, inverter="python", num_workers=2)
+
+        for mat_full, mat_split in zip(full, split):
+            self.assertTrue(mat_full.shape == mat_split.shape)
+            self.assertTrue(np.allclose((mat_full - mat_split).data, 0))
+
+    def test_num_workers_after_serial_discretization(self):
+        # The workers are started after the default (numba) inverter has been
+        # used in this process, thus they are not forked from this process.
+        g = pp.CartGrid([6, 5])
+        g.compute_geometry()
+        perm = pp.SecondOrderTensor(2, np.ones(g.num_cells))
+        bnd = _flow_bc(g)
+
+        discr = pp.Mpfa("flow")
+        full = discr.mpfa(g, perm, bnd)
+        split = discr.mpfa(g, perm, bnd, num_workers=2)
+
+        for mat_full, mat_split in zip(full, split):
+            self.assertTrue(mat_full.shape == mat_split.shape)
+            self.assertTrue(np.allclose((mat_full - mat_split).data, 0))
+
+    def _compare_update(self, g, changed_cells, robin=False):
+        # Change the permeability in a few cells, update the discretization, and
+        # compare with a discretization from scratch.
+        np.random.seed(42)
+        kxx = 1 + np.random.rand(g.num_cells)
+        bnd = _flow_bc(g, robin)
+
+        def make_data(kxx):
+            d = {}
+            specified_parameters = {
+                "bc": bnd,
+                "second_order_tensor": pp.SecondOrderTensor(g.dim, kxx),
+                "mpfa_inverter": "python",
+            }
+            pp.initialize_default_data(g, d, "flow", specified_parameters)
+            return d
+
+        discr = pp.Mpfa("flow")
+        data = make_data(kxx)
+        discr.discretize(g, data)
+
+        kxx[changed_cells] *= 10
+        data[pp.PARAMETERS]["flow"]["second_order_tensor"] = pp.SecondOrderTensor(
+            g.dim, kxx
+        )
+        discr.update_discretization(g, data, changed_cells)
+
+        data_full = make_data(kxx)
+        discr.discretize(g, data_full)
+
+        matrices_full = data_full[pp.DISCRETIZATION_MATRICES]["flow"]
+        for key, mat in data[pp.DISCRETIZATION_MATRICES]["flow"].items():
+            self.assertTrue(np.allclose((mat - matrices_full[key]).data, 0))
+
+    def test_update_discretization(self):
+        g = pp.StructuredTriangleGrid([5, 4])
+        g.compute_geometry()
+        self._compare_update(g, np.array([4, 17]))
+
+    def test_update_discretization_robin(self):
+        # The changed cells are next to Robin faces
+        for g in [
+            pp.CartGrid([5, 4]),
+            pp.StructuredTriangleGrid([5, 4]),
+            pp.CartGrid([3, 3, 2]),
+        ]:
+            g.compute_geometry()
+            changed_cells = np.array([0, g.num_cells // 2, g.num_cells - 1])
+            self._compare_update(g, changed_cells, robin=True)
+
 
 class TestPartialMPSA(unittest.TestCase):
     def setup(self):
@@ -239,6 +386,107 @@ class TestPartialMPSA(unittest.TestCase):
         self.assertTrue((bound_stress - bound_stress_full).max() < 1e-8)
         self.assertTrue((bound_stress - bound_stress_full).min() > -1e-8)
 
+    def test_partitioned_discretization(self):
+        # Discretize on partitions, serially under a memory threshold and in
+        # parallel, and compare with a discretization on the full grid. The
+        # sub-face displacement reconstruction is also compared.
+        g = pp.CartGrid([3, 3, 3])
+        g.compute_geometry()
+        np.random.seed(42)
+        mu = 1 + np.random.rand(g.num_cells)
+        lmbda = 1 + np.random.rand(g.num_cells)
+        bound_faces = g.get_all_boundary_faces()
+        cond = np.array(bound_faces.size * ["neu"])
+        cond[: bound_faces.size // 2] = "dir"
+        bnd = pp.BoundaryConditionVectorial(g, bound_faces, cond)
+
+        # The third parameter phi should also be transferred to the partitions
+        for phi in [None, np.ones(g.num_cells)]:
+            stiffness = pp.FourthOrderTensor(g.dim, mu, lmbda, phi=phi)
+            full = mpsa.mpsa(g, stiffness, bnd, inverter="python")
+            max_memory = mpsa._estimate_peak_memory_mpsa(g) / 3
+            split_serial = mpsa.mpsa(
+                g, stiffness, bnd, inverter="python", max_memory=max_memory
+            )
+            split_parallel = mpsa.mpsa(
+                g, stiffness, bnd, inverter="python", num_workers=2
+            )
+
+            for split in [split_serial, split_parallel]:
+                for mat_full, mat_split in zip(full, split):
+                    self.assertTrue(mat_full.shape == mat_split.shape)
+                    self.assertTrue(np.allclose((mat_full - mat_split).data, 0))
+
+    def test_update_discretization(self):
+        # Change the stiffness in a few cells, update the discretization, and
+        # compare with a discretization from scratch.
+        g = pp.CartGrid([3, 3, 2])
+        g.compute_geometry()
+        np.random.seed(42)
+        mu = 1 + np.random.rand(g.num_cells)
+        lmbda = 1 + np.random.rand(g.num_cells)
+        bound_faces = g.get_all_boundary_faces()
+        cond = np.array(bound_faces.size * ["neu"])
+        cond[: bound_faces.size // 2] = "dir"
+        bnd = pp.BoundaryConditionVectorial(g, bound_faces, cond)
+
+        def make_data(mu):
+            d = {}
+            specified_parameters = {
+                "bc": bnd,
+                "fourth_order_tensor": pp.FourthOrderTensor(g.dim, mu, lmbda),
+                "inverter": "python",
+            }
+            pp.initialize_default_data(g, d, "mechanics", specified_parameters)
+            return d
+
+        discr = pp.Mpsa("mechanics")
+        data = make_data(mu)
+        discr.discretize(g, data)
+
+        changed_cells = np.array([0, 13])
+        mu[changed_cells] *= 10
+        data[pp.PARAMETERS]["mechanics"]["fourth_order_tensor"] = pp.FourthOrderTensor(
+            g.dim, mu, lmbda
+        )
+        discr.update_discretization(g, data, changed_cells)
+
+        data_full = make_data(mu)
+        discr.discretize(g, data_full)
+
+        matrices_full = data_full[pp.DISCRETIZATION_MATRICES]["mechanics"]
+        for key, mat in data[pp.DISCRETIZATION_MATRICES]["mechanics"].items():
+            self.assertTrue(np.allclose((mat - matrices_full[key]).data, 0))
+
+    def test_num_workers_process_exits(self):
+        # A pool of workers started after a serial discretization with the
+        # parallel numba kernels should not leave the process hanging. Run in a
+        # separate process, and check that it exits.
+        script = "\n".join(
+            [
+                "import numpy as np",
+                "import porepy as pp",
+                "g = pp.CartGrid([4, 4])",
+                "g.compute_geometry()",
+                "c = pp.FourthOrderTensor(2, np.ones(16), np.ones(16))",
+                "stress = []",
+                "for num_workers in [1, 2]:",
+                "    d = pp.initialize_default_data(g, {}, 'mechanics', ",
+                "        {'fourth_order_tensor': c, 'num_workers': num_workers})",
+                "    pp.Mpsa('mechanics').discretize(g, d)",
+                "    matrices = d[pp.DISCRETIZATION_MATRICES]['mechanics']",
+                "    stress.append(matrices['stress'])",
+                "assert np.allclose((stress[0] - stress[1]).data, 0)",
+            ]
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=300,
+        )
+        self.assertEqual(result.returncode, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
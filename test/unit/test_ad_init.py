@@ -3,8 +3,9 @@ import scipy.sparse as sps
 import unittest
 import warnings
 
-from porepy.ad.forward_mode import initAdArrays
+from porepy.ad.forward_mode import Ad_array, initAdArrays
 from porepy.ad import functions as af
+from porepy.ad import utils as au
 
 warnings.simplefilter("ignore", sps.SparseEfficiencyWarning)
 
@@ -119,3 +120,37 @@ class AdInitTest(unittest.TestCase):
             np.allclose(b.val, np.exp(c * val)) and np.allclose(b.jac.A, jac.A)
         )
         self.assertTrue(np.all(a.val == [1, 2, 3]) and np.all(a.jac.A == jac_a.A))
+
+    def test_block_jacobian_zero_blocks(self):
+        a, b = initAdArrays([np.array([1, 2, 3]), np.array([1, 2])])
+        A = sps.csc_matrix(np.array([[1, 2, 3], [4, 5, 6]]))
+        c = A * a * b + b
+
+        # The block of a is kept as zero, the other is formed
+        self.assertTrue(a._jac.blocks[1] is None)
+        self.assertTrue(c._jac.blocks[0] is not None)
+        jac = np.array([[1, 2, 3, 15, 0], [8, 10, 12, 0, 33]])
+        self.assertTrue(np.all(c.val == [15, 66]))
+        self.assertTrue(np.allclose(c.jac.A, jac))
+
+    def test_block_jacobian_mul_diagvec(self):
+        a, b = initAdArrays([np.array([1, 2]), np.array([3, 4])])
+        c = a * b
+        d = Ad_array(c.val, c.jac_mul_diagvec(np.array([1, 2, 3, 4])))
+        jac = np.array([[3, 0, 3, 0], [0, 8, 0, 8]])
+        self.assertTrue(np.allclose(d.jac.A, jac))
+
+    def test_block_jacobian_mixed_with_full(self):
+        a, b = initAdArrays([np.array([1, 2]), np.array([3, 4])])
+        c = Ad_array(np.array([1, 1]), sps.csr_matrix(np.ones((2, 4))))
+        d = a * c - b
+        jac = np.array([[2, 1, 0, 1], [2, 3, 2, 1]])
+        self.assertTrue(np.allclose(d.jac.A, jac))
+
+    def test_block_jacobian_concatenate(self):
+        a, b = initAdArrays([np.array([1, 2]), np.array([3])])
+        c = au.concatenate([a, 2 * b, a * a])
+        jac = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 2], [2, 0, 0], [0, 4, 0]])
+        self.assertTrue(np.all(c.val == [1, 2, 6, 1, 4]))
+        self.assertTrue(np.allclose(c.jac.A, jac))
+
@@ -0,0 +1,84 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+import porepy as pp
+from porepy.ad import functions as af
+
+
+class AdLazyTest(unittest.TestCase):
+    def setUp(self):
+        self.A = sps.csr_matrix(np.array([[1, 2, 0], [0, 1, 3], [4, 0, 1]]))
+        self.x = np.array([1.0, 2.0, 3.0])
+        self.y = np.array([0.5, 1.5, 2.5])
+
+    def _equations(self, x, y):
+        z = self.A * x + 2
+        e1 = af.exp(-z / 10) * y ** 2 - 3 * x
+        e2 = af.log(y) * af.abs(x - 2) + x ** y - 2 ** y + z * af.sign(y - 1)
+        e3 = self.A * (e1 * np.array([1, 2, 3])) - e2 / (1 + x)
+        return [e1, e2, e3]
+
+    def _compare(self, a, b):
+        self.assertTrue(np.allclose(a.val, b.val))
+        self.assertTrue(np.allclose(a.jac.A, b.jac.A))
+
+    def test_compare_with_eager(self):
+        x, y = pp.ad.initAdArrays([self.x, self.y])
+        eager = self._equations(x, y)
+
+        x, y = pp.ad.lazy_variables(2)
+        compiled = pp.ad.compile_expressions(self._equations(x, y))
+        lazy = compiled.evaluate([self.x, self.y])
+        for a, b in zip(eager, lazy):
+            self._compare(a, b)
+
+        # Evaluate again with new values
+        x, y = pp.ad.initAdArrays([2 * self.x, self.y])
+        eager = self._equations(x, y)
+        lazy = compiled.evaluate([2 * self.x, self.y])
+        for a, b in zip(eager, lazy):
+            self._compare(a, b)
+
+    def test_single_expression(self):
+        x, y = pp.ad.lazy_variables(2)
+        compiled = pp.ad.compile_expressions(x * y)
+        z = compiled.evaluate([self.x, self.y])
+        self.assertTrue(np.allclose(z.val, self.x * self.y))
+        jac = np.hstack((np.diag(self.y), np.diag(self.x)))
+        self.assertTrue(np.allclose(z.jac.A, jac))
+
+        # Multiplication from the left by a numpy array
+        compiled = pp.ad.compile_expressions(self.y * x)
+        z = compiled.evaluate([self.x, self.y])
+        self.assertTrue(np.allclose(z.val, self.x * self.y))
+        self.assertTrue(np.allclose(z.jac.A[:, :3], np.diag(self.y)))
+
+    def test_matmul_operator(self):
+        x, = pp.ad.lazy_variables(1)
+        compiled = pp.ad.compile_expressions(self.A @ x)
+        z = compiled.evaluate([self.x])
+        self.assertTrue(np.allclose(z.val, self.A * self.x))
+        self.assertTrue(np.allclose(z.jac.A, self.A.A))
+        with self.assertRaises(ValueError):
+            x @ self.A
+
+    def test_constant_by_reference(self):
+        prev = np.ones(3)
+        x, = pp.ad.lazy_variables(1)
+        compiled = pp.ad.compile_expressions(x - prev)
+        self.assertTrue(np.allclose(compiled.evaluate([self.x]).val, self.x - 1))
+        prev[:] = 2
+        self.assertTrue(np.allclose(compiled.evaluate([self.x]).val, self.x - 2))
+
+    def test_no_dependency_on_variables(self):
+        x, y = pp.ad.lazy_variables(2)
+        compiled = pp.ad.compile_expressions(af.sign(x - 2))
+        z = compiled.evaluate([self.x, self.y])
+        self.assertTrue(np.allclose(z.val, [-1, 0, 1]))
+        self.assertEqual(z.jac.shape, (3, 6))
+        self.assertEqual(z.jac.nnz, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,7 @@ import scipy.sparse as sps
 import unittest
 
 import porepy as pp
+from test import test_utils
 from test.test_utils import permute_matrix_vector
 
 
@@ -1107,6 +1108,144 @@ class TestAssembler(unittest.TestCase):
             np.allclose(A_1_2, A[term + "_" + key_1 + "_" + key_2].todense())
         )
 
+    def test_cached_sparsity_pattern(self):
+        """ Repeated assembly with a cached sparsity pattern should give the
+        same matrix as a standard assembly, also when the values of the
+        discretization change between the calls.
+        """
+        gb = self.define_gb()
+        key = "var_1"
+        term = "op"
+        for g, d in gb:
+            d[pp.PRIMARY_VARIABLES] = {key: {"cells": 1}}
+            d[pp.DISCRETIZATION] = {key: {term: MockNodeDiscretization(g.grid_num)}}
+            if g.grid_num == 1:
+                g1 = g
+            else:
+                g2 = g
+
+        edge_discr = MockEdgeDiscretization(1, 1)
+        for e, d in gb.edges():
+            d[pp.PRIMARY_VARIABLES] = {key: {"cells": 1}}
+            d[pp.COUPLING_DISCRETIZATION] = {
+                term: {g1: (key, term), g2: (key, term), e: (key, edge_discr)}
+            }
+
+        general_assembler = pp.Assembler()
+        A, _, _, _ = general_assembler.assemble_matrix_rhs(gb)
+        A_cached, _, _, _ = general_assembler.assemble_matrix_rhs(
+            gb, cache_sparsity=True
+        )
+        self.assertTrue(len(gb.assembly_cache) == 1)
+        self.assertTrue(np.allclose(A.todense(), A_cached.todense()))
+
+        # Change the values, but not the structure, of the discretization
+        pattern = list(gb.assembly_cache.values())[0]
+        edge_discr.diag_val = 3
+        edge_discr.off_diag_val = 2
+        A, _, _, _ = general_assembler.assemble_matrix_rhs(gb)
+        A_cached, _, _, _ = general_assembler.assemble_matrix_rhs(
+            gb, cache_sparsity=True
+        )
+        self.assertTrue(list(gb.assembly_cache.values())[0] is pattern)
+        self.assertTrue(np.allclose(A.todense(), A_cached.todense()))
+
+        # Remove the diagonal term on one node. The cache key is the same, but
+        # the pattern should be updated
+        gb.node_props(g1)[pp.DISCRETIZATION][key][term].value = 0
+        A, _, _, _ = general_assembler.assemble_matrix_rhs(gb)
+        A_cached, _, _, _ = general_assembler.assemble_matrix_rhs(
+            gb, cache_sparsity=True
+        )
+        self.assertTrue(len(gb.assembly_cache) == 1)
+        self.assertFalse(list(gb.assembly_cache.values())[0] is pattern)
+        self.assertTrue(A_cached.nnz == pattern["indices"].size - 1)
+        self.assertTrue(np.allclose(A.todense(), A_cached.todense()))
+
+    def test_cached_sparsity_pattern_duplicate_entries(self):
+        """ Blocks with duplicate entries should be summed also when the values
+        are scattered into a cached pattern.
+        """
+        gb = self.define_gb()
+        key = "var_1"
+        term = "op"
+        discr = MockDuplicateEntriesDiscretization(1)
+        for _, d in gb:
+            d[pp.PRIMARY_VARIABLES] = {key: {"cells": 1}}
+            d[pp.DISCRETIZATION] = {key: {term: discr}}
+        for _, d in gb.edges():
+            d[pp.PRIMARY_VARIABLES] = {}
+
+        general_assembler = pp.Assembler()
+        for value in [1, 2]:
+            discr.value = value
+            A, _, _, _ = general_assembler.assemble_matrix_rhs(gb)
+            A_cached, _, _, _ = general_assembler.assemble_matrix_rhs(
+                gb, cache_sparsity=True
+            )
+            self.assertTrue(np.allclose(A.todense(), A_cached.todense()))
+            self.assertTrue(np.allclose(A_cached.diagonal(), 3 * value))
+
+    def test_num_workers(self):
+        """ Assembly of node terms in a pool of threads should give the same
+        system as a serial assembly.
+        """
+        gb = self.define_gb()
+        key_1 = "var_1"
+        key_2 = "var_2"
+        term = "op"
+        for g, d in gb:
+            d[pp.PRIMARY_VARIABLES] = {key_1: {"cells": 1}, key_2: {"cells": 1}}
+            d[pp.DISCRETIZATION] = {
+                key_1: {term: MockNodeDiscretization(g.grid_num)},
+                key_2: {term: MockNodeDiscretization(2 + g.grid_num)},
+                key_1 + "_" + key_2: {term: MockNodeDiscretization(5)},
+            }
+        for _, d in gb.edges():
+            d[pp.PRIMARY_VARIABLES] = {}
+
+        general_assembler = pp.Assembler()
+        A, b, block_dof, _ = general_assembler.assemble_matrix_rhs(gb)
+        A_par, b_par, block_dof_par, _ = general_assembler.assemble_matrix_rhs(
+            gb, num_workers=2
+        )
+        self.assertTrue(block_dof == block_dof_par)
+        self.assertTrue(np.allclose(A.todense(), A_par.todense()))
+        self.assertTrue(np.allclose(b, b_par))
+
+    def test_num_workers_mpfa(self):
+        """ Threaded assembly of an Mpfa discretization on a fractured domain
+        should give the same system as a serial assembly. The discretization
+        is done in the threads, using the default block inverter.
+        """
+
+        def setup_gb():
+            f_1 = np.array([[2, 6], [4, 4]])
+            f_2 = np.array([[4, 4], [2, 6]])
+            gb = pp.meshing.cart_grid([f_1, f_2], [8, 8])
+            for g, d in gb:
+                parameters = {}
+                if g.dim == 2:
+                    faces = np.where(g.tags["domain_boundary_faces"])[0]
+                    parameters["bc"] = pp.BoundaryCondition(g, faces, "dir")
+                    parameters["bc_values"] = g.face_centers[0]
+                pp.initialize_default_data(g, d, "flow", parameters)
+            for e, d in gb.edges():
+                mg = d["mortar_grid"]
+                pp.initialize_data(
+                    mg, d, "flow", {"normal_diffusivity": np.ones(mg.num_cells)}
+                )
+            method = pp.Mpfa("flow")
+            assembler = test_utils.setup_flow_assembler(gb, method, "flow")
+            return gb, assembler
+
+        gb, assembler = setup_gb()
+        A, b, _, _ = assembler.assemble_matrix_rhs(gb)
+        gb_par, assembler = setup_gb()
+        A_par, b_par, _, _ = assembler.assemble_matrix_rhs(gb_par, num_workers=2)
+        self.assertTrue(np.allclose((A - A_par).data, 0))
+        self.assertTrue(np.allclose(b, b_par))
+
 
 class MockNodeDiscretization(object):
     def __init__(self, value):
@@ -1116,6 +1255,19 @@ class MockNodeDiscretization(object):
         return sps.coo_matrix(self.value), np.zeros(1)
 
 
+class MockDuplicateEntriesDiscretization(object):
+    def __init__(self, value):
+        self.value = value
+
+    def assemble_matrix_rhs(self, g, data):
+        # Two entries, with the same index, that should be summed
+        A = sps.csr_matrix(
+            (self.value * np.array([1.0, 2.0]), np.array([0, 0]), np.array([0, 2])),
+            shape=(1, 1),
+        )
+        return A, np.zeros(1)
+
+
 class MockEdgeDiscretization(object):
     def __init__(self, diag_val, off_diag_val):
         self.diag_val = diag_val
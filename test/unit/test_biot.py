@@ -156,5 +156,141 @@ class BiotTest(unittest.TestCase):
         self.assertTrue(np.all(np.isclose(b, b_class)))
 
 
+    def test_discretize_num_workers(self):
+        """ Discretization in parallel over partitions of the grid should give
+        the same matrices as a serial discretization.
+        """
+        kw_f = "flow"
+        kw_m = "mechanics"
+        for g in [pp.CartGrid([4, 3]), pp.StructuredTetrahedralGrid([2, 2, 1])]:
+            g.compute_geometry()
+            bound_mech, bound_flow = self.make_boundary_conditions(g)
+            ones = np.ones(g.num_cells)
+            matrices = []
+            for num_workers in [1, 2]:
+                d = {}
+                # Non-zero phi, which should be transferred to the partitions
+                stiffness = pp.FourthOrderTensor(g.dim, ones, ones, phi=ones)
+                pp.initialize_default_data(
+                    g,
+                    d,
+                    kw_m,
+                    {
+                        "bc": bound_mech,
+                        "fourth_order_tensor": stiffness,
+                        "num_workers": num_workers,
+                        "inverter": "python",
+                    },
+                )
+                pp.initialize_default_data(
+                    g, d, kw_f, {"bc": bound_flow, "num_workers": num_workers}
+                )
+                pp.Biot().discretize(g, d)
+                matrices.append(d[pp.DISCRETIZATION_MATRICES])
+
+            for kw in [kw_f, kw_m]:
+                for key, mat in matrices[0][kw].items():
+                    diff = mat - matrices[1][kw][key]
+                    self.assertTrue(np.allclose(sps.csr_matrix(diff).data, 0))
+
+    def test_uniform_pressure_force_balance(self):
+        """ A uniform pressure with zero displacement is balanced by a total
+        traction -p n on Neumann and Robin faces. The pressure forces must then
+        cancel the boundary tractions in every cell.
+        """
+        kw_m = "mechanics"
+        p = 1.5
+        for g in [pp.CartGrid([3, 3]), pp.StructuredTriangleGrid([3, 3])]:
+            g.compute_geometry()
+            bound_faces = g.get_all_boundary_faces()
+            cond = np.array(bound_faces.size * ["neu"])
+            cond[g.face_centers[1, bound_faces] < 1e-10] = "rob"
+            cond[g.face_centers[0, bound_faces] < 1e-10] = "dir"
+            bound_mech = pp.BoundaryConditionVectorial(g, bound_faces, cond)
+
+            ones = np.ones(g.num_cells)
+            d = {}
+            pp.initialize_default_data(
+                g,
+                d,
+                kw_m,
+                {
+                    "bc": bound_mech,
+                    "fourth_order_tensor": pp.FourthOrderTensor(g.dim, ones, ones),
+                    "inverter": "python",
+                },
+            )
+            pp.initialize_default_data(g, d, "flow")
+            pp.Biot().discretize(g, d)
+            matrices = d[pp.DISCRETIZATION_MATRICES][kw_m]
+
+            # Boundary tractions are given in the direction of the outward normal
+            sgn = np.asarray(g.cell_faces.sum(axis=1)).ravel()
+            bc_val = -p * g.face_normals[: g.dim] * sgn
+            bc_val[:, bound_mech.is_dir[0]] = 0
+
+            div = pp.fvutils.vector_divergence(g)
+            force = div * matrices["bound_stress"] * bc_val.ravel("F")
+            force -= matrices["grad_p"] * (p * ones)
+            self.assertTrue(np.allclose(force, 0))
+
+    def test_update_discretization(self):
+        """ Update of the discretization after a change of parameters in a few
+        cells should give the same matrices as a discretization from scratch.
+        """
+        kw_f = "flow"
+        kw_m = "mechanics"
+        g = pp.CartGrid([4, 4])
+        g.compute_geometry()
+        bound_faces = g.get_all_boundary_faces()
+        cond = np.array(bound_faces.size * ["neu"])
+        cond[: bound_faces.size // 2] = "dir"
+        bound_mech = pp.BoundaryConditionVectorial(g, bound_faces, cond)
+        bound_flow = pp.BoundaryCondition(g, bound_faces, cond)
+
+        np.random.seed(42)
+        mu = 1 + np.random.rand(g.num_cells)
+        perm = 1 + np.random.rand(g.num_cells)
+
+        def make_data(mu, perm):
+            d = {}
+            pp.initialize_default_data(
+                g,
+                d,
+                kw_m,
+                {
+                    "bc": bound_mech,
+                    "fourth_order_tensor": pp.FourthOrderTensor(g.dim, mu, mu),
+                    "inverter": "python",
+                },
+            )
+            pp.initialize_default_data(
+                g,
+                d,
+                kw_f,
+                {"bc": bound_flow, "second_order_tensor": pp.SecondOrderTensor(g.dim, perm)},
+            )
+            return d
+
+        data = make_data(mu, perm)
+        pp.Biot().discretize(g, data)
+
+        changed_cells = np.array([5, 6])
+        mu[changed_cells] *= 10
+        perm[changed_cells] /= 10
+        params = data[pp.PARAMETERS]
+        params[kw_m]["fourth_order_tensor"] = pp.FourthOrderTensor(g.dim, mu, mu)
+        params[kw_f]["second_order_tensor"] = pp.SecondOrderTensor(g.dim, perm)
+        pp.Biot().update_discretization(g, data, changed_cells)
+
+        data_full = make_data(mu, perm)
+        pp.Biot().discretize(g, data_full)
+
+        for kw in [kw_f, kw_m]:
+            for key, mat in data_full[pp.DISCRETIZATION_MATRICES][kw].items():
+                diff = mat - data[pp.DISCRETIZATION_MATRICES][kw][key]
+                self.assertTrue(np.allclose(sps.csr_matrix(diff).data, 0))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,144 @@
+""" Tests of the on-disk cache of discretization matrices.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import porepy as pp
+
+
+class TestDiscretizationCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _flow_data(self, g, kxx, cache):
+        specified_parameters = {
+            "second_order_tensor": pp.SecondOrderTensor(g.dim, kxx),
+            "discretization_cache": cache,
+        }
+        return pp.initialize_default_data(g, {}, "flow", specified_parameters)
+
+    def _mech_data(self, g, cache):
+        specified_parameters = {"discretization_cache": cache}
+        return pp.initialize_default_data(g, {}, "mechanics", specified_parameters)
+
+    def _compare(self, d0, d1, keyword):
+        m0 = d0[pp.DISCRETIZATION_MATRICES][keyword]
+        m1 = d1[pp.DISCRETIZATION_MATRICES][keyword]
+        self.assertEqual(sorted(m0.keys()), sorted(m1.keys()))
+        for key in m0.keys():
+            self.assertEqual(m0[key].shape, m1[key].shape)
+            self.assertEqual((m0[key] != m1[key]).nnz, 0)
+
+    def test_mpfa(self):
+        g = pp.StructuredTriangleGrid([3, 3])
+        g.compute_geometry()
+        kxx = 1 + np.arange(g.num_cells)
+
+        d0 = self._flow_data(g, kxx, None)
+        pp.Mpfa("flow").discretize(g, d0)
+
+        d1 = self._flow_data(g, kxx, self.directory)
+        pp.Mpfa("flow").discretize(g, d1)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        d2 = self._flow_data(g, kxx, self.directory)
+        pp.Mpfa("flow").discretize(g, d2)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        self._compare(d0, d1, "flow")
+        self._compare(d0, d2, "flow")
+
+        # A new permeability gives a new entry
+        d3 = self._flow_data(g, 2 * kxx, self.directory)
+        pp.Mpfa("flow").discretize(g, d3)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_mpsa_and_biot(self):
+        g = pp.CartGrid([3, 2])
+        g.compute_geometry()
+        cache = pp.DiscretizationCache(self.directory)
+
+        d0 = self._mech_data(g, None)
+        pp.Mpsa("mechanics").discretize(g, d0)
+        d1 = self._mech_data(g, cache)
+        pp.Mpsa("mechanics").discretize(g, d1)
+        d2 = self._mech_data(g, cache)
+        pp.Mpsa("mechanics").discretize(g, d2)
+        self._compare(d0, d1, "mechanics")
+        self._compare(d0, d2, "mechanics")
+
+        def biot_data(cache):
+            d = self._flow_data(g, np.ones(g.num_cells), cache)
+            d[pp.PARAMETERS]["flow"]["biot_alpha"] = 1
+            d[pp.PARAMETERS]["flow"]["mass_weight"] = np.ones(g.num_cells)
+            d_m = self._mech_data(g, cache)
+            d[pp.PARAMETERS]["mechanics"] = d_m[pp.PARAMETERS]["mechanics"]
+            d[pp.DISCRETIZATION_MATRICES]["mechanics"] = {}
+            return d
+
+        d0 = biot_data(None)
+        pp.Biot().discretize(g, d0)
+        d1 = biot_data(cache)
+        pp.Biot().discretize(g, d1)
+        d2 = biot_data(cache)
+        pp.Biot().discretize(g, d2)
+        for keyword in ["flow", "mechanics"]:
+            self._compare(d0, d1, keyword)
+            self._compare(d0, d2, keyword)
+
+    def test_mpsa_phi(self):
+        # The third parameter of the stiffness tensor is part of the key
+        g = pp.CartGrid([4, 4])
+        g.compute_geometry()
+        ones = np.ones(g.num_cells)
+
+        data = []
+        for cache in [None, self.directory, self.directory]:
+            for phi in [None, ones]:
+                d = self._mech_data(g, cache)
+                stiffness = pp.FourthOrderTensor(g.dim, ones, ones, phi=phi)
+                d[pp.PARAMETERS]["mechanics"]["fourth_order_tensor"] = stiffness
+                pp.Mpsa("mechanics").discretize(g, d)
+                data.append(d)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        stress = [d[pp.DISCRETIZATION_MATRICES]["mechanics"]["stress"] for d in data]
+        self.assertTrue(abs(stress[0] - stress[1]).max() > 0.1)
+        for i in range(2, 6):
+            self._compare(data[i % 2], data[i], "mechanics")
+
+    def test_eviction(self):
+        g = pp.CartGrid([4, 4])
+        g.compute_geometry()
+
+        cache = pp.DiscretizationCache(self.directory)
+        for i in range(3):
+            d = self._flow_data(g, (i + 1) * np.ones(g.num_cells), cache)
+            pp.Mpfa("flow").discretize(g, d)
+            if i == 0:
+                first = os.listdir(self.directory)[0]
+
+        # Use the first entry again, so that the second is the least recently used
+        d = self._flow_data(g, np.ones(g.num_cells), cache)
+        pp.Mpfa("flow").discretize(g, d)
+
+        cache.max_size = 2.5 * cache.size() / 3
+        d = self._flow_data(g, 4 * np.ones(g.num_cells), cache)
+        pp.Mpfa("flow").discretize(g, d)
+        self.assertTrue(cache.size() <= cache.max_size)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertTrue(first in os.listdir(self.directory))
+
+        cache.clear()
+        self.assertEqual(cache.size(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5477,6 +5477,62 @@ def matrix_for_test_dual_vem_3d_ani_cart():
     )
 
 
+class MixedNumFacesTest(unittest.TestCase):
+    def grid(self):
+        # Cartesian grid where some of the cells are merged, so that the cells
+        # have 4, 6 and 8 faces
+        g = pp.CartGrid([4, 4], [1, 1])
+        g.compute_geometry()
+        partition = np.arange(g.num_cells)
+        partition[[1, 2]] = 1
+        partition[[9, 10, 13, 14]] = 9
+        pp.coarsening.generate_coarse_grid(g, partition)
+        g.compute_geometry()
+        return g
+
+    def test_mass_matrix(self):
+        g = self.grid()
+        self.assertTrue(np.unique(np.diff(g.cell_faces.indptr)).size == 3)
+
+        perm = pp.SecondOrderTensor(3, kxx=1 + np.arange(g.num_cells), kyy=2, kzz=1)
+        specified_parameters = {"second_order_tensor": perm}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+        solver = pp.MVEM("flow")
+        solver.discretize(g, data)
+        M = data[pp.DISCRETIZATION_MATRICES]["flow"]["mass"].todense()
+
+        # Compare with the mass matrix computed cell by cell
+        M_known = np.zeros((g.num_faces, g.num_faces))
+        diams = g.cell_diameters()
+        for c in range(g.num_cells):
+            loc = slice(g.cell_faces.indptr[c], g.cell_faces.indptr[c + 1])
+            faces = g.cell_faces.indices[loc]
+            A, _ = pp.MVEM.massHdiv(
+                perm.values[:2, :2, c],
+                g.cell_centers[:2, c],
+                g.cell_volumes[c],
+                g.face_centers[:2, faces],
+                g.face_normals[:2, faces],
+                g.cell_faces.data[loc],
+                diams[c],
+                1,
+            )
+            M_known[np.ix_(faces, faces)] += A
+
+        self.assertTrue(np.allclose(M, M.T))
+        self.assertTrue(np.allclose(M, M_known))
+
+    def test_constant_velocity(self):
+        g = self.grid()
+        specified_parameters = {"aperture": np.ones(g.num_cells)}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+
+        velocity = np.array([1, -2, 0])
+        u = np.dot(velocity, g.face_normals)
+        P0u = pp.MVEM("flow").project_flux(g, u, data)
+        self.assertTrue(np.allclose(P0u, velocity.reshape((-1, 1))))
+
+
 # ------------------------------------------------------------------------------#
 if __name__ == "__main__":
     unittest.main()
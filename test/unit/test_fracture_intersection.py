@@ -207,6 +207,66 @@ class TestBoundingBoxIntersection(unittest.TestCase):
 
         self.assertTrue(np.allclose(pairs_1, combined_pairs))
 
+    def test_boxes_3d_lines_in_square(self):
+        # Same as above, in the plane z = 0. Compare with the 2d search
+        x_min = np.array([0, 1, 0, 0])
+        x_max = np.array([1, 1, 1, 0])
+
+        y_min = np.array([0, 0, 1, 0])
+        y_max = np.array([0, 1, 1, 1])
+        z = np.zeros(4)
+
+        pairs = pp.cg._identify_overlapping_boxes_3d(
+            x_min, x_max, y_min, y_max, z, z
+        )
+        self.assertTrue(pairs.shape[1] == 4)
+
+        combined_pairs = np.sort(
+            pp.cg._identify_overlapping_rectangles(x_min, x_max, y_min, y_max), axis=0
+        )
+        self.assertTrue(test_utils.compare_arrays(pairs, combined_pairs))
+
+    def test_boxes_3d_random(self):
+        # Compare with a brute force comparison of all boxes. Some of the
+        # boxes are much larger than the others, and some only touch.
+        np.random.seed(0)
+        num_boxes = 200
+        lower = np.round(np.random.rand(3, num_boxes), 1)
+        upper = lower + np.round(0.2 * np.random.rand(3, num_boxes), 1)
+        upper[:, :5] += 0.6
+
+        pairs = pp.cg._identify_overlapping_boxes_3d(
+            lower[0], upper[0], lower[1], upper[1], lower[2], upper[2]
+        )
+
+        known = []
+        for i in range(num_boxes):
+            for j in range(i + 1, num_boxes):
+                if np.all(upper[:, i] >= lower[:, j]) and np.all(
+                    lower[:, i] <= upper[:, j]
+                ):
+                    known.append([i, j])
+        known = np.array(known).T
+        self.assertTrue(np.array_equal(pairs, known))
+
+    def test_boxes_3d_single_box(self):
+        pairs = pp.cg._identify_overlapping_boxes_3d(*[np.zeros(1)] * 6)
+        self.assertTrue(pairs.shape == (2, 0))
+
+    def test_boxes_2d_random(self):
+        # Compare with the sweep along the x-axis
+        np.random.seed(1)
+        num_boxes = 200
+        lower = np.round(np.random.rand(2, num_boxes), 1)
+        upper = lower + np.round(0.2 * np.random.rand(2, num_boxes), 1)
+
+        pairs = pp.cg._identify_overlapping_boxes(lower, upper)
+        known = pp.cg._identify_overlapping_rectangles(
+            lower[0], upper[0], lower[1], upper[1]
+        )
+        self.assertTrue(pairs.shape == known.shape)
+        self.assertTrue(test_utils.compare_arrays(pairs, known))
+
 
 class TestFractureIntersectionRemoval(unittest.TestCase):
     def test_lines_crossing_origin(self):
@@ -267,6 +327,37 @@ class TestFractureIntersectionRemoval(unittest.TestCase):
         self.assertTrue(np.allclose(new_pts, p))
         self.assertTrue(test_utils.compare_arrays(new_lines, lines_known))
 
+    def test_grid_of_lines(self):
+        # Horizontal and vertical lines, all crossing each other. The lines are
+        # tagged with their index, which should be kept by the segments.
+        num_lines = 10
+        x = np.linspace(0.05, 0.95, num_lines)
+        p = np.hstack(
+            (
+                np.vstack((np.zeros(num_lines), x)),
+                np.vstack((np.ones(num_lines), x)),
+                np.vstack((x, np.zeros(num_lines))),
+                np.vstack((x, np.ones(num_lines))),
+            )
+        )
+        start = np.hstack((np.arange(num_lines), 2 * num_lines + np.arange(num_lines)))
+        lines = np.vstack((start, start + num_lines, np.arange(2 * num_lines)))
+
+        new_pts, new_lines = pp.cg.remove_edge_crossings2(p, lines)
+
+        self.assertTrue(new_pts.shape[1] == 4 * num_lines + num_lines ** 2)
+        self.assertTrue(new_lines.shape[1] == 2 * num_lines * (num_lines + 1))
+        # All segments are parts of the original lines
+        for ei in range(new_lines.shape[1]):
+            tag = new_lines[2, ei]
+            axis = int(tag < num_lines)
+            self.assertTrue(
+                np.allclose(new_pts[axis, new_lines[:2, ei]], x[tag % num_lines])
+            )
+        # Each line is split into num_lines + 1 segments
+        num_segments = np.bincount(new_lines[2])
+        self.assertTrue(np.all(num_segments == num_lines + 1))
+
 
 if __name__ == "__main__":
     unittest.main()
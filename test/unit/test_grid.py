@@ -2,6 +2,7 @@
 """
 
 import numpy as np
+import scipy.sparse as sps
 import unittest
 
 import porepy as pp
@@ -22,6 +23,22 @@ class TestDiameterComputation(unittest.TestCase):
         known = np.repeat(np.sqrt(3), g.num_cells)
         self.assertTrue(np.allclose(cell_diameters, known))
 
+    def test_cell_diameters_mixed_cells(self):
+        # A quadrilateral and two triangles
+        nodes = np.array([[0, 1, 0, 1, 2, 3], [0, 0, 1, 1, 0, 1], np.zeros(6)])
+        fn = np.array([[0, 1, 2, 0, 1, 3, 4, 3], [1, 3, 3, 2, 4, 4, 5, 5]])
+        face_nodes = sps.csc_matrix(
+            (np.ones(16, dtype=np.bool), fn.ravel("F"), np.arange(0, 17, 2))
+        )
+        cf = np.array([0, 1, 2, 3, 4, 5, 1, 6, 7, 5])
+        cell_faces = sps.csc_matrix(
+            (np.ones(10), cf, np.array([0, 4, 7, 10])), shape=(8, 3)
+        )
+        g = pp.Grid(2, nodes, face_nodes, cell_faces, "mixed")
+        cell_diameters = g.cell_diameters()
+        known = np.array([np.sqrt(2), np.sqrt(2), 2])
+        self.assertTrue(np.allclose(cell_diameters, known))
+
 
 class TestReprAndStr(unittest.TestCase):
     def test_repr(self):
@@ -55,6 +72,20 @@ class TestClosestCell(unittest.TestCase):
         self.assertTrue(ind[0] == 0)
         self.assertTrue(ind.size == 1)
 
+    def test_distance_and_updated_centers(self):
+        g = pp.CartGrid([4, 4])
+        g.compute_geometry()
+        p = np.array([[0.4, 3.6, 2.2], [0.4, 0.6, 3.5], [0, 0, 1]])
+        ind, dist = g.closest_cell(p, return_distance=True)
+        self.assertTrue(np.all(ind == np.array([0, 3, 14])))
+        known = np.sqrt(np.array([0.02, 0.02, 1.09]))
+        self.assertTrue(np.allclose(dist, known))
+
+        # Move the grid, the closest cells should follow
+        g.cell_centers[0] += 1
+        ind = g.closest_cell(p)
+        self.assertTrue(np.all(ind == np.array([0, 2, 13])))
+
 
 class TestCellFaceAsDense(unittest.TestCase):
     def test_cart_grid(self):
@@ -1,5 +1,7 @@
 import numpy as np
 import scipy.sparse as sps
+import shutil
+import tempfile
 import unittest
 import warnings
 
@@ -71,6 +73,85 @@ class TestGridBucket(unittest.TestCase):
             R = d["cell_global2loc"]
             self.assertTrue(np.all(R * glob == loc))
 
+    def test_cell_global_slice_4_fracs(self):
+        f1 = np.array([[0, 1], [1, 1]])
+        f2 = np.array([[1, 2], [1, 1]])
+        f3 = np.array([[1, 1], [0, 1]])
+        f4 = np.array([[1, 1], [1, 2]])
+
+        gb = meshing.cart_grid([f1, f2, f3, f4], [2, 2])
+        gb.cell_global2loc()
+        node_offset, edge_offset = gb.cell_global_offsets()
+        self.assertEqual(node_offset[-1], gb.num_cells())
+        self.assertEqual(edge_offset[-1], gb.num_mortar_cells())
+
+        glob = np.random.rand(gb.num_cells())
+        for g, d in gb:
+            R = d["cell_global2loc"]
+            self.assertEqual(R.shape, (g.num_cells, gb.num_cells()))
+            self.assertTrue(np.all(R * glob == glob[d["cell_global_slice"]]))
+
+        glob = np.random.rand(gb.num_mortar_cells())
+        for _, d in gb.edges():
+            R = d["cell_global2loc"]
+            self.assertTrue(np.all(R * glob == glob[d["cell_global_slice"]]))
+
+    def test_save_load(self):
+        f1 = np.array([[0, 2], [1, 1]])
+        f2 = np.array([[1, 1], [0, 2]])
+        gb = meshing.cart_grid([f1, f2], [4, 4], physdims=[2, 2])
+        for g, d in gb:
+            d["values"] = {"cells": np.random.rand(g.num_cells), "name": "a"}
+            d["unknown"] = object()
+
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            gb.save(path)
+            self.assertEqual(len(w), gb.num_graph_nodes())
+
+        def compare(a, b):
+            if sps.issparse(a):
+                self.assertEqual(a.format, b.format)
+                self.assertEqual((a != b).nnz, 0)
+            elif isinstance(a, np.ndarray):
+                self.assertEqual(a.dtype, b.dtype)
+                self.assertTrue(np.array_equal(a, b))
+            elif isinstance(a, dict):
+                self.assertEqual(sorted(a.keys()), sorted(b.keys()))
+                [compare(a[k], b[k]) for k in a.keys()]
+            elif isinstance(a, list):
+                [compare(ai, bi) for ai, bi in zip(a, b)]
+            elif isinstance(a, (pp.Grid, pp.MortarGrid)):
+                self.assertTrue(type(a) is type(b))
+                compare(a.__dict__, b.__dict__)
+            else:
+                self.assertEqual(a, b)
+
+        for mmap in [True, False]:
+            gb_loaded = GridBucket.load(path, mmap=mmap)
+            self.assertEqual(gb_loaded.size(), gb.size())
+            for (g, d), (h, d_loaded) in zip(gb, gb_loaded):
+                compare(g, h)
+                self.assertFalse("unknown" in d_loaded)
+                del d["unknown"]
+                compare(d, d_loaded)
+                d["unknown"] = object()
+            for (e, d), (e_loaded, d_loaded) in zip(gb.edges(), gb_loaded.edges()):
+                compare(list(e), list(e_loaded))
+                compare(d, d_loaded)
+                # The edges refer to the loaded grids, not to copies
+                self.assertTrue(e_loaded[0] in gb_loaded.graph)
+                self.assertTrue(e_loaded[1] in gb_loaded.graph)
+
+            g = gb_loaded.grids_of_dimension(2)[0]
+            self.assertEqual(isinstance(g.nodes.base, np.memmap), mmap)
+            # Copy on write, the stored grid is not modified
+            g.nodes[0] += 1
+        gb_loaded = GridBucket.load(path)
+        compare(gb.grids_of_dimension(2)[0], gb_loaded.grids_of_dimension(2)[0])
+
 
 class MockGrid:
     def __init__(
@@ -508,6 +589,47 @@ class TestBucket(unittest.TestCase):
         gb = self.simple_bucket(1)
         self.assertRaises(ValueError, gb.remove_node_props, "node_number")
 
+    def test_compact_storage(self):
+        f1 = np.array([[0, 1], [1, 1]])
+        f2 = np.array([[1, 1], [0, 1]])
+        gb = meshing.cart_grid([f1, f2], [2, 2])
+        gb_compact = gb.copy()
+        gb_compact.compact = True
+
+        self.assertEqual([g for g, _ in gb], [g for g, _ in gb_compact])
+        for (e, d), (e_c, d_c) in zip(gb.edges(), gb_compact.edges()):
+            self.assertEqual(e, e_c)
+            self.assertTrue(gb_compact.edge_props(e[::-1]) is d_c)
+            self.assertEqual(gb.nodes_of_edge(e), gb_compact.nodes_of_edge(e))
+
+        for g, d in gb_compact:
+            self.assertTrue(gb_compact.node_props(g) is d)
+            self.assertTrue(gb_compact.graph.node[g] is d)
+            edges = [e for e, _ in gb.edges_of_node(g)]
+            edges_c = [e for e, _ in gb_compact.edges_of_node(g)]
+            self.assertEqual(edges, edges_c)
+            neigh = gb.node_neighbors(g, only_lower=True)
+            neigh_c = gb_compact.node_neighbors(g, only_lower=True)
+            self.assertTrue(np.array_equal(neigh, neigh_c))
+
+    def test_compact_storage_updated(self):
+        gb = pp.GridBucket(compact=True)
+        g1 = MockGrid(dim=1)
+        g2 = MockGrid(dim=2)
+        gb.add_nodes(g1)
+        self.assertEqual(gb.size(), 1)
+
+        gb.add_nodes(g2)
+        gb.add_edge([g1, g2], None)
+        self.assertEqual(len([e for e, _ in gb.edges()]), 1)
+        self.assertEqual(gb.nodes_of_edge((g2, g1)), (g1, g2))
+        self.assertTrue(gb.node_neighbors(g1)[0] is g2)
+
+        gb.remove_node(g2)
+        self.assertEqual([g for g, _ in gb], [g1])
+        self.assertEqual(len([e for e, _ in gb.edges()]), 0)
+        self.assertRaises(KeyError, gb.edge_props, (g1, g2))
+
 
 if __name__ == "__main__":
     unittest.main()
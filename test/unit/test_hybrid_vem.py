@@ -1,4 +1,5 @@
 import numpy as np
+import scipy.sparse as sps
 import unittest
 import porepy as pp
 
@@ -3184,6 +3185,47 @@ def matrix_for_test_dual_hybrid_vem_3d_ani_cart():
     )
 
 
+class LinearPressureTest(unittest.TestCase):
+    def solve(self, g, perm, p_ex):
+        bf = g.tags["domain_boundary_faces"].nonzero()[0]
+        bc = pp.BoundaryCondition(g, bf, bf.size * ["dir"])
+        data = make_dictionary(g, perm, bc, p_ex(g.face_centers))
+
+        solver = hybrid.HybridDualVEM(keyword="flow")
+        H, rhs = solver.matrix_rhs(g, data)
+        l = sps.linalg.spsolve(H, rhs)
+        return solver.compute_up(g, l, data)
+
+    def test_mixed_num_faces(self):
+        # Cartesian grid where some of the cells are merged, so that the cells
+        # have 4, 6 and 8 faces
+        g = pp.CartGrid([6, 6], [1, 1])
+        g.compute_geometry()
+        partition = np.arange(g.num_cells)
+        partition[1] = 0
+        partition[[14, 15, 20, 21]] = 8
+        pp.coarsening.generate_coarse_grid(g, partition)
+        g.compute_geometry()
+
+        perm = pp.SecondOrderTensor(g.dim, np.ones(g.num_cells))
+        u, p = self.solve(g, perm, lambda pt: pt[0] - 2 * pt[1])
+
+        self.assertTrue(np.allclose(p, g.cell_centers[0] - 2 * g.cell_centers[1]))
+        self.assertTrue(np.allclose(u, np.dot([-1, 2, 0], g.face_normals)))
+
+    def test_3d_ani_simplex(self):
+        g = pp.StructuredTetrahedralGrid([2, 2, 2], [1, 1, 1])
+        g.compute_geometry()
+
+        kxx = 2 * np.ones(g.num_cells)
+        perm = pp.SecondOrderTensor(3, kxx=kxx, kyy=1 + kxx, kzz=kxx, kxy=0.5 * kxx)
+        u, p = self.solve(g, perm, lambda pt: pt[0] + pt[1] - pt[2])
+
+        flux = -np.dot(perm.values[:, :, 0].dot([1, 1, -1]), g.face_normals)
+        self.assertTrue(np.allclose(p, np.dot([1, 1, -1], g.cell_centers)))
+        self.assertTrue(np.allclose(u, flux))
+
+
 # ------------------------------------------------------------------------------#
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@ Created on Mon Nov 27 13:01:04 2017
 @author: eke001
 """
 import numpy as np
+import scipy.spatial
 import unittest
 
 import porepy.utils.comp_geom as cg
@@ -54,5 +55,65 @@ class TestTriangulationMatching(unittest.TestCase):
         self.assertTrue(l[1][0] == 0)
         self.assertTrue(l[1][2] == 0.25)
 
+    def test_overlap_arrays(self):
+        # Second triangle is clockwise, and shares an edge with the first
+        # triangle of the first tessalation. The third triangle is disjoint.
+        p1 = np.array([[0, 1, 1, 0], [0, 0, 1, 1]])
+        t1 = np.array([[0, 1, 3], [1, 2, 3]]).T
+
+        p2 = np.array([[0, 0, 1, 2, 3, 2], [0, 1, 1, 0, 0, 1]])
+        t2 = np.array([[0, 2, 1], [3, 4, 5]]).T
+
+        i1, i2, area = cg.triangulation_overlaps(p1, p2, t1, t2)
+        self.assertTrue(np.all(i1 == [0, 1]))
+        self.assertTrue(np.all(i2 == [0, 0]))
+        self.assertTrue(np.allclose(area, [0.25, 0.25]))
+
+    def test_overlap_random_triangulations(self):
+        # Two triangulations of the unit square, the overlaps should cover
+        # all triangles
+        np.random.seed(0)
+        corners = np.array([[0, 1, 1, 0], [0, 0, 1, 1]])
+        p1 = np.hstack((corners, np.random.rand(2, 30)))
+        p2 = np.hstack((corners, np.random.rand(2, 40)))
+        t1 = scipy.spatial.Delaunay(p1.T).simplices.T
+        t2 = scipy.spatial.Delaunay(p2.T).simplices.T
+
+        i1, i2, area = cg.triangulation_overlaps(p1, p2, t1, t2)
+        self.assertTrue(np.isclose(area.sum(), 1))
+
+        def tri_areas(p, t):
+            d1 = p[:, t[1]] - p[:, t[0]]
+            d2 = p[:, t[2]] - p[:, t[0]]
+            return 0.5 * np.abs(d1[0] * d2[1] - d1[1] * d2[0])
+
+        self.assertTrue(np.allclose(np.bincount(i1, weights=area), tri_areas(p1, t1)))
+        self.assertTrue(np.allclose(np.bincount(i2, weights=area), tri_areas(p2, t2)))
+        # Sorted by the first, then the second index
+        self.assertTrue(np.all(np.diff(i1 * t2.shape[1] + i2) > 0))
+
+    def test_overlap_mixed_triangle_sizes(self):
+        # Graded triangulations, with triangles refined towards opposite
+        # corners, so that both contain triangles of very different sizes
+        np.random.seed(1)
+        corners = np.array([[0, 1, 1, 0], [0, 0, 1, 1]])
+        p1 = np.hstack((corners, np.random.rand(2, 100) ** 4))
+        p2 = np.hstack((corners, 1 - np.random.rand(2, 100) ** 4))
+        t1 = scipy.spatial.Delaunay(p1.T).simplices.T
+        t2 = scipy.spatial.Delaunay(p2.T).simplices.T
+
+        i1, i2, area = cg.triangulation_overlaps(p1, p2, t1, t2)
+
+        def tri_areas(p, t):
+            d1 = p[:, t[1]] - p[:, t[0]]
+            d2 = p[:, t[2]] - p[:, t[0]]
+            return 0.5 * np.abs(d1[0] * d2[1] - d1[1] * d2[0])
+
+        area_1 = tri_areas(p1, t1)
+        self.assertTrue(area_1.max() / area_1.min() > 1e4)
+        area_2 = tri_areas(p2, t2)
+        self.assertTrue(np.allclose(np.bincount(i1, area, t1.shape[1]), area_1))
+        self.assertTrue(np.allclose(np.bincount(i2, area, t2.shape[1]), area_2))
+
     if __name__ == "__main__":
         unittest.main()
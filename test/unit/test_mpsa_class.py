@@ -38,6 +38,35 @@ class MpsaTest(unittest.TestCase):
             self.assertTrue(np.sum(A != 0) == 0)
             self.assertTrue(np.all(b == 0))
 
+    def test_compact_tensor(self):
+        # The compact tensor should give the same discretization, and the same
+        # cell-wise values, as the full one
+        kw = "mechanics"
+        for g in [pp.StructuredTriangleGrid([2, 2]), pp.CartGrid([2, 2, 2])]:
+            g.compute_geometry()
+            mu = 1 + np.arange(g.num_cells)
+            lmbda = np.ones(g.num_cells)
+            c = pp.FourthOrderTensor(g.dim, mu, lmbda)
+            c_compact = pp.FourthOrderTensor(g.dim, mu, lmbda, compact=True)
+            self.assertTrue(np.all(c.values == c_compact.values))
+            self.assertTrue(c_compact.copy().compact)
+
+            # The copy should keep all parameters
+            c_phi = pp.FourthOrderTensor(g.dim, mu, lmbda, phi=2 * lmbda, compact=True)
+            c_copy = c_phi.copy()
+            self.assertTrue(c_copy.compact)
+            self.assertTrue(np.allclose(c_copy.phi, c_phi.phi))
+            self.assertTrue(np.allclose(c_copy.values, c_phi.values))
+
+            matrices = []
+            for tensor in [c, c_compact]:
+                specified_parameters = {"fourth_order_tensor": tensor}
+                data = pp.initialize_default_data(g, {}, kw, specified_parameters)
+                pp.Mpsa(kw).discretize(g, data)
+                matrices.append(data[pp.DISCRETIZATION_MATRICES][kw])
+            for key in ["stress", "bound_stress"]:
+                self.assertEqual((matrices[0][key] != matrices[1][key]).nnz, 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -487,6 +487,70 @@ class BasicsTest(unittest.TestCase):
 # ------------------------------------------------------------------------------#
 
 
+class TensorPermeabilityTest(unittest.TestCase):
+    def grid(self):
+        g = pp.StructuredTetrahedralGrid([3, 3, 3], [1, 1, 1])
+        g.nodes[:, 21] += [0.05, -0.1, 0.05]
+        g.nodes[:, 42] += [-0.05, 0.05, 0.1]
+        g.compute_geometry()
+        return g
+
+    def test_linear_pressure(self):
+        # A linear pressure gives zero flux for a homogeneous, anisotropic medium
+        g = self.grid()
+        kxx = 2 * np.ones(g.num_cells)
+        perm = pp.SecondOrderTensor(
+            3, kxx=kxx, kyy=1 + kxx, kzz=kxx, kxy=0.5 * kxx, kxz=0.2 * kxx
+        )
+
+        bn = g.get_boundary_nodes()
+        bc = pp.BoundaryConditionNode(g, bn, bn.size * ["neu"])
+        specified_parameters = {"bc": bc, "second_order_tensor": perm}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+        M = pp.P1(keyword="flow").matrix(g, data)
+
+        p = np.dot([1, -2, 3], g.nodes)
+        internal = g.get_internal_nodes()
+        self.assertTrue(np.allclose(M.dot(p)[internal], 0))
+        self.assertTrue(np.allclose(M.dot(np.ones(g.num_nodes)), 0))
+
+    def test_cell_wise_tensor(self):
+        # Compare with the local matrices computed cell by cell
+        g = self.grid()
+        kxx = 1 + np.arange(g.num_cells)
+        perm = pp.SecondOrderTensor(3, kxx=kxx, kyy=2 * kxx, kzz=1, kxy=0.5)
+
+        bn = g.get_boundary_nodes()
+        bc = pp.BoundaryConditionNode(g, bn, bn.size * ["neu"])
+        specified_parameters = {"bc": bc, "second_order_tensor": perm}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+        solver = pp.P1(keyword="flow")
+        M = solver.matrix(g, data).todense()
+
+        M_known = np.zeros((g.num_nodes, g.num_nodes))
+        cell_nodes = g.cell_nodes()
+        for c in range(g.num_cells):
+            nodes = cell_nodes.indices[cell_nodes.indptr[c] : cell_nodes.indptr[c + 1]]
+            A = solver.stiffH1(
+                perm.values[:, :, c], g.cell_volumes[c], g.nodes[:, nodes], g.dim
+            )
+            M_known[np.ix_(nodes, nodes)] += A
+
+        self.assertTrue(np.allclose(M, M_known))
+
+    def test_mass_matrix(self):
+        g = self.grid()
+        bc = pp.BoundaryConditionNode(g)
+        data = pp.initialize_default_data(g, {}, "flow", {"bc": bc})
+        M = pp.P1MassMatrix(keyword="flow").matrix(g, data)
+
+        self.assertTrue(np.allclose(M.sum(), 1))
+        self.assertTrue(np.allclose(M.dot(np.ones(g.num_nodes)), M.sum(axis=0)))
+
+
+# ------------------------------------------------------------------------------#
+
+
 def matrix_for_test_p1_3d():
     return np.matrix(
         [
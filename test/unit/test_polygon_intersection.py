@@ -412,6 +412,102 @@ class TestIntersectionPolygonsEmbeddedIn3d(unittest.TestCase):
         known_points = np.array([[0.5, 0.0, 0], [0.5, 1.0, 0]]).T
         self.assertTrue(test_utils.compare_arrays(new_pt, known_points))
 
+    def test_general_and_vertex_in_plane(self):
+        """
+        Three fractures. Two of the pairs are in general position, for the
+        third a fracture has an edge in the plane of the other.
+        """
+        f_1 = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]]).T
+        f_2 = np.array(
+            [[0.5, -0.5, -1], [0.5, 1.5, -1], [0.5, 1.5, 1], [0.5, -0.5, 1]]
+        ).T
+        f_3 = np.array([[0.2, 0.5, 0], [0.8, 0.5, 0], [0.8, 0.5, 1], [0.2, 0.5, 1]]).T
+
+        new_pt, isect_pt, on_bound, pairs = pp.cg.intersect_polygons_3d(
+            [f_1, f_2, f_3]
+        )
+        self.assertTrue(new_pt.shape[1] == 6)
+        self.assertEqual([tuple(p) for p in pairs], [(0, 1), (0, 2), (1, 2)])
+        self.assertTrue(np.array_equal(isect_pt[0], [0, 1, 2, 3]))
+        self.assertTrue(np.array_equal(isect_pt[1], [0, 1, 4, 5]))
+        self.assertTrue(np.array_equal(isect_pt[2], [2, 3, 4, 5]))
+        self.assertEqual(on_bound[0], [False, False])
+        self.assertEqual(on_bound[1], [False, False])
+        self.assertEqual(on_bound[2], [True, False])
+
+        known_points = np.array(
+            [
+                [0.5, 0, 0],
+                [0.5, 1, 0],
+                [0.2, 0.5, 0],
+                [0.8, 0.5, 0],
+                [0.5, 0.5, 0],
+                [0.5, 0.5, 1],
+            ]
+        ).T
+        self.assertTrue(test_utils.compare_arrays(new_pt, known_points))
+
+    def test_many_fractures(self):
+        """
+        Parallel fractures crossed by a single fracture, and a set of
+        fractures far away.
+        """
+        polys = []
+        for z in np.linspace(0.1, 0.9, 9):
+            polys.append(np.array([[0, 0, z], [1, 0, z], [1, 1, z], [0, 1, z]]).T)
+            polys.append(polys[-1] + np.array([[5], [0], [0]]))
+        polys.append(
+            np.array([[0.5, -1, -1], [0.5, 2, -1], [0.5, 2, 2], [0.5, -1, 2]]).T
+        )
+
+        new_pt, isect_pt, on_bound, pairs = pp.cg.intersect_polygons_3d(polys)
+        self.assertEqual([tuple(p) for p in pairs], [(i, 18) for i in range(0, 18, 2)])
+        self.assertTrue(new_pt.shape[1] == 18)
+        self.assertTrue(np.allclose(new_pt[0], 0.5))
+        self.assertTrue(np.allclose(new_pt[1], np.tile([0, 1], 9)))
+        self.assertTrue(np.allclose(new_pt[2], np.repeat(np.linspace(0.1, 0.9, 9), 2)))
+        self.assertTrue(np.array_equal(isect_pt[18], np.arange(18)))
+        for i in range(1, 18, 2):
+            self.assertEqual(len(isect_pt[i]), 0)
+
+    def test_mixed_number_of_vertexes(self):
+        """
+        Parallel fractures crossed by a fracture with many vertexes. The pairs
+        are also computed in small chunks, which should give the same result.
+        """
+        polys = []
+        for x in np.linspace(0.1, 0.9, 5):
+            polys.append(np.array([[x, -1, 0], [x, 2, 0], [x, 2, 1], [x, -1, 1]]).T)
+        angle = np.linspace(0, 2 * np.pi, 64, endpoint=False)
+        polys.append(
+            np.vstack(
+                (0.5 + 3 * np.cos(angle), 0.5 + 3 * np.sin(angle), 0.5 * np.ones(64))
+            )
+        )
+
+        new_pt, isect_pt, on_bound, pairs = pp.cg.intersect_polygons_3d(polys)
+        self.assertEqual([tuple(p) for p in pairs], [(i, 5) for i in range(5)])
+        self.assertTrue(new_pt.shape[1] == 10)
+        known_points = np.vstack(
+            (
+                np.repeat(np.linspace(0.1, 0.9, 5), 2),
+                np.tile([-1, 2], 5),
+                0.5 * np.ones(10),
+            )
+        )
+        self.assertTrue(test_utils.compare_arrays(new_pt, known_points))
+
+        pairs = np.array([[0, 1, 2, 3, 4, 0], [5, 5, 5, 5, 5, 1]])
+        full = pp.cg._intersect_polygon_pairs_3d(polys, pairs)
+        chunked = pp.cg._intersect_polygon_pairs_3d(polys, pairs, max_entries=50)
+        self.assertTrue(np.array_equal(full[0], chunked[0]))
+        self.assertTrue(np.array_equal(full[2], chunked[2]))
+        self.assertTrue(np.allclose(full[1][full[0]], chunked[1][full[0]]))
+        # The middle fracture contains vertexes of the many-vertex fracture, and
+        # is left undecided.
+        self.assertTrue(np.array_equal(full[0], [1, 1, 0, 1, 1, 0]))
+        self.assertTrue(np.array_equal(full[2], [0, 0, 1, 0, 0, 0]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1830,3 +1830,44 @@ def matrix_for_test_rt0_3d():
 
 
 # ------------------------------------------------------------------------------#
+
+
+class ProjectFluxTest(unittest.TestCase):
+    def test_opposite_side_node(self):
+        g = pp.StructuredTetrahedralGrid([2, 2, 2], [1, 1, 1])
+        g.compute_geometry()
+
+        faces = g.cell_faces.indices.reshape((g.num_cells, -1))
+        nodes, _, _ = sps.find(g.face_nodes)
+        node = pp.RT0.opposite_side_node_batch(g.face_nodes, faces)
+
+        for c in range(g.num_cells):
+            known = pp.RT0.opposite_side_node(g.face_nodes, nodes, faces[c])
+            self.assertTrue(np.array_equal(node[c], known))
+
+    def test_constant_velocity_tetra(self):
+        g = pp.StructuredTetrahedralGrid([2, 2, 2], [1, 1, 1])
+        g.nodes[:, 13] += [0.1, -0.05, 0.05]
+        g.compute_geometry()
+
+        specified_parameters = {"aperture": np.ones(g.num_cells)}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+
+        velocity = np.array([1, -2, 3])
+        u = np.dot(velocity, g.face_normals)
+        P0u = pp.RT0("flow").project_flux(g, u, data)
+        self.assertTrue(np.allclose(P0u, velocity.reshape((-1, 1))))
+
+    def test_constant_velocity_2d_surf(self):
+        g = pp.StructuredTriangleGrid([3, 2], [1, 1])
+        R = cg.rot(np.pi / 4.0, [1, 1, 0])
+        g.nodes = np.dot(R, g.nodes)
+        g.compute_geometry()
+
+        specified_parameters = {"aperture": np.ones(g.num_cells)}
+        data = pp.initialize_default_data(g, {}, "flow", specified_parameters)
+
+        velocity = np.dot(R, [1, -2, 0])
+        u = np.dot(velocity, g.face_normals)
+        P0u = pp.RT0("flow").project_flux(g, u, data)
+        self.assertTrue(np.allclose(P0u, velocity.reshape((-1, 1))))
@@ -179,6 +179,40 @@ class TestUniqueColumns(unittest.TestCase):
                 np.min(np.sum(np.abs(p_known[:, i] - p_unique), axis=0)) == 0
             )
 
+    def test_chain_of_close_points(self):
+        # The second point is represented by the first one. The third point is
+        # close to the second one only, and is therefore kept.
+        p = np.array([[0, 0.6, 1.2, 0.1]]) * 1e-3
+        p_unique, new_2_old, old_2_new = setmembership.unique_columns_tol(
+            p, tol=1e-3
+        )
+
+        self.assertTrue(np.allclose(p_unique, np.array([[0, 1.2e-3]])))
+        self.assertTrue(np.all(new_2_old == np.array([0, 2])))
+        self.assertTrue(np.all(old_2_new == np.array([0, 0, 1, 0])))
+
+    def test_first_kept_point_is_representative(self):
+        p = np.array([[0, 1, 0.5, 1], [0, 0, 0, 1e-9]])
+        p_unique, new_2_old, old_2_new = setmembership.unique_columns_tol(
+            p, tol=0.4
+        )
+
+        self.assertTrue(np.all(new_2_old == np.array([0, 1])))
+        self.assertTrue(np.all(old_2_new == np.array([0, 1, 0, 1])))
+
+    def test_unique_columns_tol_batch(self):
+        p = np.array([[0, 1, 1], [0, 0, 0]], dtype=np.float)
+        q = np.array([[1 + 1e-10, 2], [0, 0]])
+        p_unique, new_2_old, old_2_new = setmembership.unique_columns_tol_batch(
+            [p, q]
+        )
+
+        self.assertTrue(np.allclose(p_unique, np.array([[0, 1, 2], [0, 0, 0]])))
+        self.assertTrue(np.all(new_2_old == np.array([0, 1, 4])))
+        self.assertEqual(len(old_2_new), 2)
+        self.assertTrue(np.all(old_2_new[0] == np.array([0, 1, 1])))
+        self.assertTrue(np.all(old_2_new[1] == np.array([1, 2])))
+
 
 if __name__ == "__main__":
     unittest.main()
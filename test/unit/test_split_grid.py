@@ -0,0 +1,56 @@
+import numpy as np
+import unittest
+
+import porepy as pp
+
+
+class TestDuplicateNodes(unittest.TestCase):
+    def setUp(self):
+        self.f1 = np.array([[0, 2], [1, 1]])
+        self.f2 = np.array([[1, 1], [0, 2]])
+
+    def test_x_intersection(self):
+        gb = pp.meshing.cart_grid([self.f1, self.f2], [2, 2], physdims=[2, 2])
+        g = gb.grids_of_dimension(2)[0]
+
+        # The center node is split in four, the other fracture nodes in two
+        self.assertEqual(g.num_nodes, 16)
+        self.assertEqual(g.nodes.shape[1], 16)
+        self.assertEqual(g.face_nodes.shape[0], 16)
+
+        # The copies replace the original node, ordered by the cells
+        nodes = np.array(
+            [
+                [0, 1, 1, 2, 0, 0, 1, 1, 1, 1, 2, 2, 0, 1, 1, 2],
+                [0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2],
+            ]
+        )
+        self.assertTrue(np.allclose(g.nodes[:2], nodes))
+
+        # No node is shared between cells
+        cell_nodes = g.cell_nodes().tocsr()
+        self.assertTrue(np.all(cell_nodes.sum(axis=1) == 1))
+        cells = np.array([0, 0, 1, 1, 0, 2, 0, 1, 2, 3, 1, 3, 2, 2, 3, 3])
+        self.assertTrue(np.all(cell_nodes.indices == cells))
+
+    def test_offset(self):
+        offset = 0.1
+        gb = pp.meshing.cart_grid(
+            [self.f1, self.f2], [2, 2], physdims=[2, 2], offset=offset
+        )
+        g = gb.grids_of_dimension(2)[0]
+
+        # The copies of the center node are moved diagonally into their cells
+        center = np.array([6, 7, 8, 9])
+        dist = np.linalg.norm(g.nodes[:2, center] - 1, axis=0)
+        self.assertTrue(np.allclose(dist, offset))
+        cell_centers = g.cell_centers[:2, [0, 1, 2, 3]]
+        self.assertTrue(np.all((g.nodes[:2, center] - 1) * (cell_centers - 1) > 0))
+
+        # Nodes that are not on the fractures are not moved
+        corners = np.array([0, 3, 12, 15])
+        self.assertTrue(np.allclose(g.nodes[:2, corners], [[0, 2, 0, 2], [0, 0, 2, 2]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
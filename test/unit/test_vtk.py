@@ -1,4 +1,6 @@
+import os
 import sys
+import xml.etree.ElementTree as ET
 import numpy as np
 import unittest
 
@@ -2689,6 +2691,204 @@ class BasicsTest(unittest.TestCase):
 """
 
 
+# ------------------------------------------------------------------------------#
+
+
+class BuiltinWriterTest(unittest.TestCase):
+    """ Test of the vtu writer used when the vtk module is not available. """
+
+    def test_single_grid_2d_cart(self):
+        g = structured.CartGrid([2, 1], [2, 1])
+        g.compute_geometry()
+
+        folder = "./test_vtk/"
+        save = Exporter(g, "grid", folder, binary=False, use_vtk=False)
+        save.write_vtk({"dummy_scalar": np.array([1.0, 2.0])})
+
+        arrays = self._read_vtu(folder + "grid.vtu")
+        self.assertTrue(np.allclose(arrays["Points"], g.nodes.ravel(order="F")))
+        self.assertTrue(
+            np.array_equal(arrays["connectivity"], [0, 3, 4, 1, 1, 4, 5, 2])
+        )
+        self.assertTrue(np.array_equal(arrays["offsets"], [4, 8]))
+        self.assertTrue(np.array_equal(arrays["types"], [7, 7]))
+        self.assertTrue(np.allclose(arrays["dummy_scalar"], [1, 2]))
+        self.assertTrue(np.array_equal(arrays["cell_id"], [0, 1]))
+
+    def test_single_grid_3d_cart(self):
+        g = structured.CartGrid([1, 1, 1])
+        g.compute_geometry()
+
+        folder = "./test_vtk/"
+        save = Exporter(g, "grid", folder, binary=False, use_vtk=False)
+        save.write_vtk({"dummy_vector": np.ones((3, 1))})
+
+        arrays = self._read_vtu(folder + "grid.vtu")
+        self.assertTrue(np.array_equal(arrays["connectivity"], np.arange(8)))
+        self.assertTrue(np.array_equal(arrays["types"], [42]))
+        faces = [6, 4, 4, 6, 2, 0, 4, 5, 7, 3, 1, 4, 4, 0, 1, 5]
+        faces += [4, 6, 2, 3, 7, 4, 0, 2, 3, 1, 4, 4, 6, 7, 5]
+        self.assertTrue(np.array_equal(arrays["faces"], faces))
+        self.assertTrue(np.array_equal(arrays["faceoffsets"], [31]))
+        self.assertTrue(np.allclose(arrays["dummy_vector"], [1, 1, 1]))
+
+    def test_binary_equals_ascii(self):
+        g = structured.CartGrid([3, 2, 3], [1] * 3)
+        g.compute_geometry()
+        co.generate_coarse_grid(
+            g, [0, 0, 1, 0, 1, 1, 0, 2, 2, 3, 2, 2, 4, 4, 4, 4, 4, 4]
+        )
+        g.compute_geometry()
+
+        folder = "./test_vtk/"
+        data = {"dummy_scalar": np.arange(g.num_cells, dtype=np.float)}
+        Exporter(g, "ascii", folder, binary=False, use_vtk=False).write_vtk(data)
+        Exporter(g, "binary", folder, use_vtk=False).write_vtk(data)
+
+        ascii_arrays = self._read_vtu(folder + "ascii.vtu")
+        binary_arrays = self._read_vtu(folder + "binary.vtu")
+        self.assertEqual(ascii_arrays.keys(), binary_arrays.keys())
+        for name, values in ascii_arrays.items():
+            self.assertTrue(np.allclose(values, binary_arrays[name]))
+
+    def test_gb(self):
+        f1 = np.array([[0, 1], [0.5, 0.5]])
+        gb = meshing.cart_grid([f1], [4] * 2, **{"physdims": [1, 1]})
+        gb.compute_geometry()
+
+        folder = "./test_vtk/"
+        save = Exporter(gb, "grid", folder, use_vtk=False)
+        save.write_vtk()
+
+        arrays_1 = self._read_vtu(folder + "grid_1.vtu")
+        self.assertTrue(np.array_equal(arrays_1["types"], 3 * np.ones(4)))
+        self.assertTrue(np.array_equal(arrays_1["offsets"], 2 * np.arange(1, 5)))
+
+        arrays_2 = self._read_vtu(folder + "grid_2.vtu")
+        self.assertTrue(np.array_equal(arrays_2["types"], 7 * np.ones(16)))
+        self.assertTrue(np.array_equal(arrays_2["grid_dim"], 2 * np.ones(16)))
+
+        arrays_m = self._read_vtu(folder + "grid_mortar_1.vtu")
+        self.assertTrue(np.array_equal(arrays_m["mortar_side"], [1] * 4 + [2] * 4))
+
+    # ------------------------------------------------------------------------------#
+
+    def _read_vtu(self, file_name):
+        """ Read all the data arrays of a vtu file written by the exporter. """
+        with open(file_name, "rb") as content_file:
+            content = content_file.read()
+
+        types = {"UInt8": np.uint8, "Int64": np.int64, "Float64": np.float64}
+        head, sep, appended = content.partition(b'<AppendedData encoding="raw">')
+        if sep:
+            # the raw data starts after the underscore
+            appended = appended[appended.find(b"_") + 1 :]
+            head += b"</VTKFile>"
+        root = ET.fromstring(head)
+
+        arrays = {}
+        for array in root.iter("DataArray"):
+            dtype = types[array.get("type")]
+            if array.get("format") == "ascii":
+                arrays[array.get("Name")] = np.fromstring(
+                    array.text, dtype=dtype, sep=" "
+                )
+            else:
+                offset = int(array.get("offset"))
+                num_bytes = int(np.frombuffer(appended, np.uint64, 1, offset)[0])
+                arrays[array.get("Name")] = np.frombuffer(
+                    appended, dtype, num_bytes // np.dtype(dtype).itemsize, offset + 8
+                )
+        return arrays
+
+
+# ------------------------------------------------------------------------------#
+
+
+class TimeSeriesTest(unittest.TestCase):
+    """ Test of the export of a time series with the mesh written once. """
+
+    def test_single_grid(self):
+        g = structured.CartGrid([2, 1], [2, 1])
+        g.compute_geometry()
+
+        folder = "./test_vtk/"
+        save = Exporter(g, "series", folder, time_series=True)
+        for step in range(3):
+            save.write_vtk({"dummy_scalar": step * np.ones(2)}, time_step=step)
+        save.write_pvd(np.array([0.0, 0.5, 1.0]))
+
+        root = ET.parse(folder + "series.xdmf").getroot()
+        steps = root.find("Domain").find("Grid").findall("Grid")
+        self.assertEqual(len(steps), 3)
+
+        for step, grid in enumerate(steps):
+            self.assertEqual(float(grid.find("Time").get("Value")), 0.5 * step)
+            grid = grid.find("Grid")
+            topology = self._read_data_item(folder, grid.find("Topology"))
+            known = [3, 4, 0, 3, 4, 1, 3, 4, 1, 4, 5, 2]
+            self.assertTrue(np.array_equal(topology, known))
+            points = self._read_data_item(folder, grid.find("Geometry"))
+            self.assertTrue(np.allclose(points, g.nodes.T))
+            for attribute in grid.findall("Attribute"):
+                if attribute.get("Name") == "dummy_scalar":
+                    values = self._read_data_item(folder, attribute)
+                    self.assertTrue(np.allclose(values, step))
+
+    def test_mesh_written_once(self):
+        f1 = np.array([[0, 1], [0.5, 0.5]])
+        gb = meshing.cart_grid([f1], [4] * 2, **{"physdims": [1, 1]})
+        gb.compute_geometry()
+        gb.add_node_props(["dummy_scalar"])
+
+        folder = "./test_vtk/"
+        save = Exporter(gb, "series", folder, time_series=True)
+        sizes = []
+        for step in range(3):
+            for g, d in gb:
+                d["dummy_scalar"] = step * np.ones(g.num_cells)
+            save.write_vtk(["dummy_scalar"], time_step=step)
+            sizes.append(
+                (
+                    os.path.getsize(folder + "series_mesh.bin"),
+                    os.path.getsize(folder + "series_data.bin"),
+                )
+            )
+        # the mesh is not written again, the data grows linearly
+        self.assertTrue(np.all([s[0] == sizes[0][0] for s in sizes]))
+        self.assertEqual(sizes[2][1], 3 * sizes[0][1])
+
+        root = ET.parse(folder + "series.xdmf").getroot()
+        steps = root.find("Domain").find("Grid").findall("Grid")
+        self.assertEqual(len(steps), 3)
+        for step, collection in enumerate(steps):
+            self.assertEqual(float(collection.find("Time").get("Value")), step)
+            names = [grid.get("Name") for grid in collection.findall("Grid")]
+            self.assertEqual(names, ["series_1", "series_2", "series_mortar_1"])
+            for grid in collection.findall("Grid"):
+                for attribute in grid.findall("Attribute"):
+                    values = self._read_data_item(folder, attribute)
+                    if attribute.get("Name") == "dummy_scalar":
+                        self.assertTrue(np.allclose(values, step))
+                    elif attribute.get("Name") == "is_mortar":
+                        is_mortar = grid.get("Name") == "series_mortar_1"
+                        self.assertTrue(np.all(values == is_mortar))
+
+    # ------------------------------------------------------------------------------#
+
+    def _read_data_item(self, folder, element):
+        """ Read the binary data item of an xdmf element. """
+        item = element.find("DataItem")
+        types = {"Int": np.int64, "Float": np.float64, "UChar": np.uint8}
+        dims = [int(d) for d in item.get("Dimensions").split()]
+        with open(os.path.join(folder, item.text), "rb") as data_file:
+            data_file.seek(int(item.get("Seek")))
+            values = np.fromfile(
+                data_file, dtype=types[item.get("NumberType")], count=np.prod(dims)
+            )
+        return values.reshape(dims)
+
+
 # ------------------------------------------------------------------------------#
 
 if __name__ == "__main__":